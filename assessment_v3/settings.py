@@ -85,6 +85,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReadYourWritesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -130,6 +131,73 @@ else:
         }
     }
 
+# Optional read-only replica for analytics, report card and export reads
+# (core/db_router.py). ANALYTICS_SQLITE_PATH points at a local copy kept in
+# sync with `python manage.py sync_analytics_replica` for development.
+if os.environ.get('ANALYTICS_DATABASE_URL') and _HAS_DJ_DATABASE_URL:
+    DATABASES['analytics'] = dj_database_url.parse(
+        os.environ['ANALYTICS_DATABASE_URL'],
+        conn_max_age=600,
+        conn_health_checks=True,
+    )
+elif os.environ.get('ANALYTICS_SQLITE_PATH'):
+    DATABASES['analytics'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['ANALYTICS_SQLITE_PATH'],
+    }
+if 'analytics' in DATABASES:
+    DATABASES['analytics']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['core.db_router.QuestionBankRouter', 'core.db_router.AnalyticsReplicaRouter']
+
+# Fall back to the primary when the replica trails it by more than this many
+# seconds; after a user writes, their reads stay on the primary this long.
+# Lag is measured on StudentTestResult only (see db_router.replica_lag).
+ANALYTICS_REPLICA_MAX_LAG = int(os.environ.get('ANALYTICS_REPLICA_MAX_LAG', 300))
+ANALYTICS_REPLICA_CHECK_INTERVAL = 30  # seconds between lag checks
+
+# Grades / subjects / topics / LOs are cached per process (core/taxonomy.py);
+# other processes' edits show up within this many seconds.
+TAXONOMY_CHECK_INTERVAL = 5
+
+# Run OCR over embedded images when a question is saved, so image-only
+# questions are searchable at once (core/search.py). Slow; when off, run
+# `python manage.py rebuild_question_search --ocr` instead.
+QUESTION_SEARCH_OCR = os.environ.get('QUESTION_SEARCH_OCR', '').lower() in ('1', 'true', 'yes')
+
+# "Similar questions" snapshots written by `python manage.py rebuild_question_similarity`
+# (core/similarity.py); processes pick up vectors written since within this many seconds.
+QUESTION_SIMILARITY_DIR = Path(os.environ.get('QUESTION_SIMILARITY_DIR', BASE_DIR / 'question_similarity'))
+SIMILARITY_CHECK_INTERVAL = 5
+
+# Caches
+# Analytics results (core/analytics/cache.py) live in their own process-local
+# cache; LocMemCache evicts least recently used entries once MAX_ENTRIES is hit.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'analytics': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'analytics',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('ANALYTICS_CACHE_MAX_ENTRIES', 1000)),
+            'CULL_FREQUENCY': 10,
+        },
+    },
+}
+
+# Server-side report card PDFs (core/report_card_batch.py): rendering
+# processes per web process, and how long a pending / running batch may go
+# without progress before it is considered lost to a restart.
+REPORT_CARD_PDF_WORKERS = int(os.environ.get('REPORT_CARD_PDF_WORKERS', 2))
+REPORT_CARD_BATCH_STALE_AFTER = 15 * 60  # seconds
+
+# Columnar analytics snapshots written by `python manage.py export_analytics_snapshot`
+# (core/analytics/snapshots.py); one directory per school and month.
+ANALYTICS_SNAPSHOT_DIR = Path(os.environ.get('ANALYTICS_SNAPSHOT_DIR', BASE_DIR / 'analytics_snapshots'))
+
 # Static files configuration
 STATICFILES_DIRS = [
     BASE_DIR / "static",
@@ -15,11 +15,13 @@ from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, HttpResponse
 from django.db.models import Q
 from django.views.decorators.http import require_POST
-from django.core.paginator import Paginator
 
 from .models import (
     Question, Topic, LearningObjective, Grade, Subject
 )
+from .taxonomy import get_taxonomy
+from .question_tree import load_trees
+from .keyset import LISTING_COUNT_LIMIT, KeysetPaginator
 
 
 @login_required
@@ -33,12 +35,13 @@ def ai_tagging_export(request):
     subject_id = request.GET.get('subject', '')
     include_tagged = request.GET.get('include_tagged', '') == '1'
 
-    grades = Grade.objects.all().order_by('name')
-    subjects = Subject.objects.all().order_by('name')
+    grades = get_taxonomy().grade_list()
+    subjects = get_taxonomy().subject_list()
 
     questions = []
     topics = []
     los = []
+    paginator = page_obj = None
     selected_grade = None
     selected_subject = None
 
@@ -47,20 +50,21 @@ def ai_tagging_export(request):
         selected_subject = Subject.objects.filter(id=subject_id).first()
 
         if selected_grade and selected_subject:
-            # Get questions
-            q_filter = Q(grade=selected_grade, subject=selected_subject, parent__isnull=True)
-            qs = Question.objects.filter(q_filter).select_related(
-                'topic', 'grade', 'subject'
-            ).prefetch_related('learning_objectives').order_by('id')
-
-            for q in qs:
+            # Get questions (already-tagged ones only if requested)
+            qs = Question.objects.filter(
+                grade=selected_grade, subject=selected_subject, parent__isnull=True
+            ).select_related('topic').prefetch_related('learning_objectives')
+            if not include_tagged:
+                qs = qs.filter(is_fully_tagged=False)
+
+            # Paginate: 40 questions per page, by cursor (core/keyset.py)
+            paginator = KeysetPaginator(qs, 40, ['id'], count_limit=LISTING_COUNT_LIMIT)
+            page_obj = paginator.get_page(request.GET.get('cursor'))
+
+            for q in page_obj:
                 current_topic = q.topic.name if q.topic else ''
                 current_los = [lo.code for lo in q.learning_objectives.all()]
 
-                # Skip already-tagged questions if not requested
-                if not include_tagged and current_topic and current_los:
-                    continue
-
                 questions.append({
                     'id': q.id,
                     'question_text': q.question_text,
@@ -87,16 +91,14 @@ def ai_tagging_export(request):
                 .values('id', 'code', 'description', 'topic__name')
             )
 
-    # Paginate: 40 questions per page
-    total_questions = len(questions)
-    paginator = Paginator(questions, 40)
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    total_questions = 0
+    if paginator is not None:
+        total_questions = paginator.count if paginator.count_is_exact else f'{paginator.count}+'
 
     context = {
         'grades': grades,
         'subjects': subjects,
-        'questions': page_obj,
+        'questions': questions,
         'all_question_count': total_questions,
         'topics': topics,
         'los': los,
@@ -183,6 +185,10 @@ def ai_tagging_export_text(request):
     lines.append(f"QUESTIONS TO TAG ({questions.count()} total):")
     lines.append("-" * 70)
 
+    # Sub-questions of every exported question in one query
+    questions = list(questions)
+    trees = load_trees([q.id for q in questions])
+
     for q in questions:
         lines.append("")
         lines.append(f"--- Question ID: {q.id} | Type: {q.question_type} | Marks: {q.marks} ---")
@@ -210,8 +216,8 @@ def ai_tagging_export_text(request):
             lines.append(f"Text: {text_content}")
 
         # Include sub-questions / parts if any
-        sub_qs = Question.objects.filter(parent=q).order_by('id')
-        if sub_qs.exists():
+        sub_qs = sorted(trees[q.id].tree_children, key=lambda sq: sq.id) if q.id in trees else []
+        if sub_qs:
             for i, sq in enumerate(sub_qs, 1):
                 sub_text = sq.question_text or ''
                 sub_has_img = bool(re.search(r'<img[^>]*>', sub_text))
@@ -254,8 +260,8 @@ def ai_tagging_import(request):
     POST: processes the uploaded file
     """
     if request.method == 'GET':
-        grades = Grade.objects.all().order_by('name')
-        subjects = Subject.objects.all().order_by('name')
+        grades = get_taxonomy().grade_list()
+        subjects = get_taxonomy().subject_list()
         return render(request, 'teacher/ai_tagging_import.html', {
             'grades': grades,
             'subjects': subjects,
@@ -0,0 +1,164 @@
+"""
+Dependency-tracked analytics result cache.
+
+Every cached result declares the schools, tests, students and subjects it
+was computed from. Its key embeds the current AnalyticsVersion of each
+dependency, and answer/grade writes (or, for subjects, question bank and
+syllabus edits) bump those versions (see core/signals.py), so an edit
+invalidates exactly the entries that read the changed data; superseded
+entries are never read back and age out of the LRU 'analytics' cache.
+"""
+import hashlib
+from collections import defaultdict
+
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Q
+
+from core.models import AnalyticsVersion, Student
+
+ANALYTICS_TTL = 60 * 60  # seconds
+
+MAX_KEY_LENGTH = 200
+
+
+def _cache():
+    return caches['analytics']
+
+
+def _dependencies(schools=(), tests=(), students=(), subjects=()):
+    """[(scope, sorted ids), ...] for the non-empty dependency sets."""
+    deps = []
+    for scope, ids in (('school', schools), ('test', tests), ('student', students), ('subject', subjects)):
+        ids = sorted({int(i) for i in ids if i is not None})
+        if ids:
+            deps.append((scope, ids))
+    return deps
+
+
+def data_versions(schools=(), tests=(), students=(), subjects=()):
+    """{(scope, id): version} for the given objects, in one query.
+    Objects whose data never changed are at version 0."""
+    deps = _dependencies(schools, tests, students, subjects)
+    versions = {(scope, i): 0 for scope, ids in deps for i in ids}
+    if not deps:
+        return versions
+
+    condition = Q()
+    for scope, ids in deps:
+        condition |= Q(scope=scope, object_id__in=ids)
+    # From the primary even inside analytics_reads(): a lagging replica's
+    # versions would keep serving entries computed before the latest writes
+    versions.update(
+        ((scope, object_id), version)
+        for scope, object_id, version in AnalyticsVersion.objects.using(DEFAULT_DB_ALIAS).filter(condition)
+        .values_list('scope', 'object_id', 'version')
+    )
+    return versions
+
+
+def bump_versions(schools=(), tests=(), students=(), subjects=()):
+    """Invalidate every cached result that depends on any of these objects."""
+    for scope, ids in _dependencies(schools, tests, students, subjects):
+        AnalyticsVersion.objects.bulk_create(
+            [AnalyticsVersion(scope=scope, object_id=i) for i in ids],
+            ignore_conflicts=True,
+        )
+        AnalyticsVersion.objects.filter(scope=scope, object_id__in=ids).update(
+            version=F('version') + 1
+        )
+
+
+def bump_student_versions(student_ids, test_ids=()):
+    """bump_versions for these students, their schools and the given tests."""
+    student_ids = set(student_ids)
+    schools = Student.objects.filter(id__in=student_ids).values_list('school_id', flat=True).distinct()
+    bump_versions(schools=schools, tests=test_ids, students=student_ids)
+
+
+def queue_on_commit(name, items, flush):
+    """
+    Add `items` to the set queued under `name` and call flush(items) once
+    when the current transaction commits (straight away outside one), so a
+    transaction that writes many rows does the follow-up work once per
+    distinct item. Items queued by a rolled-back transaction are dropped.
+    """
+    connection = transaction.get_connection()
+    queues = connection.__dict__.setdefault('analytics_queues', {})
+    entry = queues.get(name)
+    # A rollback discards the registered callback along with the transaction
+    if entry is None or not any(hook[1] is entry['callback'] for hook in connection.run_on_commit):
+        def callback():
+            if queues.get(name) is entry:
+                del queues[name]
+            flush(entry['items'])
+
+        entry = queues[name] = {'items': set(items), 'callback': callback}
+        transaction.on_commit(callback)
+    else:
+        entry['items'].update(items)
+
+
+def _flush_bumps(items):
+    ids = defaultdict(set)
+    for scope, object_id in items:
+        ids[scope].add(object_id)
+    if ids['student']:
+        schools = Student.objects.filter(id__in=ids['student']).values_list('school_id', flat=True)
+        ids['school'].update(schools)
+    bump_versions(schools=ids['school'], tests=ids['test'], students=ids['student'], subjects=ids['subject'])
+
+
+def bump_versions_on_commit(schools=(), tests=(), students=(), subjects=()):
+    """
+    bump_versions once the current transaction commits, merged with every
+    other bump queued in it. Students also bump their schools.
+    """
+    items = [(scope, i) for scope, ids in _dependencies(schools, tests, students, subjects) for i in ids]
+    if items:
+        queue_on_commit('bump_versions', items, _flush_bumps)
+
+
+def result_key(name, schools=(), tests=(), students=(), subjects=()):
+    versions = data_versions(schools, tests, students, subjects)
+    deps = ','.join(f'{scope}:{i}@{v}' for (scope, i), v in sorted(versions.items()))
+    key = f'analytics:{name}:{deps}'
+    # Names can carry raw query parameters; keep keys short and whitespace-free
+    if len(key) > MAX_KEY_LENGTH or not key.isprintable() or ' ' in key:
+        key = f'analytics:{hashlib.sha1(key.encode()).hexdigest()}'
+    return key
+
+
+def cached_result(name, compute, timeout=ANALYTICS_TTL, schools=(), tests=(), students=(), subjects=()):
+    """
+    Return compute(), reusing the cached value while none of the declared
+    school/test/student/subject dependencies has changed. `name` must capture every
+    other input of compute() (filters, query parameters, ...).
+    """
+    key = result_key(name, schools, tests, students, subjects)
+    cache = _cache()
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.set(key, result, timeout)
+    return result
+
+
+def cached_test_result(test_id, name, compute, timeout=ANALYTICS_TTL):
+    """Per-test result, recomputed when the test's answers or marks change."""
+    return cached_result(f'test:{name}', compute, timeout, tests=[test_id])
+
+
+def cached_student_result(student_id, name, compute, timeout=ANALYTICS_TTL):
+    """Per-student result, recomputed when the student's answers or marks change."""
+    return cached_result(f'student:{name}', compute, timeout, students=[student_id])
+
+
+def cached_school_result(school_id, name, compute, timeout=ANALYTICS_TTL):
+    """School-wide result, recomputed when any answer or mark in the school changes."""
+    return cached_result(f'school:{name}', compute, timeout, schools=[school_id])
+
+
+def cached_subject_result(subject_id, name, compute, timeout=ANALYTICS_TTL):
+    """Per-subject result, recomputed when the subject's questions, topics or LOs change."""
+    return cached_result(f'subject:{name}', compute, timeout, subjects=[subject_id])
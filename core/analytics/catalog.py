@@ -0,0 +1,67 @@
+"""
+Per-subject question bank catalog.
+
+One cached structure per subject answers the syllabus questions the smart
+test generator asks for every topic:
+
+    {topic_id: {'name', 'grade_id',
+                'question_counts': {grade_id: root questions},
+                'los': [(lo_id, code, description), ...]}}
+
+It is built with three queries and cached under the subject's
+AnalyticsVersion, which core/signals.py bumps when a question is created,
+deleted or moved to another topic / grade / subject (or parent), and when a
+topic or learning objective is saved or deleted. Bulk .update() /
+bulk_create() bypass those signals; call bump_versions(subjects=[...]) after
+them.
+"""
+from collections import defaultdict
+
+from django.db.models import Count
+
+from core.models import LearningObjective, Question, Topic
+from .cache import cached_subject_result
+
+CATALOG_TTL = 24 * 60 * 60  # seconds; edits invalidate it long before
+
+
+def build_subject_catalog(subject_id):
+    catalog = {
+        topic_id: {'name': name, 'grade_id': grade_id, 'question_counts': {}, 'los': []}
+        for topic_id, name, grade_id in Topic.objects.filter(subject_id=subject_id)
+        .order_by('name', 'id')
+        .values_list('id', 'name', 'grade_id')
+    }
+
+    counts = (
+        Question.objects.filter(subject_id=subject_id, topic__isnull=False, parent__isnull=True)
+        .values('topic_id', 'grade_id')
+        .annotate(n=Count('id'))
+        .order_by()
+        .values_list('topic_id', 'grade_id', 'n')
+    )
+    for topic_id, grade_id, n in counts:
+        if topic_id in catalog:
+            catalog[topic_id]['question_counts'][grade_id] = n
+
+    # LOs of every topic in the subject, in LearningObjective's default order
+    los = defaultdict(list)
+    for lo_id, topic_id, code, description in LearningObjective.objects.filter(
+        topic__subject_id=subject_id
+    ).values_list('id', 'topic_id', 'code', 'description'):
+        los[topic_id].append((lo_id, code, description))
+    for topic_id, topic_los in los.items():
+        catalog[topic_id]['los'] = topic_los
+    return catalog
+
+
+def subject_catalog(subject_id):
+    """The catalog of one subject, from cache while the syllabus and bank are unchanged."""
+    return cached_subject_result(
+        subject_id, 'catalog', lambda: build_subject_catalog(subject_id), timeout=CATALOG_TTL
+    )
+
+
+def question_count(entry, grade_ids):
+    """Root questions of a catalog topic entry across the given grades."""
+    return sum(entry['question_counts'].get(grade_id, 0) for grade_id in grade_ids)
@@ -12,6 +12,7 @@ You are writing a Principal Examiner Report for a multiple-choice test.
 
 Base all statements strictly on the data.
 Do not speculate about motivation or effort.
+Read each field as described under "definitions" in the data.
 
 DATA:
 {json.dumps(schema, indent=2)}
@@ -13,9 +13,11 @@ def build_examiner_schema(test, signals):
 
         question_analysis.append({
             "question": qid,
+            "correct_pct": pct,
             "difficulty": difficulty,
             "guessing": qdata["guessing"],
             "dominant_wrong_option": qdata["dominant_wrong_option"],
+            "discrimination": qdata.get("discrimination"),
         })
 
     lo_analysis = []
@@ -41,4 +43,15 @@ def build_examiner_schema(test, signals):
         "test_title": test.title,
         "question_analysis": question_analysis,
         "learning_objective_analysis": lo_analysis,
+        "reliability": signals.get("reliability", {}),
+        # Field meanings for the report writer; see compute_mcq_signals
+        "definitions": {
+            "correct_pct": "percentage of graded answers awarded any marks",
+            "dominant_wrong_option": (
+                "incorrect option chosen by at least 40% of candidates; "
+                "never the correct answer"
+            ),
+            "guessing": "three or more incorrect options chosen about equally often",
+            "discrimination": "corrected point-biserial correlation with the rest of the test",
+        },
     }
@@ -0,0 +1,236 @@
+"""
+Rasch (1PL) calibration of question difficulty and student ability.
+
+Every graded StudentAnswer of a subject becomes one response: the fraction of
+the question's marks awarded (0-1, so partial credit counts proportionally).
+The model is
+
+    P(full marks) = 1 / (1 + exp(-(ability[student] - difficulty[question])))
+
+and is fitted jointly for the whole subject with alternating Newton steps.
+Each step only needs per-student and per-question sums of residuals and
+information, i.e. np.bincount over the sparse response list, so a pass costs
+O(responses) and millions of responses fit in seconds once loaded.
+
+Weak normal priors keep students / questions with all or nothing correct
+finite, and the ability prior (mean 0) fixes the scale: 0 logits is the
+average student of the subject. Standard errors are 1/sqrt(information).
+
+Run with `python manage.py calibrate_difficulty`; views pick questions by
+difficulty band with core/analytics/sampler.py.
+"""
+import math
+from array import array
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import QuestionCalibration, StudentAbility, StudentAnswer
+from .cache import bump_versions
+
+ABILITY_PRIOR_SD = 2.0
+DIFFICULTY_PRIOR_SD = 3.0
+MAX_STEP = 1.0  # logits per Newton step
+MAX_ITERATIONS = 200
+TOLERANCE = 1e-4
+CHUNK_SIZE = 20000
+BATCH_SIZE = 2000
+
+# Band name -> target difficulty (logits); sampler.sample() draws from
+# target ± BAND_WINDOW first, so the three bands tile -1.5..1.5
+DIFFICULTY_BANDS = {'easy': -1.0, 'medium': 0.0, 'hard': 1.0}
+BAND_WINDOW = 0.5
+
+# Practice questions aim for this chance of full marks
+PRACTICE_SUCCESS_RATE = 0.7
+
+
+def _expit(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def fit_rasch(persons, items, scores, n_persons=None, n_items=None,
+              max_iterations=MAX_ITERATIONS, tolerance=TOLERANCE):
+    """
+    Fit the Rasch model to a sparse response list. `persons` / `items` are
+    0-based integer indexes, `scores` fractions in 0..1. Returns a dict with
+    ability / ability_se / difficulty / difficulty_se arrays, per-person and
+    per-item response counts and mean scores, and the iteration count.
+    """
+    persons = np.asarray(persons, dtype=np.intp)
+    items = np.asarray(items, dtype=np.intp)
+    y = np.clip(np.asarray(scores, dtype=float), 0.0, 1.0)
+    if n_persons is None:
+        n_persons = int(persons.max()) + 1 if persons.size else 0
+    if n_items is None:
+        n_items = int(items.max()) + 1 if items.size else 0
+
+    person_n = np.bincount(persons, minlength=n_persons)
+    item_n = np.bincount(items, minlength=n_items)
+    person_score = np.bincount(persons, weights=y, minlength=n_persons)
+    item_score = np.bincount(items, weights=y, minlength=n_items)
+    person_mean = person_score / np.maximum(person_n, 1)
+    item_mean = item_score / np.maximum(item_n, 1)
+
+    ability_precision = 1.0 / ABILITY_PRIOR_SD ** 2
+    difficulty_precision = 1.0 / DIFFICULTY_PRIOR_SD ** 2
+
+    # Start from the logit of each question's facility
+    clipped = np.clip(item_mean, 0.02, 0.98)
+    difficulty = np.log((1 - clipped) / clipped)
+    ability = np.zeros(n_persons)
+
+    iterations, converged = 0, False
+    for iterations in range(1, max_iterations + 1):
+        # Ability step (difficulties fixed): Hessian is diagonal per student
+        p = _expit(ability[persons] - difficulty[items])
+        gradient = person_score - np.bincount(persons, weights=p, minlength=n_persons) - ability * ability_precision
+        information = np.bincount(persons, weights=p * (1 - p), minlength=n_persons) + ability_precision
+        ability_step = np.clip(gradient / information, -MAX_STEP, MAX_STEP)
+        ability += ability_step
+
+        # Difficulty step (abilities fixed)
+        p = _expit(ability[persons] - difficulty[items])
+        gradient = np.bincount(items, weights=p, minlength=n_items) - item_score - difficulty * difficulty_precision
+        information = np.bincount(items, weights=p * (1 - p), minlength=n_items) + difficulty_precision
+        difficulty_step = np.clip(gradient / information, -MAX_STEP, MAX_STEP)
+        difficulty += difficulty_step
+
+        change = max(
+            np.abs(ability_step).max(initial=0.0),
+            np.abs(difficulty_step).max(initial=0.0),
+        )
+        if change < tolerance:
+            converged = True
+            break
+
+    p = _expit(ability[persons] - difficulty[items])
+    w = p * (1 - p)
+    ability_info = np.bincount(persons, weights=w, minlength=n_persons) + ability_precision
+    difficulty_info = np.bincount(items, weights=w, minlength=n_items) + difficulty_precision
+
+    return dict(
+        ability=ability,
+        ability_se=1.0 / np.sqrt(ability_info),
+        difficulty=difficulty,
+        difficulty_se=1.0 / np.sqrt(difficulty_info),
+        person_responses=person_n,
+        person_mean=person_mean,
+        item_responses=item_n,
+        item_mean=item_mean,
+        iterations=iterations,
+        converged=converged,
+    )
+
+
+def load_subject_responses(subject_id):
+    """(student_ids, question_ids, scores) arrays for every graded answer in the subject."""
+    students, questions, scores = array('q'), array('q'), array('d')
+    rows = (
+        StudentAnswer.objects.filter(
+            question__subject_id=subject_id,
+            marks_awarded__isnull=False,
+            question__marks__gt=0,
+        )
+        .values_list('student_id', 'question_id', 'marks_awarded', 'question__marks')
+    )
+    for student_id, question_id, awarded, maximum in rows.iterator(chunk_size=CHUNK_SIZE):
+        students.append(student_id)
+        questions.append(question_id)
+        scores.append(float(awarded) / maximum)
+    return np.frombuffer(students, dtype=np.int64), np.frombuffer(questions, dtype=np.int64), np.frombuffer(scores)
+
+
+def calibrate_subject(subject_id, stdout=None):
+    """
+    Fit the subject's responses and replace its QuestionCalibration and
+    StudentAbility rows. Returns (questions, students, responses) counts.
+    """
+    started = timezone.now()
+    student_ids, question_ids, scores = load_subject_responses(subject_id)
+    students, persons = np.unique(student_ids, return_inverse=True)
+    questions, items = np.unique(question_ids, return_inverse=True)
+
+    fit = fit_rasch(persons, items, scores, students.size, questions.size)
+    if stdout:
+        stdout.write(
+            f'  subject {subject_id}: {scores.size} responses, {questions.size} questions, '
+            f'{students.size} students, {fit["iterations"]} iterations'
+            + ('' if fit['converged'] else ' (not converged)')
+        )
+
+    calibrations = [
+        QuestionCalibration(
+            question_id=question_id,
+            subject_id=subject_id,
+            difficulty=round(difficulty, 4),
+            standard_error=round(se, 4),
+            responses=n,
+            mean_score=round(mean, 4),
+            computed_at=started,
+        )
+        for question_id, difficulty, se, n, mean in zip(
+            questions.tolist(), fit['difficulty'].tolist(), fit['difficulty_se'].tolist(),
+            fit['item_responses'].tolist(), fit['item_mean'].tolist(),
+        )
+    ]
+    abilities = [
+        StudentAbility(
+            student_id=student_id,
+            subject_id=subject_id,
+            ability=round(ability, 4),
+            standard_error=round(se, 4),
+            responses=n,
+            mean_score=round(mean, 4),
+            computed_at=started,
+        )
+        for student_id, ability, se, n, mean in zip(
+            students.tolist(), fit['ability'].tolist(), fit['ability_se'].tolist(),
+            fit['person_responses'].tolist(), fit['person_mean'].tolist(),
+        )
+    ]
+
+    with transaction.atomic():
+        # Questions moved between subjects keep one calibration row
+        QuestionCalibration.objects.filter(
+            Q(subject_id=subject_id) | Q(question__subject_id=subject_id)
+        ).delete()
+        StudentAbility.objects.filter(subject_id=subject_id).delete()
+        QuestionCalibration.objects.bulk_create(calibrations, batch_size=BATCH_SIZE)
+        StudentAbility.objects.bulk_create(abilities, batch_size=BATCH_SIZE)
+    # Question samplers index difficulties per subject
+    bump_versions(subjects=[subject_id])
+
+    return len(calibrations), len(abilities), int(scores.size)
+
+
+def calibrate_all(subject_ids=None, stdout=None):
+    """Calibrate every subject with graded answers (or just `subject_ids`)."""
+    if subject_ids is None:
+        subject_ids = (
+            StudentAnswer.objects.filter(marks_awarded__isnull=False)
+            .order_by()
+            .values_list('question__subject_id', flat=True)
+            .distinct()
+        )
+    totals = [0, 0, 0]
+    for subject_id in sorted(subject_ids):
+        for i, n in enumerate(calibrate_subject(subject_id, stdout=stdout)):
+            totals[i] += n
+    return tuple(totals)
+
+
+def practice_target(ability, success_rate=PRACTICE_SUCCESS_RATE):
+    """Difficulty at which a student of `ability` gets full marks with `success_rate`."""
+    return ability - math.log(success_rate / (1 - success_rate))
+
+
+def mean_ability(student_ids, subject):
+    """Mean calibrated ability of the students in `subject`, or None if none are calibrated."""
+    abilities = list(
+        StudentAbility.objects.filter(student_id__in=student_ids, subject=subject)
+        .values_list('ability', flat=True)
+    )
+    return sum(abilities) / len(abilities) if abilities else None
@@ -0,0 +1,275 @@
+"""
+Whole-test item analysis.
+
+Loads a test's responses once into a students × items matrix and computes
+classical test theory statistics for every item together with NumPy:
+
+- facility (mean proportion of marks), correct % and success rate
+- corrected point-biserial (item-rest) discrimination
+- upper/lower 27% group facility and discrimination index
+- distractor frequencies for MCQ items, split by upper/lower group
+- KR-20, Cronbach's alpha and standard error of measurement
+- LO-level attempt/correct/consistency signals
+
+Unanswered or ungraded cells count as 0 towards a student's total, which is
+the usual convention for reliability estimates.
+"""
+from collections import defaultdict
+
+import numpy as np
+
+from core.models import Question, StudentAnswer, TestQuestion
+from core.analytics.cache import cached_test_result
+
+GROUP_FRACTION = 0.27
+
+
+def _round(value, digits=3):
+    """Round a NumPy scalar for JSON, mapping NaN to None."""
+    value = float(value)
+    if np.isnan(value):
+        return None
+    return round(value, digits)
+
+
+class ResponseMatrix:
+    """Dense students × items view of one test's StudentAnswer rows."""
+
+    def __init__(self, test_id):
+        rows = list(
+            StudentAnswer.objects.filter(test_id=test_id).values_list(
+                'student_id', 'question_id', 'marks_awarded', 'answer_text', 'time_spent_seconds'
+            )
+        )
+
+        ordered = list(
+            TestQuestion.objects.filter(test_id=test_id)
+            .order_by('order', 'id')
+            .values_list('question_id', flat=True)
+        )
+        seen = set(ordered)
+        extra = sorted({r[1] for r in rows} - seen)
+        self.item_ids = list(dict.fromkeys(ordered + extra))
+        self.student_ids = sorted({r[0] for r in rows})
+
+        meta = {
+            q['id']: q
+            for q in Question.objects.filter(id__in=self.item_ids).values(
+                'id', 'marks', 'question_type', 'topic_id', 'topic__name'
+            )
+        }
+        self.item_ids = [qid for qid in self.item_ids if qid in meta]
+        self.meta = [meta[qid] for qid in self.item_ids]
+
+        item_index = {qid: j for j, qid in enumerate(self.item_ids)}
+        student_index = {sid: i for i, sid in enumerate(self.student_ids)}
+        shape = (len(self.student_ids), len(self.item_ids))
+
+        self.max_marks = np.array([float(m['marks'] or 0) for m in self.meta])
+        self.scores = np.full(shape, np.nan)
+        self.answered = np.zeros(shape, dtype=bool)
+        self.times = np.full(shape, np.nan)
+
+        # MCQ option codes per item: -1 = no response
+        self.is_mcq = np.array([m['question_type'] == 'mcq' for m in self.meta], dtype=bool)
+        self.codes = np.full(shape, -1, dtype=np.int32)
+        self.options = [dict() for _ in self.item_ids]
+
+        for sid, qid, marks, text, seconds in rows:
+            j = item_index.get(qid)
+            if j is None:
+                continue
+            i = student_index[sid]
+            self.answered[i, j] = True
+            if marks is not None:
+                self.scores[i, j] = float(marks)
+            if seconds is not None:
+                self.times[i, j] = seconds
+            if self.is_mcq[j] and text:
+                option = text.strip()
+                self.codes[i, j] = self.options[j].setdefault(option, len(self.options[j]))
+
+        self.graded = ~np.isnan(self.scores)
+
+
+def _lo_items(item_ids):
+    """lo_id -> [item column indices] from the question/LO through table."""
+    index = {qid: j for j, qid in enumerate(item_ids)}
+    through = Question.learning_objectives.through
+    lo_items = defaultdict(list)
+    for qid, lo_id in through.objects.filter(question_id__in=item_ids).values_list(
+        'question_id', 'learningobjective_id'
+    ):
+        lo_items[lo_id].append(index[qid])
+    return lo_items
+
+
+def analyse_matrix(m):
+    n_students, n_items = m.scores.shape
+    graded = m.graded
+    x = np.where(graded, m.scores, 0.0)
+    max_marks = m.max_marks
+    safe_max = np.where(max_marks > 0, max_marks, 1.0)
+
+    n_graded = graded.sum(axis=0)
+    safe_n = np.maximum(n_graded, 1)
+    proportion = x / safe_max
+    correct = graded & (x > 0)
+    success = graded & (x >= 0.5 * max_marks)
+    full = graded & (x >= max_marks)
+
+    facility = np.where(n_graded > 0, proportion.sum(axis=0) / safe_n, np.nan)
+    correct_pct = np.where(n_graded > 0, correct.sum(axis=0) / safe_n * 100, np.nan)
+    success_rate = np.where(n_graded > 0, success.sum(axis=0) / safe_n * 100, np.nan)
+
+    # Only students with at least one graded answer take part in test-level statistics
+    rows = graded.any(axis=1)
+    X = x[rows]
+    totals = X.sum(axis=1)
+    k = int((n_graded > 0).sum())
+
+    # Corrected point-biserial: correlate each item with the total of the other items
+    rest = totals[:, None] - X
+    xc = X - X.mean(axis=0) if len(X) else X
+    rc = rest - rest.mean(axis=0) if len(X) else rest
+    denom = np.sqrt((xc ** 2).sum(axis=0) * (rc ** 2).sum(axis=0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        point_biserial = np.where(denom > 0, (xc * rc).sum(axis=0) / denom, np.nan)
+
+    # Reliability
+    var_total = totals.var() if len(totals) else 0.0
+    alpha = kr20 = sem = np.nan
+    if k > 1 and var_total > 0:
+        alpha = k / (k - 1) * (1 - X.var(axis=0).sum() / var_total)
+        dich = full[rows].astype(float)
+        dich_var = dich.sum(axis=1).var()
+        if dich_var > 0:
+            p = dich.mean(axis=0)
+            kr20 = k / (k - 1) * (1 - (p * (1 - p)).sum() / dich_var)
+        sem = np.sqrt(var_total) * np.sqrt(max(0.0, 1 - alpha))
+
+    # Upper / lower 27% groups by total score
+    student_rows = np.flatnonzero(rows)
+    order = student_rows[np.argsort(-totals, kind='stable')]
+    group_size = max(1, int(round(len(order) * GROUP_FRACTION))) if len(order) else 0
+    upper, lower = order[:group_size], order[len(order) - group_size:]
+
+    def group_facility(group):
+        g = graded[group]
+        n = g.sum(axis=0)
+        return np.where(n > 0, proportion[group].sum(axis=0) / np.maximum(n, 1), np.nan)
+
+    upper_facility = group_facility(upper)
+    lower_facility = group_facility(lower)
+    discrimination_index = upper_facility - lower_facility
+
+    # Response times
+    timed = ~np.isnan(m.times)
+    n_timed = timed.sum(axis=0)
+    times0 = np.where(timed, m.times, 0.0)
+    avg_time = np.where(n_timed > 0, times0.sum(axis=0) / np.maximum(n_timed, 1), np.nan)
+    min_time = np.where(timed, m.times, np.inf).min(axis=0, initial=np.inf)
+    max_time = np.where(timed, m.times, -np.inf).max(axis=0, initial=-np.inf)
+
+    items = {}
+    for j, qid in enumerate(m.item_ids):
+        item = {
+            'question_id': qid,
+            'number': j + 1,
+            'topic_id': m.meta[j]['topic_id'],
+            'topic': m.meta[j]['topic__name'] or '',
+            'type': m.meta[j]['question_type'],
+            'marks': float(max_marks[j]),
+            'responses': int(m.answered[:, j].sum()),
+            'graded': int(n_graded[j]),
+            'facility': _round(facility[j]),
+            'correct_pct': _round(correct_pct[j], 1),
+            'success_rate': _round(success_rate[j], 1),
+            'point_biserial': _round(point_biserial[j]),
+            'upper_facility': _round(upper_facility[j]),
+            'lower_facility': _round(lower_facility[j]),
+            'discrimination_index': _round(discrimination_index[j]),
+            'avg_time': _round(avg_time[j], 1),
+            'min_time': int(min_time[j]) if n_timed[j] else None,
+            'max_time': int(max_time[j]) if n_timed[j] else None,
+            'distractors': [],
+        }
+
+        if m.is_mcq[j] and m.options[j]:
+            n_opts = len(m.options[j])
+            col = m.codes[:, j]
+            chosen = col >= 0
+            counts = np.bincount(col[chosen], minlength=n_opts)
+            keyed = np.bincount(col[chosen & correct[:, j]], minlength=n_opts)
+            up = np.bincount(col[upper][col[upper] >= 0], minlength=n_opts)
+            low = np.bincount(col[lower][col[lower] >= 0], minlength=n_opts)
+            total = max(int(chosen.sum()), 1)
+            item['distractors'] = sorted(
+                (
+                    {
+                        'option': option,
+                        'count': int(counts[c]),
+                        'pct': round(float(counts[c]) / total * 100, 1),
+                        'upper': int(up[c]),
+                        'lower': int(low[c]),
+                        'is_key': bool(keyed[c] > 0),
+                    }
+                    for option, c in m.options[j].items()
+                ),
+                key=lambda d: -d['count'],
+            )
+
+        items[qid] = item
+
+    learning_objectives = {}
+    for lo_id, cols in _lo_items(m.item_ids).items():
+        g = graded[:, cols]
+        c = correct[:, cols]
+        attempts = int(g.sum())
+        attempted_any = g.any(axis=1)
+        all_correct = (c | ~g).all(axis=1) & attempted_any
+        learning_objectives[lo_id] = {
+            'attempts': attempts,
+            'correct': int(c.sum()),
+            'mean_pct': round(float(c.sum()) / attempts * 100, 1) if attempts else 0.0,
+            'consistency_pct': (
+                round(float(all_correct.sum()) / float(attempted_any.sum()) * 100, 1)
+                if attempted_any.any() else 0.0
+            ),
+        }
+
+    earned = x.sum(axis=1)
+    possible = np.where(graded, max_marks, 0.0).sum(axis=1)
+    students = {
+        sid: {
+            'earned': float(earned[i]),
+            'max': float(possible[i]),
+            'answered': int(m.answered[i].sum()),
+            'graded': int(graded[i].sum()),
+        }
+        for i, sid in enumerate(m.student_ids)
+    }
+
+    return {
+        'student_count': int(rows.sum()),
+        'item_count': n_items,
+        'reliability': {
+            'kr20': _round(kr20),
+            'alpha': _round(alpha),
+            'sem': _round(sem, 2),
+        },
+        'group_size': int(group_size),
+        'items': items,
+        'learning_objectives': learning_objectives,
+        'students': students,
+    }
+
+
+def analyse_test(test_id):
+    """Uncached item analysis for a test."""
+    return analyse_matrix(ResponseMatrix(test_id))
+
+
+def get_item_analysis(test_id):
+    """Item analysis for a test, cached until its answers or marks change."""
+    return cached_test_result(test_id, 'item_analysis', lambda: analyse_test(test_id))
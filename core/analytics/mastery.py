@@ -0,0 +1,182 @@
+"""
+Student × topic × LO mastery fact maintenance.
+
+MasteryFact rows are keyed by (student, test, topic, learning_objective) so a
+single grade save only has to rebuild one student's slice of one test.
+Marks of a question tagged with N LOs are split equally (1/N) across them;
+topic rows (learning_objective=NULL) always carry the full marks.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, Sum
+
+from core.models import MasteryFact, Question, StudentAnswer
+
+BATCH_SIZE = 2000
+
+
+def mastery_band(mastery):
+    """Band label used across report cards and the smart test generator."""
+    if mastery is None:
+        return 'Untested'
+    if mastery >= 80:
+        return 'Mastered'
+    if mastery >= 60:
+        return 'Good'
+    if mastery >= 40:
+        return 'Developing'
+    return 'Weak'
+
+
+def mastery_pct(earned, max_marks):
+    """Mastery percentage rounded for display, or None when nothing was at stake."""
+    if not max_marks:
+        return None
+    return round((earned or 0) / max_marks * 100, 1)
+
+
+def _lo_map(question_ids):
+    """question_id -> [lo_id, ...] loaded in one query from the M2M table."""
+    through = Question.learning_objectives.through
+    lo_map = defaultdict(list)
+    rows = through.objects.filter(question_id__in=question_ids).values_list(
+        'question_id', 'learningobjective_id'
+    )
+    for qid, lo_id in rows:
+        lo_map[qid].append(lo_id)
+    return lo_map
+
+
+def _accumulate(answer_rows, lo_map, facts):
+    """Fold graded answer rows into the facts dict keyed by the fact grain."""
+    for row in answer_rows:
+        earned = float(row['marks_awarded'] or 0)
+        max_marks = float(row['question__marks'] or 0)
+        base = (row['student_id'], row['test_id'], row['question__topic_id'])
+
+        keys = [(base, None, 1.0)]
+        los = lo_map.get(row['question_id'], ())
+        if los:
+            share = 1.0 / len(los)
+            keys.extend((base, lo_id, share) for lo_id in los)
+
+        for base_key, lo_id, share in keys:
+            fact = facts[base_key + (lo_id,)]
+            fact[0] += earned * share
+            fact[1] += max_marks * share
+            fact[2] += 1
+            submitted = row['submitted_at']
+            if submitted and (fact[3] is None or submitted > fact[3]):
+                fact[3] = submitted
+
+
+def _fact_objects(facts):
+    for (student_id, test_id, topic_id, lo_id), (earned, max_marks, attempts, last) in facts.items():
+        yield MasteryFact(
+            student_id=student_id,
+            test_id=test_id,
+            topic_id=topic_id,
+            learning_objective_id=lo_id,
+            earned=earned,
+            max_marks=max_marks,
+            attempts=attempts,
+            last_attempt=last,
+        )
+
+
+ANSWER_FIELDS = (
+    'student_id', 'test_id', 'question_id', 'question__topic_id',
+    'question__marks', 'marks_awarded', 'submitted_at',
+)
+
+
+def _new_facts():
+    return defaultdict(lambda: [0.0, 0.0, 0, None])
+
+
+def refresh_mastery_facts(student_id, test_id):
+    """Rebuild the facts for one student's attempt at one test."""
+    rows = list(
+        StudentAnswer.objects.filter(
+            student_id=student_id, test_id=test_id, marks_awarded__isnull=False
+        ).values(*ANSWER_FIELDS)
+    )
+    facts = _new_facts()
+    _accumulate(rows, _lo_map({r['question_id'] for r in rows}), facts)
+
+    with transaction.atomic():
+        MasteryFact.objects.filter(student_id=student_id, test_id=test_id).delete()
+        MasteryFact.objects.bulk_create(_fact_objects(facts), batch_size=BATCH_SIZE)
+
+
+def refresh_mastery_facts_for_question(question_id):
+    """Rebuild every (student, test) slice that contains answers to a question."""
+    pairs = set(
+        StudentAnswer.objects.filter(question_id=question_id)
+        .values_list('student_id', 'test_id')
+    )
+    for student_id, test_id in pairs:
+        refresh_mastery_facts(student_id, test_id)
+
+
+def rebuild_mastery_facts(answers=None, stdout=None):
+    """
+    Rebuild facts from scratch for the given StudentAnswer queryset (default:
+    every answer). Answers are streamed in (student, test) order so memory is
+    bounded by the size of one slice plus the pending insert batch.
+    Returns the number of fact rows written.
+    """
+    if answers is None:
+        answers = StudentAnswer.objects.all()
+
+    graded = answers.filter(marks_awarded__isnull=False).order_by('student_id', 'test_id')
+    lo_map = _lo_map(graded.values('question_id'))
+
+    written = 0
+    with transaction.atomic():
+        # Exactly the (student, test) slices being rebuilt, not every
+        # combination of their students and tests
+        MasteryFact.objects.filter(Exists(answers.filter(
+            student_id=OuterRef('student_id'), test_id=OuterRef('test_id')
+        ))).delete()
+
+        facts = _new_facts()
+        current = None
+        for row in graded.values(*ANSWER_FIELDS).iterator(chunk_size=BATCH_SIZE):
+            slice_key = (row['student_id'], row['test_id'])
+            if slice_key != current and len(facts) >= BATCH_SIZE:
+                MasteryFact.objects.bulk_create(_fact_objects(facts), batch_size=BATCH_SIZE)
+                written += len(facts)
+                facts = _new_facts()
+                if stdout:
+                    stdout.write(f'  {written} fact rows written...')
+            current = slice_key
+            _accumulate((row,), lo_map, facts)
+
+        MasteryFact.objects.bulk_create(_fact_objects(facts), batch_size=BATCH_SIZE)
+        written += len(facts)
+
+    return written
+
+
+# ── Query helpers ────────────────────────────────────────────────
+
+def topic_facts(facts):
+    """Topic-level rows (full marks) of a MasteryFact queryset."""
+    return facts.filter(learning_objective__isnull=True)
+
+
+def lo_facts(facts):
+    """LO-share rows of a MasteryFact queryset."""
+    return facts.filter(learning_objective__isnull=False)
+
+
+def aggregate_facts(facts, *group_by):
+    """Sum earned/max/attempts grouped by the given fields."""
+    return facts.values(*group_by).annotate(
+        total_earned=Sum('earned'),
+        total_max=Sum('max_marks'),
+        total_attempts=Sum('attempts'),
+        latest_attempt=Max('last_attempt'),
+    ).order_by()
@@ -1,58 +1,54 @@
-from collections import Counter, defaultdict
-from decimal import Decimal
+from core.models import Question
+from core.analytics.item_analysis import get_item_analysis
+
 
 def compute_mcq_signals(test):
     """
     Computes examiner-grade MCQ analytics using
     answer_text + marks_awarded ONLY.
+    Built on the cached whole-test item analysis.
+
+    Per question (only questions with at least one graded answer):
+
+    - correct_pct: % of *graded* answers with marks > 0. Ungraded answers
+      are left out rather than counted as wrong.
+    - dominant_wrong_option: the most chosen option that is not the key
+      (an option some student earned marks for), if at least 40% of the
+      students who picked an option chose it. The key is never reported.
+    - guessing: three or more wrong options were chosen, with counts
+      within one of each other.
+    - facility / discrimination: mean proportion of marks and corrected
+      point-biserial from the item analysis.
+
+    Option counts (and so dominant_wrong_option / guessing) only exist for
+    MCQ questions, using the trimmed answer text.
     """
 
-    answers = (
-        test.student_answers
-        .select_related("question")
-        .all()
-    )
+    analysis = get_item_analysis(test.id)
+    questions = Question.objects.in_bulk(list(analysis["items"].keys()))
 
     # -------------------------------
     # Question-level signals
     # -------------------------------
-    question_stats = {}
-
-    for ans in answers:
-        q = ans.question
-
-        if q.id not in question_stats:
-            question_stats[q.id] = {
-                "question": q,
-                "total": 0,
-                "correct": 0,
-                "option_counts": Counter(),
-            }
-
-        question_stats[q.id]["total"] += 1
-        question_stats[q.id]["option_counts"][ans.answer_text] += 1
-
-        if ans.marks_awarded > Decimal("0"):
-            question_stats[q.id]["correct"] += 1
-
     question_results = {}
 
-    for qid, data in question_stats.items():
-        total = data["total"]
-        correct = data["correct"]
+    for qid, item in analysis["items"].items():
+        if not item["graded"]:
+            continue
 
         wrong_opts = {
-            opt: cnt
-            for opt, cnt in data["option_counts"].items()
-            if cnt and (correct < total)
+            d["option"]: d["count"]
+            for d in item["distractors"]
+            if d["count"] and not d["is_key"]
         }
+        answered = sum(d["count"] for d in item["distractors"]) or item["graded"]
 
         dominant_wrong = None
         guessing = False
 
         if wrong_opts:
             opt, freq = max(wrong_opts.items(), key=lambda x: x[1])
-            if freq / total >= 0.4:
+            if freq / answered >= 0.4:
                 dominant_wrong = opt
 
             if len(wrong_opts) >= 3:
@@ -61,48 +57,28 @@ def compute_mcq_signals(test):
                     guessing = True
 
         question_results[qid] = {
-            "question": data["question"],
-            "correct_pct": round((correct / total) * 100, 1),
+            "question": questions.get(qid),
+            "correct_pct": item["correct_pct"],
             "dominant_wrong_option": dominant_wrong,
             "guessing": guessing,
+            "facility": item["facility"],
+            "discrimination": item["point_biserial"],
         }
 
     # -------------------------------
     # LO-level signals
     # -------------------------------
-    lo_stats = defaultdict(lambda: {
-        "attempts": 0,
-        "correct": 0,
-        "student_scores": defaultdict(list),
-    })
-
-    for ans in answers:
-        for lo in ans.question.learning_objectives.all():
-            lo_stats[lo.id]["attempts"] += 1
-            lo_stats[lo.id]["student_scores"][ans.student_id].append(
-                ans.marks_awarded > Decimal("0")
-            )
-            if ans.marks_awarded > Decimal("0"):
-                lo_stats[lo.id]["correct"] += 1
-
-    lo_results = {}
-
-    for lo_id, data in lo_stats.items():
-        mean = (
-            (data["correct"] / data["attempts"]) * 100
-            if data["attempts"] else 0
-        )
-
-        consistency = sum(
-            all(scores) for scores in data["student_scores"].values()
-        ) / max(len(data["student_scores"]), 1)
-
-        lo_results[lo_id] = {
-            "mean_pct": round(mean, 1),
-            "consistency_pct": round(consistency * 100, 1),
+    lo_results = {
+        lo_id: {
+            "mean_pct": data["mean_pct"],
+            "consistency_pct": data["consistency_pct"],
         }
+        for lo_id, data in analysis["learning_objectives"].items()
+        if data["attempts"]
+    }
 
     return {
         "questions": question_results,
         "learning_objectives": lo_results,
+        "reliability": analysis["reliability"],
     }
@@ -1,13 +1,17 @@
 """
 Analytics Engine for Lumen Assessment Platform
 Provides comprehensive performance metrics for students and teachers
+(the analytics dashboards in core/analytics_views.py)
 """
 from django.db.models import Avg, Count, StdDev, Max, Min, Q, F
 from django.utils import timezone
 from datetime import timedelta, datetime
 from collections import defaultdict
 import statistics
-from .models import StudentAnswer, Test, Question, Student, Topic, LearningObjective, Subject
+import numpy as np
+from core.models import StudentAnswer, Test, Question, Student, Topic, LearningObjective, Subject, MasteryFact
+from .mastery import topic_facts, lo_facts, aggregate_facts, mastery_pct
+from . import snapshots
 
 
 class StudentAnalytics:
@@ -152,24 +156,24 @@ class StudentAnalytics:
 
     # ==================== TOPIC & LO LEVEL PERFORMANCE ====================
 
+    def _get_facts_in_range(self):
+        """Mastery fact rows for graded attempts in the date range"""
+        return MasteryFact.objects.filter(
+            student=self.student,
+            test__is_published=True,
+            last_attempt__gte=self.start_date,
+            last_attempt__lte=self.end_date
+        )
+
     def topic_performance(self):
         """Performance across specific topics"""
-        answers = self._get_answers_in_range()
-        topic_data = defaultdict(lambda: {'correct': 0, 'total': 0, 'scores': []})
-
-        for ans in answers:
-            if ans.question.topic:
-                topic_name = ans.question.topic.name
-                percentage = (float(ans.marks_awarded) / float(ans.question.marks)) * 100 if ans.question.marks > 0 else 0
-                topic_data[topic_name]['scores'].append(percentage)
-                topic_data[topic_name]['total'] += 1
-                if percentage >= 60:  # Consider 60% as mastery threshold
-                    topic_data[topic_name]['correct'] += 1
+        rows = aggregate_facts(
+            topic_facts(self._get_facts_in_range()), 'topic_id', 'topic__name'
+        )
 
         results = []
-        for topic, data in topic_data.items():
-            mastery_percentage = (data['correct'] / data['total'] * 100) if data['total'] > 0 else 0
-            avg_score = sum(data['scores']) / len(data['scores']) if data['scores'] else 0
+        for row in rows:
+            mastery_percentage = mastery_pct(row['total_earned'], row['total_max']) or 0
 
             # Classify strength
             if mastery_percentage >= 80:
@@ -180,10 +184,9 @@ class StudentAnalytics:
                 classification = 'weak'
 
             results.append({
-                'topic': topic,
+                'topic': row['topic__name'],
                 'mastery_percentage': round(mastery_percentage, 2),
-                'avg_score': round(avg_score, 2),
-                'questions_attempted': data['total'],
+                'questions_attempted': row['total_attempts'] or 0,
                 'classification': classification
             })
 
@@ -192,23 +195,25 @@ class StudentAnalytics:
 
     def lo_performance(self):
         """Performance per Learning Objective"""
-        answers = self._get_answers_in_range()
-        lo_data = defaultdict(lambda: {'correct': 0, 'total': 0, 'scores': [], 'attempts': []})
-
-        for ans in answers:
-            for lo in ans.question.learning_objectives.all():
-                lo_key = f"{lo.code}: {lo.description[:50]}"
-                percentage = (float(ans.marks_awarded) / float(ans.question.marks)) * 100 if ans.question.marks > 0 else 0
-
-                lo_data[lo_key]['scores'].append(percentage)
-                lo_data[lo_key]['attempts'].append(ans.submitted_at)
-                lo_data[lo_key]['total'] += 1
-                if percentage >= 60:
-                    lo_data[lo_key]['correct'] += 1
+        rows = lo_facts(self._get_facts_in_range()).values(
+            'learning_objective_id', 'learning_objective__code', 'learning_objective__description',
+            'earned', 'max_marks', 'attempts'
+        ).order_by('last_attempt')
+
+        lo_data = defaultdict(lambda: {'earned': 0.0, 'max': 0.0, 'total': 0, 'scores': [], 'label': ''})
+        for row in rows:
+            data = lo_data[row['learning_objective_id']]
+            data['label'] = f"{row['learning_objective__code']}: {row['learning_objective__description'][:50]}"
+            data['earned'] += row['earned']
+            data['max'] += row['max_marks']
+            data['total'] += row['attempts']
+            if row['max_marks'] > 0:
+                # One score per test attempt, in chronological order
+                data['scores'].append(row['earned'] / row['max_marks'] * 100)
 
         results = []
-        for lo, data in lo_data.items():
-            mastery_percentage = (data['correct'] / data['total'] * 100) if data['total'] > 0 else 0
+        for data in lo_data.values():
+            mastery_percentage = mastery_pct(data['earned'], data['max']) or 0
 
             # Calculate improvement rate (comparing first half to second half)
             scores = data['scores']
@@ -224,7 +229,7 @@ class StudentAnalytics:
             volatility = statistics.stdev(scores) if len(scores) > 1 else 0
 
             results.append({
-                'lo': lo,
+                'lo': data['label'],
                 'mastery_percentage': round(mastery_percentage, 2),
                 'attempt_frequency': data['total'],
                 'improvement_rate': round(improvement_rate, 2),
@@ -395,6 +400,9 @@ class ClassAnalytics:
 
     def class_average_per_subject(self):
         """Class average performance per subject"""
+        if snapshots.is_current(self.school):
+            return self._class_average_from_snapshot()
+
         students = self._get_students()
 
         answers = StudentAnswer.objects.filter(
@@ -425,39 +433,82 @@ class ClassAnalytics:
 
         return results
 
+    def _class_average_from_snapshot(self):
+        """class_average_per_subject() scanning the analytics snapshot instead of StudentAnswer"""
+        columns = ['student_id', 'test_id', 'subject_id', 'marks_awarded', 'max_marks', 'submitted_at']
+        answers = snapshots.read_answers(
+            schools=[self.school.id],
+            months=snapshots.months_between(self.start_date, self.end_date),
+            columns=columns,
+        )
+        tests = snapshots.read_dimension('tests', ['test_id', 'is_published'])
+        student_ids = np.fromiter(self._get_students().values_list('id', flat=True), dtype=np.int64)
+
+        keep = (
+            np.isin(answers['student_id'], student_ids)
+            & ~np.isnan(answers['marks_awarded'])
+            & np.isin(answers['test_id'], tests['test_id'][tests['is_published'].astype(bool)])
+            & (answers['submitted_at'] >= snapshots.as_datetime64(self.start_date))
+            & (answers['submitted_at'] <= snapshots.as_datetime64(self.end_date))
+        )
+        marks, max_marks = answers['marks_awarded'][keep], answers['max_marks'][keep]
+        percentages = np.where(max_marks > 0, marks / np.where(max_marks > 0, max_marks, 1) * 100, 0.0)
+        subject_ids = answers['subject_id'][keep]
+
+        # Subjects in order of first answer, merged by name like the query above
+        present, first = np.unique(subject_ids, return_index=True)
+        names = dict(Subject.objects.filter(id__in=present.tolist()).values_list('id', 'name'))
+        by_name = defaultdict(list)
+        for subject_id in present[np.argsort(first)].tolist():
+            by_name[names.get(subject_id, '')].append(subject_id)
+
+        results = []
+        for subject, ids in by_name.items():
+            scores = percentages[np.isin(subject_ids, ids)]
+            results.append({
+                'subject': subject,
+                'mean': round(float(scores.mean()), 2),
+                'median': round(float(np.median(scores)), 2),
+                'std_dev': round(float(scores.std(ddof=1)), 2) if scores.size > 1 else 0,
+                'count': int(scores.size)
+            })
+
+        return results
+
     def lo_mastery_heatmap(self):
         """LO mastery across the class"""
         students = self._get_students()
 
-        answers = StudentAnswer.objects.filter(
+        facts = lo_facts(MasteryFact.objects.filter(
             student__in=students,
-            marks_awarded__isnull=False,
             test__is_published=True,
-            submitted_at__gte=self.start_date,
-            submitted_at__lte=self.end_date
-        ).select_related('question')
+            last_attempt__gte=self.start_date,
+            last_attempt__lte=self.end_date
+        ))
+        rows = aggregate_facts(
+            facts, 'learning_objective_id', 'learning_objective__code',
+            'learning_objective__description', 'student_id'
+        )
 
-        lo_data = defaultdict(lambda: {'mastered': 0, 'total_students': set()})
+        lo_data = defaultdict(lambda: {'mastered': 0, 'total_students': 0, 'label': ''})
 
-        for ans in answers:
-            for lo in ans.question.learning_objectives.all():
-                lo_key = f"{lo.code}: {lo.description[:50]}"
-                percentage = (float(ans.marks_awarded) / float(ans.question.marks)) * 100 if ans.question.marks > 0 else 0
-
-                lo_data[lo_key]['total_students'].add(ans.student.id)
-                if percentage >= 60:
-                    lo_data[lo_key]['mastered'] += 1
+        for row in rows:
+            data = lo_data[row['learning_objective_id']]
+            data['label'] = f"{row['learning_objective__code']}: {row['learning_objective__description'][:50]}"
+            data['total_students'] += 1
+            if (mastery_pct(row['total_earned'], row['total_max']) or 0) >= 60:
+                data['mastered'] += 1
 
         results = []
-        for lo, data in lo_data.items():
-            student_count = len(data['total_students'])
+        for data in lo_data.values():
+            student_count = data['total_students']
             mastery_percentage = (data['mastered'] / student_count * 100) if student_count > 0 else 0
 
             # Red zone if < 50% mastery
             is_red_zone = mastery_percentage < 50
 
             results.append({
-                'lo': lo,
+                'lo': data['label'],
                 'mastery_percentage': round(mastery_percentage, 2),
                 'students_mastered': data['mastered'],
                 'total_students': student_count,
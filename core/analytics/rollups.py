@@ -0,0 +1,169 @@
+"""
+School-wide rollup maintenance for the academic overview dashboard.
+
+StudentTestResult holds one row per (test, student) attempt and
+SchoolSubjectMonth sums those rows per (school, subject, month). A grade save
+rebuilds the affected attempt row and then re-sums only the month cells it
+moved out of or into, so both tables stay small and exact.
+"""
+from django.db import transaction
+from django.db.models import Count, FloatField, Max, Q, Sum
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from core.models import SchoolSubjectMonth, StudentAnswer, StudentTestResult
+
+from .cache import bump_versions_on_commit, queue_on_commit
+from .mastery import refresh_mastery_facts
+
+BATCH_SIZE = 2000
+
+ATTEMPT_TOTALS = dict(
+    earned=Sum(Cast('marks_awarded', FloatField()), filter=Q(marks_awarded__isnull=False)),
+    max_marks=Sum(Cast('question__marks', FloatField()), filter=Q(marks_awarded__isnull=False)),
+    answers=Count('id'),
+    graded_answers=Count('id', filter=Q(marks_awarded__isnull=False)),
+    last_submitted=Max('submitted_at'),
+)
+
+
+def month_of(moment):
+    """First day of the (local) month containing a datetime."""
+    return timezone.localtime(moment).date().replace(day=1)
+
+
+def _result_fields(row):
+    return dict(
+        school_id=row['student__school_id'],
+        subject_id=row['test__subject_id'],
+        month=month_of(row['last_submitted']),
+        earned=row['earned'] or 0.0,
+        max_marks=row['max_marks'] or 0.0,
+        answers=row['answers'],
+        graded_answers=row['graded_answers'],
+        last_submitted=row['last_submitted'],
+    )
+
+
+def _refresh_month_cells(cells):
+    """Re-sum the given (school_id, subject_id, month) cells from StudentTestResult."""
+    for school_id, subject_id, month in cells:
+        totals = StudentTestResult.objects.filter(
+            school_id=school_id, subject_id=subject_id, month=month
+        ).aggregate(earned=Sum('earned'), max_marks=Sum('max_marks'), results=Count('id'))
+        lookup = dict(school_id=school_id, subject_id=subject_id, month=month)
+        if totals['results']:
+            SchoolSubjectMonth.objects.update_or_create(defaults=totals, **lookup)
+        else:
+            SchoolSubjectMonth.objects.filter(**lookup).delete()
+
+
+def refresh_student_test_result(student_id, test_id):
+    """Rebuild one attempt's rollup row and the month cells it touches."""
+    rows = list(
+        StudentAnswer.objects.filter(student_id=student_id, test_id=test_id)
+        .values('student__school_id', 'test__subject_id')
+        .annotate(**ATTEMPT_TOTALS)
+        .order_by()
+    )
+    row = rows[0] if rows else None
+
+    with transaction.atomic():
+        lookup = dict(student_id=student_id, test_id=test_id)
+        cells = set(
+            StudentTestResult.objects.filter(**lookup).values_list('school_id', 'subject_id', 'month')
+        )
+        if row:
+            fields = _result_fields(row)
+            StudentTestResult.objects.update_or_create(defaults=fields, **lookup)
+            cells.add((fields['school_id'], fields['subject_id'], fields['month']))
+        else:
+            StudentTestResult.objects.filter(**lookup).delete()
+        _refresh_month_cells(cells)
+
+
+def _refresh_attempts(items):
+    attempts = {(student_id, test_id) for student_id, test_id, _ in items}
+    for student_id, test_id in attempts:
+        refresh_student_test_result(student_id, test_id)
+    for student_id, test_id in {(s, t) for s, t, marks_changed in items if marks_changed}:
+        refresh_mastery_facts(student_id, test_id)
+    bump_versions_on_commit(
+        tests={t for _, t in attempts}, students={s for s, _ in attempts}
+    )
+
+
+def refresh_attempts_on_commit(attempts, marks_changed=False):
+    """
+    Once the current transaction commits, rebuild the rollup row of each
+    (student_id, test_id) attempt (and, when marks changed, its mastery
+    facts) and bump the attempts' cache versions. Attempts queued several
+    times in one transaction, e.g. one per graded answer, refresh once.
+    """
+    queue_on_commit(
+        'refresh_attempts',
+        {(student_id, test_id, marks_changed) for student_id, test_id in attempts},
+        _refresh_attempts,
+    )
+
+
+def refresh_test_results(test_id):
+    """Rebuild every attempt of a test, e.g. after its subject changed."""
+    student_ids = set(
+        StudentAnswer.objects.filter(test_id=test_id).values_list('student_id', flat=True)
+    )
+    student_ids.update(
+        StudentTestResult.objects.filter(test_id=test_id).values_list('student_id', flat=True)
+    )
+    for student_id in student_ids:
+        refresh_student_test_result(student_id, test_id)
+
+
+def rebuild_school_rollups(school=None, stdout=None):
+    """
+    Rebuild both rollup tables from scratch, for one school or (default) all
+    of them. Attempt rows come from a single grouped StudentAnswer query and
+    month cells from a single grouped query over the attempt rows.
+    Returns (attempt rows, month cells) written.
+    """
+    answers = StudentAnswer.objects.all()
+    results = StudentTestResult.objects.all()
+    months = SchoolSubjectMonth.objects.all()
+    if school is not None:
+        answers = answers.filter(student__school=school)
+        results = results.filter(school=school)
+        months = months.filter(school=school)
+
+    attempts = (
+        answers.values('student_id', 'test_id', 'student__school_id', 'test__subject_id')
+        .annotate(**ATTEMPT_TOTALS)
+        .order_by()
+    )
+
+    with transaction.atomic():
+        results.delete()
+        months.delete()
+
+        batch, written = [], 0
+        for row in attempts.iterator(chunk_size=BATCH_SIZE):
+            batch.append(StudentTestResult(
+                student_id=row['student_id'], test_id=row['test_id'], **_result_fields(row)
+            ))
+            if len(batch) >= BATCH_SIZE:
+                StudentTestResult.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+                if stdout:
+                    stdout.write(f'  {written} attempt rows written...')
+        StudentTestResult.objects.bulk_create(batch)
+        written += len(batch)
+
+        cells = [
+            SchoolSubjectMonth(**row)
+            for row in results.values('school_id', 'subject_id', 'month').annotate(
+                earned=Sum('earned'), max_marks=Sum('max_marks'), results=Count('id')
+            ).order_by()
+        ]
+        SchoolSubjectMonth.objects.bulk_create(cells, batch_size=BATCH_SIZE)
+
+    return written, len(cells)
@@ -0,0 +1,164 @@
+"""
+Question sampling for generated worksheets and student practice.
+
+Instead of `order_by('?')` (a full sort of the filtered question table per
+topic), selection runs over a per-subject candidate index of root questions
+held in the analytics cache as parallel NumPy arrays:
+
+    id, topic, grade, difficulty (Rasch logits, NaN if uncalibrated)
+    lo_ptr / lo_ids   question -> learning objective ids (CSR layout)
+
+The index is cached under the subject's AnalyticsVersion, bumped by
+core/signals.py on question create/delete/move and LO retagging, and by the
+calibration job, so filtering and drawing need no queries at all.
+
+- sample() draws uniformly without replacement; with a target difficulty it
+  takes questions calibrated within target ± BAND_WINDOW first, then the
+  nearest calibrated ones, then uncalibrated ones - all at random within
+  each tier.
+- cover_los() greedily picks the question adding the most not-yet-covered
+  learning objectives (set cover), e.g. to reach the LOs a cohort has never
+  been tested on, and tops up with sample() once nothing new can be covered.
+"""
+import numpy as np
+from django.db.models import Count, ExpressionWrapper, F, FloatField
+
+from core.models import Question, QuestionCalibration, StudentAnswer
+from .cache import cached_subject_result
+from .irt import BAND_WINDOW
+
+INDEX_TTL = 24 * 60 * 60  # seconds; edits invalidate it long before
+
+MASTERED_FRACTION = 0.7  # share of a question's marks that counts as answered well
+
+
+def build_candidate_index(subject_id):
+    rows = list(
+        Question.objects.filter(subject_id=subject_id, parent__isnull=True)
+        .order_by('id')
+        .values_list('id', 'topic_id', 'grade_id')
+    )
+    ids = np.array([r[0] for r in rows], dtype=np.int64)
+    index = {
+        'id': ids,
+        'topic': np.array([r[1] or 0 for r in rows], dtype=np.int64),
+        'grade': np.array([r[2] or 0 for r in rows], dtype=np.int64),
+        'difficulty': np.full(ids.size, np.nan),
+    }
+
+    calibrated = list(
+        QuestionCalibration.objects.filter(question__subject_id=subject_id, question__parent__isnull=True)
+        .values_list('question_id', 'difficulty')
+    )
+    if calibrated:
+        cal_ids, difficulty = np.array(calibrated).T
+        index['difficulty'][np.searchsorted(ids, cal_ids.astype(np.int64))] = difficulty
+
+    tags = np.array(
+        Question.learning_objectives.through.objects.filter(
+            question__subject_id=subject_id, question__parent__isnull=True
+        )
+        .order_by('question_id', 'learningobjective_id')
+        .values_list('question_id', 'learningobjective_id'),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    counts = np.bincount(np.searchsorted(ids, tags[:, 0]), minlength=ids.size)
+    index['lo_ptr'] = np.concatenate([[0], np.cumsum(counts)])
+    index['lo_ids'] = tags[:, 1]
+    return index
+
+
+def candidate_index(subject_id):
+    """The subject's candidate index, from cache while its question bank is unchanged."""
+    return cached_subject_result(
+        subject_id, 'candidates', lambda: build_candidate_index(subject_id), timeout=INDEX_TTL
+    )
+
+
+def candidates(index, topic_ids=None, grade_ids=None, exclude_ids=()):
+    """Row positions in `index` matching the topic / grade filters, minus `exclude_ids`."""
+    mask = np.ones(index['id'].size, dtype=bool)
+    if topic_ids is not None:
+        mask &= np.isin(index['topic'], list(topic_ids))
+    if grade_ids is not None:
+        mask &= np.isin(index['grade'], list(grade_ids))
+    if len(exclude_ids):
+        mask &= ~np.isin(index['id'], list(exclude_ids))
+    return np.flatnonzero(mask)
+
+
+def sample(index, rows, count, target=None, window=BAND_WINDOW, rng=None):
+    """Up to `count` of `rows`, uniformly at random or (with `target`) by difficulty tier."""
+    rng = rng or np.random.default_rng()
+    rows = rng.permutation(np.asarray(rows, dtype=np.int64))
+    if target is None:
+        return rows[:count]
+    distance = np.abs(index['difficulty'][rows] - target)
+    # Tier 0: within the band, 1: calibrated elsewhere, 2: uncalibrated. The
+    # stable sort keeps the shuffled order within the band and among uncalibrated
+    tier = np.where(np.isnan(distance), 2, np.where(distance <= window, 0, 1))
+    key = np.where(tier == 1, distance, 0.0)
+    return rows[np.lexsort((key, tier))][:count]
+
+
+def cover_los(index, rows, count, skip_los=(), target=None, rng=None):
+    """
+    Up to `count` of `rows` chosen greedily to cover as many learning
+    objectives outside `skip_los` as possible; ties go to the question closest
+    to `target` (if given), then at random. Topped up with sample().
+    """
+    rng = rng or np.random.default_rng()
+    rows = rng.permutation(np.asarray(rows, dtype=np.int64))
+    skip_los = set(skip_los)
+    ptr, lo_ids = index['lo_ptr'], index['lo_ids']
+    remaining = [set(lo_ids[ptr[r]:ptr[r + 1]].tolist()) - skip_los for r in rows]
+    if target is None:
+        closeness = np.zeros(rows.size)
+    else:
+        closeness = -np.nan_to_num(np.abs(index['difficulty'][rows] - target), nan=np.inf)
+
+    picked = []
+    available = np.ones(rows.size, dtype=bool)
+    while len(picked) < count:
+        gains = np.array([len(los) if ok else -1 for los, ok in zip(remaining, available)])
+        if not gains.size or gains.max() <= 0:
+            break
+        best = np.flatnonzero(gains == gains.max())
+        choice = best[np.argmax(closeness[best])]
+        picked.append(choice)
+        available[choice] = False
+        covered = remaining[choice]
+        remaining = [los - covered for los in remaining]
+
+    picked = rows[picked]
+    rest = rows[available]
+    return np.concatenate([picked, sample(index, rest, count - picked.size, target, rng=rng)])
+
+
+def question_ids(index, rows):
+    return index['id'][np.asarray(rows, dtype=np.int64)].tolist()
+
+
+def mastered_question_ids(student_ids, fraction=MASTERED_FRACTION, **filters):
+    """
+    Ids of questions that every one of `student_ids` has already answered
+    with at least `fraction` of the marks. `filters` narrow the StudentAnswer
+    rows (e.g. question__topic_id=...).
+    """
+    student_ids = set(student_ids)
+    if not student_ids:
+        return set()
+    return set(
+        StudentAnswer.objects.filter(
+            student_id__in=student_ids,
+            marks_awarded__isnull=False,
+            question__marks__gt=0,
+            marks_awarded__gte=ExpressionWrapper(F('question__marks') * fraction, output_field=FloatField()),
+            **filters,
+        )
+        .values('question_id')
+        .annotate(students=Count('student_id', distinct=True))
+        .filter(students=len(student_ids))
+        .order_by()
+        .values_list('question_id', flat=True)
+    )
@@ -0,0 +1,352 @@
+"""
+Columnar analytics snapshots for offline analysis.
+
+`python manage.py export_analytics_snapshot` copies StudentAnswer, joined with
+its question / topic / test / student keys, into column files under
+settings.ANALYTICS_SNAPSHOT_DIR, partitioned Hive-style by school and month of
+submission:
+
+    answers/school=3/month=2025-03/part.parquet
+    dimensions/questions.parquet, students.parquet, ... question_los.parquet
+    manifest.json
+
+Files are Parquet when pyarrow is installed and NumPy .npz archives (one
+array per column) otherwise; readers handle both. Incremental runs only
+rewrite the partitions holding attempts whose StudentTestResult row changed
+since the previous export (grading, new submissions); `--full` rewrites all.
+
+Fact columns are numeric: missing foreign keys are 0, missing marks / times
+NaN and missing timestamps NaT. Names, codes and the question → LO bridge
+live in the dimension tables. Read with read_answers() / read_dimension(),
+which return {column: ndarray} so callers can scan with NumPy (or wrap the
+result in a pandas DataFrame) without touching the live database.
+
+Views use a snapshot only while it is current for the school they report
+on (is_current(): none of its attempts changed since the export), so the
+dashboards show the same numbers whichever source they read.
+"""
+import json
+import os
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Exists, Max, OuterRef
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from core.models import (
+    LearningObjective, Question, Student, StudentAnswer, StudentTestResult, Test, Topic,
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+CHUNK_SIZE = 20000
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 2
+
+# column -> (StudentAnswer lookup, dtype)
+ANSWER_COLUMNS = {
+    'answer_id': ('id', np.int64),
+    'student_id': ('student_id', np.int64),
+    'test_id': ('test_id', np.int64),
+    'question_id': ('question_id', np.int64),
+    'subject_id': ('question__subject_id', np.int64),
+    'topic_id': ('question__topic_id', np.int64),
+    'grade_id': ('question__grade_id', np.int64),
+    'test_subject_id': ('test__subject_id', np.int64),
+    'marks_awarded': ('marks_awarded', np.float64),
+    'max_marks': ('question__marks', np.float64),
+    'time_spent_seconds': ('time_spent_seconds', np.float64),
+    'submitted_at': ('submitted_at', 'datetime64[s]'),
+    'evaluated_at': ('evaluated_at', 'datetime64[s]'),
+}
+
+# dimension -> (queryset factory, {column: (lookup, dtype)})
+DIMENSIONS = {
+    'students': (
+        lambda: Student.objects.all(),
+        {'student_id': ('id', np.int64), 'school_id': ('school_id', np.int64),
+         'grade_id': ('grade_id', np.int64), 'section': ('section', str), 'full_name': ('full_name', str)},
+    ),
+    'tests': (
+        lambda: Test.objects.all(),
+        {'test_id': ('id', np.int64), 'subject_id': ('subject_id', np.int64),
+         'test_type': ('test_type', str), 'title': ('title', str), 'is_published': ('is_published', bool)},
+    ),
+    'questions': (
+        lambda: Question.objects.all(),
+        {'question_id': ('id', np.int64), 'subject_id': ('subject_id', np.int64),
+         'topic_id': ('topic_id', np.int64), 'grade_id': ('grade_id', np.int64),
+         'parent_id': ('parent_id', np.int64), 'marks': ('marks', np.float64),
+         'question_type': ('question_type', str)},
+    ),
+    'topics': (
+        lambda: Topic.objects.all(),
+        {'topic_id': ('id', np.int64), 'subject_id': ('subject_id', np.int64),
+         'grade_id': ('grade_id', np.int64), 'name': ('name', str)},
+    ),
+    'learning_objectives': (
+        lambda: LearningObjective.objects.all(),
+        {'lo_id': ('id', np.int64), 'topic_id': ('topic_id', np.int64), 'code': ('code', str)},
+    ),
+    'question_los': (
+        lambda: Question.learning_objectives.through.objects.all(),
+        {'question_id': ('question_id', np.int64), 'lo_id': ('learningobjective_id', np.int64)},
+    ),
+}
+
+
+def snapshot_dir(directory=None):
+    return Path(directory or settings.ANALYTICS_SNAPSHOT_DIR)
+
+
+# ── Column files ────────────────────────────────────────────────────────────
+
+def as_datetime64(value):
+    """An aware datetime as the snapshot stores timestamps (UTC, whole seconds)."""
+    return np.datetime64(value.astimezone(dt_timezone.utc).replace(tzinfo=None), 's')
+
+
+def _column(values, dtype):
+    if dtype is str:
+        return np.array(['' if v is None else str(v) for v in values], dtype=str)
+    if dtype == 'datetime64[s]':
+        return np.array(
+            [as_datetime64(v) if v else np.datetime64('NaT') for v in values],
+            dtype=dtype,
+        )
+    if dtype is np.float64:
+        return np.array([np.nan if v is None else float(v) for v in values], dtype=dtype)
+    return np.array([v or 0 for v in values], dtype=dtype)
+
+
+def _table(queryset, columns):
+    lookups = [lookup for lookup, _ in columns.values()]
+    rows = list(queryset.order_by().values_list(*lookups).iterator(chunk_size=CHUNK_SIZE))
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    return {
+        name: _column(col, dtype)
+        for (name, (_, dtype)), col in zip(columns.items(), values)
+    }
+
+
+def _write_table(stem, table):
+    """Write {column: array} to stem.parquet (or stem.npz) atomically; returns the path."""
+    stem.parent.mkdir(parents=True, exist_ok=True)
+    suffix = '.parquet' if PARQUET_AVAILABLE else '.npz'
+    path = stem.with_suffix(suffix)
+    tmp = stem.with_suffix(suffix + '.tmp')
+    if PARQUET_AVAILABLE:
+        pq.write_table(pa.table(table), tmp)
+    else:
+        with open(tmp, 'wb') as fh:
+            np.savez(fh, **table)
+    os.replace(tmp, path)
+    # Drop a copy left behind in the other format
+    for other in ('.parquet', '.npz'):
+        if other != suffix and stem.with_suffix(other).exists():
+            stem.with_suffix(other).unlink()
+    return path
+
+
+def _read_table(stem, columns=None):
+    if stem.with_suffix('.parquet').exists():
+        if not PARQUET_AVAILABLE:
+            raise RuntimeError(f'{stem}.parquet needs pyarrow: pip install pyarrow')
+        table = pq.read_table(stem.with_suffix('.parquet'), columns=columns)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+    with np.load(stem.with_suffix('.npz')) as archive:
+        return {name: archive[name] for name in (columns or archive.files)}
+
+
+def _table_exists(stem):
+    return stem.with_suffix('.parquet').exists() or stem.with_suffix('.npz').exists()
+
+
+# ── Export ──────────────────────────────────────────────────────────────────
+
+def partition_name(school_id, month):
+    return f'school={school_id or 0}/month={month:%Y-%m}'
+
+
+def _month_bounds(month):
+    start = timezone.make_aware(datetime(month.year, month.month, 1))
+    following = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+    return start, timezone.make_aware(following)
+
+
+def _partitions(answers):
+    """{(school_id, month)} covered by an answer queryset."""
+    return {
+        (school_id, month.date() if isinstance(month, datetime) else month)
+        for school_id, month in answers.order_by()
+        .annotate(month=TruncMonth('submitted_at'))
+        .values_list('student__school_id', 'month')
+        .distinct()
+    }
+
+
+def export_partition(school_id, month, directory=None):
+    """Rewrite one school × month partition from the live database; returns its row count."""
+    start, end = _month_bounds(month)
+    answers = StudentAnswer.objects.filter(submitted_at__gte=start, submitted_at__lt=end)
+    if school_id:
+        answers = answers.filter(student__school_id=school_id)
+    else:
+        answers = answers.filter(student__school__isnull=True)
+    answers = answers.order_by('id')
+    table = _table(answers, ANSWER_COLUMNS)
+    stem = snapshot_dir(directory) / 'answers' / partition_name(school_id, month) / 'part'
+    rows = int(table['answer_id'].size)
+    if rows:
+        _write_table(stem, table)
+    else:
+        for suffix in ('.parquet', '.npz'):
+            stem.with_suffix(suffix).unlink(missing_ok=True)
+    return rows
+
+
+def export_dimensions(directory=None):
+    for name, (queryset, columns) in DIMENSIONS.items():
+        _write_table(snapshot_dir(directory) / 'dimensions' / name, _table(queryset(), columns))
+
+
+def read_manifest(directory=None):
+    path = snapshot_dir(directory) / MANIFEST
+    if not path.exists():
+        return {'partitions': {}}
+    return json.loads(path.read_text())
+
+
+def export_snapshot(directory=None, full=False, school=None, stdout=None):
+    """
+    Refresh the snapshot. Incremental by default: only partitions with
+    attempts updated since the last export are rewritten. Restricting to a
+    school rewrites all of that school's partitions and leaves the
+    incremental watermark alone. Returns the number of partitions written.
+    """
+    started = timezone.now()
+    # The watermark is the newest attempt update the source database has seen,
+    # so a lagging read replica can't make the next run skip changes
+    watermark = StudentTestResult.objects.aggregate(newest=Max('updated_at'))['newest'] or started
+    manifest = read_manifest(directory)
+    answers = StudentAnswer.objects.all()
+    if school is not None:
+        answers = answers.filter(student__school=school)
+
+    last_export = manifest.get('exported_at')
+    if not full and school is None and last_export:
+        changed = StudentTestResult.objects.filter(
+            test_id=OuterRef('test_id'),
+            student_id=OuterRef('student_id'),
+            updated_at__gte=datetime.fromisoformat(last_export),
+        )
+        answers = answers.filter(Exists(changed))
+    elif school is None:
+        # Full export: partitions that no longer have answers go away
+        manifest['partitions'] = {}
+
+    partitions = sorted(_partitions(answers), key=lambda p: (p[0] or 0, p[1]))
+    if stdout:
+        stdout.write(f'  {len(partitions)} partitions to write')
+
+    for school_id, month in partitions:
+        name = partition_name(school_id, month)
+        rows = export_partition(school_id, month, directory)
+        if rows:
+            manifest['partitions'][name] = {'rows': rows, 'exported_at': started.isoformat()}
+        else:
+            manifest['partitions'].pop(name, None)
+        if stdout:
+            stdout.write(f'    {name}: {rows} rows')
+
+    export_dimensions(directory)
+    manifest['format'] = 'parquet' if PARQUET_AVAILABLE else 'npz'
+    manifest['version'] = FORMAT_VERSION
+    if school is None:
+        manifest['exported_at'] = watermark.isoformat()
+
+    path = snapshot_dir(directory) / MANIFEST
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    os.replace(tmp, path)
+    return len(partitions)
+
+
+# ── Query layer ─────────────────────────────────────────────────────────────
+
+def snapshot_watermark(directory=None):
+    """The newest attempt update the snapshot holds, or None before the first export in this format."""
+    manifest = read_manifest(directory)
+    if manifest.get('version') != FORMAT_VERSION or not manifest.get('exported_at'):
+        return None
+    return datetime.fromisoformat(manifest['exported_at'])
+
+
+def is_current(school, directory=None):
+    """True if none of `school`'s attempts were graded or submitted since the snapshot was exported."""
+    watermark = snapshot_watermark(directory)
+    return watermark is not None and not StudentTestResult.objects.filter(
+        school=school, updated_at__gt=watermark
+    ).exists()
+
+
+def months_between(start, end):
+    """'YYYY-MM' of every month from `start` to `end`, for pruning partitions."""
+    # Partitions are by local month (TruncMonth)
+    start, end = timezone.localtime(start), timezone.localtime(end)
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append(f'{year:04d}-{month:02d}')
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def answer_partitions(schools=None, months=None, directory=None):
+    """[(school_id, month 'YYYY-MM', stem)] on disk, pruned to the given schools / months."""
+    root = snapshot_dir(directory) / 'answers'
+    schools = None if schools is None else {int(s) for s in schools}
+    months = None if months is None else {m if isinstance(m, str) else f'{m:%Y-%m}' for m in months}
+    found = []
+    for school_dir in sorted(root.glob('school=*')):
+        school_id = int(school_dir.name.split('=', 1)[1])
+        if schools is not None and school_id not in schools:
+            continue
+        for month_dir in sorted(school_dir.glob('month=*')):
+            month = month_dir.name.split('=', 1)[1]
+            if months is not None and month not in months:
+                continue
+            if _table_exists(month_dir / 'part'):
+                found.append((school_id, month, month_dir / 'part'))
+    return found
+
+
+def read_answers(schools=None, months=None, columns=None, directory=None):
+    """
+    Snapshot answers as {column: ndarray}, concatenated over the matching
+    partitions. Only the requested `columns` are read from disk.
+    """
+    columns = list(columns or ANSWER_COLUMNS)
+    parts = [
+        _read_table(stem, columns)
+        for _, _, stem in answer_partitions(schools, months, directory)
+    ]
+    if not parts:
+        return {name: np.zeros(0, dtype=ANSWER_COLUMNS[name][1]) for name in columns}
+    return {name: np.concatenate([part[name] for part in parts]) for name in columns}
+
+
+def read_dimension(name, columns=None, directory=None):
+    """One dimension table (see DIMENSIONS) as {column: ndarray}."""
+    if name not in DIMENSIONS:
+        raise ValueError(f'Unknown dimension: {name}')
+    return _read_table(snapshot_dir(directory) / 'dimensions' / name, columns)
@@ -0,0 +1,149 @@
+"""
+Vectorized descriptive statistics for analytics views.
+
+Every function takes array-likes (lists, tuples or NumPy arrays, usually pulled
+with a single values_list() query) and returns plain Python numbers / lists so
+results can go straight into JSON, templates or the analytics cache.
+Benchmark against the pure-Python equivalents with
+`python manage.py benchmark_stats`.
+"""
+import math
+
+import numpy as np
+
+SCORE_RANGE = (0, 100)
+
+
+def as_array(values):
+    return np.asarray(values, dtype=float)
+
+
+def describe(values, ddof=1):
+    """count/mean/median/std/min/max; std uses `ddof` (1 = sample, 0 = population)."""
+    v = as_array(values)
+    n = int(v.size)
+    if not n:
+        return {'count': 0, 'mean': 0.0, 'median': 0.0, 'std': 0.0, 'min': 0.0, 'max': 0.0}
+    return {
+        'count': n,
+        'mean': float(v.mean()),
+        'median': float(np.median(v)),
+        'std': float(v.std(ddof=ddof)) if n > ddof else 0.0,
+        'min': float(v.min()),
+        'max': float(v.max()),
+    }
+
+
+def histogram(values, bins=10, value_range=SCORE_RANGE):
+    """Counts per equal-width bin; the top edge is inclusive (100% lands in the last bin)."""
+    v = as_array(values)
+    low, high = value_range
+    counts, _ = np.histogram(np.clip(v, low, high), bins=bins, range=value_range)
+    return counts.tolist()
+
+
+def percentiles(values, q=(10, 25, 50, 75, 90)):
+    """{percentile: value} using linear interpolation."""
+    v = as_array(values)
+    if not v.size:
+        return {p: 0.0 for p in q}
+    return dict(zip(q, np.percentile(v, q).tolist()))
+
+
+def zscores(values, ddof=1):
+    """Standard scores; all zeros when the spread is zero."""
+    v = as_array(values)
+    if v.size <= ddof:
+        return np.zeros_like(v)
+    std = v.std(ddof=ddof)
+    if std == 0:
+        return np.zeros_like(v)
+    return (v - v.mean()) / std
+
+
+def gaussian_fit(values):
+    """(mean, sample std) of the normal curve fitted to the values."""
+    d = describe(values)
+    return d['mean'], d['std']
+
+
+def curve_grid(step=2, value_range=SCORE_RANGE):
+    low, high = value_range
+    return np.arange(low, high + 1, step)
+
+
+def gaussian_curve(mean, std, n, x=None, bin_width=10):
+    """
+    Normal pdf over `x` (default 0..100 step 2) scaled to expected counts per
+    histogram bin of `bin_width`, so it overlays histogram(). Returns (x, y).
+    """
+    x = curve_grid() if x is None else as_array(x)
+    if std <= 0:
+        return x.tolist(), [0] * len(x)
+    pdf = np.exp(-0.5 * ((x - mean) / std) ** 2) / (std * math.sqrt(2 * math.pi))
+    return x.tolist(), (pdf * n * bin_width).tolist()
+
+
+def kernel_density(values, x=None, bandwidth=None, bin_width=10):
+    """
+    Gaussian KDE over `x`, scaled like gaussian_curve(). Bandwidth defaults to
+    Silverman's rule of thumb.
+    """
+    v = as_array(values)
+    x = curve_grid() if x is None else as_array(x)
+    if v.size < 2:
+        return [0.0] * len(x)
+    if bandwidth is None:
+        spread = min(v.std(ddof=1), np.subtract(*np.percentile(v, [75, 25])) / 1.34) or v.std(ddof=1)
+        bandwidth = 0.9 * spread * v.size ** -0.2
+    if not bandwidth:
+        return [0.0] * len(x)
+    u = (x[:, None] - v[None, :]) / bandwidth
+    density = np.exp(-0.5 * u ** 2).sum(axis=1) / (v.size * bandwidth * math.sqrt(2 * math.pi))
+    return (density * v.size * bin_width).tolist()
+
+
+def group_sums(keys, *columns):
+    """
+    Sum each column per distinct key. Returns (keys, counts, sums...) with
+    keys in order of first appearance.
+    """
+    keys = np.asarray(keys)
+    if not keys.size:
+        return (keys, np.zeros(0, dtype=int)) + tuple(np.zeros(0) for _ in columns)
+    unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.size)
+    inverse = rank[inverse.ravel()]
+    counts = np.bincount(inverse, minlength=order.size)
+    sums = tuple(
+        np.bincount(inverse, weights=as_array(col), minlength=order.size) for col in columns
+    )
+    return (unique[order], counts) + sums
+
+
+def section_breakdown(values, labels, ddof=1):
+    """describe() of `values` per distinct label, in order of first appearance."""
+    v = as_array(values)
+    labels = np.asarray(labels)
+    if not labels.size:
+        return {}
+    order = np.argsort(labels, kind='stable')
+    sorted_labels = labels[order]
+    bounds = np.flatnonzero(sorted_labels[1:] != sorted_labels[:-1]) + 1
+    members = {labels[idx[0]].item(): v[idx] for idx in np.split(order, bounds)}
+    return {
+        label: describe(members[label], ddof)
+        for label in group_sums(labels)[0].tolist()
+    }
+
+
+def pearson(x, y):
+    """Pearson correlation, or 0.0 when either side has no spread."""
+    x, y = as_array(x), as_array(y)
+    if x.size < 2:
+        return 0.0
+    xc, yc = x - x.mean(), y - y.mean()
+    denom = math.sqrt(float((xc * xc).sum()) * float((yc * yc).sum()))
+    return float((xc * yc).sum()) / denom if denom > 0 else 0.0
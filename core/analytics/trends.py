@@ -0,0 +1,163 @@
+"""
+Batch longitudinal trend detection.
+
+Loads every graded attempt (StudentTestResult) of the selected students in one
+query, orders them into (student, subject) series and computes, for all series
+at once with grouped sums:
+
+- least-squares slope of score against test index (percentage points per test)
+- rolling mean of the latest ROLLING_WINDOW tests
+- volatility (sample standard deviation of scores)
+- latest / best / worst score
+
+Series are flagged like StudentAnalytics.subject_performance_trend: a slope
+above TREND_THRESHOLD is improving, below -TREND_THRESHOLD declining, anything
+else stable; single-test series have insufficient data.
+"""
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import StudentSubjectTrend, StudentTestResult
+
+TREND_THRESHOLD = 2.0
+ROLLING_WINDOW = 3
+BATCH_SIZE = 2000
+
+
+def compute_series_trends(student_ids, subject_ids, scores):
+    """
+    Trend statistics for pre-sorted series. Rows must be grouped by
+    (student, subject) and in chronological order within each group.
+    Returns a dict of per-series arrays.
+    """
+    sid = np.asarray(student_ids)
+    subj = np.asarray(subject_ids)
+    y = np.asarray(scores, dtype=float)
+    if not y.size:
+        empty = np.zeros(0)
+        return dict(student=sid, subject=subj, points=empty.astype(int), slope=empty,
+                    rolling_mean=empty, volatility=empty, latest=empty, best=empty,
+                    worst=empty, ends=empty.astype(int))
+
+    is_start = np.ones(y.size, dtype=bool)
+    is_start[1:] = (sid[1:] != sid[:-1]) | (subj[1:] != subj[:-1])
+    starts = np.flatnonzero(is_start)
+    ends = np.r_[starts[1:], y.size] - 1
+    group = np.cumsum(is_start) - 1
+    x = np.arange(y.size) - starts[group]
+
+    def grouped(weights):
+        return np.bincount(group, weights=weights, minlength=starts.size)
+
+    n = grouped(None)
+    sx, sy = grouped(x), grouped(y)
+    sxx, sxy, syy = grouped(x * x), grouped(x * y), grouped(y * y)
+
+    denom = n * sxx - sx * sx
+    slope = np.where(denom > 0, (n * sxy - sx * sy) / np.where(denom > 0, denom, 1), 0.0)
+
+    mean = sy / n
+    variance = np.where(n > 1, (syy - n * mean * mean) / np.maximum(n - 1, 1), 0.0)
+    volatility = np.sqrt(np.maximum(variance, 0.0))
+
+    recent = (n[group] - 1 - x) < ROLLING_WINDOW
+    rolling_mean = (
+        np.bincount(group[recent], weights=y[recent], minlength=starts.size)
+        / np.bincount(group[recent], minlength=starts.size)
+    )
+
+    return dict(
+        student=sid[starts],
+        subject=subj[starts],
+        points=n.astype(int),
+        slope=slope,
+        rolling_mean=rolling_mean,
+        volatility=volatility,
+        latest=y[ends],
+        best=np.maximum.reduceat(y, starts),
+        worst=np.minimum.reduceat(y, starts),
+        ends=ends,
+    )
+
+
+def trend_flag(points, slope):
+    if points < 2:
+        return 'insufficient_data'
+    if slope > TREND_THRESHOLD:
+        return 'improving'
+    if slope < -TREND_THRESHOLD:
+        return 'declining'
+    return 'stable'
+
+
+def refresh_student_trends(results=None, stdout=None):
+    """
+    Recompute StudentSubjectTrend rows for every student that has a row in
+    the given StudentTestResult queryset (default: all). Rows are stamped
+    with the run's start time so an incremental run can pick up results
+    updated while this one was reading. Returns the number of trend rows
+    written.
+    """
+    if results is None:
+        results = StudentTestResult.objects.all()
+    student_ids = results.values('student_id')
+    started = timezone.now()
+
+    rows = list(
+        StudentTestResult.objects.filter(
+            student_id__in=student_ids, subject__isnull=False, max_marks__gt=0
+        )
+        .order_by('student_id', 'subject_id', 'last_submitted', 'test_id')
+        .values_list('student_id', 'subject_id', 'earned', 'max_marks', 'last_submitted')
+    )
+    if stdout:
+        stdout.write(f'  {len(rows)} graded attempts loaded')
+
+    series = compute_series_trends(
+        [r[0] for r in rows],
+        [r[1] for r in rows],
+        [r[2] / r[3] * 100 for r in rows],
+    )
+    last_dates = [rows[i][4] for i in series['ends'].tolist()]
+
+    trends = [
+        StudentSubjectTrend(
+            student_id=student_id,
+            subject_id=subject_id,
+            trend=trend_flag(points, slope),
+            points=points,
+            slope=round(slope, 3),
+            rolling_mean=round(rolling, 2),
+            volatility=round(volatility, 2),
+            latest_score=round(latest, 2),
+            best_score=round(best, 2),
+            worst_score=round(worst, 2),
+            last_test_at=last_test_at,
+            computed_at=started,
+        )
+        for student_id, subject_id, points, slope, rolling, volatility, latest, best, worst, last_test_at in zip(
+            series['student'].tolist(), series['subject'].tolist(), series['points'].tolist(),
+            series['slope'].tolist(), series['rolling_mean'].tolist(), series['volatility'].tolist(),
+            series['latest'].tolist(), series['best'].tolist(), series['worst'].tolist(), last_dates,
+        )
+    ]
+
+    with transaction.atomic():
+        StudentSubjectTrend.objects.filter(student_id__in=student_ids).delete()
+        StudentSubjectTrend.objects.bulk_create(trends, batch_size=BATCH_SIZE)
+
+    return len(trends)
+
+
+def trends_by_student(student_ids):
+    """student_id -> [StudentSubjectTrend, ...] (with subject) in one query."""
+    grouped = {}
+    for trend in (
+        StudentSubjectTrend.objects.filter(student_id__in=student_ids)
+        .select_related('subject')
+        .order_by('subject__name')
+    ):
+        grouped.setdefault(trend.student_id, []).append(trend)
+    return grouped
+
@@ -1,71 +1,96 @@
 from django.http import JsonResponse
 from django.db.models import Count
+from django.db.models.functions import Substr
 from core.models import StudentAnswer, Question
+from core.analytics.item_analysis import get_item_analysis
+from core.analytics.cache import cached_test_result
+from core.db_router import use_analytics_replica
 
+@use_analytics_replica
 def question_analytics(request, test_id):
-    q_ids = request.GET.getlist("questions[]")
-
-    answers = StudentAnswer.objects.filter(
-        test_id=test_id,
-        question_id__in=q_ids if q_ids else None
-    ).select_related("question")
+    q_ids = {int(q) for q in request.GET.getlist("questions[]") if q.isdigit()}
+    name = "questions:" + ",".join(map(str, sorted(q_ids)))
+    return JsonResponse(cached_test_result(test_id, name, lambda: _question_analytics(test_id, q_ids)))
+
+
+def _question_analytics(test_id, q_ids):
+    analysis = get_item_analysis(test_id)
+    items = {
+        qid: item for qid, item in analysis["items"].items()
+        if item["responses"] and (not q_ids or qid in q_ids)
+    }
+    texts = dict(
+        Question.objects.filter(id__in=items.keys())
+        .annotate(snippet=Substr("question_text", 1, 120))
+        .values_list("id", "snippet")
+    )
 
     data = {}
 
-    for q in Question.objects.filter(id__in=answers.values("question_id")):
-        q_ans = answers.filter(question=q)
-
-        total = q_ans.count()
-        correct = q_ans.filter(marks_awarded__gt=0).count()
-
-        distractors = (
-            q_ans.values("answer_text")
-            .annotate(count=Count("id"))
-            .order_by("-count")
-        )
-
-        data[q.id] = {
-            "question": q.text[:120],
-            "correct_pct": round(correct / total * 100, 2) if total else 0,
-            "distractors": list(distractors),
+    for qid, item in items.items():
+        data[qid] = {
+            "question": texts.get(qid) or "",
+            "correct_pct": item["correct_pct"] or 0,
+            "facility": item["facility"],
+            "discrimination": item["point_biserial"],
+            "discrimination_index": item["discrimination_index"],
+            "distractors": [
+                {"answer_text": d["option"], "count": d["count"]}
+                for d in item["distractors"]
+            ],
         }
 
-    return JsonResponse(data)
+    return data
 
-from core.models import LearningObjective
+from django.db.models import Q
 
-def lo_mastery_heatmap(request, test_id):
-    answers = StudentAnswer.objects.filter(test_id=test_id)
-
-    heatmap = {}
 
-    for lo in LearningObjective.objects.all():
-        lo_answers = answers.filter(question__learning_objectives=lo)
-
-        if not lo_answers.exists():
-            continue
+def _lo_mastery_heatmap(test_id):
+    """Percentage of responses with marks > 0 per LO, in one grouped query."""
+    rows = (
+        StudentAnswer.objects.filter(
+            test_id=test_id,
+            question__learning_objectives__isnull=False,
+        )
+        .values("question__learning_objectives__id", "question__learning_objectives__code")
+        .annotate(
+            total=Count("id"),
+            correct=Count("id", filter=Q(marks_awarded__gt=0)),
+        )
+        .order_by("question__learning_objectives__id")
+    )
 
-        mastery = (
-            lo_answers.filter(marks_awarded__gt=0).count()
-            / lo_answers.count()
-        ) * 100
+    heatmap = {}
+    for row in rows:
+        heatmap[row["question__learning_objectives__code"]] = round(
+            row["correct"] / row["total"] * 100, 2
+        )
+    return heatmap
 
-        heatmap[lo.code] = round(mastery, 2)
 
+@use_analytics_replica
+def lo_mastery_heatmap(request, test_id):
+    heatmap = cached_test_result(
+        test_id, "lo_heatmap", lambda: _lo_mastery_heatmap(test_id)
+    )
     return JsonResponse(heatmap)
 
 
-def risk_prediction(request, test_id):
-    answers = StudentAnswer.objects.filter(test_id=test_id)
+def _risk_prediction(test_id):
+    """Share of each student's responses with marks > 0, in one grouped query."""
+    rows = (
+        StudentAnswer.objects.filter(test_id=test_id)
+        .values("student_id")
+        .annotate(
+            total=Count("id"),
+            correct=Count("id", filter=Q(marks_awarded__gt=0)),
+        )
+        .order_by()
+    )
 
     risk = {}
-
-    for student_id in answers.values_list("student_id", flat=True).distinct():
-        s_ans = answers.filter(student_id=student_id)
-        pct = (
-            s_ans.filter(marks_awarded__gt=0).count()
-            / s_ans.count()
-        ) * 100
+    for row in rows:
+        pct = (row["correct"] / row["total"]) * 100
 
         risk_level = (
             "high" if pct < 40 else
@@ -73,11 +98,18 @@ def risk_prediction(request, test_id):
             "low"
         )
 
-        risk[student_id] = {
+        risk[row["student_id"]] = {
             "percentage": round(pct, 2),
             "risk": risk_level
         }
+    return risk
 
+
+@use_analytics_replica
+def risk_prediction(request, test_id):
+    risk = cached_test_result(
+        test_id, "risk", lambda: _risk_prediction(test_id)
+    )
     return JsonResponse(risk)
 
 import requests
@@ -7,13 +7,14 @@ from django.contrib import messages
 from django.utils import timezone
 from datetime import timedelta
 from .models import Student, ClassGroup, Grade, Subject
-# Note: analytics.py file is shadowed by analytics/ package
-# Commenting out for now - will create simplified version
-#from .analytics import StudentAnalytics, ClassAnalytics
+from .taxonomy import get_taxonomy
+from .analytics.performance import StudentAnalytics, ClassAnalytics
 from .views import get_user_school, staff_member_required
+from .db_router import use_analytics_replica
 
 
 @login_required
+@use_analytics_replica
 def student_analytics_dashboard(request):
     """
     Comprehensive yet concise analytics dashboard for students.
@@ -244,7 +245,10 @@ def teacher_analytics_dashboard(request):
     class_group = ClassGroup.objects.get(id=group_id) if group_id else None
 
     # Initialize class analytics
-    #class_analytics = ClassAnalytics( school=school, section=section, class_group=class_group, start_date=start_date,, end_date=end_date)
+    class_analytics = ClassAnalytics(
+        school=school, grade=grade, section=section, class_group=class_group,
+        start_date=start_date, end_date=end_date,
+    )
 
     # Get student list for individual analysis
     students = class_analytics._get_students()
@@ -260,7 +264,7 @@ def teacher_analytics_dashboard(request):
         'view_type': view_type,
 
         # Filters
-        'grades': Grade.objects.all(),
+        'grades': get_taxonomy().grade_list(),
         'selected_grade': grade,
         'selected_section': section,
         'class_groups': ClassGroup.objects.filter(school=school),
@@ -374,10 +378,12 @@ from core.models import Test
 from core.analytics.mcq_signals import compute_mcq_signals
 from core.analytics.examiner_schema import build_examiner_schema
 from core.analytics.examiner_ai import generate_examiner_report
+from core.analytics.cache import cached_test_result
 
 
 @login_required
 @staff_member_required
+@use_analytics_replica
 def mcq_examiner_report(request, test_id):
     """
     JSON API: MCQ Examiner-style report for a test
@@ -395,11 +401,12 @@ def mcq_examiner_report(request, test_id):
             }
         })
 
-    signals = compute_mcq_signals(test)
-    schema = build_examiner_schema(test, signals)
-    narrative = generate_examiner_report(schema)
+    def build_report():
+        signals = compute_mcq_signals(test)
+        schema = build_examiner_schema(test, signals)
+        return {
+            "examiner_report": generate_examiner_report(schema),
+            "structured_data": schema
+        }
 
-    return JsonResponse({
-        "examiner_report": narrative,
-        "structured_data": schema
-    })
+    return JsonResponse(cached_test_result(test.id, "examiner_report", build_report))
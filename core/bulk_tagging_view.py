@@ -7,7 +7,6 @@ import json
 import time
 from django.http import StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
 from .models import Question, Topic, LearningObjective
 from django.contrib.admin.views.decorators import staff_member_required
 from .ai_tagging_improved import (
@@ -39,8 +38,8 @@ def bulk_ai_tag_questions_improved(request):
         try:
             # Get all untagged questions
             untagged_questions = Question.objects.filter(
-                Q(topic__isnull=True) | Q(learning_objectives__isnull=True)
-            ).distinct().select_related('subject', 'grade', 'topic')
+                is_fully_tagged=False
+            ).select_related('subject', 'grade', 'topic')
 
             total = untagged_questions.count()
             tag_logger.log_start(total)
@@ -0,0 +1,471 @@
+"""
+Question-bank bundles: a portable copy of a subject's questions, for moving
+a bank to another school's database or into a DLC database.
+
+A bundle is a directory
+
+    manifest.json           format version, what was exported, row counts
+    taxonomy.jsonl[.gz]     grades, subjects, topics and LOs the questions use
+    questions.jsonl[.gz]    one question per line, each tree in path order so
+                            parents come before their sub-questions
+    answer_spaces.jsonl[.gz]
+    images/<sha256>.<ext>   embedded images, stored once however many
+                            questions use them
+
+Rows refer to each other by their id in the exporting database ("ref");
+question HTML refers to images as bundle-image:<file>. Importing matches the
+taxonomy by natural key (grade name, subject code, topic name, LO code),
+creating what is missing, and gives questions new ids.
+
+Both directions stream CHUNK_SIZE rows at a time: export reads with
+iterator(), import bulk-inserts each chunk (whole question trees only) and
+fills in what the save signals would have - tree paths and totals, previews,
+tagging counters, search documents and fingerprints - so memory stays
+bounded by the chunk size plus the old-to-new id map.
+"""
+import base64
+import binascii
+import gzip
+import hashlib
+import json
+import mimetypes
+import re
+from collections import defaultdict
+from itertools import islice
+from pathlib import Path
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import CharField, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Concat, LPad
+from django.utils import timezone
+
+from .analytics.cache import bump_versions_on_commit
+from .duplicates import find_duplicates, fingerprint_new_questions
+from .models import AnswerSpace, Grade, LearningObjective, Question, Subject, Topic
+from .question_preview import update_preview
+from .question_tree import PATH_WIDTH
+from .search import rebuild_index
+
+FORMAT = 'question-bundle'
+FORMAT_VERSION = 1
+CHUNK_SIZE = 500
+MANIFEST = 'manifest.json'
+IMAGE_DIR = 'images'
+
+QUESTION_FIELDS = (
+    'id', 'parent_id', 'grade_id', 'subject_id', 'topic_id', 'year', 'question_number', 'order',
+    'marks', 'question_type', 'question_text', 'answer_text', 'parts_config',
+)
+ANSWER_SPACE_FIELDS = ('question_id', 'space_type', 'x', 'y', 'width', 'height', 'config', 'order', 'marks')
+
+_DATA_URI_RE = re.compile(r'data:(image/[\w.+-]+);base64,([A-Za-z0-9+/=\s]+)')
+_IMAGE_REF_RE = re.compile(r'bundle-image:([0-9a-f]{64}\.[\w+-]+)')
+
+LO_LINKS = Question.learning_objectives.through
+
+
+class BundleError(Exception):
+    pass
+
+
+# ── Files ───────────────────────────────────────────────────────────────────
+
+def _file_name(name, compress):
+    return f'{name}.jsonl.gz' if compress else f'{name}.jsonl'
+
+
+def _open(path, mode):
+    path = Path(path)
+    if path.suffix == '.gz':
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def _write_rows(handle, rows):
+    for row in rows:
+        handle.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False))
+        handle.write('\n')
+
+
+def _read_rows(path):
+    with _open(path, 'r') as handle:
+        for line in handle:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+# ── Images ──────────────────────────────────────────────────────────────────
+
+class _ImageStore:
+    """Moves embedded images between data: URIs and the bundle's images/ files."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory) / IMAGE_DIR
+        self.written = set()
+
+    def extract(self, value):
+        """`value` (a string, or JSON containing strings) with its data: URIs swapped for file references."""
+        if isinstance(value, str):
+            return _DATA_URI_RE.sub(self._save, value) if 'data:image' in value else value
+        if isinstance(value, list):
+            return [self.extract(v) for v in value]
+        if isinstance(value, dict):
+            return {k: self.extract(v) for k, v in value.items()}
+        return value
+
+    def _save(self, match):
+        try:
+            data = base64.b64decode(re.sub(r'\s+', '', match.group(2)))
+        except (binascii.Error, ValueError):
+            return match.group(0)
+        extension = (mimetypes.guess_extension(match.group(1)) or '.bin').lstrip('.')
+        name = f'{hashlib.sha256(data).hexdigest()}.{extension}'
+        if name not in self.written:
+            path = self.directory / name
+            if not path.exists():
+                path.write_bytes(data)
+            self.written.add(name)
+        return f'bundle-image:{name}'
+
+    def restore(self, value):
+        """Inverse of extract()."""
+        if isinstance(value, str):
+            return _IMAGE_REF_RE.sub(self._load, value) if 'bundle-image:' in value else value
+        if isinstance(value, list):
+            return [self.restore(v) for v in value]
+        if isinstance(value, dict):
+            return {k: self.restore(v) for k, v in value.items()}
+        return value
+
+    def _load(self, match):
+        path = self.directory / match.group(1)
+        if not path.exists():
+            raise BundleError(f'Bundle image {match.group(1)} is missing')
+        mime = mimetypes.guess_type(path.name)[0] or 'image/png'
+        return f'data:{mime};base64,{base64.b64encode(path.read_bytes()).decode()}'
+
+
+# ── Export ──────────────────────────────────────────────────────────────────
+
+def bundle_questions(subject, grade=None):
+    """Every question of `subject` (and `grade`) with its whole tree, in tree (path) order."""
+    roots = Question.objects.filter(subject=subject, parent__isnull=True)
+    if grade is not None:
+        roots = roots.filter(grade=grade)
+    root_ids = roots.values('pk')
+    return Question.objects.filter(Q(pk__in=root_ids) | Q(root_id__in=root_ids)).order_by('path', 'id')
+
+
+def _taxonomy_rows(questions, subject):
+    question_rows = questions.order_by()
+    grade_ids = set(question_rows.values_list('grade_id', flat=True).distinct())
+    lo_ids = set(LO_LINKS.objects.filter(question__in=question_rows.values('pk')).values_list(
+        'learningobjective_id', flat=True
+    ).distinct())
+    los = LearningObjective.objects.filter(
+        Q(subject=subject, grade_id__in=grade_ids) | Q(pk__in=lo_ids)
+    ).order_by('id')
+    topics = Topic.objects.filter(
+        Q(subject=subject, grade_id__in=grade_ids)
+        | Q(pk__in=question_rows.values('topic_id'))
+        | Q(pk__in=los.values('topic_id'))
+    ).order_by('id')
+    grade_ids |= set(topics.values_list('grade_id', flat=True)) | set(los.values_list('grade_id', flat=True))
+    subject_ids = (
+        {subject.pk} | set(topics.values_list('subject_id', flat=True)) | set(los.values_list('subject_id', flat=True))
+    )
+
+    for grade in Grade.objects.filter(pk__in=grade_ids).order_by('id'):
+        yield {'kind': 'grade', 'ref': grade.pk, 'name': grade.name, 'grade_level': grade.grade_level}
+    for s in Subject.objects.filter(pk__in=subject_ids).order_by('id'):
+        yield {'kind': 'subject', 'ref': s.pk, 'name': s.name, 'code': s.code, 'description': s.description}
+    for topic in topics:
+        yield {
+            'kind': 'topic', 'ref': topic.pk, 'name': topic.name,
+            'grade': topic.grade_id, 'subject': topic.subject_id,
+        }
+    for lo in los:
+        yield {
+            'kind': 'lo', 'ref': lo.pk, 'code': lo.code, 'description': lo.description,
+            'grade': lo.grade_id, 'subject': lo.subject_id, 'topic': lo.topic_id,
+        }
+
+
+def _question_rows(questions, images, chunk_size):
+    for chunk in _chunks(questions.values(*QUESTION_FIELDS).iterator(chunk_size=chunk_size), chunk_size):
+        los = {}
+        for question_id, lo_id in LO_LINKS.objects.filter(
+            question_id__in=[row['id'] for row in chunk]
+        ).values_list('question_id', 'learningobjective_id'):
+            los.setdefault(question_id, []).append(lo_id)
+        for row in chunk:
+            yield {
+                'ref': row['id'],
+                'parent': row['parent_id'],
+                'grade': row['grade_id'],
+                'subject': row['subject_id'],
+                'topic': row['topic_id'],
+                'learning_objectives': sorted(los.get(row['id'], [])),
+                'year': row['year'],
+                'question_number': row['question_number'],
+                'order': row['order'],
+                'marks': row['marks'],
+                'question_type': row['question_type'],
+                'question_text': images.extract(row['question_text']),
+                'answer_text': images.extract(row['answer_text']),
+                'parts_config': images.extract(row['parts_config']),
+            }
+
+
+def _answer_space_rows(questions, chunk_size):
+    spaces = AnswerSpace.objects.filter(question__in=questions.order_by().values('pk')).order_by('id')
+    for row in spaces.values(*ANSWER_SPACE_FIELDS).iterator(chunk_size=chunk_size):
+        row['question'] = row.pop('question_id')
+        yield row
+
+
+def export_bundle(directory, subject, grade=None, compress=False, chunk_size=CHUNK_SIZE, stdout=None):
+    """Write `subject`'s bank (optionally one grade) as a bundle into `directory`; returns the manifest."""
+    directory = Path(directory)
+    (directory / IMAGE_DIR).mkdir(parents=True, exist_ok=True)
+    questions = bundle_questions(subject, grade)
+    images = _ImageStore(directory)
+    counts = {}
+    files = {}
+
+    for name, rows in (
+        ('taxonomy', _taxonomy_rows(questions, subject)),
+        ('questions', _question_rows(questions, images, chunk_size)),
+        ('answer_spaces', _answer_space_rows(questions, chunk_size)),
+    ):
+        files[name] = _file_name(name, compress)
+        counts[name] = 0
+        with _open(directory / files[name], 'w') as handle:
+            for chunk in _chunks(rows, chunk_size):
+                _write_rows(handle, chunk)
+                counts[name] += len(chunk)
+                if stdout is not None and name == 'questions':
+                    stdout.write(f'  {counts[name]} questions exported')
+    counts['images'] = len(images.written)
+
+    manifest = {
+        'format': FORMAT,
+        'version': FORMAT_VERSION,
+        'exported_at': timezone.now(),
+        'subject': {'name': subject.name, 'code': subject.code},
+        'grade': grade.name if grade is not None else None,
+        'files': files,
+        'counts': counts,
+    }
+    with open(directory / MANIFEST, 'w', encoding='utf-8') as handle:
+        json.dump(manifest, handle, cls=DjangoJSONEncoder, indent=2)
+    return manifest
+
+
+# ── Import ──────────────────────────────────────────────────────────────────
+
+def read_manifest(directory):
+    try:
+        with open(Path(directory) / MANIFEST, encoding='utf-8') as handle:
+            manifest = json.load(handle)
+    except (OSError, ValueError) as e:
+        raise BundleError(f'Not a question bundle: {e}')
+    if manifest.get('format') != FORMAT:
+        raise BundleError('Not a question bundle')
+    if manifest.get('version') != FORMAT_VERSION:
+        raise BundleError(f"Unsupported bundle version {manifest.get('version')}")
+    return manifest
+
+
+def _import_taxonomy(path):
+    """{kind: {ref: local id}}, creating grades / subjects / topics / LOs that don't exist yet."""
+    refs = {'grade': {}, 'subject': {}, 'topic': {}, 'lo': {}}
+    for row in _read_rows(path):
+        kind = row['kind']
+        if kind == 'grade':
+            obj, _ = Grade.objects.get_or_create(name=row['name'], defaults={'grade_level': row['grade_level']})
+        elif kind == 'subject':
+            lookup = {'code': row['code']} if row['code'] else {'name': row['name'], 'code__isnull': True}
+            obj = Subject.objects.filter(**lookup).first() or Subject.objects.create(
+                name=row['name'], code=row['code'], description=row['description'],
+            )
+        elif kind == 'topic':
+            obj, _ = Topic.objects.get_or_create(
+                name=row['name'], grade_id=refs['grade'][row['grade']], subject_id=refs['subject'][row['subject']],
+            )
+        elif kind == 'lo':
+            obj, _ = LearningObjective.objects.get_or_create(
+                code=row['code'],
+                grade_id=refs['grade'][row['grade']],
+                subject_id=refs['subject'][row['subject']],
+                topic_id=refs['topic'][row['topic']],
+                defaults={'description': row['description']},
+            )
+        else:
+            raise BundleError(f'Unknown taxonomy row kind {kind!r}')
+        refs[kind][row['ref']] = obj.pk
+    return refs
+
+
+def _tree_chunks(rows, size):
+    """Chunks of about `size` question rows that never split a tree."""
+    chunk = []
+    for row in rows:
+        if row['parent'] is None and len(chunk) >= size:
+            yield chunk
+            chunk = []
+        chunk.append(row)
+    if chunk:
+        yield chunk
+
+
+def _set_tree_position(ids):
+    """root / path of new questions whose parents' are already set (what question_tree.sync_tree_position does)."""
+    parents = Question.objects.filter(pk=OuterRef('parent_id'))
+    own = Concat(LPad(Cast('id', CharField()), PATH_WIDTH, Value('0')), Value('/'))
+    Question.objects.filter(pk__in=ids).update(
+        path=Concat(Coalesce(Subquery(parents.values('path')), Value('')), own, output_field=CharField()),
+        root_id=Coalesce(Subquery(parents.values('root_id')), F('parent_id')),
+    )
+
+
+def _set_total_marks(questions):
+    """total_marks of the new questions of whole trees, one UPDATE per distinct total."""
+    by_id = {q.pk: q for q in questions}
+    totals = {q.pk: q.marks for q in questions}
+    depth = {}
+    for question in questions:  # parents come first
+        depth[question.pk] = depth[question.parent_id] + 1 if question.parent_id in depth else 0
+    # Deepest first, so each total is complete before it is added to its parent
+    for question in sorted(questions, key=lambda q: -depth[q.pk]):
+        if question.parent_id in by_id:
+            totals[question.parent_id] += totals[question.pk]
+    changed = defaultdict(list)
+    for pk, total in totals.items():
+        changed[total].append(pk)
+        by_id[pk].total_marks = total
+    for total, ids in changed.items():
+        Question.objects.filter(pk__in=ids).update(total_marks=total)
+
+
+class _QuestionImporter:
+    def __init__(self, refs, images, created_by, skip_duplicates):
+        self.refs = refs
+        self.images = images
+        self.created_by = created_by
+        self.skip_duplicates = skip_duplicates
+        self.ids = {}       # bundle ref -> new question id
+        self.skipped = set()
+        self.subjects = set()   # subject ids questions were imported into
+        self.duplicates = 0
+
+    def build(self, row):
+        lo_ids = [self.refs['lo'][ref] for ref in row['learning_objectives'] if ref in self.refs['lo']]
+        question = Question(
+            grade_id=self.refs['grade'][row['grade']],
+            subject_id=self.refs['subject'][row['subject']],
+            topic_id=self.refs['topic'][row['topic']],
+            year=row['year'],
+            question_number=row['question_number'],
+            order=row['order'],
+            marks=row['marks'],
+            question_type=row['question_type'],
+            question_text=self.images.restore(row['question_text']),
+            answer_text=self.images.restore(row['answer_text']),
+            parts_config=self.images.restore(row['parts_config']),
+            created_by=self.created_by,
+            lo_count=len(lo_ids),
+            is_fully_tagged=bool(lo_ids),
+        )
+        update_preview(question)
+        return question, lo_ids
+
+    def import_chunk(self, rows):
+        built = {}
+        for row in rows:
+            if row['parent'] in self.skipped:
+                self.skipped.add(row['ref'])
+                continue
+            question, lo_ids = self.build(row)
+            if (
+                self.skip_duplicates and row['parent'] is None
+                and find_duplicates(question.subject_id, question.question_text)
+            ):
+                self.skipped.add(row['ref'])
+                self.duplicates += 1
+                continue
+            built[row['ref']] = (row['parent'], question, lo_ids)
+
+        # Parents first: each wave inserts the questions whose parent has an id
+        # and then sets their tree position in one UPDATE from the parent's
+        pending = list(built)
+        while pending:
+            wave = [ref for ref in pending if built[ref][0] is None or built[ref][0] in self.ids]
+            if not wave:
+                raise BundleError('Question rows reference parents missing from the bundle')
+            for ref in wave:
+                parent_ref, question, _ = built[ref]
+                question.parent_id = self.ids.get(parent_ref)
+            Question.objects.bulk_create([built[ref][1] for ref in wave])
+            for ref in wave:
+                self.ids[ref] = built[ref][1].pk
+            _set_tree_position([built[ref][1].pk for ref in wave])
+            pending = [ref for ref in pending if ref not in self.ids]
+
+        questions = [question for _, question, _ in built.values()]
+        by_id = {q.pk: q for q in questions}
+        self.subjects.update(q.subject_id for q in questions)
+        _set_total_marks(questions)
+
+        LO_LINKS.objects.bulk_create([
+            LO_LINKS(question_id=question.pk, learningobjective_id=lo_id)
+            for _, question, lo_ids in built.values()
+            for lo_id in lo_ids
+        ])
+        rebuild_index(Question.objects.filter(pk__in=by_id))
+        fingerprint_new_questions([q for q in questions if q.parent_id is None])
+        return len(questions)
+
+
+def import_bundle(directory, created_by, skip_duplicates=False, chunk_size=CHUNK_SIZE, stdout=None):
+    """
+    Import the bundle in `directory` as questions of `created_by`, all or
+    nothing; returns {'questions', 'duplicates', 'answer_spaces'} counts.
+    With skip_duplicates, trees whose top-level question is a near-duplicate
+    of one already in the bank (core/duplicates.py) are left out.
+    """
+    directory = Path(directory)
+    manifest = read_manifest(directory)
+    files = manifest['files']
+    imported = answer_spaces = 0
+
+    with transaction.atomic():
+        refs = _import_taxonomy(directory / files['taxonomy'])
+        importer = _QuestionImporter(refs, _ImageStore(directory), created_by, skip_duplicates)
+        for chunk in _tree_chunks(_read_rows(directory / files['questions']), chunk_size):
+            imported += importer.import_chunk(chunk)
+            if stdout is not None:
+                stdout.write(f"  {imported}/{manifest['counts']['questions']} questions imported")
+
+        for chunk in _chunks(_read_rows(directory / files['answer_spaces']), chunk_size):
+            spaces = [
+                AnswerSpace(
+                    question_id=importer.ids[row['question']],
+                    **{field: row[field] for field in ANSWER_SPACE_FIELDS if field != 'question_id'},
+                )
+                for row in chunk if row['question'] in importer.ids
+            ]
+            AnswerSpace.objects.bulk_create(spaces)
+            answer_spaces += len(spaces)
+
+        # bulk_create skipped the signals that invalidate the subject catalog and candidate index
+        bump_versions_on_commit(subjects=importer.subjects)
+
+    return {'questions': imported, 'duplicates': importer.duplicates, 'answer_spaces': answer_spaces}
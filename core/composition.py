@@ -0,0 +1,130 @@
+"""
+Building tests out of bank questions in a fixed handful of queries.
+
+Adding questions used to cost a lookup, an exists() and an INSERT per
+selected question, and duplicating a test an INSERT per TestQuestion. Here
+a composition reads the requested questions and the test's current
+membership once each, works out the new `order` values in memory and writes
+with bulk_create / bulk_update, so a 60-question test costs the same few
+queries as a 6-question one.
+
+bulk_create skips the TestQuestion signals, so these functions refresh the
+usage counters (core/question_counters.py) and the test's analytics cache
+version themselves.
+"""
+from django.db import transaction
+
+from .analytics.cache import bump_versions_on_commit
+from .models import Question, Test, TestQuestion
+from .question_counters import refresh_usage_counts
+
+
+class UnknownQuestions(ValueError):
+    """Some requested question IDs don't exist; nothing was added."""
+
+    def __init__(self, question_ids):
+        self.question_ids = question_ids
+        super().__init__(f"Questions not found: {', '.join(map(str, question_ids))}")
+
+
+def _question_ids(values):
+    """Integer IDs of `values` in their given order, repeats dropped."""
+    try:
+        return list(dict.fromkeys(int(v) for v in values))
+    except (TypeError, ValueError):
+        raise ValueError('Question IDs must be integers')
+
+
+def _changed(test_id, question_ids):
+    refresh_usage_counts(question_ids)
+    bump_versions_on_commit(tests=[test_id])
+
+
+def add_questions(test, question_ids):
+    """
+    Append `question_ids` (in order) to `test`, skipping questions it already
+    contains; returns the new TestQuestion rows. Raises UnknownQuestions
+    without adding anything if any ID doesn't exist.
+    """
+    question_ids = _question_ids(question_ids)
+    if not question_ids:
+        return []
+    found = set(Question.objects.filter(pk__in=question_ids).values_list('pk', flat=True))
+    missing = [pk for pk in question_ids if pk not in found]
+    if missing:
+        raise UnknownQuestions(missing)
+
+    with transaction.atomic():
+        # Existing membership and the last order value in one read
+        existing = dict(
+            TestQuestion.objects.select_for_update().filter(test=test).values_list('question_id', 'order')
+        )
+        last = max(existing.values(), default=0)
+        new_ids = [pk for pk in question_ids if pk not in existing]
+        added = TestQuestion.objects.bulk_create([
+            TestQuestion(test=test, question_id=pk, order=order)
+            for order, pk in enumerate(new_ids, start=last + 1)
+        ])
+        _changed(test.pk, new_ids)
+    return added
+
+
+def renumber(test):
+    """Close gaps in `test`'s question order (1, 2, 3, ...); returns how many rows moved."""
+    rows = list(TestQuestion.objects.filter(test=test).order_by('order', 'id').only('id', 'order'))
+    moved = []
+    for order, row in enumerate(rows, start=1):
+        if row.order != order:
+            row.order = order
+            moved.append(row)
+    TestQuestion.objects.bulk_update(moved, ['order'])
+    return len(moved)
+
+
+def remove_questions(test, test_question_ids):
+    """Delete these TestQuestion rows of `test` and renumber the rest; returns how many were removed."""
+    rows = TestQuestion.objects.filter(test=test, id__in=list(test_question_ids))
+    with transaction.atomic():
+        # delete() sends the per-row signals that refresh counters and caches
+        removed, _ = rows.delete()
+        renumber(test)
+    return removed
+
+
+def copy_test(test, created_by, title=None, assignments=False, teachers=False):
+    """
+    A new unpublished Test with `test`'s settings and questions (renumbered
+    1..n), created by `created_by`. With `assignments` it is also assigned
+    to the same students and groups (and excludes the same students); with
+    `teachers` it is shared with the same teachers.
+    """
+    with transaction.atomic():
+        copy = Test.objects.create(
+            title=title or f"{test.title} (Copy)",
+            created_by=created_by,
+            duration_minutes=test.duration_minutes,
+            start_time=test.start_time,
+            subject=test.subject,
+        )
+        question_ids = list(
+            TestQuestion.objects.filter(test=test).order_by('order', 'id').values_list('question_id', flat=True)
+        )
+        TestQuestion.objects.bulk_create([
+            TestQuestion(test=copy, question_id=pk, order=order)
+            for order, pk in enumerate(question_ids, start=1)
+        ])
+        refresh_usage_counts(question_ids)
+
+        if assignments:
+            for relation in ('assigned_students', 'assigned_groups', 'excluded_students'):
+                ids = list(getattr(test, relation).values_list('id', flat=True))
+                if ids:
+                    getattr(copy, relation).add(*ids)
+        if teachers:
+            ids = list(test.assigned_teachers.exclude(id=created_by.id).values_list('id', flat=True))
+            if test.created_by_id != created_by.id:
+                # Whoever owned the original keeps access to the copy
+                ids.append(test.created_by_id)
+            if ids:
+                copy.assigned_teachers.add(*ids)
+    return copy
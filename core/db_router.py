@@ -6,7 +6,33 @@ For example:
 - 9702_physics.db for AS & A Level Physics
 - 0625_physics.db for IGCSE Physics
 - jee_physics.db for JEE Physics
+
+AnalyticsReplicaRouter sends the reads of analytics views, report cards and
+exports to a read-only 'analytics' replica when one is configured (see
+ANALYTICS_DATABASE_URL / ANALYTICS_SQLITE_PATH in settings).
+
+Both are listed in settings.DATABASE_ROUTERS, QuestionBankRouter first: it
+only answers for question models given a `question_bank` hint and returns
+None otherwise (allow_migrate included), so without such a hint routing is
+exactly what it would be with the replica router alone.
 """
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.models import Max
+
+ANALYTICS_DB = 'analytics'
+
+_analytics_reads = ContextVar('analytics_reads', default=False)
+_primary_pinned = ContextVar('primary_pinned', default=False)
+_wrote_primary = ContextVar('wrote_primary', default=False)
+
+# Process-wide result of the last replica lag check: (checked_at, usable)
+_replica_state = [0.0, False]
 
 
 class QuestionBankRouter:
@@ -53,13 +79,10 @@ class QuestionBankRouter:
         """
         Control which models get migrated to which database
         """
-        # Question models should migrate to their specific databases
-        if model_name in ['question', 'testquestion', 'studentanswer']:
-            # Only migrate to main DB if no specific DB is being targeted
-            return db == 'default'
-
-        # All other models only in default database
-        return db == 'default'
+        # QuestionBank databases are created and filled by
+        # setup_question_databases / migrate_questions_to_dlc rather than
+        # migrate, so leave every alias to the routers after this one
+        return None
 
     def _get_db_alias(self, question_bank):
         """
@@ -69,3 +92,122 @@ class QuestionBankRouter:
         if question_bank.subject and question_bank.subject.code:
             return f"qb_{question_bank.subject.code}"
         return f"qb_{question_bank.id}"
+
+
+def replica_configured():
+    return ANALYTICS_DB in settings.DATABASES
+
+
+def replica_lag():
+    """
+    Seconds the replica trails the primary, judged by the newest
+    StudentTestResult write (touched by every submission and grade) each
+    side has seen. None when the replica can't be queried.
+
+    Only that table is probed. Writes that leave it alone, such as retagging
+    questions (which rebuilds MasteryFact rows) or question bank and syllabus
+    edits, don't move the probe, so the replica can serve older copies of
+    them while it looks current. The user who made the change still reads
+    the primary copy through ReadYourWritesMiddleware; other users see it
+    once the replica catches up.
+    """
+    from core.models import StudentTestResult
+
+    try:
+        primary, replica = (
+            StudentTestResult.objects.using(alias).aggregate(newest=Max('updated_at'))['newest']
+            for alias in (DEFAULT_DB_ALIAS, ANALYTICS_DB)
+        )
+    except DatabaseError:
+        return None
+    if primary is None or (replica is not None and replica >= primary):
+        return 0.0
+    if replica is None:
+        return float('inf')
+    return (primary - replica).total_seconds()
+
+
+def replica_usable():
+    """Whether the replica is within ANALYTICS_REPLICA_MAX_LAG; re-checked every ANALYTICS_REPLICA_CHECK_INTERVAL."""
+    if not replica_configured():
+        return False
+    now = time.monotonic()
+    checked_at, usable = _replica_state
+    if checked_at and now - checked_at < settings.ANALYTICS_REPLICA_CHECK_INTERVAL:
+        return usable
+    lag = replica_lag()
+    usable = lag is not None and lag <= settings.ANALYTICS_REPLICA_MAX_LAG
+    _replica_state[:] = [now, usable]
+    return usable
+
+
+@contextmanager
+def analytics_reads():
+    """Route ORM reads in this block to the analytics replica (when usable)."""
+    token = _analytics_reads.set(True)
+    try:
+        yield
+    finally:
+        _analytics_reads.reset(token)
+
+
+def use_analytics_replica(view):
+    """View decorator: the view's reads may be served by the analytics replica."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with analytics_reads():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def read_your_writes(pinned=False):
+    """
+    Request scope for ReadYourWritesMiddleware: with `pinned`, every read
+    goes to the primary. Yields a callable telling whether the block wrote
+    to a core model.
+    """
+    pin_token = _primary_pinned.set(pinned)
+    wrote_token = _wrote_primary.set(False)
+    try:
+        yield _wrote_primary.get
+    finally:
+        _primary_pinned.reset(pin_token)
+        _wrote_primary.reset(wrote_token)
+
+
+class AnalyticsReplicaRouter:
+    """
+    Serve reads inside analytics_reads() from the 'analytics' replica, unless
+    the replica lags too far behind, the request is pinned to the primary
+    after a write (read your writes) or a transaction is open on the primary.
+    Writes always go to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _analytics_reads.get() or _primary_pinned.get():
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block or not replica_usable():
+            return None
+        return ANALYTICS_DB
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == 'core':
+            _wrote_primary.set(True)
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == ANALYTICS_DB:
+            # Objects read from the replica are saved back to the primary
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica mirrors the primary, so their objects can be mixed
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, ANALYTICS_DB}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is kept in sync by replication (or sync_analytics_replica)
+        if db == ANALYTICS_DB:
+            return False
+        return None
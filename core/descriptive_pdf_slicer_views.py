@@ -22,9 +22,11 @@ except ImportError:
     _FITZ_AVAILABLE = False
 
 from .models import (
-    Question, Grade, Subject, Topic, LearningObjective,
+    Question, Topic, LearningObjective,
     QuestionPage, AnswerSpace, ProcessedPDF
 )
+from .taxonomy import get_taxonomy
+from .duplicates import duplicate_summary, find_duplicates
 
 
 def detect_colored_lines(page, zoom=2):
@@ -260,9 +262,9 @@ def descriptive_pdf_slicer(request):
                              'Ask your administrator to run: pip install PyMuPDF')
         return redirect('teacher_dashboard')
 
-    grades = Grade.objects.all().order_by('name')
-    subjects = Subject.objects.all().order_by('name')
-    topics = Topic.objects.all().order_by('name')
+    grades = get_taxonomy().grade_list()
+    subjects = get_taxonomy().subject_list()
+    topics = get_taxonomy().topics_for()
 
     if request.method == 'POST':
         # Check action from form data first, then from JSON body
@@ -385,6 +387,11 @@ def descriptive_pdf_slicer(request):
                     topic = Topic.objects.filter(subject_id=subject_id).first()
                     topic_id = topic.id if topic else None
 
+                # Near-duplicate of a question already in the bank?
+                matches = find_duplicates(subject_id, pages_data[0].get('page_image', ''))
+                if matches and data.get('skip_duplicates'):
+                    return JsonResponse({'success': False, 'skipped': True, **duplicate_summary(matches)})
+
                 # Format markscheme as HTML
                 ms_html = format_markscheme_html(markscheme)
 
@@ -416,10 +423,13 @@ def descriptive_pdf_slicer(request):
                     question.question_text = pages_data[0]['page_image']
                     question.save()
 
-                return JsonResponse({
+                response = {
                     'success': True,
                     'question_id': question.id
-                })
+                }
+                if matches:
+                    response.update(duplicate_summary(matches))
+                return JsonResponse(response)
 
             except Exception as e:
                 import traceback
@@ -448,10 +458,22 @@ def descriptive_pdf_slicer(request):
 
                 saved_count = 0
                 saved_question_ids = []
+                duplicates = []
+                skip_duplicates = bool(data.get('skip_duplicates'))
 
                 for q_data in questions:
                     pages_data = q_data.get('pages', [])
                     markscheme = q_data.get('markscheme', {})
+
+                    matches = find_duplicates(subject_id, pages_data[0].get('page_image', '')) if pages_data else []
+                    if matches:
+                        duplicates.append({
+                            'question_number': q_data.get('question_number'),
+                            'skipped': skip_duplicates,
+                            **duplicate_summary(matches),
+                        })
+                        if skip_duplicates:
+                            continue
                     marks = markscheme.get('total_marks', 5) if markscheme else 5
 
                     ms_html = format_markscheme_html(markscheme)
@@ -505,6 +527,7 @@ def descriptive_pdf_slicer(request):
                     'success': True,
                     'count': saved_count,
                     'question_ids': saved_question_ids,
+                    'duplicates': duplicates,
                 })
 
             except Exception as e:
@@ -7,6 +7,7 @@ from django.contrib import messages
 from django.db.models import Count, Q, F
 from django.db import models
 from .models import QuestionBank, SubjectGradeCombination, Question, Subject, Grade
+from .taxonomy import get_taxonomy
 from django.http import JsonResponse
 
 
@@ -175,8 +176,8 @@ def add_combination(request):
     """
     if request.method != 'POST':
         # Show form
-        subjects = Subject.objects.all()
-        grades = Grade.objects.all()
+        subjects = get_taxonomy().subject_list()
+        grades = get_taxonomy().grade_list()
         return render(request, 'teacher/add_combination.html', {
             'subjects': subjects,
             'grades': grades,
@@ -0,0 +1,245 @@
+"""
+Near-duplicate detection for imported questions.
+
+The same past-paper questions get sliced again by other teachers and in
+later sessions; ProcessedPDF only recognises byte-identical PDFs. Every
+top-level question therefore gets a QuestionFingerprint:
+
+    image_hash      256-bit difference hash (16 x 16 dHash) of its first
+                    embedded image, cropped to the ink so slicing margins and
+                    scale don't matter (an 8 x 8 hash can't tell pages of
+                    printed text apart)
+    text_signature  MinHash (NUM_PERM values) of the word 3-grams of its
+                    plain text, when it has at least MIN_WORDS words
+
+and a few dozen QuestionLSHBucket rows - one per sample of IMAGE_SAMPLE_BITS
+fixed image hash bits and one per band of the MinHash - keyed within the
+subject. A lookup
+computes the same keys for the new question and reads only the questions
+sharing a bucket, so its cost depends on how many near-duplicates exist, not
+on the size of the bank. Candidates are then confirmed with the exact
+Hamming distance / estimated Jaccard similarity.
+
+core/signals.py fingerprints questions on save and records the closest
+earlier match as `duplicate_of`; importers call find_duplicates() first to
+report (or, with skip_duplicates, not create) questions already in the bank.
+"""
+import base64
+import hashlib
+import re
+import zlib
+from functools import lru_cache
+from io import BytesIO
+
+import numpy as np
+from django.db import transaction
+from PIL import Image, UnidentifiedImageError
+
+from .models import Question, QuestionFingerprint, QuestionLSHBucket
+from .question_preview import first_image
+from .search import plain_text
+
+HASH_SIZE = 16                # dHash grid; HASH_SIZE ** 2 bits
+IMAGE_BANDS, IMAGE_SAMPLE_BITS = 24, 32  # a copy 5% of bits away shares a band with >99% odds
+IMAGE_MAX_DISTANCE = 0.1      # fraction of differing bits; re-slices stay under ~0.07
+INK_THRESHOLD = 128           # grey level below which a pixel counts as print
+
+NUM_PERM = 64
+TEXT_BANDS, TEXT_ROWS = 16, 4  # candidate from ~50% Jaccard similarity
+TEXT_MIN_SIMILARITY = 0.8
+SHINGLE_WORDS = 3
+MIN_WORDS = 8                 # shorter texts ("Answer all parts") would all collide
+
+_PRIME = (1 << 31) - 1
+_perm_rng = np.random.default_rng(20240601)
+_PERM_A = _perm_rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_PERM_B = _perm_rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+_IMAGE_SAMPLES = np.stack([
+    _perm_rng.choice(HASH_SIZE * HASH_SIZE, IMAGE_SAMPLE_BITS, replace=False) for _ in range(IMAGE_BANDS)
+])
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+# ── Fingerprints ────────────────────────────────────────────────────────────
+
+def image_hash(payload):
+    """dHash bits (bool array) of a base64 image, or None if it won't decode."""
+    try:
+        image = Image.open(BytesIO(base64.b64decode(payload))).convert('L')
+    except (ValueError, UnidentifiedImageError, OSError):
+        return None
+    ink = image.point(lambda v: 255 if v < INK_THRESHOLD else 0).getbbox()
+    if ink:
+        image = image.crop(ink)
+    pixels = np.asarray(image.resize((HASH_SIZE + 1, HASH_SIZE), Image.BOX), dtype=np.int16)
+    return (pixels[:, 1:] > pixels[:, :-1]).ravel()
+
+
+def text_signature(text):
+    """MinHash signature (uint32 array) of `text`'s word shingles, or None if too short."""
+    words = [w.lower() for w in _WORD_RE.findall(text)]
+    if len(words) < MIN_WORDS:
+        return None
+    shingles = {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+@lru_cache(maxsize=8)
+def fingerprint(markup):
+    """(image_hash, text_signature) of a question's HTML; cached so a check before create isn't repeated on save."""
+    payload = first_image(markup)
+    return (
+        image_hash(payload) if payload else None,
+        text_signature(plain_text(markup)),
+    )
+
+
+def markup_digest(markup):
+    return hashlib.sha256((markup or '').encode()).hexdigest()
+
+
+def _bucket(subject_id, kind, band, value):
+    digest = hashlib.blake2b(f'{subject_id}:{kind}:{band}:'.encode() + value, digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def bucket_keys(subject_id, hashed, signature):
+    keys = []
+    if hashed is not None:
+        keys += [
+            _bucket(subject_id, 'img', b, np.packbits(hashed[sample]).tobytes())
+            for b, sample in enumerate(_IMAGE_SAMPLES)
+        ]
+    if signature is not None:
+        keys += [
+            _bucket(subject_id, 'txt', b, signature[b * TEXT_ROWS:(b + 1) * TEXT_ROWS].tobytes())
+            for b in range(TEXT_BANDS)
+        ]
+    return keys
+
+
+def similarity(hashed, signature, other_hash, other_signature):
+    """Best confirmed similarity (0-1) between two fingerprints, or 0 if they aren't near-duplicates."""
+    best = 0.0
+    if hashed is not None and other_hash:
+        other = np.unpackbits(np.frombuffer(other_hash, dtype=np.uint8))[:hashed.size].astype(bool)
+        distance = float(np.mean(hashed != other))
+        if distance <= IMAGE_MAX_DISTANCE:
+            best = 1 - distance
+    if signature is not None and other_signature:
+        jaccard = float(np.mean(signature == np.frombuffer(other_signature, dtype=np.uint32)))
+        if jaccard >= TEXT_MIN_SIMILARITY:
+            best = max(best, jaccard)
+    return best
+
+
+# ── Lookups ─────────────────────────────────────────────────────────────────
+
+def _matches(subject_id, hashed, signature, exclude_id=None):
+    keys = bucket_keys(subject_id, hashed, signature)
+    if not keys:
+        return []
+    candidates = QuestionLSHBucket.objects.filter(bucket__in=keys).values_list('question_id', flat=True)
+    if exclude_id is not None:
+        candidates = candidates.exclude(question_id=exclude_id)
+    found = []
+    # Questions since moved under a parent keep stale fingerprints; skip them
+    for question_id, other_hash, other_signature in QuestionFingerprint.objects.filter(
+        question_id__in=set(candidates), question__parent__isnull=True
+    ).values_list('question_id', 'image_hash', 'text_signature'):
+        score = similarity(hashed, signature, other_hash, other_signature)
+        if score:
+            found.append((question_id, round(score, 3)))
+    # Most similar first, the original (oldest) question breaking ties
+    return sorted(found, key=lambda match: (-match[1], match[0]))
+
+
+def find_duplicates(subject_id, markup, exclude_id=None):
+    """[(question_id, similarity), ...] of bank questions in the subject that `markup` nearly duplicates."""
+    hashed, signature = fingerprint(markup)
+    return _matches(subject_id, hashed, signature, exclude_id)
+
+
+def duplicate_summary(matches):
+    """JSON-ready description of the closest match, for importer responses."""
+    question_id, score = matches[0]
+    return {'duplicate_of': question_id, 'similarity': score}
+
+
+# ── Keeping fingerprints in sync ─────────────────────────────────────────────
+
+def fingerprint_question(question):
+    """Create or refresh `question`'s fingerprint and buckets, flagging its closest earlier duplicate."""
+    if question.parent_id:
+        return
+    digest = markup_digest(question.question_text)
+    current = QuestionFingerprint.objects.filter(question_id=question.pk).values_list(
+        'text_digest', 'subject_id'
+    ).first()
+    if current == (digest, question.subject_id):
+        return
+
+    hashed, signature = fingerprint(question.question_text)
+    earlier = [m for m in _matches(question.subject_id, hashed, signature, question.pk) if m[0] < question.pk]
+    with transaction.atomic():
+        QuestionFingerprint.objects.update_or_create(
+            question_id=question.pk,
+            defaults={
+                'subject_id': question.subject_id,
+                'text_digest': digest,
+                'image_hash': np.packbits(hashed).tobytes() if hashed is not None else b'',
+                'text_signature': signature.tobytes() if signature is not None else b'',
+                'duplicate_of_id': earlier[0][0] if earlier else None,
+                'similarity': earlier[0][1] if earlier else None,
+            },
+        )
+        QuestionLSHBucket.objects.filter(question_id=question.pk).delete()
+        QuestionLSHBucket.objects.bulk_create([
+            QuestionLSHBucket(question_id=question.pk, bucket=key)
+            for key in bucket_keys(question.subject_id, hashed, signature)
+        ])
+
+
+def fingerprint_new_questions(questions):
+    """
+    fingerprint_question() for many just bulk-created top-level questions, with
+    bulk inserts; they are matched against the bank but not against each other.
+    """
+    fingerprints, buckets = [], []
+    for question in questions:
+        hashed, signature = fingerprint(question.question_text)
+        earlier = [m for m in _matches(question.subject_id, hashed, signature, question.pk) if m[0] < question.pk]
+        fingerprints.append(QuestionFingerprint(
+            question_id=question.pk,
+            subject_id=question.subject_id,
+            text_digest=markup_digest(question.question_text),
+            image_hash=np.packbits(hashed).tobytes() if hashed is not None else b'',
+            text_signature=signature.tobytes() if signature is not None else b'',
+            duplicate_of_id=earlier[0][0] if earlier else None,
+            similarity=earlier[0][1] if earlier else None,
+        ))
+        buckets += [
+            QuestionLSHBucket(question_id=question.pk, bucket=key)
+            for key in bucket_keys(question.subject_id, hashed, signature)
+        ]
+    QuestionFingerprint.objects.bulk_create(fingerprints)
+    QuestionLSHBucket.objects.bulk_create(buckets)
+
+
+def rebuild_fingerprints(questions=None, stdout=None):
+    """Fingerprint `questions` (default: every top-level question) oldest first; returns how many."""
+    questions = Question.objects.filter(parent__isnull=True) if questions is None else questions
+    ids = list(questions.order_by('id').values_list('id', flat=True))
+    QuestionFingerprint.objects.filter(question_id__in=ids).delete()
+    QuestionLSHBucket.objects.filter(question_id__in=ids).delete()
+    for done, question in enumerate(
+        Question.objects.filter(id__in=ids).order_by('id')
+        .only('id', 'parent_id', 'subject_id', 'question_text').iterator(chunk_size=100),
+        1,
+    ):
+        fingerprint_question(question)
+        if stdout is not None and done % 500 == 0:
+            stdout.write(f'  {done}/{len(ids)} questions fingerprinted')
+    return len(ids)
@@ -0,0 +1,321 @@
+"""
+Keyset (cursor) pagination for long listings.
+
+Paginator pages with OFFSET, so page 500 makes the database produce and
+throw away 10,000 rows first, and every page also runs a COUNT(*) over the
+whole filtered (often joined) queryset. KeysetPaginator instead remembers
+the sort key of the last row shown and asks for the rows after it
+
+    WHERE (grade, section, roll_number, id) > (<last row's values>)
+    ORDER BY grade, section, roll_number, id LIMIT per_page + 1
+
+which costs the same on every page when an index matches the ordering. The
+primary key is always the final sort key, so the order is total and no row
+is skipped or repeated between pages. Positions travel as opaque cursor
+strings (?cursor=...), and a "last page" cursor reads the ordering backwards.
+
+Counting is optional: with `count_limit` the paginator counts at most that
+many rows and reports "count_limit+" beyond it.
+
+Several querysets (e.g. teachers and students) can be paged as one list when
+each one annotates the same sort keys, including one telling the sources
+apart ahead of the primary key: every source fetches its next per_page + 1
+rows and the paginator merges them.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.functions import Collate
+
+NEXT, PREVIOUS = 'n', 'p'
+
+# Listings say "1000+" rather than count every matching row
+LISTING_COUNT_LIMIT = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def binary_collation(expression):
+    """
+    `expression` compared byte-wise, so text keys of merged sources sort the
+    same in the database as in Python (SQLite already compares that way).
+    """
+    return Collate(expression, 'C') if connection.vendor == 'postgresql' else expression
+
+
+class _KeyEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # Full precision: DjangoJSONEncoder rounds times to milliseconds, and
+        # a rounded key would skip rows
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(direction, values=None, start=None):
+    payload = json.dumps({'d': direction, 'k': values, 'i': start}, cls=_KeyEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(direction, key values or None, start index or None) of a cursor string."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        direction, values, start = payload['d'], payload['k'], payload['i']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursor(cursor)
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, (list, type(None))):
+        raise InvalidCursor(cursor)
+    if not isinstance(start, (int, type(None))) or isinstance(start, bool):
+        raise InvalidCursor(cursor)
+    return direction, values, start
+
+
+def _nullable(model, path):
+    """Whether `path` (a field lookup, or an annotation) can be NULL in rows of `model`."""
+    for name in path.split('__'):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return True
+        if field.null:
+            return True
+        model = field.related_model
+    return False
+
+
+def _attname(model, name):
+    try:
+        return model._meta.get_field(name).attname
+    except (FieldDoesNotExist, AttributeError):
+        return name  # annotation
+
+
+class SortKey:
+    def __init__(self, spec, model):
+        self.descending = spec.startswith('-')
+        self.name = spec.lstrip('-')
+        self.nullable = _nullable(model, self.name)
+
+    def order_by(self, reverse):
+        # NULLs sort last in the listing's own direction (first when read backwards)
+        descending = self.descending != reverse
+        nulls = ({'nulls_first': True} if reverse else {'nulls_last': True}) if self.nullable else {}
+        return F(self.name).desc(**nulls) if descending else F(self.name).asc(**nulls)
+
+    def equal(self, value):
+        return Q(**{f'{self.name}__isnull': True}) if value is None else Q(**{self.name: value})
+
+    def beyond(self, value, reverse):
+        """Rows strictly past `value` in the (possibly reversed) order, or None if there are none."""
+        if value is None:
+            # NULLs come last going forwards, first going backwards
+            return Q(**{f'{self.name}__isnull': False}) if reverse else None
+        lookup = 'lt' if self.descending != reverse else 'gt'
+        condition = Q(**{f'{self.name}__{lookup}': value})
+        if self.nullable and not reverse:
+            condition |= Q(**{f'{self.name}__isnull': True})
+        return condition
+
+
+def keyset_filter(keys, values, reverse=False):
+    """Q matching the rows after (or, reversed, before) the row whose sort key is `values`."""
+    condition = None
+    # Built from the last key outwards: a > x OR (a = x AND (b > y OR (b = y AND ...)))
+    for key, value in reversed(list(zip(keys, values))):
+        beyond = key.beyond(value, reverse)
+        if condition is not None:
+            tied = key.equal(value) & condition
+            condition = tied if beyond is None else beyond | tied
+        else:
+            condition = beyond
+    return condition
+
+
+class KeysetPage:
+    def __init__(self, paginator, rows, start, has_previous, has_next):
+        self.paginator = paginator
+        self.object_list = rows
+        self.start = start
+        self.has_previous = has_previous
+        self.has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_previous or self.has_next
+
+    # Row positions are carried along in the cursors; None when unknown
+    # (the last page of a listing whose count was capped)
+    def start_index(self):
+        if self.start is None:
+            return None
+        return self.start if self.object_list else 0
+
+    def end_index(self):
+        if self.start is None:
+            return None
+        return self.start + len(self.object_list) - 1 if self.object_list else 0
+
+    @property
+    def next_cursor(self):
+        if not self.has_next:
+            return None
+        start = self.start + len(self.object_list) if self.start is not None else None
+        return encode_cursor(NEXT, self.paginator.key_of(self.object_list[-1]), start)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous:
+            return None
+        start = self.start - self.paginator.per_page if self.start is not None else None
+        return encode_cursor(PREVIOUS, self.paginator.key_of(self.object_list[0]), start if start and start > 1 else None)
+
+    @property
+    def last_cursor(self):
+        return encode_cursor(PREVIOUS) if self.has_next else None
+
+
+class KeysetPaginator:
+    """
+    Pages of `queryset` (or a list of querysets annotating the same sort keys)
+    in `ordering` - field lookups or annotation names, '-' for descending.
+    Rows may be model instances or .values() dicts.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-pk',), count_limit=None):
+        self.sources = list(queryset) if isinstance(queryset, (list, tuple)) else [queryset]
+        self.per_page = per_page
+        self.count_limit = count_limit
+        model = self.sources[0].model
+        pk = model._meta.pk.name
+        ordering = [spec.replace('pk', pk) if spec.lstrip('-') == 'pk' else spec for spec in ordering]
+        if ordering[-1].lstrip('-') != pk:
+            ordering.append(f'-{pk}' if ordering[-1].startswith('-') else pk)
+        self.ordering = ordering
+        self._counted = None
+
+        self.keys = [SortKey(spec, model) for spec in ordering]
+        # Related / expression keys are read back from annotations
+        self._fields = [
+            _attname(model, key.name) if '__' not in key.name else f'keyset_{i}'
+            for i, key in enumerate(self.keys)
+        ]
+        self._counted_sources = self.sources
+        self.sources = [self._prepare(qs) for qs in self.sources]
+
+    def _prepare(self, queryset):
+        extra = {
+            field: F(key.name) for key, field in zip(self.keys, self._fields) if field != key.name
+        }
+        return queryset.annotate(**extra) if extra else queryset
+
+    def key_of(self, row):
+        if isinstance(row, dict):
+            values = [row[field] for field in self._fields]
+        else:
+            values = [getattr(row, field) for field in self._fields]
+        return json.loads(json.dumps(values, cls=_KeyEncoder))
+
+    def _fetch(self, values, reverse, limit):
+        order = [key.order_by(reverse) for key in self.keys]
+        condition = keyset_filter(self.keys, values, reverse) if values is not None else None
+        rows = []
+        for source in self.sources:
+            queryset = source if condition is None else source.filter(condition)
+            rows.extend(queryset.order_by(*order)[:limit])
+        if len(self.sources) > 1:
+            rows.sort(key=self._sort_key(reverse))
+        return rows[:limit]
+
+    def _sort_key(self, reverse):
+        keys = self.keys
+
+        def sort_key(row):
+            parts = []
+            for key, value in zip(keys, self.key_of(row)):
+                # Comparable stand-ins for the database order, NULLs last
+                descending = key.descending != reverse
+                null = (value is None) != reverse
+                parts.append((null, _Reversed(value) if descending else value) if value is not None else (null, 0))
+            return parts
+        return sort_key
+
+    def get_page(self, cursor=None):
+        """Page at `cursor`; the first page for a missing or invalid cursor (like Paginator.get_page)."""
+        try:
+            direction, values, start = decode_cursor(cursor) if cursor else (NEXT, None, None)
+            if values is not None and len(values) != len(self.keys):
+                raise InvalidCursor(cursor)
+        except InvalidCursor:
+            direction, values, start = NEXT, None, None
+
+        if direction == NEXT:
+            rows = self._fetch(values, False, self.per_page + 1)
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = values is not None
+            start = start if has_previous else 1
+        else:
+            rows = self._fetch(values, True, self.per_page + 1)
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = values is not None
+            if not has_previous:
+                start = 1
+            elif values is None and self.count_is_exact:  # last page
+                start = self.count - len(rows) + 1
+        return KeysetPage(self, rows, start, has_previous, has_next)
+
+    def _count(self):
+        if self._counted is None:
+            total, exact = 0, True
+            for source in self._counted_sources:
+                queryset = source.order_by()
+                if self.count_limit is not None:
+                    n = queryset.values('pk')[:self.count_limit + 1].count()
+                    exact = exact and n <= self.count_limit
+                    total += min(n, self.count_limit)
+                else:
+                    total += queryset.count()
+            self._counted = (total, exact)
+        return self._counted
+
+    @property
+    def count(self):
+        """Number of rows, at most count_limit (see count_is_exact)."""
+        return self._count()[0]
+
+    @property
+    def count_is_exact(self):
+        return self._count()[1]
+
+
+class _Reversed:
+    """Inverts comparisons of a sort value, for descending keys in a Python sort."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
@@ -0,0 +1,122 @@
+"""
+Micro-benchmark: vectorized core.analytics.stats vs the pure-Python loops
+test_analytics_view used before, on a synthetic test (no database access)
+Usage:
+    python manage.py benchmark_stats
+    python manage.py benchmark_stats --students 10000 --questions 40 --repeat 5
+"""
+import math
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from core.analytics import stats
+
+
+def _legacy(student_ids, earned, max_marks, times):
+    totals = {}
+    for sid, e, m in zip(student_ids, earned, max_marks):
+        t = totals.setdefault(sid, [0.0, 0.0])
+        t[0] += e
+        t[1] += m
+    scores = [round(e / m * 100, 2) if m else 0.0 for e, m in totals.values()]
+
+    mean = statistics.mean(scores)
+    std = statistics.stdev(scores)
+    median = statistics.median(scores)
+
+    bins = [0] * 10
+    for v in scores:
+        bins[min(9, int(v // 10))] += 1
+
+    curve = []
+    for x in range(0, 101, 2):
+        pdf = (1 / (std * math.sqrt(2 * math.pi))) * math.exp(-0.5 * ((x - mean) / std) ** 2)
+        curve.append(pdf * len(scores) * 10)
+
+    student_times = {}
+    for sid, t in zip(student_ids, times):
+        student_times[sid] = student_times.get(sid, 0) + t
+
+    accuracy = [round(e / m * 100, 1) if m else 0 for e, m in zip(earned, max_marks)]
+    n = len(times)
+    mean_t = sum(times) / n
+    mean_a = sum(accuracy) / n
+    num = sum((t - mean_t) * (a - mean_a) for t, a in zip(times, accuracy))
+    den_t = sum((t - mean_t) ** 2 for t in times) ** 0.5
+    den_a = sum((a - mean_a) ** 2 for a in accuracy) ** 0.5
+    correlation = num / (den_t * den_a)
+
+    return mean, std, median, bins, curve, correlation
+
+
+def _vectorized(student_ids, earned, max_marks, times):
+    _, _, e, m = stats.group_sums(student_ids, earned, max_marks)
+    scores = np.round(np.where(m > 0, e / np.where(m > 0, m, 1) * 100, 0), 2)
+
+    cohort = stats.describe(scores)
+    bins = stats.histogram(scores)
+    _, curve = stats.gaussian_curve(cohort['mean'], cohort['std'], scores.size)
+    stats.group_sums(student_ids, times)
+
+    accuracy = np.round(np.where(max_marks > 0, earned / np.where(max_marks > 0, max_marks, 1) * 100, 0), 1)
+    correlation = stats.pearson(times, accuracy)
+
+    return cohort['mean'], cohort['std'], cohort['median'], bins, curve, correlation
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the vectorized analytics statistics against the legacy pure-Python loops'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=10000, help='Synthetic students (default 10000)')
+        parser.add_argument('--questions', type=int, default=40, help='Questions per test (default 40)')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per implementation (best is reported)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        n_students, n_questions = options['students'], options['questions']
+        rng = np.random.default_rng(options['seed'])
+
+        student_ids = np.repeat(np.arange(n_students), n_questions)
+        max_marks = np.tile(rng.integers(1, 6, n_questions), n_students).astype(float)
+        ability = np.repeat(rng.beta(4, 3, n_students), n_questions)
+        earned = np.floor(rng.binomial(max_marks.astype(int), ability)).astype(float)
+        times = rng.integers(5, 300, student_ids.size).astype(float)
+
+        py_args = (student_ids.tolist(), earned.tolist(), max_marks.tolist(), times.tolist())
+        np_args = (student_ids, earned, max_marks, times)
+
+        self.stdout.write(
+            f'Synthetic test: {n_students} students × {n_questions} questions '
+            f'({student_ids.size} answers)'
+        )
+
+        def best_of(fn, fn_args):
+            best, result = float('inf'), None
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                result = fn(*fn_args)
+                best = min(best, time.perf_counter() - start)
+            return best, result
+
+        legacy_time, legacy = best_of(_legacy, py_args)
+        vector_time, vector = best_of(_vectorized, np_args)
+
+        self.stdout.write(f'  pure Python : {legacy_time * 1000:9.1f} ms')
+        self.stdout.write(f'  NumPy stats : {vector_time * 1000:9.1f} ms')
+
+        agree = (
+            legacy[3] == vector[3]
+            and np.allclose(legacy[:3], vector[:3])
+            and np.allclose(legacy[4], vector[4])
+            and math.isclose(legacy[5], vector[5], abs_tol=1e-9)
+        )
+        if not agree:
+            self.stdout.write(self.style.ERROR('✗ Results differ between implementations'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Results match; speedup {legacy_time / vector_time:.1f}×'
+        ))
@@ -0,0 +1,37 @@
+"""
+Management command to fit Rasch question difficulties and student abilities
+Run nightly (or after a marking session); each subject is fitted over every
+graded answer in the database.
+Usage:
+    python manage.py calibrate_difficulty
+    python manage.py calibrate_difficulty --subject 0625
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Subject
+from core.analytics.irt import calibrate_all
+
+
+class Command(BaseCommand):
+    help = 'Fit Rasch (1PL) question difficulty and student ability per subject from graded StudentAnswer rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--subject',
+            type=str,
+            help='Only calibrate this subject code',
+        )
+
+    def handle(self, *args, **options):
+        subject_ids = None
+        if options['subject']:
+            subject = Subject.objects.filter(code=options['subject']).first()
+            if not subject:
+                raise CommandError(f"Subject '{options['subject']}' not found")
+            subject_ids = [subject.id]
+
+        self.stdout.write('Calibrating question difficulty...')
+        questions, students, responses = calibrate_all(subject_ids, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Calibrated {questions} questions and {students} students from {responses} responses'
+        ))
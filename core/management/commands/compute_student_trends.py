@@ -0,0 +1,51 @@
+"""
+Management command to compute (student, subject) score trends in one batch
+Run nightly; --incremental only revisits students whose results changed
+since the previous run.
+Usage:
+    python manage.py compute_student_trends
+    python manage.py compute_student_trends --incremental
+    python manage.py compute_student_trends --school SCH001
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+
+from core.models import School, StudentSubjectTrend, StudentTestResult
+from core.analytics.trends import refresh_student_trends
+
+
+class Command(BaseCommand):
+    help = 'Compute StudentSubjectTrend slopes, rolling means and trend flags from StudentTestResult rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--school',
+            type=str,
+            help='Only compute trends for students of this school code',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only recompute students with results updated since the last run',
+        )
+
+    def handle(self, *args, **options):
+        results = StudentTestResult.objects.all()
+        trends = StudentSubjectTrend.objects.all()
+
+        if options['school']:
+            school = School.objects.filter(code=options['school']).first()
+            if not school:
+                raise CommandError(f"School '{options['school']}' not found")
+            results = results.filter(school=school)
+            trends = trends.filter(student__school=school)
+
+        if options['incremental']:
+            last_run = trends.aggregate(last=Max('computed_at'))['last']
+            if last_run:
+                results = results.filter(updated_at__gte=last_run)
+                self.stdout.write(f'Recomputing students with results updated since {last_run:%Y-%m-%d %H:%M}')
+
+        self.stdout.write('Computing student trends...')
+        written = refresh_student_trends(results, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'✓ Wrote {written} student/subject trend rows'))
@@ -0,0 +1,54 @@
+"""
+Management command to export StudentAnswer into columnar analytics snapshots
+Run after school hours; reads come from the analytics replica when one is
+configured. Incremental runs only rewrite school × month partitions whose
+attempts changed since the previous export. Run --full now and then to
+drop answers that were deleted outright.
+Usage:
+    python manage.py export_analytics_snapshot
+    python manage.py export_analytics_snapshot --full
+    python manage.py export_analytics_snapshot --school SCH001
+    python manage.py export_analytics_snapshot --output /srv/snapshots
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import School
+from core.analytics.snapshots import PARQUET_AVAILABLE, export_snapshot, snapshot_dir
+from core.db_router import analytics_reads
+
+
+class Command(BaseCommand):
+    help = 'Export StudentAnswer with question/topic/test/student keys into partitioned columnar files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--school',
+            type=str,
+            help='Only rewrite partitions of this school code',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rewrite every partition instead of only those changed since the last export',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Snapshot directory (default: settings.ANALYTICS_SNAPSHOT_DIR)',
+        )
+
+    def handle(self, *args, **options):
+        school = None
+        if options['school']:
+            school = School.objects.filter(code=options['school']).first()
+            if not school:
+                raise CommandError(f"School '{options['school']}' not found")
+
+        directory = snapshot_dir(options['output'])
+        if not PARQUET_AVAILABLE:
+            self.stdout.write(self.style.WARNING('pyarrow not installed; writing NumPy .npz column files'))
+
+        self.stdout.write(f'Exporting analytics snapshot to {directory}...')
+        with analytics_reads():
+            written = export_snapshot(directory, full=options['full'], school=school, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'✓ Wrote {written} partitions'))
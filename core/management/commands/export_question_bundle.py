@@ -0,0 +1,69 @@
+"""
+Management command to export a subject's question bank as a bundle
+(core/bundles.py) for import_question_bundle on another database. Reads
+come from the analytics replica when one is configured.
+Usage:
+    python manage.py export_question_bundle --subject 9702 --output bundles/9702
+    python manage.py export_question_bundle --subject 9702 --grade "AS Level" --output bundles/9702 --compress
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bundles import CHUNK_SIZE, export_bundle
+from core.db_router import analytics_reads
+from core.models import Grade, Subject
+
+
+class Command(BaseCommand):
+    help = 'Write a subject\'s questions, trees, LOs, answer spaces and images to a bundle directory'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--subject',
+            type=str,
+            required=True,
+            help='Subject code (e.g., 9702)',
+        )
+        parser.add_argument(
+            '--grade',
+            type=str,
+            help='Only export questions of this grade name',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            required=True,
+            help='Bundle directory to write',
+        )
+        parser.add_argument(
+            '--compress',
+            action='store_true',
+            help='gzip the JSONL files',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Rows read per query',
+        )
+
+    def handle(self, *args, **options):
+        subject = Subject.objects.filter(code=options['subject']).first()
+        if not subject:
+            raise CommandError(f"Subject '{options['subject']}' not found")
+        grade = None
+        if options['grade']:
+            grade = Grade.objects.filter(name=options['grade']).first()
+            if not grade:
+                raise CommandError(f"Grade '{options['grade']}' not found")
+
+        self.stdout.write(f"Exporting {subject} to {options['output']}...")
+        with analytics_reads():
+            manifest = export_bundle(
+                options['output'], subject, grade,
+                compress=options['compress'], chunk_size=options['chunk_size'], stdout=self.stdout,
+            )
+        counts = manifest['counts']
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Exported {counts['questions']} questions, {counts['answer_spaces']} answer spaces "
+            f"and {counts['images']} images"
+        ))
@@ -0,0 +1,58 @@
+"""
+Management command to import a question bundle written by
+export_question_bundle (core/bundles.py). Questions get new IDs; grades,
+subjects, topics and LOs are matched by name / code and created if missing.
+Usage:
+    python manage.py import_question_bundle bundles/9702 --user teacher1
+    python manage.py import_question_bundle bundles/9702 --user teacher1 --skip-duplicates
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bundles import CHUNK_SIZE, BundleError, import_bundle, read_manifest
+
+
+class Command(BaseCommand):
+    help = 'Import the questions of a bundle directory in chunks with bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('bundle', type=str, help='Bundle directory')
+        parser.add_argument(
+            '--user',
+            type=str,
+            required=True,
+            help='Username recorded as the creator of the imported questions',
+        )
+        parser.add_argument(
+            '--skip-duplicates',
+            action='store_true',
+            help='Leave out questions that nearly duplicate ones already in the bank',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Questions inserted per batch',
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['user']).first()
+        if not user:
+            raise CommandError(f"User '{options['user']}' not found")
+
+        try:
+            manifest = read_manifest(options['bundle'])
+            self.stdout.write(
+                f"Importing {manifest['counts']['questions']} questions of {manifest['subject']['name']}..."
+            )
+            result = import_bundle(
+                options['bundle'], user,
+                skip_duplicates=options['skip_duplicates'], chunk_size=options['chunk_size'], stdout=self.stdout,
+            )
+        except BundleError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Imported {result['questions']} questions and {result['answer_spaces']} answer spaces"
+            + (f", skipped {result['duplicates']} near-duplicates" if options['skip_duplicates'] else '')
+        ))
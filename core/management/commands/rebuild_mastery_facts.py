@@ -0,0 +1,49 @@
+"""
+Management command to rebuild the student × topic × LO mastery fact table
+Usage:
+    python manage.py rebuild_mastery_facts
+    python manage.py rebuild_mastery_facts --school SCH001
+    python manage.py rebuild_mastery_facts --test 42
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import StudentAnswer, School
+from core.analytics.mastery import rebuild_mastery_facts
+
+
+class Command(BaseCommand):
+    help = 'Rebuild MasteryFact rows from graded StudentAnswer records'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--school',
+            type=str,
+            help='Only rebuild facts for students of this school code',
+        )
+        parser.add_argument(
+            '--test',
+            type=int,
+            help='Only rebuild facts for this test ID',
+        )
+        parser.add_argument(
+            '--student',
+            type=int,
+            help='Only rebuild facts for this student ID',
+        )
+
+    def handle(self, *args, **options):
+        answers = StudentAnswer.objects.all()
+
+        if options['school']:
+            school = School.objects.filter(code=options['school']).first()
+            if not school:
+                raise CommandError(f"School '{options['school']}' not found")
+            answers = answers.filter(student__school=school)
+        if options['test']:
+            answers = answers.filter(test_id=options['test'])
+        if options['student']:
+            answers = answers.filter(student_id=options['student'])
+
+        self.stdout.write('Rebuilding mastery facts...')
+        written = rebuild_mastery_facts(answers, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'✓ Wrote {written} mastery fact rows'))
@@ -0,0 +1,35 @@
+"""
+Management command to (re)compute near-duplicate fingerprints and LSH
+buckets (core/duplicates.py) for existing questions, oldest first, so each
+copy is flagged against the question it duplicates
+Usage:
+    python manage.py rebuild_question_fingerprints
+    python manage.py rebuild_question_fingerprints --subject 3
+"""
+from django.core.management.base import BaseCommand
+
+from core.duplicates import rebuild_fingerprints
+from core.models import Question, QuestionFingerprint
+
+
+class Command(BaseCommand):
+    help = 'Recompute QuestionFingerprint / QuestionLSHBucket rows for top-level questions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--subject',
+            type=int,
+            help='Only fingerprint questions of this subject ID',
+        )
+
+    def handle(self, *args, **options):
+        questions = Question.objects.filter(parent__isnull=True)
+        if options['subject']:
+            questions = questions.filter(subject_id=options['subject'])
+
+        self.stdout.write('Fingerprinting questions...')
+        written = rebuild_fingerprints(questions, stdout=self.stdout)
+        flagged = QuestionFingerprint.objects.filter(
+            question__in=questions, duplicate_of__isnull=False
+        ).count()
+        self.stdout.write(self.style.SUCCESS(f'✓ Fingerprinted {written} questions, {flagged} flagged as near-duplicates'))
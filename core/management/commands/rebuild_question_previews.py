@@ -0,0 +1,45 @@
+"""
+Management command to recompute question listing previews (preview_text and
+thumbnail, core/question_preview.py) for existing questions
+Usage:
+    python manage.py rebuild_question_previews
+    python manage.py rebuild_question_previews --subject 3
+"""
+from django.core.management.base import BaseCommand
+
+from core.models import Question
+from core.question_preview import update_preview
+
+BATCH_SIZE = 200
+
+
+class Command(BaseCommand):
+    help = 'Recompute Question.preview_text and thumbnail from question_text'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--subject',
+            type=int,
+            help='Only rebuild previews for questions of this subject ID',
+        )
+
+    def handle(self, *args, **options):
+        questions = Question.objects.order_by('id')
+        if options['subject']:
+            questions = questions.filter(subject_id=options['subject'])
+        ids = list(questions.values_list('id', flat=True))
+
+        self.stdout.write(f'Rebuilding previews for {len(ids)} questions...')
+        thumbnails = 0
+        for start in range(0, len(ids), BATCH_SIZE):
+            batch = list(
+                Question.objects.filter(id__in=ids[start:start + BATCH_SIZE])
+                .only('id', 'question_text', 'preview_text', 'thumbnail')
+            )
+            for question in batch:
+                update_preview(question)
+                thumbnails += bool(question.thumbnail)
+            # bulk_update skips save signals, so the search index etc. are untouched
+            Question.objects.bulk_update(batch, ['preview_text', 'thumbnail'])
+            self.stdout.write(f'  {min(start + BATCH_SIZE, len(ids))}/{len(ids)}')
+        self.stdout.write(self.style.SUCCESS(f'✓ Updated {len(ids)} questions ({thumbnails} with thumbnails)'))
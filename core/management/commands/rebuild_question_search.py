@@ -0,0 +1,37 @@
+"""
+Management command to rebuild the question library search index
+(core/search.py), optionally running OCR over embedded images
+Usage:
+    python manage.py rebuild_question_search
+    python manage.py rebuild_question_search --ocr
+    python manage.py rebuild_question_search --subject 3
+"""
+from django.core.management.base import BaseCommand
+
+from core.models import Question
+from core.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild QuestionSearchDocument rows from question and markscheme text'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ocr',
+            action='store_true',
+            help='Also extract text from embedded images with Tesseract (slow)',
+        )
+        parser.add_argument(
+            '--subject',
+            type=int,
+            help='Only rebuild documents for questions of this subject ID',
+        )
+
+    def handle(self, *args, **options):
+        questions = Question.objects.all()
+        if options['subject']:
+            questions = questions.filter(subject_id=options['subject'])
+
+        self.stdout.write('Rebuilding question search index...')
+        written = rebuild_index(questions, ocr=options['ocr'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'✓ Indexed {written} questions'))
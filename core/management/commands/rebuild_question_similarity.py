@@ -0,0 +1,28 @@
+"""
+Management command to recompute the "similar questions" vectors
+(core/similarity.py) with fresh document frequencies and write a new
+memory-mapped snapshot. Run it after large imports and periodically, so
+processes score fewer rows outside the snapshot
+Usage:
+    python manage.py rebuild_question_similarity
+"""
+from django.core.management.base import BaseCommand
+
+from core.similarity import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild QuestionVector rows and the similarity snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Questions vectorised per database round trip (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Vectorising questions...')
+        written = rebuild(batch_size=options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'✓ Vectorised {written} questions into a new snapshot'))
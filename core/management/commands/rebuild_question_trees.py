@@ -0,0 +1,20 @@
+"""
+Management command to recompute the materialized question trees
+(root / path / total_marks) after bulk edits that bypassed model signals
+Usage:
+    python manage.py rebuild_question_trees
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.question_tree import rebuild_all_trees
+
+
+class Command(BaseCommand):
+    help = 'Recompute Question.root, path and total_marks for every question'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding question trees...')
+        with transaction.atomic():
+            written = rebuild_all_trees()
+        self.stdout.write(self.style.SUCCESS(f'✓ Updated {written} questions'))
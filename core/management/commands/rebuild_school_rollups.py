@@ -0,0 +1,34 @@
+"""
+Management command to rebuild the school-wide academic overview rollups
+Usage:
+    python manage.py rebuild_school_rollups
+    python manage.py rebuild_school_rollups --school SCH001
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import School
+from core.analytics.rollups import rebuild_school_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild StudentTestResult and SchoolSubjectMonth rows from StudentAnswer records'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--school',
+            type=str,
+            help='Only rebuild rollups for this school code',
+        )
+
+    def handle(self, *args, **options):
+        school = None
+        if options['school']:
+            school = School.objects.filter(code=options['school']).first()
+            if not school:
+                raise CommandError(f"School '{options['school']}' not found")
+
+        self.stdout.write('Rebuilding school rollups...')
+        attempts, cells = rebuild_school_rollups(school, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Wrote {attempts} attempt rows and {cells} subject-month rows'
+        ))
@@ -0,0 +1,21 @@
+"""
+Management command to recompute Question.usage_count, lo_count and
+is_fully_tagged (core/question_counters.py), e.g. after bulk writes that
+skipped model signals
+Usage:
+    python manage.py reconcile_question_counters
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.question_counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized question usage / tagging counters'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Reconciling question counters...')
+        with transaction.atomic():
+            drifted = reconcile()
+        self.stdout.write(self.style.SUCCESS(f'✓ Done; {drifted} questions were out of date'))
@@ -0,0 +1,37 @@
+"""
+Management command to refresh a development SQLite analytics replica
+Copies the primary SQLite database to ANALYTICS_SQLITE_PATH with SQLite's
+online backup API; production replicas are kept in sync by the database.
+Usage:
+    ANALYTICS_SQLITE_PATH=replica.sqlite3 python manage.py sync_analytics_replica
+"""
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.db_router import ANALYTICS_DB, replica_configured
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database to the analytics replica (development only)'
+
+    def handle(self, *args, **options):
+        if not replica_configured():
+            raise CommandError('No analytics replica configured (set ANALYTICS_SQLITE_PATH)')
+
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[ANALYTICS_DB]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('sync_analytics_replica only copies SQLite databases')
+
+        replica.close()
+        primary.ensure_connection()
+        target = sqlite3.connect(replica.settings_dict['NAME'])
+        try:
+            primary.connection.backup(target)
+        finally:
+            target.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Copied {primary.settings_dict['NAME']} to {replica.settings_dict['NAME']}"
+        ))
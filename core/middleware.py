@@ -0,0 +1,34 @@
+"""
+Request middleware for the core app.
+"""
+import time
+
+from django.conf import settings
+
+from .db_router import read_your_writes, replica_configured
+
+PRIMARY_PINNED_SESSION_KEY = '_primary_pinned_until'
+
+
+class ReadYourWritesMiddleware:
+    """
+    Keep a user's reads on the primary database for ANALYTICS_REPLICA_MAX_LAG
+    seconds after a request of theirs wrote to a core model (e.g. grading),
+    so analytics pages they open next never show the replica's older copy.
+    Does nothing when no analytics replica is configured.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        session = getattr(request, 'session', None)
+        if session is None or not replica_configured():
+            return self.get_response(request)
+
+        pinned = session.get(PRIMARY_PINNED_SESSION_KEY, 0) > time.time()
+        with read_your_writes(pinned) as wrote:
+            response = self.get_response(request)
+            if wrote():
+                session[PRIMARY_PINNED_SESSION_KEY] = time.time() + settings.ANALYTICS_REPLICA_MAX_LAG
+        return response
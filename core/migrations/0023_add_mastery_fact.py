@@ -0,0 +1,44 @@
+# Generated by Django 4.2 on 2026-10-19 07:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_add_results_published_to_test'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MasteryFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('earned', models.FloatField(default=0)),
+                ('max_marks', models.FloatField(default=0)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_attempt', models.DateTimeField(blank=True, null=True)),
+                ('learning_objective', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='mastery_facts', to='core.learningobjective')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mastery_facts', to='core.student')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mastery_facts', to='core.test')),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mastery_facts', to='core.topic')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='masteryfact',
+            index=models.Index(fields=['student', 'topic'], name='mastery_student_topic_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='masteryfact',
+            index=models.Index(fields=['student', 'learning_objective'], name='mastery_student_lo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='masteryfact',
+            index=models.Index(fields=['test', 'student'], name='mastery_test_student_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='masteryfact',
+            index=models.Index(fields=['topic', 'student'], name='mastery_topic_student_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2 on 2026-10-19 07:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_add_mastery_fact'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentTestResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('earned', models.FloatField(default=0)),
+                ('max_marks', models.FloatField(default=0)),
+                ('answers', models.PositiveIntegerField(default=0)),
+                ('graded_answers', models.PositiveIntegerField(default=0)),
+                ('last_submitted', models.DateTimeField(blank=True, null=True)),
+                ('school', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='test_results', to='core.school')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='test_results', to='core.student')),
+                ('subject', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.subject')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_results', to='core.test')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SchoolSubjectMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('earned', models.FloatField(default=0)),
+                ('max_marks', models.FloatField(default=0)),
+                ('results', models.PositiveIntegerField(default=0)),
+                ('school', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='subject_months', to='core.school')),
+                ('subject', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.subject')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='studenttestresult',
+            index=models.Index(fields=['school', 'subject'], name='result_school_subject_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studenttestresult',
+            index=models.Index(fields=['school', 'student'], name='result_school_student_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='studenttestresult',
+            unique_together={('test', 'student')},
+        ),
+        migrations.AddIndex(
+            model_name='schoolsubjectmonth',
+            index=models.Index(fields=['school', 'month'], name='subject_month_school_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='schoolsubjectmonth',
+            unique_together={('school', 'subject', 'month')},
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-19 07:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_add_school_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('school', 'School'), ('test', 'Test'), ('student', 'Student')], max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('scope', 'object_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2 on 2026-10-19 07:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_add_analytics_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studenttestresult',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.CreateModel(
+            name='StudentSubjectTrend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trend', models.CharField(choices=[('improving', 'Improving'), ('declining', 'Declining'), ('stable', 'Stable'), ('insufficient_data', 'Insufficient data')], max_length=20)),
+                ('points', models.PositiveIntegerField(default=0)),
+                ('slope', models.FloatField(default=0, help_text='Score change in percentage points per test')),
+                ('rolling_mean', models.FloatField(default=0, help_text='Mean of the latest tests (rolling window)')),
+                ('volatility', models.FloatField(default=0, help_text='Standard deviation of test scores')),
+                ('latest_score', models.FloatField(default=0)),
+                ('best_score', models.FloatField(default=0)),
+                ('worst_score', models.FloatField(default=0)),
+                ('last_test_at', models.DateTimeField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Start of the run that computed this row')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subject_trends', to='core.student')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_trends', to='core.subject')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='studentsubjecttrend',
+            index=models.Index(fields=['trend', 'subject'], name='trend_flag_subject_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='studentsubjecttrend',
+            unique_together={('student', 'subject')},
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2 on 2026-10-19 07:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_add_student_subject_trend'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionCalibration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('difficulty', models.FloatField(default=0, help_text='Rasch difficulty in logits')),
+                ('standard_error', models.FloatField(default=0)),
+                ('responses', models.PositiveIntegerField(default=0)),
+                ('mean_score', models.FloatField(default=0, help_text='Mean fraction of marks awarded (0-1)')),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='calibration', to='core.question')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_calibrations', to='core.subject')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StudentAbility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ability', models.FloatField(default=0, help_text='Rasch ability in logits')),
+                ('standard_error', models.FloatField(default=0)),
+                ('responses', models.PositiveIntegerField(default=0)),
+                ('mean_score', models.FloatField(default=0, help_text='Mean fraction of marks awarded (0-1)')),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='abilities', to='core.student')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_abilities', to='core.subject')),
+            ],
+            options={
+                'unique_together': {('student', 'subject')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='questioncalibration',
+            index=models.Index(fields=['subject', 'difficulty'], name='calibration_subject_diff_idx'),
+        ),
+    ]
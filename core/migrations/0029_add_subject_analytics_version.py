@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 07:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_add_report_card_batch'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='analyticsversion',
+            name='scope',
+            field=models.CharField(choices=[('school', 'School'), ('test', 'Test'), ('student', 'Student'), ('subject', 'Subject')], max_length=10),
+        ),
+    ]
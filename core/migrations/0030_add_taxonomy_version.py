@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 07:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_add_subject_analytics_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='analyticsversion',
+            name='scope',
+            field=models.CharField(choices=[('school', 'School'), ('test', 'Test'), ('student', 'Student'), ('subject', 'Subject'), ('taxonomy', 'Curriculum taxonomy')], max_length=10),
+        ),
+    ]
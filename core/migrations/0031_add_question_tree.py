@@ -0,0 +1,54 @@
+# Generated by Django 4.2 on 2026-10-19 07:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import defaultdict
+
+
+def backfill_question_trees(apps, schema_editor):
+    # Same walk as core.question_tree.rebuild_all_trees, against the historical model
+    Question = apps.get_model('core', 'Question')
+    rows = list(Question.objects.order_by().values_list('id', 'parent_id', 'marks'))
+    children = defaultdict(list)
+    for pk, parent_id, _ in rows:
+        children[parent_id].append(pk)
+    marks = {pk: m for pk, _, m in rows}
+
+    updates, totals = [], {}
+    stack = [(pk, '', None, False) for pk in children[None]]
+    while stack:
+        node, prefix, root, done = stack.pop()
+        path = f'{prefix}{node:010d}/'
+        if done:
+            totals[node] = marks[node] + sum(totals[c] for c in children[node])
+            updates.append(Question(pk=node, path=path, root_id=root, total_marks=totals[node]))
+            continue
+        stack.append((node, prefix, root, True))
+        stack.extend((child, path, root or node, False) for child in children[node])
+    Question.objects.bulk_update(updates, ['path', 'root', 'total_marks'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_add_taxonomy_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='root',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tree_descendants', to='core.question'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='total_marks',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_question_trees, migrations.RunPython.noop),
+    ]
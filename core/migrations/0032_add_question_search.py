@@ -0,0 +1,105 @@
+# Generated by Django 4.2 on 2026-10-19 07:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+import html
+import re
+
+SQLITE_INDEX = [
+    """CREATE VIRTUAL TABLE core_question_fts USING fts5(
+        body, answer, ocr_text,
+        content='core_questionsearchdocument', content_rowid='question_id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER core_question_fts_insert AFTER INSERT ON core_questionsearchdocument BEGIN
+        INSERT INTO core_question_fts(rowid, body, answer, ocr_text)
+        VALUES (new.question_id, new.body, new.answer, new.ocr_text);
+    END""",
+    """CREATE TRIGGER core_question_fts_delete AFTER DELETE ON core_questionsearchdocument BEGIN
+        INSERT INTO core_question_fts(core_question_fts, rowid, body, answer, ocr_text)
+        VALUES ('delete', old.question_id, old.body, old.answer, old.ocr_text);
+    END""",
+    """CREATE TRIGGER core_question_fts_update AFTER UPDATE ON core_questionsearchdocument BEGIN
+        INSERT INTO core_question_fts(core_question_fts, rowid, body, answer, ocr_text)
+        VALUES ('delete', old.question_id, old.body, old.answer, old.ocr_text);
+        INSERT INTO core_question_fts(rowid, body, answer, ocr_text)
+        VALUES (new.question_id, new.body, new.answer, new.ocr_text);
+    END""",
+]
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS core_question_fts_insert',
+    'DROP TRIGGER IF EXISTS core_question_fts_delete',
+    'DROP TRIGGER IF EXISTS core_question_fts_update',
+    'DROP TABLE IF EXISTS core_question_fts',
+]
+POSTGRES_INDEX = [
+    """CREATE INDEX core_question_search_idx ON core_questionsearchdocument
+        USING GIN (to_tsvector('english', body || ' ' || answer || ' ' || ocr_text))""",
+]
+POSTGRES_DROP = ['DROP INDEX IF EXISTS core_question_search_idx']
+
+
+def _run(schema_editor, statements):
+    vendor = schema_editor.connection.vendor
+    for sql in statements.get(vendor, []):
+        schema_editor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_INDEX, 'postgresql': POSTGRES_INDEX})
+
+
+def drop_search_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP})
+
+
+def _plain_text(markup):
+    # Same cleanup as core.search.plain_text, frozen for this migration
+    text = re.sub(r'<img\b[^>]*>', ' ', markup or '', flags=re.IGNORECASE)
+    text = re.sub(r'data:image/[^;]+;base64,[A-Za-z0-9+/=\s]+', ' ', text)
+    text = re.sub(r'<br\s*/?>|</(?:p|div|li|tr|td|th|h\d)>', ' ', text, flags=re.IGNORECASE)
+    text = html.unescape(re.sub(r'<[^>]+>', ' ', text))
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def index_existing_questions(apps, schema_editor):
+    # Text only; OCR text comes from `manage.py rebuild_question_search --ocr`
+    Question = apps.get_model('core', 'Question')
+    QuestionSearchDocument = apps.get_model('core', 'QuestionSearchDocument')
+    rows = Question.objects.order_by().values_list(
+        'id', 'subject_id', 'grade_id', 'topic_id', 'question_text', 'answer_text'
+    ).iterator()
+    documents = [
+        QuestionSearchDocument(
+            question_id=pk, subject_id=subject_id, grade_id=grade_id, topic_id=topic_id,
+            body=_plain_text(text), answer=_plain_text(answer),
+        )
+        for pk, subject_id, grade_id, topic_id, text, answer in rows
+    ]
+    QuestionSearchDocument.objects.bulk_create(documents, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_add_question_tree'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionSearchDocument',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='core.question')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.subject')),
+                ('grade', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.grade')),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.topic')),
+                ('body', models.TextField(blank=True)),
+                ('answer', models.TextField(blank=True)),
+                ('ocr_text', models.TextField(blank=True)),
+                ('image_digest', models.CharField(blank=True, max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(index_existing_questions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2 on 2026-10-19 08:00
+
+import html
+import re
+
+from django.db import migrations, models
+
+
+def _preview_text(markup):
+    # Same as core.question_preview.preview_text, frozen for this migration
+    text = re.sub(r'<img\b[^>]*>', ' ', markup or '', flags=re.IGNORECASE)
+    text = re.sub(r'data:image/[^;]+;base64,[A-Za-z0-9+/=\s]+', ' ', text)
+    text = re.sub(r'<br\s*/?>|</(?:p|div|li|tr|td|th|h\d)>', ' ', text, flags=re.IGNORECASE)
+    text = re.sub(r'\s+', ' ', html.unescape(re.sub(r'<[^>]+>', ' ', text))).strip()
+    return text[:150] + '...' if len(text) > 150 else text
+
+
+def fill_preview_text(apps, schema_editor):
+    # Thumbnails are files; `manage.py rebuild_question_previews` renders them
+    Question = apps.get_model('core', 'Question')
+    updates = [
+        Question(pk=pk, preview_text=_preview_text(text))
+        for pk, text in Question.objects.order_by().values_list('id', 'question_text').iterator()
+    ]
+    Question.objects.bulk_update(updates, ['preview_text'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_add_question_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='preview_text',
+            field=models.CharField(blank=True, editable=False, max_length=160),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='question_thumbnails/'),
+        ),
+        migrations.RunPython(fill_preview_text, migrations.RunPython.noop),
+    ]
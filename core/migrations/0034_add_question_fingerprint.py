@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-19 08:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_add_question_preview'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionLSHBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField(db_index=True)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.question')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuestionFingerprint',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fingerprint', serialize=False, to='core.question')),
+                ('text_digest', models.CharField(max_length=64)),
+                ('image_hash', models.BinaryField(blank=True, help_text='16 x 16 dHash of the first image (packed bits)')),
+                ('text_signature', models.BinaryField(blank=True, help_text='MinHash of word 3-grams (uint32 values)')),
+                ('similarity', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('duplicate_of', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='near_duplicates', to='core.question')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.subject')),
+            ],
+        ),
+    ]
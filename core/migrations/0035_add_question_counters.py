@@ -0,0 +1,51 @@
+# Generated by Django 4.2 on 2026-10-19 08:06
+
+from django.db import migrations, models
+from django.db.models import BooleanField, Count, Exists, ExpressionWrapper, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    # Same as core.question_counters.refresh_counters, against the historical models
+    Question = apps.get_model('core', 'Question')
+    TestQuestion = apps.get_model('core', 'TestQuestion')
+    links = Question.learning_objectives.through
+
+    def count_of(model):
+        rows = model.objects.filter(question_id=OuterRef('pk')).order_by().values('question_id').annotate(
+            n=Count('pk')
+        ).values('n')
+        return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+    tagged = Q(topic__isnull=False) & Exists(links.objects.filter(question_id=OuterRef('pk')))
+    Question.objects.update(
+        usage_count=count_of(TestQuestion),
+        lo_count=count_of(links),
+        is_fully_tagged=ExpressionWrapper(tagged, output_field=BooleanField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0034_add_question_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='is_fully_tagged',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='lo_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='usage_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
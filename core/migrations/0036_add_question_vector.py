@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-19 08:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0035_add_question_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionVector',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='similarity_vector', serialize=False, to='core.question')),
+                ('vector', models.BinaryField(help_text='Unit-length float32 values')),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.subject')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0036_add_question_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportcardbatch',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 # Create your models here.
@@ -70,10 +71,9 @@ class Grade(models.Model):
         return self.name
 
     def get_same_level_grades(self):
-        """Return all Grade objects that share the same grade_level."""
-        if not self.grade_level:
-            return Grade.objects.filter(id=self.id)
-        return Grade.objects.filter(grade_level=self.grade_level)
+        """Return all Grade objects that share the same grade_level (a list, from the taxonomy cache)."""
+        from .taxonomy import get_taxonomy
+        return get_taxonomy().same_level_grades(self)
         
         
 class Subject(models.Model):
@@ -171,6 +171,11 @@ class Question(models.Model):
     question_text = models.TextField()
     answer_text = models.TextField(blank=True)
 
+    # Listing previews (maintained by core/question_preview.py): plain-text
+    # snippet and a small image of the first embedded picture
+    preview_text = models.CharField(max_length=160, blank=True, editable=False)
+    thumbnail = models.ImageField(upload_to='question_thumbnails/', blank=True, editable=False)
+
     marks = models.PositiveIntegerField(default=1)
     question_type = models.CharField(
         max_length=20,
@@ -192,6 +197,26 @@ class Question(models.Model):
     # Order within parent for sorting sub-questions
     order = models.PositiveIntegerField(default=0)
 
+    # Materialized tree (maintained by core/question_tree.py): the top-level
+    # question of this tree (null for top-level questions), the zero-padded ids
+    # from the root down to this question, and marks including all sub-questions
+    root = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='tree_descendants'
+    )
+    path = models.CharField(max_length=255, blank=True, db_index=True, editable=False)
+    total_marks = models.PositiveIntegerField(default=0, editable=False)
+
+    # Bank counters (maintained by core/question_counters.py): tests using the
+    # question, LOs tagged, and whether it has both a topic and an LO
+    usage_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
+    lo_count = models.PositiveIntegerField(default=0, editable=False)
+    is_fully_tagged = models.BooleanField(default=False, db_index=True, editable=False)
+
     # NEW: JSON configuration for question parts (Step 2 of two-step import)
     parts_config = models.JSONField(
         blank=True,
@@ -216,20 +241,15 @@ class Question(models.Model):
         return f"Q{self.id} | {self.grade}.{self.subject}.{self.topic}"
 
     def get_all_sub_questions(self):
-        """Recursively get all sub-questions"""
-        subs = list(self.sub_questions.all().order_by('order'))
-        all_subs = []
-        for sub in subs:
-            all_subs.append(sub)
-            all_subs.extend(sub.get_all_sub_questions())
-        return all_subs
+        """All sub-questions, depth first (one query via the materialized path)"""
+        from .question_tree import load_tree, walk_tree
+        if not hasattr(self, 'tree_children'):
+            load_tree(self)
+        return walk_tree(self)
 
     def get_total_marks(self):
-        """Calculate total marks including all sub-questions"""
-        total = self.marks
-        for sub in self.sub_questions.all():
-            total += sub.get_total_marks()
-        return total
+        """Total marks including all sub-questions"""
+        return self.total_marks if self.path else self.marks
 
     def is_root_question(self):
         """Check if this is a top-level question (no parent)"""
@@ -468,6 +488,327 @@ class StudentAnswer(models.Model):
         return f"{self.student.full_name} - {self.test.title} - Q{self.question.id}"
 
 
+class MasteryFact(models.Model):
+    """
+    Pre-aggregated graded marks per student × test × topic × LO.
+    Rows with learning_objective=NULL hold the full topic totals; rows with an
+    LO hold that LO's equal share of each question's marks.
+    Maintained from StudentAnswer saves (see core/signals.py) and rebuilt with
+    `python manage.py rebuild_mastery_facts`.
+    """
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='mastery_facts')
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='mastery_facts')
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name='mastery_facts')
+    learning_objective = models.ForeignKey(
+        LearningObjective,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='mastery_facts'
+    )
+
+    earned = models.FloatField(default=0)
+    max_marks = models.FloatField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    last_attempt = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'topic'], name='mastery_student_topic_idx'),
+            models.Index(fields=['student', 'learning_objective'], name='mastery_student_lo_idx'),
+            models.Index(fields=['test', 'student'], name='mastery_test_student_idx'),
+            models.Index(fields=['topic', 'student'], name='mastery_topic_student_idx'),
+        ]
+
+    def __str__(self):
+        lo = self.learning_objective.code if self.learning_objective_id else '*'
+        return f"{self.student_id} | T{self.test_id} | {self.topic_id}.{lo}: {self.earned}/{self.max_marks}"
+
+
+class StudentTestResult(models.Model):
+    """
+    School-wide rollup: one row per school × test × student with the graded
+    totals of that attempt. `month` is the month of the student's latest
+    submission and `subject` mirrors the test's subject, so the academic
+    overview can group without touching StudentAnswer.
+    Maintained from StudentAnswer saves (see core/signals.py) and rebuilt with
+    `python manage.py rebuild_school_rollups`.
+    """
+    school = models.ForeignKey(School, on_delete=models.CASCADE, null=True, blank=True, related_name='test_results')
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='student_results')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='test_results')
+    subject = models.ForeignKey(Subject, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    month = models.DateField()
+
+    earned = models.FloatField(default=0)
+    max_marks = models.FloatField(default=0)
+    answers = models.PositiveIntegerField(default=0)
+    graded_answers = models.PositiveIntegerField(default=0)
+    last_submitted = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("test", "student")
+        indexes = [
+            models.Index(fields=['school', 'subject'], name='result_school_subject_idx'),
+            models.Index(fields=['school', 'student'], name='result_school_student_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} | T{self.test_id}: {self.earned}/{self.max_marks}"
+
+
+class SchoolSubjectMonth(models.Model):
+    """
+    School-wide rollup: graded totals per school × subject × month, summed
+    from StudentTestResult. subject=NULL collects tests without a subject.
+    """
+    school = models.ForeignKey(School, on_delete=models.CASCADE, null=True, blank=True, related_name='subject_months')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    month = models.DateField()
+
+    earned = models.FloatField(default=0)
+    max_marks = models.FloatField(default=0)
+    results = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("school", "subject", "month")
+        indexes = [
+            models.Index(fields=['school', 'month'], name='subject_month_school_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.school_id} | {self.subject_id} | {self.month:%Y-%m}: {self.earned}/{self.max_marks}"
+
+
+class StudentSubjectTrend(models.Model):
+    """
+    Longitudinal trend of one student's test scores in one subject, computed
+    for every (student, subject) series at once by
+    `python manage.py compute_student_trends` (core/analytics/trends.py).
+    The report card dashboard reads the stored flags (trends_by_student).
+    """
+    TREND_CHOICES = [
+        ('improving', 'Improving'),
+        ('declining', 'Declining'),
+        ('stable', 'Stable'),
+        ('insufficient_data', 'Insufficient data'),
+    ]
+
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='subject_trends')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='student_trends')
+
+    trend = models.CharField(max_length=20, choices=TREND_CHOICES)
+    points = models.PositiveIntegerField(default=0)
+    slope = models.FloatField(default=0, help_text='Score change in percentage points per test')
+    rolling_mean = models.FloatField(default=0, help_text='Mean of the latest tests (rolling window)')
+    volatility = models.FloatField(default=0, help_text='Standard deviation of test scores')
+    latest_score = models.FloatField(default=0)
+    best_score = models.FloatField(default=0)
+    worst_score = models.FloatField(default=0)
+    last_test_at = models.DateTimeField(null=True, blank=True)
+    computed_at = models.DateTimeField(default=timezone.now, help_text='Start of the run that computed this row')
+
+    class Meta:
+        unique_together = ("student", "subject")
+        indexes = [
+            models.Index(fields=['trend', 'subject'], name='trend_flag_subject_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} | {self.subject_id}: {self.trend} ({self.slope:+.2f}/test)"
+
+
+class QuestionCalibration(models.Model):
+    """
+    Rasch (1PL) difficulty of one question in logits, fitted per subject over
+    every graded StudentAnswer by `python manage.py calibrate_difficulty`
+    (core/analytics/irt.py). Higher is harder; a student whose ability equals
+    the difficulty has an even chance of full marks.
+    """
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, related_name='calibration')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='question_calibrations')
+
+    difficulty = models.FloatField(default=0, help_text='Rasch difficulty in logits')
+    standard_error = models.FloatField(default=0)
+    responses = models.PositiveIntegerField(default=0)
+    mean_score = models.FloatField(default=0, help_text='Mean fraction of marks awarded (0-1)')
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['subject', 'difficulty'], name='calibration_subject_diff_idx'),
+        ]
+
+    def __str__(self):
+        return f"Q{self.question_id}: b={self.difficulty:+.2f} ±{self.standard_error:.2f}"
+
+
+class QuestionSearchDocument(models.Model):
+    """
+    Searchable plain text of one question: HTML-stripped question and
+    markscheme text plus OCR text from its images. Indexed by SQLite FTS5 or a
+    PostgreSQL tsvector index and refreshed on question save (core/search.py).
+    """
+    question = models.OneToOneField(
+        Question, on_delete=models.CASCADE, primary_key=True, related_name='search_document'
+    )
+    # Copied from the question so filters and facets never read its (image-laden) row
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='+')
+    grade = models.ForeignKey(Grade, on_delete=models.CASCADE, related_name='+')
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name='+')
+    body = models.TextField(blank=True)
+    answer = models.TextField(blank=True)
+    ocr_text = models.TextField(blank=True)
+    # sha256 of the embedded image payloads, so OCR reruns only when they change
+    image_digest = models.CharField(max_length=64, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Q{self.question_id}: {self.body[:60]}"
+
+
+class QuestionFingerprint(models.Model):
+    """
+    Perceptual image hash and MinHash text signature of one top-level
+    question, used to spot re-sliced copies of questions already in the bank
+    (core/duplicates.py). `duplicate_of` is the closest earlier match, if any.
+    """
+    question = models.OneToOneField(
+        Question, on_delete=models.CASCADE, primary_key=True, related_name='fingerprint'
+    )
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='+')
+    # sha256 of question_text when fingerprinted, so unchanged saves are skipped
+    text_digest = models.CharField(max_length=64)
+    image_hash = models.BinaryField(blank=True, help_text='16 x 16 dHash of the first image (packed bits)')
+    text_signature = models.BinaryField(blank=True, help_text='MinHash of word 3-grams (uint32 values)')
+
+    duplicate_of = models.ForeignKey(
+        Question, on_delete=models.SET_NULL, null=True, blank=True, related_name='near_duplicates'
+    )
+    similarity = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        if self.duplicate_of_id:
+            return f"Q{self.question_id} ≈ Q{self.duplicate_of_id} ({self.similarity:.0%})"
+        return f"Q{self.question_id}"
+
+
+class QuestionLSHBucket(models.Model):
+    """One locality-sensitive-hashing bucket a fingerprinted question falls in."""
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='+')
+    bucket = models.BigIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"Q{self.question_id} in {self.bucket:x}"
+
+
+class QuestionVector(models.Model):
+    """
+    Hashed TF-IDF vector of one top-level question's text, OCR text and tags,
+    for "similar questions" lookups (core/similarity.py).
+    """
+    question = models.OneToOneField(
+        Question, on_delete=models.CASCADE, primary_key=True, related_name='similarity_vector'
+    )
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='+')
+    vector = models.BinaryField(help_text='Unit-length float32 values')
+    # Indexed: processes fetch the rows written since their snapshot
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Q{self.question_id} vector"
+
+
+class StudentAbility(models.Model):
+    """
+    Rasch ability of one student in one subject, on the same logit scale as
+    QuestionCalibration.difficulty. Written by the same calibration run.
+    """
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='abilities')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='student_abilities')
+
+    ability = models.FloatField(default=0, help_text='Rasch ability in logits')
+    standard_error = models.FloatField(default=0)
+    responses = models.PositiveIntegerField(default=0)
+    mean_score = models.FloatField(default=0, help_text='Mean fraction of marks awarded (0-1)')
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ("student", "subject")
+
+    def __str__(self):
+        return f"{self.student_id} | {self.subject_id}: θ={self.ability:+.2f} ±{self.standard_error:.2f}"
+
+
+class ReportCardBatch(models.Model):
+    """
+    Bulk report card job: PDFs for every student matching a grade / cohort
+    filter, rendered in the background (core/report_card_batch.py) and
+    delivered as one zip. Progress lives here so any worker can report it.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='report_card_batches')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='report_card_batches')
+
+    # Same keys as the report card dashboard filters: grade, cohort, subject, date_from, date_to, tests
+    filters = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    archive = models.FileField(upload_to='report_cards/', blank=True)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Heartbeat: touched after every chunk; see report_card_batch.fail_stale_batches
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Report cards #{self.id} ({self.status}: {self.completed}/{self.total})"
+
+    @property
+    def percent(self):
+        return int(self.completed / self.total * 100) if self.total else 0
+
+
+class AnalyticsVersion(models.Model):
+    """
+    Data-version counter for one school, test, student or subject. Cached
+    analytics results embed the versions they were computed from
+    (core/analytics/cache.py), so bumping a counter invalidates exactly the
+    entries that depend on it.
+    Kept in the database so every worker process sees the same versions.
+    """
+    SCOPE_CHOICES = [
+        ('school', 'School'),
+        ('test', 'Test'),
+        ('student', 'Student'),
+        ('subject', 'Subject'),
+        ('taxonomy', 'Curriculum taxonomy'),
+    ]
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    object_id = models.PositiveIntegerField()
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("scope", "object_id")
+
+    def __str__(self):
+        return f"{self.scope}:{self.object_id} v{self.version}"
+
+
 class PDFImportSession(models.Model):
     """
     Tracks PDF import sessions for resuming later
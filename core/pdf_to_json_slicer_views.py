@@ -12,7 +12,7 @@ from django.shortcuts import render
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
-from .models import Grade, Subject, Topic
+from .taxonomy import get_taxonomy
 
 
 # Configure pytesseract path if needed (Windows)
@@ -270,9 +270,9 @@ def pdf_to_json_slicer(request):
     PDF to JSON Slicer page - upload PDFs, detect colored lines,
     OCR content, and generate structured JSON for the question editor.
     """
-    grades = Grade.objects.all().order_by('name')
-    subjects = Subject.objects.all().order_by('name')
-    topics = Topic.objects.all().order_by('name')
+    grades = get_taxonomy().grade_list()
+    subjects = get_taxonomy().subject_list()
+    topics = get_taxonomy().topics_for()
 
     if request.method == 'POST':
         action = request.POST.get('action')
@@ -18,9 +18,11 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 
 from .models import (
-    Question, Grade, Subject, Topic,
+    Question, Topic,
     QuestionPage, AnswerSpace,
 )
+from .taxonomy import get_taxonomy
+from .duplicates import duplicate_summary, find_duplicates
 
 
 # ─── Utilities ───────────────────────────────────────────────────────
@@ -50,9 +52,9 @@ def qp_ms_ingester(request):
     GET: Render the ingester page with PDF.js + Fabric.js interface.
     All processing happens client-side.
     """
-    grades = Grade.objects.all().order_by('name')
-    subjects = Subject.objects.all().order_by('name')
-    topics = Topic.objects.all().order_by('name')
+    grades = get_taxonomy().grade_list()
+    subjects = get_taxonomy().subject_list()
+    topics = get_taxonomy().topics_for()
 
     return render(request, 'teacher/qp_ms_ingester.html', {
         'grades': grades,
@@ -76,6 +78,7 @@ def qp_ms_ingester_save(request):
         "subject_id": 2,
         "topic_id": 3,        // optional
         "year": 2023,          // optional
+        "skip_duplicates": false,  // optional: don't save near-duplicates of bank questions
         "questions": [
             {
                 "question_number": "1",
@@ -121,8 +124,21 @@ def qp_ms_ingester_save(request):
             return JsonResponse({'error': 'No topic available for this subject'}, status=400)
 
         saved_roots = []
+        duplicates = []
+        skip_duplicates = bool(data.get('skip_duplicates'))
 
         for q_data in questions:
+            question_text = _root_question_html(q_data)
+            matches = find_duplicates(subject_id, question_text) if question_text else []
+            if matches:
+                duplicates.append({
+                    'question_number': q_data.get('question_number', ''),
+                    'skipped': skip_duplicates,
+                    **duplicate_summary(matches),
+                })
+                if skip_duplicates:
+                    continue
+
             root = _save_question_recursive(
                 node=q_data,
                 parent=None,
@@ -138,6 +154,7 @@ def qp_ms_ingester_save(request):
             'success': True,
             'question_ids': saved_roots,
             'count': len(saved_roots),
+            'duplicates': duplicates,
         })
 
     except Exception as e:
@@ -148,6 +165,18 @@ def qp_ms_ingester_save(request):
         }, status=500)
 
 
+def _root_question_html(node):
+    """question_text of a root question: its sliced image."""
+    image_data = node.get('image', '')
+    if not image_data:
+        return ''
+    return (
+        f'<img src="{image_data}" '
+        f'alt="Question {node.get("question_number", "")}" '
+        f'style="max-width:100%;height:auto;display:block;" />'
+    )
+
+
 def _save_question_recursive(node, parent, grade_id, subject_id, topic_id, year, user):
     """Recursively create Question objects with parent FK chain."""
 
@@ -155,15 +184,7 @@ def _save_question_recursive(node, parent, grade_id, subject_id, topic_id, year,
     has_children = len(children) > 0
 
     # Build question_text from image data (only for root questions)
-    question_text = ''
-    if parent is None:
-        image_data = node.get('image', '')
-        if image_data:
-            question_text = (
-                f'<img src="{image_data}" '
-                f'alt="Question {node.get("question_number", "")}" '
-                f'style="max-width:100%;height:auto;display:block;" />'
-            )
+    question_text = _root_question_html(node) if parent is None else ''
 
     # Build answer_text from markscheme
     answer_text = node.get('answer_text', '')
@@ -0,0 +1,81 @@
+"""
+Denormalized per-question counters used to sort and filter the question bank:
+
+    usage_count      TestQuestion rows using the question
+    lo_count         learning objectives it is tagged with
+    is_fully_tagged  has a topic and at least one learning objective
+
+core/signals.py keeps them current on TestQuestion save / delete and LO
+(re)tagging, and recomputes them whenever a question is saved, since a full
+save() writes back whatever counters the instance was loaded with.
+TestQuestion.objects.bulk_create() and other bulk writes skip the signals;
+call refresh_usage_counts() after them.
+`python manage.py reconcile_question_counters` repairs any drift.
+"""
+from django.db.models import BooleanField, Count, Exists, ExpressionWrapper, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Question, TestQuestion
+
+LO_LINKS = Question.learning_objectives.through
+
+COUNTER_FIELDS = ('usage_count', 'lo_count', 'is_fully_tagged')
+
+
+def _count_of(model):
+    rows = (
+        model.objects.filter(question_id=OuterRef('pk'))
+        .order_by()
+        .values('question_id')
+        .annotate(n=Count('pk'))
+        .values('n')
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def _usage():
+    return {'usage_count': _count_of(TestQuestion)}
+
+
+def _tagging():
+    tagged = Q(topic__isnull=False) & Exists(LO_LINKS.objects.filter(question_id=OuterRef('pk')))
+    return {
+        'lo_count': _count_of(LO_LINKS),
+        'is_fully_tagged': ExpressionWrapper(tagged, output_field=BooleanField()),
+    }
+
+
+def refresh_usage_counts(question_ids):
+    Question.objects.filter(pk__in=list(question_ids)).update(**_usage())
+
+
+def refresh_tagging(question_ids):
+    Question.objects.filter(pk__in=list(question_ids)).update(**_tagging())
+
+
+def refresh_counters(question_ids, instance=None):
+    """Recompute all counters of `question_ids` (and copy them onto `instance`)."""
+    Question.objects.filter(pk__in=list(question_ids)).update(**_usage(), **_tagging())
+    if instance is not None:
+        values = Question.objects.filter(pk=instance.pk).values_list(*COUNTER_FIELDS).first()
+        if values:
+            instance.usage_count, instance.lo_count, instance.is_fully_tagged = values
+
+
+def reconcile(batch_size=5000):
+    """Recompute every question's counters; returns how many questions were out of date."""
+    expected = Question.objects.annotate(
+        actual_usage=_count_of(TestQuestion),
+        actual_los=_count_of(LO_LINKS),
+    )
+    drifted = expected.filter(
+        ~Q(usage_count=F('actual_usage'))
+        | ~Q(lo_count=F('actual_los'))
+        | Q(is_fully_tagged=True) & (Q(topic__isnull=True) | Q(actual_los=0))
+        | Q(is_fully_tagged=False, topic__isnull=False, actual_los__gt=0)
+    ).count()
+
+    ids = list(Question.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(ids), batch_size):
+        refresh_counters(ids[start:start + batch_size])
+    return drifted
@@ -0,0 +1,90 @@
+"""
+Listing previews for questions.
+
+Question rows carry their full HTML with base64 images inline, so listing
+pages that only show a snippet used to load (and ship) megabytes. Each
+Question instead keeps
+
+    preview_text  the first PREVIEW_LENGTH characters of its plain text
+    thumbnail     a small WebP of its first embedded image, stored under
+                  MEDIA_ROOT/question_thumbnails/ and named by the image's
+                  sha256, so unchanged images are never re-rendered and
+                  identical images share one file
+
+set by a pre_save handler in core/signals.py, and listings defer() the heavy
+columns (LISTING_DEFER). `python manage.py rebuild_question_previews` fills
+in existing questions.
+"""
+import base64
+import binascii
+import hashlib
+import re
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, UnidentifiedImageError
+
+from .search import plain_text
+
+PREVIEW_LENGTH = 150
+THUMBNAIL_SIZE = (240, 160)
+THUMBNAIL_DIR = 'question_thumbnails'
+
+# Columns listing pages never need
+LISTING_DEFER = ('question_text', 'answer_text', 'parts_config')
+
+_FIRST_IMAGE_RE = re.compile(r'data:image/[^;]+;base64,([A-Za-z0-9+/=\s]+)')
+
+
+def preview_text(markup):
+    text = plain_text(markup)
+    return text[:PREVIEW_LENGTH] + '...' if len(text) > PREVIEW_LENGTH else text
+
+
+def first_image(markup):
+    """Base64 payload of the first image embedded in `markup`, or None."""
+    match = _FIRST_IMAGE_RE.search(markup or '')
+    return re.sub(r'\s+', '', match.group(1)) if match else None
+
+
+def thumbnail_name(payload):
+    return f'{THUMBNAIL_DIR}/{hashlib.sha256(payload.encode()).hexdigest()}.webp'
+
+
+def render_thumbnail(payload):
+    """WebP bytes of the image in `payload` scaled to fit THUMBNAIL_SIZE, or None if it won't decode."""
+    try:
+        image = Image.open(BytesIO(base64.b64decode(payload)))
+        image.thumbnail(THUMBNAIL_SIZE)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        out = BytesIO()
+        image.save(out, 'WEBP', quality=70)
+        return out.getvalue()
+    except (binascii.Error, UnidentifiedImageError, OSError, ValueError):
+        return None
+
+
+def update_preview(question):
+    """Set `question.preview_text` and `.thumbnail` from its question_text (not saved)."""
+    question.preview_text = preview_text(question.question_text)
+
+    payload = first_image(question.question_text)
+    if payload is None:
+        question.thumbnail = ''
+        return
+    name = thumbnail_name(payload)
+    if question.thumbnail.name == name:
+        return
+    storage = question.thumbnail.storage
+    if not storage.exists(name):
+        data = render_thumbnail(payload)
+        if data is None:
+            question.thumbnail = ''
+            return
+        name = storage.save(name, ContentFile(data))
+    question.thumbnail.name = name
+
+
+def thumbnail_url(question):
+    return question.thumbnail.url if question.thumbnail else None
@@ -0,0 +1,176 @@
+"""
+Materialized-path storage for hierarchical (parent / sub-question) questions.
+
+Every Question stores
+    root         the top-level question of its tree (null for top-level questions)
+    path         zero-padded ids from the root down to itself, e.g.
+                 "0000000012/0000000045/", so a subtree is a prefix match
+    total_marks  its own marks plus those of all its sub-questions
+
+core/signals.py keeps them current when a question is created, moved to
+another parent, has its marks changed or is deleted. Readers load a whole
+tree - or many - with one query through load_trees() instead of walking
+`sub_questions` one level at a time.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Concat, Substr
+
+from .models import Question
+
+PATH_WIDTH = 10  # digits per id; 255 characters hold 23 levels
+
+
+def node_path(parent_path, question_id):
+    return f'{parent_path}{question_id:0{PATH_WIDTH}d}/'
+
+
+def tree_id(question):
+    """Id of the top-level question of `question`'s tree."""
+    return question.root_id or question.pk
+
+
+def _tree_rows(root_ids):
+    return Question.objects.filter(Q(pk__in=root_ids) | Q(root_id__in=root_ids))
+
+
+# ── Maintenance (called from core/signals.py) ────────────────────────────────
+
+def sync_tree_position(question):
+    """Set path / root of a new or re-parented question and rewrite its subtree."""
+    old_path = question.path
+    if question.parent_id:
+        parent_path, parent_root = Question.objects.filter(pk=question.parent_id).values_list(
+            'path', 'root_id'
+        ).get()
+        root_id = parent_root or question.parent_id
+    else:
+        parent_path, root_id = '', None
+    path = node_path(parent_path, question.pk)
+    old_root_id = question.root_id if old_path else None
+
+    Question.objects.filter(pk=question.pk).update(path=path, root_id=root_id)
+    if old_path and old_path != path:
+        # Move the subtree along: swap the path prefix and point it at the new root
+        Question.objects.filter(path__startswith=old_path).exclude(pk=question.pk).update(
+            path=Concat(Value(path), Substr('path', len(old_path) + 1)),
+            root_id=root_id or question.pk,
+        )
+    question.path, question.root_id = path, root_id
+
+    refresh_total_marks(root_id or question.pk, question)
+    if old_root_id and old_root_id != (root_id or question.pk):
+        # The tree it left lost these marks
+        refresh_total_marks(old_root_id)
+
+
+def refresh_total_marks(root_id, instance=None):
+    """Recompute total_marks for every question of one tree."""
+    rows = list(_tree_rows([root_id]).values_list('id', 'parent_id', 'marks', 'total_marks', 'path'))
+    totals = {pk: marks for pk, _, marks, _, _ in rows}
+    # Deepest first, so each question's total is complete before it is added to its parent
+    for pk, parent_id, _, _, path in sorted(rows, key=lambda r: -len(r[4])):
+        if parent_id in totals:
+            totals[parent_id] += totals[pk]
+
+    changed = defaultdict(list)
+    for pk, _, _, stored, _ in rows:
+        if totals[pk] != stored:
+            changed[totals[pk]].append(pk)
+    for total, ids in changed.items():
+        Question.objects.filter(pk__in=ids).update(total_marks=total)
+    if instance is not None and instance.pk in totals:
+        instance.total_marks = totals[instance.pk]
+
+
+def refresh_total_marks_on_commit(root_id):
+    transaction.on_commit(lambda: refresh_total_marks(root_id))
+
+
+def rebuild_all_trees(batch_size=2000):
+    """Recompute root / path / total_marks for every question (repairs bulk edits)."""
+    rows = list(Question.objects.order_by().values_list('id', 'parent_id', 'marks'))
+    children = defaultdict(list)
+    for pk, parent_id, _ in rows:
+        children[parent_id].append(pk)
+    marks = {pk: m for pk, _, m in rows}
+
+    updates = []
+    totals = {}
+
+    def walk(pk, parent_path, root_id):
+        # Iterative pre-order walk; totals are summed on the way back up
+        stack = [(pk, parent_path, root_id, False)]
+        while stack:
+            node, prefix, root, done = stack.pop()
+            path = node_path(prefix, node)
+            if done:
+                totals[node] = marks[node] + sum(totals[c] for c in children[node])
+                updates.append(Question(pk=node, path=path, root_id=root, total_marks=totals[node]))
+                continue
+            stack.append((node, prefix, root, True))
+            for child in children[node]:
+                stack.append((child, path, root or node, False))
+
+    for pk in children[None]:
+        walk(pk, '', None)
+    Question.objects.bulk_update(updates, ['path', 'root', 'total_marks'], batch_size=batch_size)
+    return len(updates)
+
+
+# ── Loading ─────────────────────────────────────────────────────────────────
+
+def _sort_key(question):
+    return (question.order, question.pk)
+
+
+def load_trees(root_ids, queryset=None):
+    """
+    {root id: root question} for the given top-level questions, each node
+    carrying its sub-questions (ordered like `sub_questions`) in
+    `.tree_children`. One query for all the trees.
+    """
+    root_ids = set(root_ids)
+    queryset = Question.objects.all() if queryset is None else queryset
+    nodes = {q.pk: q for q in queryset.filter(Q(pk__in=root_ids) | Q(root_id__in=root_ids))}
+    for node in nodes.values():
+        node.tree_children = []
+    for node in nodes.values():
+        parent = nodes.get(node.parent_id)
+        if parent is not None:
+            node.parent = parent
+            parent.tree_children.append(node)
+    for node in nodes.values():
+        node.tree_children.sort(key=_sort_key)
+    return {pk: nodes[pk] for pk in root_ids if pk in nodes}
+
+
+def load_tree(question):
+    """`question` (any node) with its whole subtree attached as `.tree_children`."""
+    nodes = {question.pk: question}
+    if not question.path:  # unsaved
+        question.tree_children = []
+        return question
+    for node in Question.objects.filter(path__startswith=question.path).exclude(pk=question.pk):
+        nodes[node.pk] = node
+    for node in nodes.values():
+        node.tree_children = []
+    for node in nodes.values():
+        if node.pk != question.pk and node.parent_id in nodes:
+            nodes[node.parent_id].tree_children.append(node)
+    for node in nodes.values():
+        node.tree_children.sort(key=_sort_key)
+    return question
+
+
+def walk_tree(question):
+    """Pre-order list of the sub-questions below a loaded tree node."""
+    found = []
+    stack = list(reversed(question.tree_children))
+    while stack:
+        node = stack.pop()
+        found.append(node)
+        stack.extend(reversed(node.tree_children))
+    return found
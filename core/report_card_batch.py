@@ -0,0 +1,189 @@
+"""
+Bulk report card generation for whole grades / cohorts.
+
+A ReportCardBatch is processed in the background (like the background
+tagging tasks), but its state lives in the database so progress survives
+navigation and can be read by any worker:
+
+1. report_card_payloads() computes the report card data for CHUNK_SIZE
+   students at a time in a few grouped queries - the same payload
+   report_card_detail returns to the browser.
+2. Each payload is rendered to HTML (teacher/report_card_pdf.html) and the
+   HTML is turned into a PDF in a spawned process pool, so PyMuPDF layout
+   runs while the next chunk's data is being computed.
+3. PDFs are streamed into one zip, stored on ReportCardBatch.archive.
+
+Each web process runs one batch at a time from a queue, on one pool of
+settings.REPORT_CARD_PDF_WORKERS processes shared by all its batches, so
+concurrent requests queue up instead of oversubscribing the host. A running
+batch touches `updated_at` after every chunk (and keeps its queued batches
+alive); a batch left pending or running without a heartbeat for
+REPORT_CARD_BATCH_STALE_AFTER seconds lost its process to a restart and is
+marked failed by fail_stale_batches().
+"""
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import traceback
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connections
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .db_router import analytics_reads
+from .models import ReportCardBatch
+from .report_card_pdf import PDF_AVAILABLE, render_pdf
+
+CHUNK_SIZE = 50  # students per data pass (and per progress update)
+
+_queue = queue.Queue()
+_queued = set()         # ids waiting in _queue or being processed by this process
+_lock = threading.Lock()
+_state = {'runner': None, 'pool': None}
+
+
+def shared_pool():
+    """This process's PDF rendering pool, started on first use."""
+    with _lock:
+        if _state['pool'] is None:
+            _state['pool'] = ProcessPoolExecutor(
+                max_workers=settings.REPORT_CARD_PDF_WORKERS, mp_context=multiprocessing.get_context('spawn')
+            )
+        return _state['pool']
+
+
+def _discard_pool():
+    with _lock:
+        pool, _state['pool'] = _state['pool'], None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_queue():
+    while True:
+        batch_id = _queue.get()
+        try:
+            run_report_card_batch(batch_id)
+        finally:
+            _queued.discard(batch_id)
+            connections.close_all()
+
+
+def start_report_card_batch(batch):
+    """Queue the batch for this process's background runner, starting it if needed."""
+    fail_stale_batches()
+    _queued.add(batch.id)
+    _queue.put(batch.id)
+    with _lock:
+        if _state['runner'] is None or not _state['runner'].is_alive():
+            _state['runner'] = threading.Thread(target=_run_queue, daemon=True)
+            _state['runner'].start()
+
+
+def _heartbeat(batch, **fields):
+    """Save progress and keep this process's queued batches from looking abandoned."""
+    now = timezone.now()
+    ReportCardBatch.objects.filter(id=batch.id).update(updated_at=now, **fields)
+    ReportCardBatch.objects.filter(id__in=list(_queued - {batch.id}), status='pending').update(updated_at=now)
+
+
+def fail_stale_batches():
+    """Mark batches whose process stopped sending heartbeats as failed; returns how many."""
+    cutoff = timezone.now() - timedelta(seconds=settings.REPORT_CARD_BATCH_STALE_AFTER)
+    return ReportCardBatch.objects.filter(status__in=['pending', 'running'], updated_at__lt=cutoff).update(
+        status='failed',
+        error='The server stopped while generating this batch. Please start it again.',
+        finished_at=timezone.now(),
+        updated_at=timezone.now(),
+    )
+
+
+def report_card_filename(student):
+    return get_valid_filename(
+        f'ReportCard_{student.grade.name}_{student.section}_{student.roll_number}_{student.full_name}_{student.id}.pdf'
+    )
+
+
+def _write_ready(pending, archive, wait=False):
+    """Move finished PDFs from `pending` into the zip; returns how many were written."""
+    written = 0
+    while pending and (wait or pending[0][1].done()):
+        student, future = pending.pop(0)
+        archive.writestr(report_card_filename(student), future.result())
+        written += 1
+    return written
+
+
+def run_report_card_batch(batch_id, pool=None):
+    """
+    Generate every PDF of a pending batch and attach the zip, rendering on
+    `pool` (default: the shared pool). Safe to call synchronously.
+    """
+    from .report_card_views import filtered_students, report_card_payloads
+
+    batch = ReportCardBatch.objects.select_related('school').get(id=batch_id)
+    if batch.status != 'pending':
+        # Already run, or given up on by fail_stale_batches()
+        return batch
+    tmp_path = None
+    try:
+        if not PDF_AVAILABLE:
+            raise RuntimeError('PyMuPDF is not installed; server-side report cards are unavailable')
+
+        filters = batch.filters
+        students = list(
+            filtered_students(
+                batch.school, filters.get('search', ''), filters.get('grade', ''), filters.get('cohort', '')
+            ).order_by('grade', 'section', 'roll_number')
+        )
+        batch.status = 'running'
+        batch.total = len(students)
+        batch.completed = 0
+        _heartbeat(batch, status=batch.status, total=batch.total, completed=0)
+
+        pool = pool or shared_pool()
+        with tempfile.NamedTemporaryFile(suffix='.zip', delete=False) as tmp:
+            tmp_path = tmp.name
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            pending = []
+            for start in range(0, len(students), CHUNK_SIZE):
+                chunk = students[start:start + CHUNK_SIZE]
+                with analytics_reads():
+                    payloads = report_card_payloads(
+                        chunk, batch.school,
+                        filters.get('subject', ''), filters.get('date_from', ''),
+                        filters.get('date_to', ''), filters.get('tests', ''),
+                    )
+                for student in chunk:
+                    html = render_to_string('teacher/report_card_pdf.html', {'card': payloads[student.id]})
+                    pending.append((student, pool.submit(render_pdf, html)))
+
+                batch.completed += _write_ready(pending, archive)
+                _heartbeat(batch, completed=batch.completed)
+
+            batch.completed += _write_ready(pending, archive, wait=True)
+
+        with open(tmp_path, 'rb') as fh:
+            batch.archive.save(f'report_cards_{batch.id}.zip', File(fh), save=False)
+        batch.status = 'completed'
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            # A worker died; the next batch starts a fresh pool
+            _discard_pool()
+        batch.status = 'failed'
+        batch.error = traceback.format_exc(limit=5)
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        batch.finished_at = timezone.now()
+        batch.save()
+    return batch
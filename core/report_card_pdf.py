@@ -0,0 +1,35 @@
+"""
+HTML → PDF rendering for server-side report cards, using PyMuPDF's Story
+layout engine.
+
+Deliberately free of Django imports: report_card_batch.py renders PDFs in a
+spawned process pool, and workers only need this module to start.
+"""
+import io
+
+try:
+    import fitz  # PyMuPDF
+    PDF_AVAILABLE = True
+except ImportError:
+    PDF_AVAILABLE = False
+
+PAGE_SIZE = 'a4'
+PAGE_MARGIN = 36  # points (0.5 inch)
+
+
+def render_pdf(html):
+    """Lay out an HTML document over as many A4 pages as needed; returns PDF bytes."""
+    buffer = io.BytesIO()
+    story = fitz.Story(html=html)
+    writer = fitz.DocumentWriter(buffer)
+    mediabox = fitz.paper_rect(PAGE_SIZE)
+    where = mediabox + (PAGE_MARGIN, PAGE_MARGIN, -PAGE_MARGIN, -PAGE_MARGIN)
+
+    more = True
+    while more:
+        device = writer.begin_page(mediabox)
+        more, _ = story.place(where)
+        story.draw(device)
+        writer.end_page()
+    writer.close()
+    return buffer.getvalue()
@@ -4,34 +4,40 @@ with topic mastery, LO mastery, subject trends, and strengths/weaknesses
 """
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.db.models import Q, Avg, Sum, Count
-from django.core.paginator import Paginator
+from django.http import JsonResponse, FileResponse, Http404
+from django.urls import reverse
+from django.db.models import Q, Avg, Sum, Count, FloatField
+from django.db.models.functions import Cast
 from datetime import datetime
 from collections import defaultdict
+import numpy as np
 
 from .models import (
     Student, Test, TestQuestion, StudentAnswer, Subject, Grade,
-    ClassGroup, School, LearningObjective, Topic, Question
+    ClassGroup, School, LearningObjective, MasteryFact, ReportCardBatch
 )
+from .taxonomy import get_taxonomy
+from .keyset import LISTING_COUNT_LIMIT, KeysetPaginator
+from .composition import add_questions
+from .analytics.mastery import topic_facts, lo_facts, aggregate_facts
+from .analytics.cache import cached_student_result
+from .analytics import stats
+from .analytics.trends import trends_by_student
+from .analytics.irt import DIFFICULTY_BANDS, mean_ability
+from .analytics.sampler import (
+    candidate_index, candidates, cover_los, mastered_question_ids, question_ids, sample,
+)
+from .analytics.catalog import subject_catalog, question_count
+from .db_router import use_analytics_replica
+from .report_card_batch import fail_stale_batches, start_report_card_batch
+from .report_card_pdf import PDF_AVAILABLE
 
+REPORT_CARD_PAGE_SIZES = (10, 25, 50, 100)
+MAX_REPORT_CARDS_PER_PAGE = REPORT_CARD_PAGE_SIZES[-1]
 
-@login_required
-def report_card_dashboard(request):
-    """
-    Main report card dashboard with search, filter, test selection, and pagination
-    """
-    school = request.user.profile.school
-
-    # Initialize filters
-    search_query = request.GET.get('search', '').strip()
-    subject_filter = request.GET.get('subject', '')
-    grade_filter = request.GET.get('grade', '')
-    cohort_filter = request.GET.get('cohort', '')
-    date_from = request.GET.get('date_from', '')
-    date_to = request.GET.get('date_to', '')
-    page_number = request.GET.get('page', 1)
 
+def filtered_students(school, search_query='', grade_filter='', cohort_filter=''):
+    """Students of the school matching the report card dashboard filters."""
     # Base queryset - students in this school
     students = Student.objects.filter(school=school).select_related('grade')
 
@@ -52,9 +58,30 @@ def report_card_dashboard(request):
             cohort_user_ids = cohort.students.values_list('id', flat=True)
             students = students.filter(user__id__in=cohort_user_ids)
 
+    return students
+
+
+@login_required
+@use_analytics_replica
+def report_card_dashboard(request):
+    """
+    Main report card dashboard with search, filter, test selection, and pagination
+    """
+    school = request.user.profile.school
+
+    # Initialize filters
+    search_query = request.GET.get('search', '').strip()
+    subject_filter = request.GET.get('subject', '')
+    grade_filter = request.GET.get('grade', '')
+    cohort_filter = request.GET.get('cohort', '')
+    date_from = request.GET.get('date_from', '')
+    date_to = request.GET.get('date_to', '')
+
+    students = filtered_students(school, search_query, grade_filter, cohort_filter)
+
     # Get filter options for dropdowns
-    subjects = Subject.objects.all().order_by('name')
-    grades = Grade.objects.all().order_by('name')
+    subjects = get_taxonomy().subject_list()
+    grades = get_taxonomy().grade_list()
     cohorts = ClassGroup.objects.filter(school=school).order_by('name')
 
     # Get available tests for the test selector
@@ -83,44 +110,60 @@ def report_card_dashboard(request):
         available_tests = available_tests.filter(subject__id=subject_filter)
 
     # Pagination
-    paginator = Paginator(students.order_by('grade', 'section', 'roll_number'), 10)
-    page_obj = paginator.get_page(page_number)
+    try:
+        per_page = min(max(int(request.GET.get('per_page', 10)), 1), MAX_REPORT_CARDS_PER_PAGE)
+    except ValueError:
+        per_page = 10
+    paginator = KeysetPaginator(
+        students, per_page, ['grade__name', 'section', 'roll_number'], count_limit=LISTING_COUNT_LIMIT
+    )
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    page_ids = [student.id for student in page_obj]
 
-    # Summary data per student on current page
+    # Summary data per student on current page: graded totals per (student, test)
+    # in one grouped query, then each student's mean test percentage
+    answer_filters = Q(student_id__in=page_ids, marks_awarded__isnull=False)
+    if date_from:
+        try:
+            answer_filters &= Q(test__created_at__gte=datetime.strptime(date_from, '%Y-%m-%d'))
+        except ValueError:
+            pass
+    if date_to:
+        try:
+            answer_filters &= Q(test__created_at__lte=datetime.strptime(date_to, '%Y-%m-%d'))
+        except ValueError:
+            pass
+    if subject_filter:
+        answer_filters &= Q(test__subject__id=subject_filter)
+
+    attempts = list(
+        StudentAnswer.objects.filter(answer_filters)
+        .values('student_id', 'test_id')
+        .annotate(
+            earned=Sum(Cast('marks_awarded', FloatField())),
+            total=Sum(Cast('question__marks', FloatField())),
+        )
+        .order_by()
+        .values_list('student_id', 'earned', 'total')
+    )
+    attempt_students = np.array([a[0] for a in attempts], dtype=np.int64)
+    earned = stats.as_array([a[1] or 0 for a in attempts])
+    total = stats.as_array([a[2] or 0 for a in attempts])
+
+    tested_ids, test_counts = stats.group_sums(attempt_students)[:2]
+    test_count_by_student = dict(zip(tested_ids.tolist(), test_counts.tolist()))
+    scored = total > 0
+    scored_ids, scored_counts, score_sums = stats.group_sums(
+        attempt_students[scored], earned[scored] / total[scored] * 100
+    )
+    avg_by_student = dict(zip(scored_ids.tolist(), (score_sums / scored_counts).tolist()))
+
+    # Trend flags come from the nightly compute_student_trends job
+    page_trends = trends_by_student(page_ids)
     students_data = []
     for student in page_obj:
-        test_filters = Q(student=student, marks_awarded__isnull=False)
-
-        if date_from:
-            try:
-                test_filters &= Q(test__created_at__gte=datetime.strptime(date_from, '%Y-%m-%d'))
-            except ValueError:
-                pass
-        if date_to:
-            try:
-                test_filters &= Q(test__created_at__lte=datetime.strptime(date_to, '%Y-%m-%d'))
-            except ValueError:
-                pass
-
-        answers = StudentAnswer.objects.filter(test_filters).select_related('test', 'test__subject')
-
-        if subject_filter:
-            answers = answers.filter(test__subject__id=subject_filter)
-
-        test_ids = answers.values_list('test__id', flat=True).distinct()
-        test_count = test_ids.count()
-
-        if test_count > 0:
-            test_scores = []
-            for tid in test_ids:
-                test_answers = answers.filter(test_id=tid)
-                total_marks = sum(float(a.question.marks or 0) for a in test_answers)
-                earned_marks = sum(float(a.marks_awarded or 0) for a in test_answers)
-                if total_marks > 0:
-                    test_scores.append((earned_marks / total_marks) * 100)
-            avg_score = sum(test_scores) / len(test_scores) if test_scores else 0
-        else:
-            avg_score = 0
+        test_count = test_count_by_student.get(student.id, 0)
+        avg_score = avg_by_student.get(student.id, 0)
 
         if avg_score >= 80:
             status = 'Excellent'
@@ -140,6 +183,10 @@ def report_card_dashboard(request):
             'test_count': test_count,
             'avg_score': round(avg_score, 1),
             'status': status,
+            'trends': [
+                t for t in page_trends.get(student.id, [])
+                if t.trend in ('improving', 'declining')
+            ],
         })
 
     # Build test list for JSON (for the test selector in the template)
@@ -166,14 +213,18 @@ def report_card_dashboard(request):
             'cohort': cohort_filter,
             'date_from': date_from,
             'date_to': date_to,
+            'per_page': per_page,
         },
+        'per_page_options': REPORT_CARD_PAGE_SIZES,
         'total_count': paginator.count,
+        'count_is_exact': paginator.count_is_exact,
     }
 
     return render(request, 'teacher/report_card_dashboard.html', context)
 
 
 @login_required
+@use_analytics_replica
 def report_card_detail(request, student_id):
     """
     Comprehensive report card data for a specific student (JSON for jsPDF).
@@ -189,58 +240,186 @@ def report_card_detail(request, student_id):
     date_to = request.GET.get('date_to', '')
     selected_tests = request.GET.get('tests', '')  # comma-separated test IDs
 
-    # Build query filters
-    test_filters = Q(student=student, marks_awarded__isnull=False)
+    cache_name = f"report_card:{subject_filter}:{date_from}:{date_to}:{selected_tests}"
+    response_data = cached_student_result(
+        student.id,
+        cache_name,
+        lambda: _report_card_data(student, school, subject_filter, date_from, date_to, selected_tests),
+    )
+    return JsonResponse(response_data)
+
+
+def _report_card_data(student, school, subject_filter, date_from, date_to, selected_tests):
+    """Report card payload for report_card_detail."""
+    return report_card_payloads(
+        [student], school, subject_filter, date_from, date_to, selected_tests
+    )[student.id]
+
+
+REPORT_CARD_BATCH_FILTERS = ('search', 'grade', 'cohort', 'subject', 'date_from', 'date_to', 'tests')
+
+
+def _batch_status(batch):
+    return {
+        'batch_id': batch.id,
+        'status': batch.status,
+        'total': batch.total,
+        'completed': batch.completed,
+        'percent': batch.percent,
+        'error': batch.error if batch.status == 'failed' else '',
+        'download_url': reverse('report_card_batch_download', args=[batch.id])
+        if batch.status == 'completed' else None,
+    }
+
+
+@login_required
+def report_card_batch_start(request):
+    """
+    Queue server-side PDF report cards for every student matching the
+    dashboard filters. Returns the batch id to poll.
+    POST JSON: { search, grade, cohort, subject, date_from, date_to, tests }
+    """
+    import json
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+
+    try:
+        data = json.loads(request.body or '{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    if not PDF_AVAILABLE:
+        return JsonResponse({'error': 'PDF generation is not available on this server'}, status=503)
+
+    school = request.user.profile.school
+    filters = {key: str(data.get(key) or '').strip() for key in REPORT_CARD_BATCH_FILTERS}
+    if not filtered_students(school, filters['search'], filters['grade'], filters['cohort']).exists():
+        return JsonResponse({'error': 'No students match the selected filters'}, status=400)
+
+    batch = ReportCardBatch.objects.create(school=school, created_by=request.user, filters=filters)
+    start_report_card_batch(batch)
+    return JsonResponse(_batch_status(batch), status=202)
+
+
+@login_required
+def report_card_batch_status(request, batch_id):
+    """Progress of a report card batch (JSON)."""
+    fail_stale_batches()
+    batch = get_object_or_404(ReportCardBatch, id=batch_id, school=request.user.profile.school)
+    return JsonResponse(_batch_status(batch))
+
+
+@login_required
+def report_card_batch_download(request, batch_id):
+    """Zip of all PDFs of a completed batch."""
+    batch = get_object_or_404(
+        ReportCardBatch, id=batch_id, school=request.user.profile.school, status='completed'
+    )
+    if not batch.archive:
+        raise Http404('Archive not found')
+    return FileResponse(
+        batch.archive.open('rb'), as_attachment=True, filename=f'report_cards_{batch.id}.zip'
+    )
+
+
+def _report_card_facts(subject_filter, date_from, date_to, selected_tests):
+    """MasteryFact rows inside the report card's date / subject / test selection."""
+    facts = MasteryFact.objects.all()
 
     if date_from:
         try:
-            test_filters &= Q(test__created_at__gte=datetime.strptime(date_from, '%Y-%m-%d'))
+            facts = facts.filter(test__created_at__gte=datetime.strptime(date_from, '%Y-%m-%d'))
         except ValueError:
             pass
 
     if date_to:
         try:
-            test_filters &= Q(test__created_at__lte=datetime.strptime(date_to, '%Y-%m-%d'))
+            facts = facts.filter(test__created_at__lte=datetime.strptime(date_to, '%Y-%m-%d'))
         except ValueError:
             pass
 
-    answers = StudentAnswer.objects.filter(test_filters).select_related(
-        'test', 'test__subject', 'question', 'question__topic',
-        'question__topic__grade', 'question__topic__subject'
-    ).prefetch_related('question__learning_objectives')
-
     if subject_filter:
-        answers = answers.filter(test__subject__id=subject_filter)
+        facts = facts.filter(test__subject__id=subject_filter)
 
     # Filter by selected tests if provided
     if selected_tests:
         test_id_list = [int(x) for x in selected_tests.split(',') if x.strip().isdigit()]
         if test_id_list:
-            answers = answers.filter(test__id__in=test_id_list)
+            facts = facts.filter(test__id__in=test_id_list)
+
+    return facts
+
+
+def _rows_by_student(rows):
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row['student_id']].append(row)
+    return grouped
+
+
+def report_card_payloads(students, school, subject_filter='', date_from='', date_to='', selected_tests=''):
+    """
+    Report card payloads for many students at once, {student_id: payload}.
+    Every section is a single grouped query over all the students' facts,
+    so a whole cohort costs the same handful of queries as one student.
+    """
+    students = list(students)
+    facts = _report_card_facts(subject_filter, date_from, date_to, selected_tests).filter(
+        student_id__in=[student.id for student in students]
+    )
+    topic_rows = topic_facts(facts)
+
+    test_rows = _rows_by_student(aggregate_facts(
+        topic_rows, 'student_id', 'test_id', 'test__title', 'test__subject__name', 'test__created_at'
+    ))
+    topic_groups = _rows_by_student(aggregate_facts(
+        topic_rows, 'student_id', 'topic_id', 'topic__name', 'topic__subject__name'
+    ))
+    lo_groups = _rows_by_student(aggregate_facts(
+        lo_facts(facts),
+        'student_id', 'learning_objective_id', 'learning_objective__code',
+        'learning_objective__description', 'learning_objective__topic__name',
+    ))
+
+    tested_lo_codes = defaultdict(lambda: defaultdict(set))
+    for row in lo_facts(facts).values('student_id', 'topic_id', 'learning_objective__code').distinct():
+        tested_lo_codes[row['student_id']][row['topic_id']].add(row['learning_objective__code'])
+
+    # Get total LO counts per topic for coverage calculation
+    topic_ids = {row['topic_id'] for rows in topic_groups.values() for row in rows if row['topic_id']}
+    all_topic_los = defaultdict(list)
+    if topic_ids:
+        for lo in LearningObjective.objects.filter(topic_id__in=topic_ids).values('topic_id', 'code', 'description'):
+            all_topic_los[lo['topic_id']].append({'code': lo['code'], 'description': lo['description']})
 
+    return {
+        student.id: _build_report_card(
+            student, school, date_from, date_to,
+            test_rows[student.id], topic_groups[student.id], lo_groups[student.id],
+            tested_lo_codes[student.id], all_topic_los,
+        )
+        for student in students
+    }
+
+
+def _build_report_card(student, school, date_from, date_to, test_rows, topic_rows, lo_rows,
+                       tested_lo_codes, all_topic_los):
+    """Assemble one student's report card from their pre-grouped fact rows."""
     # ─────────────────────────────────────────────
     # 1. Group by test - basic test performance
     # ─────────────────────────────────────────────
     tests_data = {}
-    for answer in answers:
-        test_id = answer.test.id
-        if test_id not in tests_data:
-            tests_data[test_id] = {
-                'test': answer.test,
-                'subject': answer.test.subject.name if answer.test.subject else 'General',
-                'title': answer.test.title,
-                'date': answer.test.created_at.strftime('%d/%m/%Y'),
-                'answers': [],
-                'total_marks': 0,
-                'earned_marks': 0,
-            }
-
-        tests_data[test_id]['answers'].append(answer)
-        tests_data[test_id]['total_marks'] += float(answer.question.marks or 0)
-        tests_data[test_id]['earned_marks'] += float(answer.marks_awarded or 0)
+    for row in test_rows:
+        tests_data[row['test_id']] = {
+            'subject': row['test__subject__name'] or 'General',
+            'title': row['test__title'],
+            'date': row['test__created_at'].strftime('%d/%m/%Y'),
+            'total_marks': row['total_max'] or 0,
+            'earned_marks': row['total_earned'] or 0,
+        }
 
     tests_list = []
-    subject_summary = {}
+    test_subjects, test_percentages = [], []
     subject_trend = defaultdict(list)  # subject -> [{date, percentage}, ...]
 
     for test_id, data in tests_data.items():
@@ -259,13 +438,8 @@ def report_card_detail(request, student_id):
         tests_list.append(test_info)
 
         # Subject summary
-        if data['subject'] not in subject_summary:
-            subject_summary[data['subject']] = {
-                'test_count': 0,
-                'total_percentage': 0,
-            }
-        subject_summary[data['subject']]['test_count'] += 1
-        subject_summary[data['subject']]['total_percentage'] += percentage
+        test_subjects.append(data['subject'])
+        test_percentages.append(percentage)
 
         # Subject trend (per-subject over time)
         subject_trend[data['subject']].append({
@@ -283,11 +457,11 @@ def report_card_detail(request, student_id):
     # ─────────────────────────────────────────────
     subjects_list = []
     overall_average = 0
-    for subject, summary in subject_summary.items():
-        avg = summary['total_percentage'] / summary['test_count']
+    for subject, summary in stats.section_breakdown(test_percentages, test_subjects).items():
+        avg = summary['mean']
         subjects_list.append({
             'name': subject,
-            'test_count': summary['test_count'],
+            'test_count': summary['count'],
             'average': round(avg, 1),
             'grade': get_letter_grade(avg),
         })
@@ -299,36 +473,20 @@ def report_card_detail(request, student_id):
     # ─────────────────────────────────────────────
     # 3. Topic mastery analysis (with LO coverage)
     # ─────────────────────────────────────────────
-    topic_map = defaultdict(lambda: {
-        'earned': 0.0, 'max': 0.0, 'count': 0, 'subject': '',
-        'topic_id': None, 'grade_id': None, 'subject_id': None,
-        'tested_lo_codes': set(),
-    })
-
-    for answer in answers:
-        topic = answer.question.topic
-        if topic:
-            key = topic.name
-            topic_map[key]['earned'] += float(answer.marks_awarded or 0)
-            topic_map[key]['max'] += float(answer.question.marks or 0)
-            topic_map[key]['count'] += 1
-            topic_map[key]['subject'] = answer.test.subject.name if answer.test.subject else 'General'
-            topic_map[key]['topic_id'] = topic.id
-            topic_map[key]['grade_id'] = topic.grade_id
-            topic_map[key]['subject_id'] = topic.subject_id
-            # Track which LOs have been tested
-            for lo in answer.question.learning_objectives.all():
-                topic_map[key]['tested_lo_codes'].add(lo.code)
-
-    # Get total LO counts per topic for coverage calculation
-    topic_ids = [d['topic_id'] for d in topic_map.values() if d['topic_id']]
-    all_topic_los = defaultdict(list)
-    if topic_ids:
-        for lo in LearningObjective.objects.filter(topic_id__in=topic_ids).values('topic_id', 'code', 'description'):
-            all_topic_los[lo['topic_id']].append({'code': lo['code'], 'description': lo['description']})
+    topic_map = {}
+    for row in topic_rows:
+        topic_map[row['topic_id']] = {
+            'name': row['topic__name'],
+            'earned': row['total_earned'] or 0,
+            'max': row['total_max'] or 0,
+            'count': row['total_attempts'] or 0,
+            'subject': row['topic__subject__name'] or 'General',
+            'topic_id': row['topic_id'],
+            'tested_lo_codes': tested_lo_codes[row['topic_id']],
+        }
 
     topic_mastery = []
-    for topic_name, data in topic_map.items():
+    for data in topic_map.values():
         mastery = round((data['earned'] / data['max']) * 100, 1) if data['max'] > 0 else 0
         band = (
             'Mastered' if mastery >= 80 else
@@ -342,7 +500,7 @@ def report_card_detail(request, student_id):
         untested_los = [lo for lo in total_los if lo['code'] not in tested_codes]
 
         topic_mastery.append({
-            'name': topic_name,
+            'name': data['name'],
             'subject': data['subject'],
             'mastery': mastery,
             'band': band,
@@ -360,22 +518,19 @@ def report_card_detail(request, student_id):
     # ─────────────────────────────────────────────
     # 4. LO mastery analysis (ONLY tested LOs)
     # ─────────────────────────────────────────────
-    lo_map = defaultdict(lambda: {'earned': 0.0, 'max': 0.0, 'count': 0, 'description': '', 'topic': ''})
-
-    for answer in answers:
-        los = answer.question.learning_objectives.all()
-        for lo in los:
-            key = lo.code
-            # Distribute marks equally across LOs
-            lo_share = 1.0 / len(los) if len(los) > 0 else 1.0
-            lo_map[key]['earned'] += float(answer.marks_awarded or 0) * lo_share
-            lo_map[key]['max'] += float(answer.question.marks or 0) * lo_share
-            lo_map[key]['count'] += 1
-            lo_map[key]['description'] = lo.description
-            lo_map[key]['topic'] = lo.topic.name if lo.topic else ''
+    lo_map = {}
+    for row in lo_rows:
+        lo_map[row['learning_objective_id']] = {
+            'code': row['learning_objective__code'],
+            'earned': row['total_earned'] or 0,
+            'max': row['total_max'] or 0,
+            'count': row['total_attempts'] or 0,
+            'description': row['learning_objective__description'],
+            'topic': row['learning_objective__topic__name'] or '',
+        }
 
     lo_mastery = []
-    for lo_code, data in lo_map.items():
+    for data in lo_map.values():
         mastery = round((data['earned'] / data['max']) * 100, 1) if data['max'] > 0 else 0
         band = (
             'Mastered' if mastery >= 80 else
@@ -384,7 +539,7 @@ def report_card_detail(request, student_id):
             'Weak'
         )
         lo_mastery.append({
-            'code': lo_code,
+            'code': data['code'],
             'description': data['description'],
             'topic': data['topic'],
             'mastery': mastery,
@@ -454,8 +609,6 @@ def report_card_detail(request, student_id):
     }
 
     if tests_list:
-        import math
-
         # Signal 1: Overall average (0-100)
         avg = overall_average
         avg_score = min(avg / 100, 1.0)  # normalised 0-1
@@ -463,9 +616,7 @@ def report_card_detail(request, student_id):
         # Signal 2: Consistency (low std dev = more consistent = better)
         percentages = [t['percentage'] for t in tests_list]
         if len(percentages) > 1:
-            mean_p = sum(percentages) / len(percentages)
-            variance = sum((p - mean_p) ** 2 for p in percentages) / len(percentages)
-            std_dev = math.sqrt(variance)
+            std_dev = stats.describe(percentages, ddof=0)['std']
             # Consistency score: std_dev of 0 => 1.0, std_dev >= 30 => 0.0
             consistency_score = max(0, 1.0 - (std_dev / 30.0))
         else:
@@ -648,7 +799,7 @@ def report_card_detail(request, student_id):
         'subject_competence_timeline': dict(subject_competence_timeline),
     }
 
-    return JsonResponse(response_data)
+    return response_data
 
 
 def get_letter_grade(percentage):
@@ -672,6 +823,7 @@ def get_letter_grade(percentage):
 
 
 @login_required
+@use_analytics_replica
 def topic_reissue_suggestions(request):
     """
     Returns JSON with per-topic list of students who are weak and should be
@@ -698,78 +850,66 @@ def topic_reissue_suggestions(request):
     # Get all students in this school/grade
     students = Student.objects.filter(school=school, grade=grade)
 
-    # Get all answers for these students in this subject
-    answer_filter = Q(
+    # Graded mastery facts for these students in this subject
+    facts = MasteryFact.objects.filter(
         student__in=students,
         test__subject=subject,
-        marks_awarded__isnull=False,
     )
     if test_id:
-        answer_filter &= Q(test_id=test_id)
-
-    answers = StudentAnswer.objects.filter(answer_filter).select_related(
-        'student', 'question', 'question__topic'
-    ).prefetch_related('question__learning_objectives')
-
-    # Build per-student, per-topic mastery
-    # Structure: {topic_name: {student_id: {earned, max, tested_los}}}
-    topic_student_map = defaultdict(lambda: defaultdict(lambda: {
-        'earned': 0.0, 'max': 0.0, 'tested_lo_codes': set(),
-        'student_name': '', 'roll_number': '', 'student_id': None,
-    }))
-
-    for answer in answers:
-        topic = answer.question.topic
-        if not topic:
-            continue
-
-        sid = answer.student.id
-        entry = topic_student_map[topic.name][sid]
-        entry['earned'] += float(answer.marks_awarded or 0)
-        entry['max'] += float(answer.question.marks or 0)
-        entry['student_name'] = answer.student.full_name
-        entry['roll_number'] = answer.student.roll_number or ''
-        entry['student_id'] = sid
+        facts = facts.filter(test_id=test_id)
+
+    # Per-topic, per-student mastery and tested-LO counts, grouped in the database.
+    # Topics are reported by name, so same-named topics of other grades merge in.
+    tested_lo_counts = {
+        (row['topic__name'], row['student_id']): row['lo_count']
+        for row in lo_facts(facts).values('topic__name', 'student_id').annotate(
+            lo_count=Count('learning_objective', distinct=True)
+        ).order_by()
+    }
+    topic_groups = aggregate_facts(
+        topic_facts(facts),
+        'topic__name', 'student_id', 'student__full_name', 'student__roll_number',
+    )
 
-        for lo in answer.question.learning_objectives.all():
-            entry['tested_lo_codes'].add(lo.code)
+    # Total LOs per topic of this grade, from the cached subject catalog
+    topic_total_los = {
+        topic['name']: len(topic['los'])
+        for topic in subject_catalog(subject.id).values()
+        if topic['grade_id'] == grade.id
+    }
 
-    # Get total LOs per topic
-    topics = Topic.objects.filter(grade=grade, subject=subject)
-    topic_total_los = {}
-    for topic in topics:
-        lo_count = LearningObjective.objects.filter(topic=topic).count()
-        topic_total_los[topic.name] = lo_count
+    # Weak or Developing (< 60%) students per topic
+    weak_by_topic = defaultdict(list)
+    for row in topic_groups:
+        earned, max_marks = row['total_earned'] or 0, row['total_max'] or 0
+        if max_marks <= 0:
+            continue
+        mastery = round((earned / max_marks) * 100, 1)
+        if mastery >= 60:
+            continue
+        topic_name, sid = row['topic__name'], row['student_id']
+        total_los = topic_total_los.get(topic_name, 0)
+        tested_los = tested_lo_counts.get((topic_name, sid), 0)
+        weak_by_topic[topic_name].append({
+            'id': sid,
+            'name': row['student__full_name'],
+            'roll_number': row['student__roll_number'] or '',
+            'mastery': mastery,
+            'tested_los': tested_los,
+            'total_los': total_los,
+            'lo_coverage': round((tested_los / total_los) * 100, 0) if total_los > 0 else 100,
+        })
 
     # Build suggestions per topic
     suggestions = []
-    for topic_name, student_data in topic_student_map.items():
-        total_los = topic_total_los.get(topic_name, 0)
-        weak_students = []
-
-        for sid, data in student_data.items():
-            if data['max'] <= 0:
-                continue
-            mastery = round((data['earned'] / data['max']) * 100, 1)
-            if mastery < 60:  # Weak or Developing
-                weak_students.append({
-                    'id': data['student_id'],
-                    'name': data['student_name'],
-                    'roll_number': data['roll_number'],
-                    'mastery': mastery,
-                    'tested_los': len(data['tested_lo_codes']),
-                    'total_los': total_los,
-                    'lo_coverage': round((len(data['tested_lo_codes']) / total_los) * 100, 0) if total_los > 0 else 100,
-                })
-
-        if weak_students:
-            weak_students.sort(key=lambda x: x['mastery'])
-            suggestions.append({
-                'topic': topic_name,
-                'total_los': total_los,
-                'weak_student_count': len(weak_students),
-                'students': weak_students,
-            })
+    for topic_name, weak_students in weak_by_topic.items():
+        weak_students.sort(key=lambda x: x['mastery'])
+        suggestions.append({
+            'topic': topic_name,
+            'total_los': topic_total_los.get(topic_name, 0),
+            'weak_student_count': len(weak_students),
+            'students': weak_students,
+        })
 
     suggestions.sort(key=lambda x: x['weak_student_count'], reverse=True)
 
@@ -785,8 +925,8 @@ def topic_reissue_suggestions(request):
 def reissue_dashboard(request):
     """Teacher dashboard for re-issuing topics to weak students."""
     school = request.user.profile.school
-    grades = Grade.objects.all().order_by('name')
-    subjects = Subject.objects.all().order_by('name')
+    grades = get_taxonomy().grade_list()
+    subjects = get_taxonomy().subject_list()
     tests = Test.objects.filter(
         created_by__profile__school=school,
         is_published=True
@@ -844,8 +984,8 @@ def smart_test_generator(request):
     based on weak topics/LOs per student or cohort.
     """
     school = request.user.profile.school
-    grades = Grade.objects.all().order_by('name')
-    subjects = Subject.objects.all().order_by('name')
+    grades = get_taxonomy().grade_list()
+    subjects = get_taxonomy().subject_list()
     cohorts = ClassGroup.objects.filter(school=school).order_by('name')
 
     return render(request, 'teacher/smart_test_generator.html', {
@@ -892,48 +1032,44 @@ def smart_test_analyse(request):
     else:
         students = Student.objects.filter(school=school, grade=grade)
 
-    # Get all answers for these students in this subject
-    answers = StudentAnswer.objects.filter(
-        student__in=students,
-        test__subject=subject,
-        marks_awarded__isnull=False,
-    ).select_related('student', 'question', 'question__topic').prefetch_related(
-        'question__learning_objectives'
-    )
+    # Graded mastery facts for these students in this subject
+    facts = MasteryFact.objects.filter(student__in=students, test__subject=subject)
 
     # Build topic mastery map
-    topic_performance = defaultdict(lambda: {'earned': 0.0, 'max': 0.0, 'count': 0})
-    lo_performance = defaultdict(lambda: {'earned': 0.0, 'max': 0.0, 'count': 0})
-
-    for a in answers:
-        t = a.question.topic
-        if t:
-            topic_performance[t.id]['earned'] += float(a.marks_awarded or 0)
-            topic_performance[t.id]['max'] += float(a.question.marks or 0)
-            topic_performance[t.id]['count'] += 1
-        for lo in a.question.learning_objectives.all():
-            lo_share = 1.0 / len(a.question.learning_objectives.all()) if a.question.learning_objectives.count() > 0 else 1.0
-            lo_performance[lo.id]['earned'] += float(a.marks_awarded or 0) * lo_share
-            lo_performance[lo.id]['max'] += float(a.question.marks or 0) * lo_share
-            lo_performance[lo.id]['count'] += 1
-
-    # Get all topics across same-level grades (e.g. IGCSE-1 sees topics from IGCSE, IGCSE-2 too)
-    topics = Topic.objects.filter(
-        grade__in=same_level_grades, subject=subject
-    ).order_by('name').distinct()
+    topic_performance = {
+        row['topic_id']: {
+            'earned': row['total_earned'] or 0,
+            'max': row['total_max'] or 0,
+            'count': row['total_attempts'] or 0,
+        }
+        for row in aggregate_facts(topic_facts(facts), 'topic_id')
+    }
+    lo_performance = {
+        row['learning_objective_id']: {
+            'earned': row['total_earned'] or 0,
+            'max': row['total_max'] or 0,
+            'count': row['total_attempts'] or 0,
+        }
+        for row in aggregate_facts(lo_facts(facts), 'learning_objective_id')
+    }
+
+    # Topics across same-level grades (e.g. IGCSE-1 sees topics from IGCSE, IGCSE-2 too),
+    # with their LOs and available root-question counts, from the cached catalog
+    same_level_ids = {g.id for g in same_level_grades}
+    catalog = subject_catalog(subject.id)
 
     weak_topics = []
-    for topic in topics:
-        perf = topic_performance.get(topic.id)
+    for topic_id, topic in catalog.items():
+        if topic['grade_id'] not in same_level_ids:
+            continue
+        perf = topic_performance.get(topic_id)
         if perf and perf['max'] > 0:
             mastery = round((perf['earned'] / perf['max']) * 100, 1)
         else:
             mastery = None  # Not tested
 
         # Count available questions across ALL same-level grades for this topic
-        q_count = Question.objects.filter(
-            topic=topic, grade__in=same_level_grades, subject=subject, parent__isnull=True
-        ).count()
+        q_count = question_count(topic, same_level_ids)
 
         band = (
             'Mastered' if mastery is not None and mastery >= 80 else
@@ -943,19 +1079,17 @@ def smart_test_analyse(request):
             'Untested'
         )
 
-        # Get LOs for this topic
-        topic_los = LearningObjective.objects.filter(topic=topic)
         lo_details = []
-        for lo in topic_los:
-            lp = lo_performance.get(lo.id)
+        for lo_id, lo_code, lo_description in topic['los']:
+            lp = lo_performance.get(lo_id)
             if lp and lp['max'] > 0:
                 lo_mastery = round((lp['earned'] / lp['max']) * 100, 1)
             else:
                 lo_mastery = None
             lo_details.append({
-                'id': lo.id,
-                'code': lo.code,
-                'description': lo.description[:80],
+                'id': lo_id,
+                'code': lo_code,
+                'description': lo_description[:80],
                 'mastery': lo_mastery,
                 'band': (
                     'Mastered' if lo_mastery is not None and lo_mastery >= 80 else
@@ -967,8 +1101,8 @@ def smart_test_analyse(request):
             })
 
         weak_topics.append({
-            'id': topic.id,
-            'name': topic.name,
+            'id': topic_id,
+            'name': topic['name'],
             'mastery': mastery,
             'band': band,
             'question_count': q_count,
@@ -1009,6 +1143,8 @@ def smart_test_create(request):
         questions_per_topic: int,      # how many per topic
         student_ids: [int,...],        # students to assign
         include_untested_los: bool,    # prefer questions covering untested LOs
+        difficulty: str,               # optional: easy / medium / hard, or adaptive
+                                       # (matched to the students' calibrated ability)
     }
     """
     import json
@@ -1028,15 +1164,66 @@ def smart_test_create(request):
     questions_per_topic = int(data.get('questions_per_topic', 5))
     student_ids = data.get('student_ids', [])
     include_untested = data.get('include_untested_los', False)
+    difficulty = data.get('difficulty')
 
     if not grade_id or not subject_id or not topic_ids:
         return JsonResponse({'error': 'grade_id, subject_id, and topic_ids are required'}, status=400)
+    try:
+        topic_ids = [int(t) for t in topic_ids]
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'topic_ids must be integers'}, status=400)
+    if difficulty and difficulty != 'adaptive' and difficulty not in DIFFICULTY_BANDS:
+        return JsonResponse({'error': f'Unknown difficulty: {difficulty}'}, status=400)
 
     grade = Grade.objects.filter(id=grade_id).first()
     subject = Subject.objects.filter(id=subject_id).first()
     if not grade or not subject:
         return JsonResponse({'error': 'Invalid grade or subject'}, status=404)
 
+    target_student_ids = (
+        list(Student.objects.filter(id__in=student_ids, school=school).values_list('id', flat=True))
+        if student_ids else []
+    )
+
+    # Target Rasch difficulty (logits); questions at the students' ability are the most informative
+    target_difficulty = None
+    if difficulty == 'adaptive':
+        if target_student_ids:
+            target_difficulty = mean_ability(target_student_ids, subject)
+    elif difficulty:
+        target_difficulty = DIFFICULTY_BANDS[difficulty]
+
+    # Sample from the subject's cached candidate index: root questions across all
+    # same-level grades, skipping those every assigned student already answers well
+    index = candidate_index(subject.id)
+    same_level_ids = [g.id for g in grade.get_same_level_grades()]
+    mastered_ids = mastered_question_ids(target_student_ids, question__subject=subject)
+
+    tested_lo_ids = None
+    if include_untested and target_student_ids:
+        # Find LOs already tested by these students; selection covers the others first
+        tested_lo_ids = set(
+            StudentAnswer.objects.filter(
+                student_id__in=target_student_ids,
+                test__subject=subject,
+                marks_awarded__isnull=False,
+            ).values_list('question__learning_objectives__id', flat=True)
+        )
+
+    def pick(topic_id):
+        rows = candidates(index, [topic_id], same_level_ids, mastered_ids)
+        if tested_lo_ids is not None:
+            rows = cover_los(index, rows, questions_per_topic, tested_lo_ids, target_difficulty)
+        else:
+            rows = sample(index, rows, questions_per_topic, target_difficulty)
+        selected = question_ids(index, rows)
+        if len(selected) < questions_per_topic:
+            # Not enough new material: top up with already-mastered questions
+            extra = candidates(index, [topic_id], same_level_ids, selected)
+            extra = sample(index, extra, questions_per_topic - len(selected), target_difficulty)
+            selected += question_ids(index, extra)
+        return selected
+
     # Create the test
     test = Test.objects.create(
         title=title,
@@ -1046,53 +1233,13 @@ def smart_test_create(request):
         is_published=False,
     )
 
-    # Pull questions from selected topics
-    order = 0
-    total_added = 0
-
-    for topic_id in topic_ids:
-        topic = Topic.objects.filter(id=topic_id).first()
-        if not topic:
-            continue
-
-        # Get available questions across all same-level grades for this topic
-        same_level_grades = grade.get_same_level_grades()
-        qs = Question.objects.filter(
-            topic=topic, grade__in=same_level_grades, subject=subject, parent__isnull=True
-        )
-
-        if include_untested:
-            # If student_ids provided, prefer questions with untested LOs for those students
-            if student_ids:
-                students = Student.objects.filter(id__in=student_ids, school=school)
-                # Find LOs already tested by these students
-                tested_lo_ids = set(
-                    StudentAnswer.objects.filter(
-                        student__in=students,
-                        test__subject=subject,
-                        marks_awarded__isnull=False,
-                    ).values_list('question__learning_objectives__id', flat=True)
-                )
-                # Prefer questions with untested LOs
-                untested_qs = qs.exclude(learning_objectives__id__in=tested_lo_ids)
-                if untested_qs.exists():
-                    selected = list(untested_qs.order_by('?')[:questions_per_topic])
-                else:
-                    selected = list(qs.order_by('?')[:questions_per_topic])
-            else:
-                selected = list(qs.order_by('?')[:questions_per_topic])
-        else:
-            selected = list(qs.order_by('?')[:questions_per_topic])
-
-        for q in selected:
-            order += 1
-            TestQuestion.objects.create(test=test, question=q, order=order)
-            total_added += 1
+    # Pull questions from selected topics, in topic order
+    selected_ids = [question_id for topic_id in topic_ids for question_id in pick(topic_id)]
+    total_added = len(add_questions(test, selected_ids))
 
     # Assign to students
-    if student_ids:
-        valid_students = Student.objects.filter(id__in=student_ids, school=school)
-        test.assigned_students.set(valid_students)
+    if target_student_ids:
+        test.assigned_students.set(target_student_ids)
 
     return JsonResponse({
         'success': True,
@@ -1100,5 +1247,6 @@ def smart_test_create(request):
         'title': test.title,
         'questions_added': total_added,
         'students_assigned': len(student_ids),
+        'target_difficulty': target_difficulty,
         'edit_url': f'/teacher/tests/{test.id}/edit/',
     })
@@ -6,7 +6,8 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
-from .models import Resource, Grade, Subject, School, UserProfile
+from .models import Resource, Grade, School, UserProfile
+from .taxonomy import get_taxonomy
 from .views import get_user_school
 
 
@@ -29,7 +30,7 @@ def resource_list(request):
     if rtype:
         qs = qs.filter(resource_type=rtype)
 
-    subjects = Subject.objects.all().order_by('name')
+    subjects = get_taxonomy().subject_list()
 
     # Check role
     try:
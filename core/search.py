@@ -0,0 +1,223 @@
+"""
+Full-text search over the question library.
+
+Filtering with `question_text__icontains` scans every question's full HTML,
+base64 image payloads included. Instead each Question has a
+QuestionSearchDocument holding just its searchable plain text (and a copy
+of its subject / grade / topic for filtering)
+
+    body      question_text with tags, entities and embedded images removed
+    answer    the markscheme (answer_text), likewise
+    ocr_text  text read from the question's embedded images
+
+and the database indexes those columns: an FTS5 table kept in step by
+triggers on SQLite, a GIN index on their tsvector on PostgreSQL (both created
+in migration 0032). core/signals.py refreshes a question's document when it
+is saved. OCR is slow, so it only runs on save with settings.QUESTION_SEARCH_OCR
+and otherwise through `manage.py rebuild_question_search --ocr`; the stored
+ocr_text is kept until the question's images change.
+
+search_questions() returns ranked hits with highlighted snippets and
+subject / grade / topic facet counts for the whole match set.
+"""
+import hashlib
+import html
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Question, QuestionSearchDocument
+from .similarity import refresh_vectors
+
+FTS_TABLE = 'core_question_fts'
+HIGHLIGHT = ('<mark>', '</mark>')
+# The database marks matches with these private-use characters; highlight()
+# escapes the snippet and only then swaps them for HIGHLIGHT
+MATCH_MARKERS = ('\ue000', '\ue001')
+SNIPPET_WORDS = 16
+FACET_COLUMNS = ('subject_id', 'grade_id', 'topic_id')
+
+_IMG_RE = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+_DATA_URI_RE = re.compile(r'data:image/[^;]+;base64,[A-Za-z0-9+/=\s]+')
+_BLOCK_END_RE = re.compile(r'<br\s*/?>|</(?:p|div|li|tr|td|th|h\d)>', re.IGNORECASE)
+_TAG_RE = re.compile(r'<[^>]+>')
+_SPACE_RE = re.compile(r'\s+')
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def plain_text(markup):
+    """Visible text of a question's HTML, without tags or image payloads."""
+    if not markup:
+        return ''
+    text = _IMG_RE.sub(' ', markup)
+    text = _DATA_URI_RE.sub(' ', text)
+    text = _BLOCK_END_RE.sub(' ', text)
+    text = html.unescape(_TAG_RE.sub(' ', text))
+    return _SPACE_RE.sub(' ', text).strip()
+
+
+def image_digest(markup):
+    """Fingerprint of the images embedded in `markup` ('' when there are none)."""
+    images = _DATA_URI_RE.findall(markup or '')
+    if not images:
+        return ''
+    digest = hashlib.sha256()
+    for image in images:
+        digest.update(image.encode())
+    return digest.hexdigest()
+
+
+def extract_image_text(markup):
+    from .ai_tagging_improved import ImageTextExtractor
+    return ImageTextExtractor.extract_from_html(markup)
+
+
+# ── Keeping documents in sync ────────────────────────────────────────────────
+
+def build_document(question, existing=None, ocr=False):
+    """A QuestionSearchDocument for `question`, reusing `existing`'s OCR text while its images are unchanged."""
+    digest = image_digest(question.question_text)
+    if ocr and digest:
+        ocr_text = extract_image_text(question.question_text)
+    elif existing is not None and existing.image_digest == digest:
+        ocr_text = existing.ocr_text
+    else:
+        ocr_text = ''
+    return QuestionSearchDocument(
+        question_id=question.pk,
+        subject_id=question.subject_id,
+        grade_id=question.grade_id,
+        topic_id=question.topic_id,
+        body=plain_text(question.question_text),
+        answer=plain_text(question.answer_text),
+        ocr_text=ocr_text,
+        image_digest=digest,
+    )
+
+
+def index_question(question, ocr=None):
+    """Create or refresh one question's search document."""
+    ocr = settings.QUESTION_SEARCH_OCR if ocr is None else ocr
+    existing = QuestionSearchDocument.objects.filter(question_id=question.pk).first()
+    images_changed = existing is None or existing.image_digest != image_digest(question.question_text)
+    document = build_document(question, existing, ocr=ocr and images_changed)
+    document.save(force_insert=existing is None)
+
+
+def rebuild_index(questions=None, ocr=False, batch_size=500, stdout=None):
+    """(Re)build the documents of `questions` (default: all); returns how many were written."""
+    questions = Question.objects.all() if questions is None else questions
+    ids = list(questions.order_by('id').values_list('id', flat=True))
+    written = 0
+    for start in range(0, len(ids), batch_size):
+        batch_ids = ids[start:start + batch_size]
+        existing = QuestionSearchDocument.objects.in_bulk(batch_ids)
+        documents = [
+            build_document(q, existing.get(q.pk), ocr=ocr)
+            for q in Question.objects.filter(id__in=batch_ids).only(
+                'id', 'subject_id', 'grade_id', 'topic_id', 'question_text', 'answer_text'
+            )
+        ]
+        with transaction.atomic():
+            QuestionSearchDocument.objects.filter(question_id__in=batch_ids).delete()
+            QuestionSearchDocument.objects.bulk_create(documents, batch_size=batch_size)
+        # Bulk writes skip the signals that keep similarity vectors current
+        refresh_vectors(batch_ids)
+        written += len(documents)
+        if stdout is not None:
+            stdout.write(f'  {written}/{len(ids)} questions indexed')
+    return written
+
+
+# ── Querying ────────────────────────────────────────────────────────────────
+
+def search_terms(query):
+    """Words of a user's search box input (operators and punctuation dropped)."""
+    return _TERM_RE.findall(query or '')
+
+
+def _match_sql(terms):
+    """
+    (FROM/WHERE fragment, params, rank expression, snippet expression) matching
+    every term, the last one as a prefix so results follow the user's typing.
+    """
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{t}:*' if i == len(terms) - 1 else t for i, t in enumerate(terms))
+        vector = "to_tsvector('english', d.body || ' ' || d.answer || ' ' || d.ocr_text)"
+        source = f"core_questionsearchdocument d, to_tsquery('english', %s) query WHERE {vector} @@ query"
+        rank = f'-ts_rank({vector}, query)'  # ascending like bm25()
+        snippet = (
+            "ts_headline('english', d.body || ' ' || d.ocr_text, query, "
+            f"'StartSel={MATCH_MARKERS[0]}, StopSel={MATCH_MARKERS[1]}, MaxWords={SNIPPET_WORDS}, MinWords=5')"
+        )
+        return source, [tsquery], rank, snippet
+
+    match = ' '.join(f'"{t}"' for t in terms[:-1])
+    match = f'{match} "{terms[-1]}"*'.strip()
+    source = (
+        f'{FTS_TABLE} JOIN core_questionsearchdocument d ON d.question_id = {FTS_TABLE}.rowid '
+        f'WHERE {FTS_TABLE} MATCH %s'
+    )
+    rank = f'bm25({FTS_TABLE}, 1.0, 0.4, 0.6)'  # question text outranks markscheme / OCR hits
+    snippet = f"snippet({FTS_TABLE}, -1, '{MATCH_MARKERS[0]}', '{MATCH_MARKERS[1]}', '…', {SNIPPET_WORDS})"
+    return source, [match], rank, snippet
+
+
+def highlight(snippet):
+    """HTML for a database snippet: its text escaped, the matched words in HIGHLIGHT tags."""
+    text = html.escape(snippet or '')
+    return text.replace(MATCH_MARKERS[0], HIGHLIGHT[0]).replace(MATCH_MARKERS[1], HIGHLIGHT[1])
+
+
+def search_questions(query, subject_id=None, grade_id=None, topic_id=None, limit=50, after=None):
+    """
+    Questions matching every word of `query`, best first:
+
+        {'hits': [(question_id, rank, highlight), ...],
+         'total': matches, 'facets': {'subject': {id: n}, 'grade': {...}, 'topic': {...}}}
+
+    Facets count the matches within the other filters, so each one shows what
+    changing that filter would find. `after` - the (rank, question_id) of the
+    last hit already shown - continues the listing from there.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return {'hits': [], 'total': 0, 'facets': {'subject': {}, 'grade': {}, 'topic': {}}}
+
+    source, params, rank, snippet = _match_sql(terms)
+    filters = {'subject_id': subject_id, 'grade_id': grade_id, 'topic_id': topic_id}
+    filters = {column: int(value) for column, value in filters.items() if value}
+
+    extra = ''.join(f' AND d.{c} = %s' for c in filters)
+    extra_params = list(filters.values())
+    page, page_params = '', []
+    if after is not None:
+        page = f' AND ({rank} > %s OR ({rank} = %s AND d.question_id > %s))'
+        page_params = [after[0], after[0], after[1]]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT d.question_id, {rank}, {snippet} FROM {source}{extra}{page} ORDER BY 2, d.question_id LIMIT %s',
+            params + extra_params + page_params + [limit],
+        )
+        hits = [(pk, score, highlight(snippet)) for pk, score, snippet in cursor.fetchall()]
+
+        # One grouped pass over the match set gives every facet: rows outside
+        # a single filter still count towards that filter's own facet
+        cursor.execute(
+            f'SELECT d.subject_id, d.grade_id, d.topic_id, COUNT(*) FROM {source} GROUP BY 1, 2, 3', params,
+        )
+        facets = {'subject': Counter(), 'grade': Counter(), 'topic': Counter()}
+        total = 0
+        for *row, n in cursor.fetchall():
+            values = dict(zip(FACET_COLUMNS, row))
+            misses = [c for c, v in filters.items() if values[c] != v]
+            if not misses:
+                total += n
+            for column in FACET_COLUMNS:
+                if not misses or misses == [column]:
+                    facets[column[:-3]][values[column]] += n
+
+    return {'hits': hits, 'total': total, 'facets': {k: dict(v) for k, v in facets.items()}}
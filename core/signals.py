@@ -0,0 +1,319 @@
+"""
+Model signal handlers that keep derived analytics tables and caches in sync.
+Connected from CoreConfig.ready().
+
+Derived tables are refreshed before cache versions are bumped, so a request
+racing the commit can't cache stale rows under the new version.
+"""
+from django.db import transaction
+from django.db.models import DEFERRED
+from django.db.models.signals import post_init, pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import (
+    StudentAnswer, Question, Test, TestQuestion, StudentTestResult, Topic, LearningObjective,
+    Grade, Subject,
+)
+from .analytics.mastery import refresh_mastery_facts
+from .analytics.cache import bump_versions_on_commit, queue_on_commit
+from .analytics.rollups import refresh_attempts_on_commit, refresh_student_test_result, refresh_test_results
+from .taxonomy import bump_taxonomy_version
+from .question_tree import refresh_total_marks, refresh_total_marks_on_commit, sync_tree_position, tree_id
+from .search import index_question
+from .question_preview import update_preview
+from .duplicates import fingerprint_question
+from .question_counters import COUNTER_FIELDS, refresh_counters, refresh_tagging, refresh_usage_counts
+from .similarity import refresh_vectors
+
+
+@receiver(post_init, sender=StudentAnswer)
+def remember_loaded_marks(sender, instance, **kwargs):
+    """Snapshot marks so post_save can skip saves that don't touch grading (e.g. autosave)."""
+    # Read __dict__ so answers loaded with .only(...) don't trigger a deferred-field query
+    instance._loaded_marks_awarded = instance.__dict__.get('marks_awarded', DEFERRED)
+
+
+@receiver(post_save, sender=StudentAnswer)
+def update_analytics_on_answer_save(sender, instance, created, **kwargs):
+    marks_changed = instance.marks_awarded != instance._loaded_marks_awarded
+    if created:
+        # post_init saw the constructor's marks, so compare against "ungraded"
+        marks_changed = instance.marks_awarded is not None
+    if not marks_changed:
+        # Ungraded answers reach the rollups when submit_test refreshes the attempt
+        return
+    instance._loaded_marks_awarded = instance.marks_awarded
+    refresh_attempts_on_commit([(instance.student_id, instance.test_id)], marks_changed=True)
+
+
+@receiver(post_delete, sender=StudentAnswer)
+def update_analytics_on_answer_delete(sender, instance, **kwargs):
+    refresh_attempts_on_commit(
+        [(instance.student_id, instance.test_id)], marks_changed=instance.marks_awarded is not None
+    )
+
+
+@receiver(post_init, sender=Test)
+def remember_loaded_subject(sender, instance, **kwargs):
+    # Read __dict__ so tests loaded with .only(...) don't trigger a deferred-field query
+    instance._loaded_subject_id = instance.__dict__.get('subject_id', DEFERRED)
+
+
+@receiver(post_save, sender=Test)
+def update_rollups_on_subject_change(sender, instance, created, **kwargs):
+    if created or instance.subject_id == instance._loaded_subject_id:
+        return
+    instance._loaded_subject_id = instance.subject_id
+    test_id = instance.pk
+
+    def refresh():
+        refresh_test_results(test_id)
+        bump_versions_on_commit(
+            tests=[test_id],
+            students=StudentTestResult.objects.filter(test_id=test_id).values_list('student_id', flat=True),
+        )
+
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=TestQuestion)
+@receiver(post_delete, sender=TestQuestion)
+def update_analytics_on_test_questions_change(sender, instance, **kwargs):
+    bump_versions_on_commit(tests=[instance.test_id])
+
+
+def _refresh_rescored(items):
+    question_ids = {question_id for question_id, _ in items}
+    rescored_ids = {question_id for question_id, marks_changed in items if marks_changed}
+    answered = StudentAnswer.objects.filter(question_id__in=question_ids)
+    attempts = set(answered.values_list('student_id', 'test_id'))
+    for student_id, test_id in attempts:
+        refresh_mastery_facts(student_id, test_id)
+    for student_id, test_id in set(
+        answered.filter(question_id__in=rescored_ids).values_list('student_id', 'test_id')
+    ):
+        refresh_student_test_result(student_id, test_id)
+
+    test_ids = set(
+        TestQuestion.objects.filter(question_id__in=question_ids).values_list('test_id', flat=True)
+    )
+    bump_versions_on_commit(
+        tests=test_ids | {t for _, t in attempts},
+        students={s for s, _ in attempts},
+        # Question samplers index LO tags per subject
+        subjects=Question.objects.filter(id__in=question_ids).values_list('subject_id', flat=True),
+    )
+
+
+def _question_scoring_changed(question_ids, marks_changed=False):
+    """Rebuild the mastery facts (and, after a marks change, attempt rollups) answering these questions, on commit."""
+    queue_on_commit(
+        'rescored_questions',
+        {(question_id, marks_changed) for question_id in question_ids},
+        _refresh_rescored,
+    )
+
+
+SCORING_FIELDS = ('topic_id', 'marks')
+
+
+@receiver(post_init, sender=Question)
+def remember_loaded_scoring(sender, instance, **kwargs):
+    instance._loaded_scoring = tuple(instance.__dict__.get(f, DEFERRED) for f in SCORING_FIELDS)
+
+
+@receiver(post_save, sender=Question)
+def update_analytics_on_rescoring(sender, instance, created, **kwargs):
+    # Facts are filed under the question's topic and weighted by its marks
+    scoring = tuple(instance.__dict__.get(f, DEFERRED) for f in SCORING_FIELDS)
+    loaded, instance._loaded_scoring = instance._loaded_scoring, scoring
+    changed = scoring != loaded
+    if created or not changed:
+        return
+    if StudentAnswer.objects.filter(question_id=instance.pk, marks_awarded__isnull=False).exists():
+        _question_scoring_changed([instance.pk], marks_changed=scoring[1] != loaded[1])
+
+
+# ── Question bank catalog (core/analytics/catalog.py) ───────────────────────
+
+CATALOG_FIELDS = ('subject_id', 'topic_id', 'grade_id', 'parent_id')
+
+
+def _bump_subjects(*subject_ids):
+    bump_versions_on_commit(subjects=subject_ids)
+
+
+@receiver(post_init, sender=Question)
+def remember_loaded_placement(sender, instance, **kwargs):
+    # Read __dict__ so questions loaded with .only(...) don't trigger deferred-field queries
+    instance._loaded_placement = tuple(instance.__dict__.get(f, DEFERRED) for f in CATALOG_FIELDS)
+
+
+@receiver(post_save, sender=Question)
+def update_catalog_on_question_save(sender, instance, created, **kwargs):
+    placement = tuple(instance.__dict__.get(f, DEFERRED) for f in CATALOG_FIELDS)
+    if not created and placement == instance._loaded_placement:
+        return
+    subject_ids = {placement[0], instance._loaded_placement[0]} - {DEFERRED}
+    instance._loaded_placement = placement
+    _bump_subjects(*subject_ids)
+
+
+@receiver(post_delete, sender=Question)
+def update_catalog_on_question_delete(sender, instance, **kwargs):
+    _bump_subjects(instance.subject_id)
+
+
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+def update_catalog_on_topic_change(sender, instance, **kwargs):
+    _bump_subjects(instance.subject_id)
+
+
+@receiver(post_save, sender=LearningObjective)
+@receiver(post_delete, sender=LearningObjective)
+def update_catalog_on_lo_change(sender, instance, **kwargs):
+    # The catalog files LOs under their topic's subject, which is normally the LO's own
+    topic_subject_id = Topic.objects.filter(id=instance.topic_id).values_list('subject_id', flat=True).first()
+    _bump_subjects(instance.subject_id, topic_subject_id)
+
+
+# ── Question trees (core/question_tree.py) ──────────────────────────────────
+
+@receiver(post_init, sender=Question)
+def remember_loaded_tree(sender, instance, **kwargs):
+    instance._loaded_parent_id = instance.__dict__.get('parent_id', DEFERRED)
+
+
+@receiver(post_save, sender=Question)
+def update_tree_on_question_save(sender, instance, created, update_fields=None, **kwargs):
+    moved = instance._loaded_parent_id is not DEFERRED and instance.parent_id != instance._loaded_parent_id
+    if created or moved or not instance.__dict__.get('path', True):
+        sync_tree_position(instance)
+    elif 'total_marks' in instance.__dict__ and (
+        update_fields is None or {'marks', 'total_marks'} & set(update_fields)
+    ):
+        # Also after saves that didn't change marks: the instance may have been
+        # loaded before its sub-questions changed and just wrote a stale total
+        refresh_total_marks(tree_id(instance), instance)
+    instance._loaded_parent_id = instance.parent_id
+
+
+@receiver(post_delete, sender=Question)
+def update_tree_on_question_delete(sender, instance, **kwargs):
+    # Deleting a root cascades to its whole tree, leaving nothing to refresh
+    if instance.root_id:
+        refresh_total_marks_on_commit(instance.root_id)
+
+
+# ── Listing previews (core/question_preview.py) ─────────────────────────────
+
+@receiver(pre_save, sender=Question)
+def update_preview_on_question_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'question_text' not in update_fields:
+        return
+    if 'question_text' in instance.__dict__:
+        update_preview(instance)
+
+
+# ── Per-question indexes (core/search.py, duplicates.py, similarity.py) ────
+
+INDEXED_FIELDS = {'question_text', 'answer_text', 'subject', 'grade', 'topic', 'parent'}
+
+
+def _refresh_question_indexes(items):
+    """
+    Refresh the indexes of the queued (question_id, text_changed) items, in
+    dependency order: search documents and fingerprints of the saved
+    questions, then the similarity vectors, which are built from the search
+    documents and LO tags.
+    """
+    saved_ids = {question_id for question_id, text_changed in items if text_changed}
+    for question in Question.objects.filter(id__in=saved_ids).only(
+        'id', 'subject_id', 'grade_id', 'topic_id', 'parent_id', 'question_text', 'answer_text'
+    ):
+        index_question(question)
+        fingerprint_question(question)
+    refresh_vectors({question_id for question_id, _ in items})
+
+
+def _question_indexes_changed(question_ids, text_changed=False):
+    """Refresh the indexes of these questions once, on commit; retags (text_changed=False) only touch the vectors."""
+    queue_on_commit(
+        'question_indexes',
+        {(question_id, text_changed) for question_id in question_ids},
+        _refresh_question_indexes,
+    )
+
+
+@receiver(post_save, sender=Question)
+def update_indexes_on_question_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not INDEXED_FIELDS & set(update_fields):
+        return
+    _question_indexes_changed([instance.pk], text_changed=True)
+
+
+# ── Question bank counters (core/question_counters.py) ──────────────────────
+
+@receiver(post_save, sender=Question)
+def update_counters_on_question_save(sender, instance, created, update_fields=None, **kwargs):
+    # A full save writes back the counters the instance was loaded with
+    # (possibly stale) and a topic change alters is_fully_tagged
+    if created:
+        return
+    if update_fields is not None and not {'topic', *COUNTER_FIELDS} & set(update_fields):
+        return
+    refresh_counters([instance.pk], instance)
+
+
+@receiver(post_init, sender=TestQuestion)
+def remember_loaded_question(sender, instance, **kwargs):
+    instance._loaded_question_id = instance.__dict__.get('question_id', DEFERRED)
+
+
+@receiver(post_save, sender=TestQuestion)
+def update_usage_on_test_question_save(sender, instance, created, **kwargs):
+    if created or instance.question_id != instance._loaded_question_id:
+        refresh_usage_counts({instance.question_id, instance._loaded_question_id} - {DEFERRED, None})
+    instance._loaded_question_id = instance.question_id
+
+
+@receiver(post_delete, sender=TestQuestion)
+def update_usage_on_test_question_delete(sender, instance, **kwargs):
+    refresh_usage_counts([instance.question_id])
+
+
+# ── LO tagging ──────────────────────────────────────────────────────────────
+
+@receiver(m2m_changed, sender=Question.learning_objectives.through)
+def update_on_retag(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # lo.questions.clear() doesn't say which questions lost the LO
+        instance._cleared_question_ids = list(instance.questions.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        question_ids = [instance.pk]
+    elif pk_set is not None:
+        # lo.questions.add(...) — instance is the LO, pk_set holds question ids
+        question_ids = pk_set
+    else:
+        question_ids = instance.__dict__.pop('_cleared_question_ids', [])
+    _question_scoring_changed(question_ids)
+    refresh_tagging(question_ids)
+    _question_indexes_changed(question_ids)
+
+
+# ── Curriculum taxonomy cache (core/taxonomy.py) ────────────────────────────
+
+@receiver(post_save, sender=Grade)
+@receiver(post_delete, sender=Grade)
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+@receiver(post_save, sender=LearningObjective)
+@receiver(post_delete, sender=LearningObjective)
+def update_taxonomy_on_change(sender, instance, **kwargs):
+    transaction.on_commit(bump_taxonomy_version)
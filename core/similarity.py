@@ -0,0 +1,374 @@
+"""
+"Similar questions" for the test editor, found with local vectors: no model
+service, no network.
+
+Each top-level question gets a QuestionVector: a DIMENSIONS-long float32
+TF-IDF vector of
+
+    body / ocr_text   word unigrams and bigrams of its search document
+                      (core/search.py), OCR words at OCR_WEIGHT
+    topic, LOs        one token each (TAG_WEIGHT), so questions tagged alike
+                      sit closer than their wording alone would put them
+
+folded into DIMENSIONS with the signed hashing trick (no vocabulary to keep),
+IDF-weighted by document frequencies over HASH_BUCKETS term hashes and
+L2-normalised, so a dot product is the cosine similarity. core/signals.py
+re-vectorises a question when its text, topic or LOs change.
+
+The rows live in the database so every process sees every write, but a
+query never reads them all: `python manage.py rebuild_question_similarity`
+recomputes the document frequencies and vectors and writes a snapshot to
+settings.QUESTION_SIMILARITY_DIR
+
+    vectors.npy   (n, DIMENSIONS) float32, memory-mapped by each process
+    ids.npy       question id of each row, ascending
+    subjects.npy  subject id of each row
+    df.npy        document frequency of each term hash
+    meta.json     document count and the time the rows were read
+
+Processes then only fetch the QuestionVector rows updated since the
+snapshot (rechecked at most every SIMILARITY_CHECK_INTERVAL seconds) and
+score those alongside it, so a query is one matrix-vector product over
+mapped memory. Without a snapshot every row counts as updated, which is
+fine for a small bank; bulk writes that skip the signals (rebuild_index,
+bundle imports) call refresh_vectors() themselves.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Question, QuestionSearchDocument, QuestionVector
+
+LO_LINKS = Question.learning_objectives.through
+
+DIMENSIONS = 256               # signed hashing keeps dot products unbiased; more dims, less noise
+HASH_BUCKETS = 1 << 20         # term hashes document frequencies are kept for
+OCR_WEIGHT = 0.5               # OCR output is noisier than typed text
+TAG_WEIGHT = 1.5               # a word used once weighs log(2) ~ 0.7
+MIN_WORD_LENGTH = 2
+
+# Rows written by transactions still open while a snapshot was read carry
+# earlier timestamps; processes keep refetching them this long afterwards
+SNAPSHOT_OVERLAP = timedelta(hours=1)
+CURRENT_FILE = 'CURRENT'
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+# ── Vectors ─────────────────────────────────────────────────────────────────
+
+def _words(text):
+    return [w for w in _WORD_RE.findall((text or '').lower()) if len(w) >= MIN_WORD_LENGTH]
+
+
+def question_terms(body, ocr_text, topic_id, lo_ids):
+    """(term hashes, weights before IDF) of one question's features."""
+    terms = Counter()
+    words = _words(body)
+    terms.update(words)
+    terms.update(f'{a} {b}' for a, b in zip(words, words[1:]))
+    for word in _words(ocr_text):
+        terms[word] += OCR_WEIGHT
+    tags = [f'lo:{lo_id}' for lo_id in lo_ids]
+    if topic_id:
+        tags.append(f'topic:{topic_id}')
+
+    hashes = np.fromiter(
+        (zlib.crc32(term.encode()) for term in [*terms, *tags]), dtype=np.uint32, count=len(terms) + len(tags)
+    )
+    weights = np.concatenate([
+        np.log1p(np.fromiter(terms.values(), dtype=np.float32, count=len(terms))),
+        np.full(len(tags), TAG_WEIGHT, dtype=np.float32),
+    ])
+    return hashes, weights
+
+
+def idf_weights(df, documents):
+    """Smoothed inverse document frequency per term hash (all ones without statistics)."""
+    if df is None:
+        return None
+    return (np.log((1 + documents) / (1 + df.astype(np.float32))) + 1).astype(np.float32)
+
+
+def vectorize(hashes, weights, idf=None):
+    """Unit-length DIMENSIONS vector of hashed terms (zeros for a question without any)."""
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    if not len(hashes):
+        return vector
+    if idf is not None:
+        weights = weights * idf[hashes & (HASH_BUCKETS - 1)]
+    # Bucket, dimension and sign come from disjoint bits of the hash
+    dims = (hashes >> 20) % DIMENSIONS
+    signs = np.where(hashes >> 31, -1, 1).astype(np.float32)
+    np.add.at(vector, dims, signs * weights)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _question_batch(question_ids):
+    """[(question_id, subject_id, terms), ...] of the top-level questions among `question_ids`."""
+    documents = {
+        row[0]: row[1:] for row in QuestionSearchDocument.objects.filter(
+            question_id__in=question_ids, question__parent__isnull=True
+        ).values_list('question_id', 'subject_id', 'topic_id', 'body', 'ocr_text')
+    }
+    lo_ids = {}
+    for question_id, lo_id in LO_LINKS.objects.filter(question_id__in=list(documents)).values_list(
+        'question_id', 'learningobjective_id'
+    ):
+        lo_ids.setdefault(question_id, []).append(lo_id)
+    return [
+        (question_id, subject_id, question_terms(body, ocr_text, topic_id, sorted(lo_ids.get(question_id, []))))
+        for question_id, (subject_id, topic_id, body, ocr_text) in sorted(documents.items())
+    ]
+
+
+def refresh_vectors(question_ids):
+    """Recompute the vectors of `question_ids` (dropping those of sub-questions) with the snapshot's IDF."""
+    question_ids = list(question_ids)
+    if not question_ids:
+        return
+    idf = (_state['index'] or get_index()).idf
+    rows = [
+        QuestionVector(question_id=question_id, subject_id=subject_id, vector=vectorize(*terms, idf).tobytes())
+        for question_id, subject_id, terms in _question_batch(question_ids)
+    ]
+    with transaction.atomic():
+        QuestionVector.objects.filter(question_id__in=question_ids).delete()
+        QuestionVector.objects.bulk_create(rows)
+    # This process sees its own writes on its next query
+    _state['checked_at'] = 0.0
+
+
+# ── Snapshots ────────────────────────────────────────────────────────────────
+
+def _directory():
+    return settings.QUESTION_SIMILARITY_DIR
+
+
+def rebuild(batch_size=1000, stdout=None):
+    """Recompute document frequencies and every vector, then write a new snapshot; returns how many."""
+    ids = list(
+        QuestionSearchDocument.objects.filter(question__parent__isnull=True)
+        .order_by('question_id').values_list('question_id', flat=True)
+    )
+    batches = [ids[start:start + batch_size] for start in range(0, len(ids), batch_size)]
+
+    # Pass 1: how many questions use each term
+    df = np.zeros(HASH_BUCKETS, dtype=np.int32)
+    for batch in batches:
+        for _, _, (hashes, _) in _question_batch(batch):
+            df[np.unique(hashes & (HASH_BUCKETS - 1))] += 1
+    idf = idf_weights(df, len(ids))
+
+    # Pass 2: vectors into the database and a new snapshot directory
+    built_at = timezone.now() - SNAPSHOT_OVERLAP
+    name = f'snapshot-{time.time_ns()}'
+    path = _directory() / name
+    path.mkdir(parents=True)
+    vectors = np.lib.format.open_memmap(path / 'vectors.npy', mode='w+', dtype=np.float32, shape=(len(ids), DIMENSIONS))
+    subjects = np.zeros(len(ids), dtype=np.int64)
+    written = 0
+    for batch in batches:
+        rows = []
+        # Questions deleted since the id list was read keep a zero row
+        for question_id, subject_id, terms in _question_batch(batch):
+            row = ids.index(question_id, written)
+            vectors[row] = vectorize(*terms, idf)
+            subjects[row] = subject_id
+            rows.append(QuestionVector(question_id=question_id, subject_id=subject_id, vector=vectors[row].tobytes()))
+        with transaction.atomic():
+            QuestionVector.objects.filter(question_id__in=batch).delete()
+            QuestionVector.objects.bulk_create(rows)
+            # Dated before the snapshot, which holds them, so no process refetches them
+            QuestionVector.objects.filter(question_id__in=[r.question_id for r in rows]).update(
+                updated_at=built_at - timedelta(seconds=1)
+            )
+        written += len(batch)
+        if stdout is not None:
+            stdout.write(f'  {written}/{len(ids)} questions vectorised')
+    vectors.flush()
+    del vectors
+    np.save(path / 'ids.npy', np.array(ids, dtype=np.int64))
+    np.save(path / 'subjects.npy', subjects)
+    np.save(path / 'df.npy', df)
+    (path / 'meta.json').write_text(json.dumps({
+        'documents': len(ids), 'dimensions': DIMENSIONS, 'built_at': built_at.isoformat(),
+    }))
+
+    # Switch readers over atomically, then drop older snapshots (open maps keep their files)
+    pointer = _directory() / f'{CURRENT_FILE}.tmp'
+    pointer.write_text(name)
+    os.replace(pointer, _directory() / CURRENT_FILE)
+    for old in _directory().glob('snapshot-*'):
+        if old.name != name:
+            shutil.rmtree(old, ignore_errors=True)
+    _state['checked_at'] = 0.0
+    return len(ids)
+
+
+class Snapshot:
+    """One snapshot directory, memory-mapped."""
+
+    def __init__(self, path):
+        self.name = path.name
+        meta = json.loads((path / 'meta.json').read_text())
+        self.built_at = parse_datetime(meta['built_at'])
+        self.vectors = np.load(path / 'vectors.npy', mmap_mode='r')
+        self.ids = np.load(path / 'ids.npy')
+        self.subjects = np.load(path / 'subjects.npy')
+        self.idf = idf_weights(np.load(path / 'df.npy'), meta['documents'])
+        if self.vectors.shape[1] != DIMENSIONS:
+            raise ValueError(f'{path} holds {self.vectors.shape[1]}-dimensional vectors, expected {DIMENSIONS}')
+
+    def row_of(self, question_id):
+        row = np.searchsorted(self.ids, question_id)
+        return row if row < len(self.ids) and self.ids[row] == question_id else None
+
+
+def load_snapshot():
+    """The current Snapshot, or None before the first rebuild."""
+    try:
+        name = (_directory() / CURRENT_FILE).read_text().strip()
+        return Snapshot(_directory() / name)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+# ── Queries ──────────────────────────────────────────────────────────────────
+
+class SimilarityIndex:
+    """A snapshot plus the vectors written since, as this process last saw them."""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.idf = snapshot.idf if snapshot else None
+        self.delta_state = None
+        self.delta_ids = np.zeros(0, dtype=np.int64)
+        self.delta_subjects = np.zeros(0, dtype=np.int64)
+        self.delta_vectors = np.zeros((0, DIMENSIONS), dtype=np.float32)
+        self.superseded = None
+
+    def _updated(self):
+        rows = QuestionVector.objects.using(DEFAULT_DB_ALIAS)
+        if self.snapshot is not None:
+            rows = rows.filter(updated_at__gte=self.snapshot.built_at)
+        return rows
+
+    def refresh(self):
+        """Refetch the rows updated since the snapshot if they changed since the last check."""
+        updated = self._updated()
+        state = updated.aggregate(n=Count('pk'), latest=Max('updated_at'))
+        if state == self.delta_state:
+            return
+        rows = list(updated.order_by('question_id').values_list('question_id', 'subject_id', 'vector'))
+        self.delta_ids = np.array([r[0] for r in rows], dtype=np.int64)
+        self.delta_subjects = np.array([r[1] for r in rows], dtype=np.int64)
+        self.delta_vectors = (
+            np.frombuffer(b''.join(bytes(r[2]) for r in rows), dtype=np.float32).reshape(len(rows), DIMENSIONS)
+        )
+        self.superseded = np.isin(self.snapshot.ids, self.delta_ids) if self.snapshot is not None else None
+        self.delta_state = state
+
+    def vector_of(self, question_id):
+        row = np.searchsorted(self.delta_ids, question_id)
+        if row < len(self.delta_ids) and self.delta_ids[row] == question_id:
+            return self.delta_vectors[row]
+        if self.snapshot is not None:
+            row = self.snapshot.row_of(question_id)
+            if row is not None:
+                return np.asarray(self.snapshot.vectors[row])
+        return None
+
+    def _scored(self, vectors, ids, subjects, vector, subject_id, exclude, mask=None):
+        scores = vectors @ vector
+        drop = np.isin(ids, exclude)
+        if subject_id is not None:
+            drop |= subjects != subject_id
+        if mask is not None:
+            drop |= mask
+        scores[drop] = -np.inf
+        return scores
+
+    def nearest(self, vector, limit, subject_id=None, exclude=()):
+        """[(question_id, score), ...] of the `limit` rows closest to `vector`, best first."""
+        exclude = np.array(list(exclude), dtype=np.int64)
+        parts = [(
+            self.delta_ids,
+            self._scored(self.delta_vectors, self.delta_ids, self.delta_subjects, vector, subject_id, exclude),
+        )]
+        if self.snapshot is not None:
+            parts.append((self.snapshot.ids, self._scored(
+                self.snapshot.vectors, self.snapshot.ids, self.snapshot.subjects, vector, subject_id, exclude,
+                self.superseded,
+            )))
+        ids = np.concatenate([p[0] for p in parts])
+        scores = np.concatenate([p[1] for p in parts])
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit)[:limit]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.lexsort((ids[top], -scores[top]))]
+        return [(int(ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+
+_lock = threading.Lock()
+_state = {'index': None, 'checked_at': 0.0}
+
+
+def get_index():
+    """This process's SimilarityIndex, switched to a new snapshot and refreshed as needed."""
+    now = time.monotonic()
+    if _state['index'] is not None and now - _state['checked_at'] < settings.SIMILARITY_CHECK_INTERVAL:
+        return _state['index']
+    with _lock:
+        index = _state['index']
+        try:
+            current = (_directory() / CURRENT_FILE).read_text().strip()
+        except OSError:
+            current = None
+        if index is None or (index.snapshot.name if index.snapshot else None) != current:
+            index = SimilarityIndex(load_snapshot())
+        index.refresh()
+        _state['index'] = index
+        _state['checked_at'] = now
+        return index
+
+
+def similar_questions(question_id, k=10, subject_id=None, exclude=()):
+    """
+    [(question_id, similarity), ...] of the `k` top-level questions most like
+    `question_id` (optionally within one subject), most similar first.
+    """
+    index = get_index()
+    vector = index.vector_of(question_id)
+    if vector is None:
+        refresh_vectors([question_id])
+        index = get_index()
+        vector = index.vector_of(question_id)
+        if vector is None:
+            return []
+    exclude = {question_id, *exclude}
+    # Snapshot rows of since-deleted questions and sub-questions are skipped here
+    found = []
+    limit = k * 2 + 10
+    while True:
+        hits = index.nearest(vector, limit, subject_id, exclude)
+        live = set(Question.objects.filter(pk__in=[h[0] for h in hits], parent__isnull=True).values_list('pk', flat=True))
+        found = [hit for hit in hits if hit[0] in live]
+        if len(found) >= k or len(hits) < limit:
+            return [(question_id, round(score, 4)) for question_id, score in found[:k]]
+        limit *= 4
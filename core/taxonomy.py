@@ -0,0 +1,155 @@
+"""
+In-process cache of the curriculum taxonomy: grades, subjects, topics and
+learning objectives.
+
+These tables are small and almost never change, but nearly every page and
+the topic / LO pickers read them. get_taxonomy() loads all four once per
+process into a Taxonomy, whose model instances have their grade / subject /
+topic relations pre-filled so templates can follow them without queries.
+
+Writes to any of the four models bump a database-stored version counter
+(AnalyticsVersion scope 'taxonomy', see core/signals.py); each process
+rechecks it at most every TAXONOMY_CHECK_INTERVAL seconds and reloads when
+it moved, and the writing process reloads immediately. Treat the returned
+instances as read-only.
+
+The four tables are read in one transaction; a topic or LO whose parent row
+the load didn't see (inserted between the queries on a backend without
+snapshot reads) is left out until the reload its insert triggers.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+
+from .models import AnalyticsVersion, Grade, LearningObjective, Subject, Topic
+
+TAXONOMY_SCOPE = 'taxonomy'
+
+_lock = threading.Lock()
+_state = {'taxonomy': None, 'version': None, 'checked_at': 0.0}
+
+
+class Taxonomy:
+    """The whole curriculum tree, indexed for the lookups views need."""
+
+    def __init__(self, grades, subjects, topics, learning_objectives):
+        self.grades = {g.id: g for g in grades}
+        self.subjects = {s.id: s for s in subjects}
+        self.topics = {}
+        self.learning_objectives = {}
+        self._topics_by_grade_subject = defaultdict(list)
+        self._los_by_topic = defaultdict(list)
+        self._grades_by_level = defaultdict(list)
+
+        for grade in self.grades.values():
+            self._grades_by_level[grade.grade_level or None].append(grade)
+        for topic in topics:
+            if topic.grade_id not in self.grades or topic.subject_id not in self.subjects:
+                continue
+            topic.grade = self.grades[topic.grade_id]
+            topic.subject = self.subjects[topic.subject_id]
+            self.topics[topic.id] = topic
+            self._topics_by_grade_subject[(topic.grade_id, topic.subject_id)].append(topic)
+        for lo in learning_objectives:
+            if lo.topic_id not in self.topics or lo.grade_id not in self.grades or lo.subject_id not in self.subjects:
+                continue
+            lo.grade = self.grades[lo.grade_id]
+            lo.subject = self.subjects[lo.subject_id]
+            lo.topic = self.topics[lo.topic_id]
+            self.learning_objectives[lo.id] = lo
+            self._los_by_topic[lo.topic_id].append(lo)
+
+    # Lists come back in each model's default ordering (grades / subjects by
+    # name, topics by grade, subject and name), like the querysets they replace
+
+    def grade_list(self):
+        return list(self.grades.values())
+
+    def subject_list(self):
+        return list(self.subjects.values())
+
+    def topic_list(self):
+        return list(self.topics.values())
+
+    def topics_for(self, grade_id=None, subject_id=None):
+        """Topics of a grade and/or subject, by name."""
+        grade_id = _as_id(grade_id)
+        subject_id = _as_id(subject_id)
+        if grade_id and subject_id:
+            topics = self._topics_by_grade_subject.get((grade_id, subject_id), [])
+        else:
+            topics = [
+                t for t in self.topics.values()
+                if (not grade_id or t.grade_id == grade_id) and (not subject_id or t.subject_id == subject_id)
+            ]
+        return sorted(topics, key=lambda t: (t.name, t.id))
+
+    def learning_objectives_for(self, topic_id):
+        """LOs of a topic, by code."""
+        return sorted(self._los_by_topic.get(_as_id(topic_id), []), key=lambda lo: (lo.code, lo.id))
+
+    def same_level_grades(self, grade):
+        """Grades sharing `grade`'s grade_level (just `grade` when it has none)."""
+        if not grade.grade_level:
+            return [self.grades.get(grade.id, grade)]
+        return list(self._grades_by_level.get(grade.grade_level, []))
+
+
+def _as_id(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return -1  # matches nothing, like filtering on a bad id
+
+
+def load_taxonomy():
+    db = DEFAULT_DB_ALIAS
+    with transaction.atomic(using=db):
+        return Taxonomy(
+            list(Grade.objects.using(db).all()),
+            list(Subject.objects.using(db).all()),
+            list(Topic.objects.using(db).order_by('grade__name', 'subject__name', 'name', 'id')),
+            list(LearningObjective.objects.using(db).all()),
+        )
+
+
+def taxonomy_version():
+    return (
+        AnalyticsVersion.objects.using(DEFAULT_DB_ALIAS)
+        .filter(scope=TAXONOMY_SCOPE, object_id=0)
+        .values_list('version', flat=True)
+        .first()
+    ) or 0
+
+
+def get_taxonomy():
+    """This process's Taxonomy, reloaded when another process changed the curriculum."""
+    now = time.monotonic()
+    if _state['taxonomy'] is not None and now - _state['checked_at'] < settings.TAXONOMY_CHECK_INTERVAL:
+        return _state['taxonomy']
+    with _lock:
+        version = taxonomy_version()
+        if _state['taxonomy'] is None or version != _state['version']:
+            _state['taxonomy'] = load_taxonomy()
+            _state['version'] = version
+        _state['checked_at'] = now
+        return _state['taxonomy']
+
+
+def clear_taxonomy_cache():
+    """Forget this process's Taxonomy; the next get_taxonomy() reloads it."""
+    with _lock:
+        _state.update(taxonomy=None, version=None, checked_at=0.0)
+
+
+def bump_taxonomy_version():
+    """Invalidate every process's Taxonomy (this one at once, others on their next check)."""
+    AnalyticsVersion.objects.bulk_create(
+        [AnalyticsVersion(scope=TAXONOMY_SCOPE, object_id=0)], ignore_conflicts=True
+    )
+    AnalyticsVersion.objects.filter(scope=TAXONOMY_SCOPE, object_id=0).update(version=F('version') + 1)
+    clear_taxonomy_cache()
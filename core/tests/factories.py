@@ -0,0 +1,71 @@
+"""
+Small builders for the core test suite's fixtures.
+
+Each returns saved objects with just enough filled in for the analytics,
+question bank and composition code under test.
+"""
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+
+from core.models import (
+    Grade, LearningObjective, Question, School, Student, StudentAnswer, Subject, Test, TestQuestion, Topic,
+    UserProfile,
+)
+
+
+def make_school(name='School', code='S1'):
+    return School.objects.create(name=name, code=code)
+
+
+def make_teacher(school, username='teacher'):
+    user = User.objects.create_user(username, password='x', is_staff=True)
+    UserProfile.objects.create(user=user, role='teacher', school=school)
+    return user
+
+
+def make_syllabus(topics=2, los_per_topic=2):
+    """(grade, subject, [topic, ...], {topic_id: [lo, ...]})"""
+    grade = Grade.objects.create(name='IGCSE-1', grade_level='IGCSE')
+    subject = Subject.objects.create(name='Physics', code='0625')
+    topic_list, los = [], {}
+    for i in range(topics):
+        topic = Topic.objects.create(name=f'Topic {i}', grade=grade, subject=subject)
+        topic_list.append(topic)
+        los[topic.id] = [
+            LearningObjective.objects.create(
+                code=f'{i}.{j}', description=f'Objective {i}.{j}', grade=grade, subject=subject, topic=topic
+            )
+            for j in range(los_per_topic)
+        ]
+    return grade, subject, topic_list, los
+
+
+def make_question(teacher, grade, subject, topic=None, text='<p>Question</p>', marks=1, **fields):
+    fields.setdefault('question_type', 'mcq')
+    return Question.objects.create(
+        grade=grade, subject=subject, topic=topic, question_text=text, marks=marks, created_by=teacher, **fields
+    )
+
+
+def make_test(teacher, subject, questions=(), title='Test'):
+    test = Test.objects.create(title=title, subject=subject, created_by=teacher, is_published=True)
+    for order, question in enumerate(questions, start=1):
+        TestQuestion.objects.create(test=test, question=question, order=order)
+    return test
+
+
+def make_student(school, grade, teacher, n):
+    user = User.objects.create_user(f'student{n}', password='x')
+    UserProfile.objects.create(user=user, role='student', school=school)
+    return Student.objects.create(
+        full_name=f'Student {n}', roll_number=str(n), grade=grade, section='A',
+        school=school, user=user, created_by=teacher,
+    )
+
+
+def answer(student, test, question, marks=None, text=''):
+    return StudentAnswer.objects.create(
+        student=student, test=test, question=question, answer_text=text,
+        marks_awarded=None if marks is None else Decimal(str(marks)),
+    )
@@ -0,0 +1,97 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.db import transaction
+from django.test import TestCase
+
+from core.analytics import cache
+from core.analytics.cache import (
+    bump_versions_on_commit, cached_school_result, cached_subject_result, cached_test_result, data_versions,
+)
+from core.models import StudentAnswer
+
+from .factories import answer, make_question, make_school, make_student, make_syllabus, make_teacher, make_test
+
+
+class Counter:
+    """compute() stand-in counting how often the cache had to call it."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.calls
+
+
+class AnalyticsCacheTests(TestCase):
+    def setUp(self):
+        caches['analytics'].clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.school = make_school()
+            self.other_school = make_school('Other', 'S2')
+            self.teacher = make_teacher(self.school)
+            self.grade, self.subject, self.topics, _ = make_syllabus()
+            self.question = make_question(self.teacher, self.grade, self.subject, self.topics[0], marks=2)
+            self.test = make_test(self.teacher, self.subject, [self.question])
+            self.student = make_student(self.school, self.grade, self.teacher, 1)
+            self.answer = answer(self.student, self.test, self.question)
+
+    def save_answer(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            a = StudentAnswer.objects.get(pk=self.answer.pk)
+            for name, value in fields.items():
+                setattr(a, name, value)
+            a.save()
+
+    def test_cached_until_marks_change(self):
+        compute = Counter()
+        self.assertEqual(cached_test_result(self.test.id, 'stats', compute), 1)
+        self.assertEqual(cached_test_result(self.test.id, 'stats', compute), 1)
+
+        self.save_answer(answer_text='autosaved')
+        self.assertEqual(cached_test_result(self.test.id, 'stats', compute), 1)
+
+        self.save_answer(marks_awarded=2)
+        self.assertEqual(cached_test_result(self.test.id, 'stats', compute), 2)
+
+    def test_grading_invalidates_only_the_students_school(self):
+        compute = Counter()
+        mine = lambda: cached_school_result(self.school.id, 'overview', compute)
+        other = lambda: cached_school_result(self.other_school.id, 'overview', compute)
+        self.assertEqual((mine(), other()), (1, 2))
+
+        self.save_answer(marks_awarded=1)
+        self.assertEqual((mine(), other()), (3, 2))
+
+    def test_question_bank_edits_invalidate_their_subject(self):
+        compute = Counter()
+        self.assertEqual(cached_subject_result(self.subject.id, 'catalog', compute), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_question(self.teacher, self.grade, self.subject, self.topics[1])
+        self.assertEqual(cached_subject_result(self.subject.id, 'catalog', compute), 2)
+
+    def test_bumps_merge_into_one_per_transaction(self):
+        versions = lambda: data_versions(tests=[self.test.id], schools=[self.school.id])
+        before = versions()
+        with mock.patch.object(cache, 'bump_versions', wraps=cache.bump_versions) as bump:
+            with self.captureOnCommitCallbacks(execute=True):
+                bump_versions_on_commit(tests=[self.test.id])
+                bump_versions_on_commit(tests=[self.test.id], subjects=[self.subject.id])
+                bump_versions_on_commit(students=[self.student.id])
+        bump.assert_called_once_with(
+            schools={self.school.id}, tests={self.test.id}, students={self.student.id}, subjects={self.subject.id},
+        )
+        self.assertEqual(versions(), {key: version + 1 for key, version in before.items()})
+
+    def test_rolled_back_bumps_are_dropped(self):
+        with mock.patch.object(cache, 'bump_versions', wraps=cache.bump_versions) as bump:
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        bump_versions_on_commit(tests=[self.test.id])
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+                bump_versions_on_commit(subjects=[self.subject.id])
+        bump.assert_called_once_with(schools=set(), tests=set(), students=set(), subjects={self.subject.id})
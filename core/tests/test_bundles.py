@@ -0,0 +1,109 @@
+import gzip
+import tempfile
+from pathlib import Path
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from core.analytics.catalog import question_count, subject_catalog
+from core.bundles import BundleError, export_bundle, import_bundle, read_manifest
+from core.models import AnswerSpace, Grade, LearningObjective, Question, Subject, Topic
+
+from .factories import make_question, make_school, make_syllabus, make_teacher
+
+PIXEL = 'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+IMAGE = f'<img src="data:image/png;base64,{PIXEL}">'
+STEM = (
+    '<p>A ball of mass 0.5 kg is dropped from a height of 20 m above the ground. '
+    f'Calculate the speed of the ball just before it hits the ground.</p>{IMAGE}'
+)
+
+
+def tree(question):
+    """(text, marks, total_marks, LO codes, sub-question trees) of `question`, read back from the database."""
+    question = Question.objects.get(pk=question.pk)
+    return (
+        question.question_text,
+        question.marks,
+        question.total_marks,
+        sorted(question.learning_objectives.values_list('code', flat=True)),
+        [tree(child) for child in question.sub_questions.order_by('order', 'id')],
+    )
+
+
+class BundleTests(TestCase):
+    def setUp(self):
+        self.directory = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        # Saving image questions writes thumbnails
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.teacher = make_teacher(make_school())
+            self.grade, self.subject, self.topics, self.los = make_syllabus()
+
+            self.root = make_question(self.teacher, self.grade, self.subject, self.topics[0], text=STEM, marks=0)
+            self.root.learning_objectives.set(self.los[self.topics[0].id])
+            for n in range(2):
+                part = make_question(
+                    self.teacher, self.grade, self.subject, self.topics[0],
+                    text=f'<p>Part {n}</p>{IMAGE}', marks=n + 1, parent=self.root, order=n,
+                )
+                part.learning_objectives.set(self.los[self.topics[0].id][:1])
+            AnswerSpace.objects.create(question=part, space_type='text_line', y=40, marks=2)
+            self.other = make_question(self.teacher, self.grade, self.subject, self.topics[1], text='<p>Other</p>')
+
+    def test_export_writes_each_image_once(self):
+        manifest = export_bundle(self.directory, self.subject, compress=True)
+        self.assertEqual(read_manifest(self.directory)['counts'], manifest['counts'])
+        self.assertEqual(manifest['counts'], {'taxonomy': 8, 'questions': 4, 'answer_spaces': 1, 'images': 1})
+        self.assertEqual(len(list((self.directory / 'images').iterdir())), 1)
+        with gzip.open(self.directory / manifest['files']['questions'], 'rt') as handle:
+            self.assertNotIn('data:image', handle.read())
+
+    def test_round_trip_restores_trees_into_the_existing_taxonomy(self):
+        export_bundle(self.directory, self.subject)
+        original = [tree(self.root), tree(self.other)]
+        Question.objects.all().delete()
+        taxonomy = [Model.objects.count() for Model in (Grade, Subject, Topic, LearningObjective)]
+
+        self.assertEqual(
+            import_bundle(self.directory, self.teacher, chunk_size=1),
+            {'questions': 4, 'duplicates': 0, 'answer_spaces': 1},
+        )
+        self.assertEqual([Model.objects.count() for Model in (Grade, Subject, Topic, LearningObjective)], taxonomy)
+        roots = Question.objects.filter(parent__isnull=True).order_by('id')
+        self.assertEqual([tree(q) for q in roots], original)
+        self.assertEqual(roots[0].total_marks, 3)
+        part = roots[0].sub_questions.get(order=1)
+        self.assertEqual(list(part.answer_spaces.values_list('y', 'marks')), [(40, 2)])
+        self.assertTrue(all(q.path.startswith(roots[0].path) for q in roots[0].sub_questions.all()))
+
+    def test_import_invalidates_the_subject_catalog(self):
+        caches['analytics'].clear()
+        export_bundle(self.directory, self.subject)
+        counted = lambda: sum(
+            question_count(entry, [self.grade.id]) for entry in subject_catalog(self.subject.id).values()
+        )
+        self.assertEqual(counted(), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            import_bundle(self.directory, self.teacher)
+        self.assertEqual(counted(), 4)
+
+    def test_missing_taxonomy_is_created(self):
+        export_bundle(self.directory, self.subject)
+        Question.objects.all().delete()
+        Subject.objects.all().delete()
+
+        import_bundle(self.directory, self.teacher)
+        subject = Subject.objects.get(code='0625')
+        self.assertEqual(Topic.objects.filter(subject=subject).count(), 2)
+        self.assertEqual(Question.objects.filter(subject=subject).count(), 4)
+
+    def test_skip_duplicates(self):
+        export_bundle(self.directory, self.subject)
+        result = import_bundle(self.directory, self.teacher, skip_duplicates=True)
+        # The long stem is already in the bank, and its parts go with it; 'Other' is too short to compare
+        self.assertEqual(result, {'questions': 1, 'duplicates': 1, 'answer_spaces': 0})
+
+    def test_rejects_other_directories(self):
+        with self.assertRaises(BundleError):
+            read_manifest(self.directory)
@@ -0,0 +1,88 @@
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+
+from core.analytics.catalog import build_subject_catalog, question_count, subject_catalog
+from core.models import Grade, LearningObjective, Question, Topic
+from core.taxonomy import clear_taxonomy_cache
+
+from .factories import answer, make_question, make_school, make_student, make_syllabus, make_teacher, make_test
+
+
+def reference_topics(grades, subject):
+    """(id, name, question_count, [lo ids]) per topic from the per-topic queries smart_test_analyse used before."""
+    return sorted(
+        (
+            topic.id,
+            topic.name,
+            Question.objects.filter(topic=topic, grade__in=grades, subject=subject, parent__isnull=True).count(),
+            [lo.id for lo in LearningObjective.objects.filter(topic=topic)],
+        )
+        for topic in Topic.objects.filter(grade__in=grades, subject=subject).order_by('name').distinct()
+    )
+
+
+class SubjectCatalogTests(TestCase):
+    def setUp(self):
+        caches['analytics'].clear()
+        clear_taxonomy_cache()
+        self.addCleanup(clear_taxonomy_cache)
+        with self.captureOnCommitCallbacks(execute=True):
+            school = make_school()
+            self.teacher = make_teacher(school)
+            self.grade, self.subject, self.topics, self.los = make_syllabus(topics=3)
+            self.grade2 = Grade.objects.create(name='IGCSE-2', grade_level='IGCSE')
+            self.dp = Grade.objects.create(name='DP-1', grade_level='DP')
+            self.waves = Topic.objects.create(name='Waves', grade=self.grade2, subject=self.subject)
+            LearningObjective.objects.create(code='W.1', description='Waves', grade=self.grade2,
+                                             subject=self.subject, topic=self.waves)
+            Topic.objects.create(name='Fields', grade=self.dp, subject=self.subject)
+
+            t0, t1, _ = self.topics
+            root = self.make(t0)
+            self.make(t0, parent=root)  # sub-questions aren't counted
+            self.make(t0, grade=self.grade2)
+            self.make(t1)
+            self.make(t1, grade=self.dp)  # another level's question on this topic
+            self.make(self.waves, grade=self.grade2)
+
+            student = make_student(school, self.grade, self.teacher, 1)
+            answer(student, make_test(self.teacher, self.subject, [root]), root, marks=1)
+        self.client.force_login(self.teacher)
+
+    def make(self, topic, grade=None, **fields):
+        return make_question(self.teacher, grade or self.grade, self.subject, topic, **fields)
+
+    def analyse(self):
+        response = self.client.get(reverse('smart_test_analyse'), {'grade': self.grade.id, 'subject': self.subject.id})
+        return response.json()['topics']
+
+    def test_matches_the_per_topic_queries(self):
+        found = sorted(
+            (topic['id'], topic['name'], topic['question_count'], [lo['id'] for lo in topic['los']])
+            for topic in self.analyse()
+        )
+        self.assertEqual(found, reference_topics([self.grade, self.grade2], self.subject))
+        self.assertEqual([row[2] for row in found], [2, 1, 0, 1])
+
+        catalog = build_subject_catalog(self.subject.id)
+        self.assertEqual(len(catalog), 5)
+        self.assertEqual(question_count(catalog[self.topics[1].id], {self.grade.id, self.dp.id}), 2)
+
+    def test_cached_until_the_bank_changes(self):
+        subject_catalog(self.subject.id)
+        with self.assertNumQueries(1):  # the version lookup
+            cached = subject_catalog(self.subject.id)
+        self.assertEqual(question_count(cached[self.waves.id], [self.grade2.id]), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make(self.waves, grade=self.grade2)
+            LearningObjective.objects.create(code='W.2', description='More waves', grade=self.grade2,
+                                             subject=self.subject, topic=self.waves)
+        entry = subject_catalog(self.subject.id)[self.waves.id]
+        self.assertEqual(question_count(entry, [self.grade2.id]), 2)
+        self.assertEqual([code for _, code, _ in entry['los']], ['W.1', 'W.2'])
+        self.assertEqual(
+            sorted(topic['question_count'] for topic in self.analyse()),
+            sorted(row[2] for row in reference_topics([self.grade, self.grade2], self.subject)),
+        )
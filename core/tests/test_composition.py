@@ -0,0 +1,75 @@
+from django.test import TestCase
+
+from core.composition import UnknownQuestions, add_questions, copy_test, remove_questions
+from core.models import Question, TestQuestion
+
+from .factories import make_question, make_school, make_student, make_syllabus, make_teacher, make_test
+
+
+def members(test):
+    return list(TestQuestion.objects.filter(test=test).order_by('order').values_list('question_id', 'order'))
+
+
+def usage(question):
+    return Question.objects.values_list('usage_count', flat=True).get(pk=question.pk)
+
+
+class CompositionTests(TestCase):
+    def setUp(self):
+        self.school = make_school()
+        self.teacher = make_teacher(self.school)
+        self.grade, self.subject, topics, _ = make_syllabus()
+        self.questions = [
+            make_question(self.teacher, self.grade, self.subject, topics[0], text=f'<p>Question {n}</p>')
+            for n in range(4)
+        ]
+        self.test = make_test(self.teacher, self.subject, self.questions[:1])
+
+    def test_add_appends_in_the_given_order(self):
+        q = self.questions
+        added = add_questions(self.test, [q[3].id, str(q[1].id), q[0].id, q[3].id])
+        self.assertEqual([row.question_id for row in added], [q[3].id, q[1].id])
+        self.assertEqual(members(self.test), [(q[0].id, 1), (q[3].id, 2), (q[1].id, 3)])
+        self.assertEqual(usage(q[3]), 1)
+
+    def test_unknown_ids_add_nothing(self):
+        missing = Question.objects.latest('id').id + 1
+        with self.assertRaises(UnknownQuestions) as raised:
+            add_questions(self.test, [self.questions[1].id, missing, missing + 1])
+        self.assertEqual(raised.exception.question_ids, [missing, missing + 1])
+        self.assertIsInstance(raised.exception, ValueError)
+        self.assertEqual(members(self.test), [(self.questions[0].id, 1)])
+
+        with self.assertRaisesMessage(ValueError, 'Question IDs must be integers'):
+            add_questions(self.test, [self.questions[1].id, 'abc'])
+        self.assertEqual(add_questions(self.test, []), [])
+
+    def test_remove_renumbers(self):
+        q = self.questions
+        add_questions(self.test, [question.id for question in q[1:]])
+        second = TestQuestion.objects.get(test=self.test, question=q[1])
+        self.assertEqual(remove_questions(self.test, [second.id]), 1)
+        self.assertEqual(members(self.test), [(q[0].id, 1), (q[2].id, 2), (q[3].id, 3)])
+        self.assertEqual(usage(q[1]), 0)
+
+    def test_copy(self):
+        q = self.questions
+        add_questions(self.test, [q[2].id])
+        TestQuestion.objects.filter(test=self.test, question=q[2]).update(order=7)
+        student = make_student(self.school, self.grade, self.teacher, 1)
+        self.test.assigned_students.add(student)
+        colleague = make_teacher(self.school, 'colleague')
+        self.test.assigned_teachers.add(colleague)
+
+        plain = copy_test(self.test, self.teacher)
+        self.assertEqual((plain.title, plain.is_published), ('Test (Copy)', False))
+        self.assertEqual(members(plain), [(q[0].id, 1), (q[2].id, 2)])
+        self.assertFalse(plain.assigned_students.exists())
+        self.assertFalse(plain.assigned_teachers.exists())
+        self.assertEqual(usage(q[2]), 2)
+
+        shared = copy_test(self.test, colleague, title='Retake', assignments=True, teachers=True)
+        self.assertEqual(shared.title, 'Retake')
+        self.assertEqual(list(shared.assigned_students.all()), [student])
+        # The colleague owns the copy; the original's owner keeps access
+        self.assertEqual(list(shared.assigned_teachers.all()), [self.teacher])
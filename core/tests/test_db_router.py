@@ -0,0 +1,145 @@
+import datetime
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TransactionTestCase, override_settings
+
+from core import db_router
+from core.analytics.cache import bump_versions, data_versions
+from core.db_router import ANALYTICS_DB, analytics_reads
+from core.middleware import PRIMARY_PINNED_SESSION_KEY, ReadYourWritesMiddleware
+from core.models import Grade, Question, StudentTestResult
+
+from .factories import make_school, make_student, make_syllabus, make_teacher, make_test
+
+
+class ReplicaTestCase(TransactionTestCase):
+    """
+    Runs with a second SQLite file as the 'analytics' alias, copied from the
+    test database by sync_analytics_replica. The alias is added after the
+    test runner set up its databases, so it is a plain file it doesn't manage.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        replica = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(Path(cls.replica_dir.name) / 'replica.sqlite3')}
+        cls.databases_patch = mock.patch.dict(settings.DATABASES, {ANALYTICS_DB: replica})
+        cls.databases_patch.start()
+        connections.settings[ANALYTICS_DB] = connections.configure_settings(
+            {DEFAULT_DB_ALIAS: dict(settings.DATABASES[DEFAULT_DB_ALIAS]), ANALYTICS_DB: replica}
+        )[ANALYTICS_DB]
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[ANALYTICS_DB].close()
+        del connections[ANALYTICS_DB]
+        del connections.settings[ANALYTICS_DB]
+        cls.databases_patch.stop()
+        cls.replica_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.enterContext(override_settings(ANALYTICS_REPLICA_CHECK_INTERVAL=0, ANALYTICS_REPLICA_MAX_LAG=300))
+        db_router._replica_state[:] = [0.0, False]
+        self.addCleanup(db_router._replica_state.__setitem__, slice(None), [0.0, False])
+        school = make_school()
+        teacher = make_teacher(school)
+        self.grade, subject, _, _ = make_syllabus()
+        self.result = StudentTestResult.objects.create(
+            school=school, test=make_test(teacher, subject), student=make_student(school, self.grade, teacher, 1),
+            subject=subject, month=datetime.date.today().replace(day=1),
+        )
+        self.sync()
+
+    def sync(self):
+        call_command('sync_analytics_replica', stdout=StringIO())
+
+    def make_primary_newer(self, seconds):
+        StudentTestResult.objects.filter(pk=self.result.pk).update(
+            updated_at=self.result.updated_at + datetime.timedelta(seconds=seconds)
+        )
+
+
+class AnalyticsReplicaRouterTests(ReplicaTestCase):
+    def test_analytics_reads_use_the_replica(self):
+        Grade.objects.create(name='Only on primary', grade_level='IGCSE')
+        self.assertEqual(Grade.objects.all().db, DEFAULT_DB_ALIAS)
+        with analytics_reads():
+            self.assertEqual(Grade.objects.all().db, ANALYTICS_DB)
+            self.assertFalse(Grade.objects.filter(name='Only on primary').exists())
+            # Objects read from the replica are saved back to the primary
+            grade = Grade.objects.get(pk=self.grade.pk)
+            self.assertEqual(router.db_for_write(Grade, instance=grade), DEFAULT_DB_ALIAS)
+            grade.name = 'Renamed'
+            grade.save()
+        self.assertEqual(Grade.objects.get(pk=self.grade.pk).name, 'Renamed')
+
+    def test_lagging_replica_falls_back_to_the_primary(self):
+        self.make_primary_newer(60)
+        with analytics_reads():
+            self.assertEqual(Grade.objects.all().db, ANALYTICS_DB)
+        self.make_primary_newer(301)
+        with analytics_reads():
+            self.assertEqual(Grade.objects.all().db, DEFAULT_DB_ALIAS)
+        self.sync()
+        with analytics_reads():
+            self.assertEqual(Grade.objects.all().db, ANALYTICS_DB)
+
+    def test_open_transactions_read_the_primary(self):
+        with analytics_reads(), transaction.atomic():
+            self.assertEqual(Grade.objects.all().db, DEFAULT_DB_ALIAS)
+
+    def test_question_bank_router_needs_a_hint(self):
+        with analytics_reads():
+            self.assertEqual(Question.objects.all().db, ANALYTICS_DB)
+        self.assertEqual(router.db_for_write(Question), DEFAULT_DB_ALIAS)
+        self.assertTrue(router.allow_migrate(DEFAULT_DB_ALIAS, 'core', model_name='question'))
+        self.assertFalse(router.allow_migrate(ANALYTICS_DB, 'core', model_name='question'))
+
+    def test_cache_versions_come_from_the_primary(self):
+        bump_versions(tests=[self.result.test_id])
+        with analytics_reads():
+            self.assertEqual(Grade.objects.all().db, ANALYTICS_DB)
+            self.assertEqual(data_versions(tests=[self.result.test_id]), {('test', self.result.test_id): 1})
+
+
+class ReadYourWritesMiddlewareTests(ReplicaTestCase):
+    def request(self, view, session):
+        request = RequestFactory().get('/')
+        request.session = session
+        seen = {}
+
+        def wrapped(request):
+            with analytics_reads():
+                seen['db'] = Grade.objects.all().db
+                return view(request)
+
+        ReadYourWritesMiddleware(wrapped)(request)
+        return seen['db']
+
+    def test_a_write_pins_the_users_reads_to_the_primary(self):
+        session = {}
+        read_only = lambda request: HttpResponse()
+
+        def grading(request):
+            Grade.objects.create(name='Written', grade_level='IGCSE')
+            return HttpResponse()
+
+        self.assertEqual(self.request(read_only, session), ANALYTICS_DB)
+        self.assertNotIn(PRIMARY_PINNED_SESSION_KEY, session)
+        self.assertEqual(self.request(grading, session), ANALYTICS_DB)
+        self.assertIn(PRIMARY_PINNED_SESSION_KEY, session)
+        self.assertEqual(self.request(read_only, session), DEFAULT_DB_ALIAS)
+        # Another user's session still reads the replica
+        self.assertEqual(self.request(read_only, {}), ANALYTICS_DB)
+
+        session[PRIMARY_PINNED_SESSION_KEY] = 0
+        self.assertEqual(self.request(read_only, session), ANALYTICS_DB)
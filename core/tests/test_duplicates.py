@@ -0,0 +1,81 @@
+import base64
+import random
+import tempfile
+from io import BytesIO
+
+from django.test import TestCase, override_settings
+from PIL import Image, ImageDraw
+
+from core.duplicates import find_duplicates
+from core.models import QuestionFingerprint, Subject
+
+from .factories import make_question, make_school, make_syllabus, make_teacher
+
+TEXT = (
+    '<p>A ball of mass 0.5 kg is dropped from a height of 20 m above the ground. '
+    'Calculate the speed of the ball just before it hits the ground.</p>'
+)
+
+
+def scanned_page(margin=0, scale=1.0, seed=7):
+    """<img> markup of a synthetic printed page, padded by `margin` pixels and resized by `scale`."""
+    rnd = random.Random(seed)
+    page = Image.new('L', (400, 240), 255)
+    draw = ImageDraw.Draw(page)
+    for line in range(8):
+        x = 10
+        while x < 380:
+            width = rnd.randint(8, 40)
+            draw.rectangle([x, 15 + line * 28, x + width, 30 + line * 28], fill=0)
+            x += width + rnd.randint(6, 14)
+    if margin:
+        padded = Image.new('L', (page.width + 2 * margin, page.height + 2 * margin), 255)
+        padded.paste(page, (margin, margin))
+        page = padded
+    if scale != 1.0:
+        page = page.resize((int(page.width * scale), int(page.height * scale)))
+    buffer = BytesIO()
+    page.save(buffer, format='PNG')
+    return f'<p><img src="data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"></p>'
+
+
+class DuplicateDetectionTests(TestCase):
+    def setUp(self):
+        # Saving image questions writes thumbnails
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        self.teacher = make_teacher(make_school())
+        self.grade, self.subject, topics, _ = make_syllabus()
+        self.topic = topics[0]
+
+    def make(self, text, subject=None):
+        # Fingerprints are written on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_question(self.teacher, self.grade, subject or self.subject, self.topic, text=text)
+
+    def test_lightly_edited_text_is_a_duplicate(self):
+        original = self.make(TEXT)
+        copy = self.make(TEXT.replace('hits the ground', 'hits the floor').replace('<p>', '<p><b>1</b> '))
+        fingerprint = QuestionFingerprint.objects.get(question=copy)
+        self.assertEqual(fingerprint.duplicate_of_id, original.id)
+        self.assertGreaterEqual(fingerprint.similarity, 0.8)
+        self.assertEqual([pk for pk, _ in find_duplicates(self.subject.id, TEXT)], [original.id, copy.id])
+
+    def test_different_text_and_other_subjects_dont_match(self):
+        self.make(TEXT)
+        other = Subject.objects.create(name='Chemistry', code='0620')
+        self.assertEqual(find_duplicates(other.id, TEXT), [])
+        self.assertEqual(
+            find_duplicates(self.subject.id, '<p>State two differences between evaporation and boiling '
+                                             'of a liquid at room temperature.</p>'),
+            [],
+        )
+
+    def test_short_texts_are_not_compared(self):
+        self.make('<p>Answer all parts.</p>')
+        self.assertEqual(find_duplicates(self.subject.id, '<p>Answer all parts.</p>'), [])
+
+    def test_resliced_image_is_a_duplicate(self):
+        original = self.make(scanned_page())
+        matches = find_duplicates(self.subject.id, scanned_page(margin=30, scale=1.5))
+        self.assertEqual([pk for pk, _ in matches], [original.id])
+        self.assertEqual(find_duplicates(self.subject.id, scanned_page(seed=8)), [])
@@ -0,0 +1,109 @@
+import math
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.analytics.irt import ABILITY_PRIOR_SD, DIFFICULTY_PRIOR_SD, fit_rasch
+from core.models import QuestionCalibration, StudentAbility, StudentAnswer
+
+from .factories import answer, make_question, make_school, make_student, make_syllabus, make_teacher, make_test
+
+# (person, item, fraction of marks) for four students and three questions
+RESPONSES = [
+    (0, 0, 1.0), (0, 1, 1.0), (0, 2, 0.5),
+    (1, 0, 1.0), (1, 1, 0.5), (1, 2, 0.0),
+    (2, 0, 1.0), (2, 1, 0.0),
+    (3, 0, 0.0), (3, 1, 0.0), (3, 2, 0.0),
+]
+
+
+def reference_rasch(responses, n_persons, n_items, iterations=500):
+    """The same MAP estimate from per-response loops: alternating full Newton steps to convergence."""
+    ability, difficulty = [0.0] * n_persons, [0.0] * n_items
+    for _ in range(iterations):
+        for params, sign, prior_sd, index in (
+            (ability, 1, ABILITY_PRIOR_SD, 0),
+            (difficulty, -1, DIFFICULTY_PRIOR_SD, 1),
+        ):
+            gradient = [-value / prior_sd ** 2 for value in params]
+            information = [1 / prior_sd ** 2] * len(params)
+            for row in responses:
+                person, item, score = row
+                p = 1 / (1 + math.exp(-(ability[person] - difficulty[item])))
+                gradient[row[index]] += sign * (score - p)
+                information[row[index]] += p * (1 - p)
+            for k in range(len(params)):
+                params[k] += gradient[k] / information[k]
+    return ability, difficulty
+
+
+class FitRaschTests(TestCase):
+    def test_matches_the_per_response_estimate(self):
+        persons, items, scores = zip(*RESPONSES)
+        fit = fit_rasch(persons, items, scores)
+        self.assertTrue(fit['converged'])
+        ability, difficulty = reference_rasch(RESPONSES, 4, 3)
+        np.testing.assert_allclose(fit['ability'], ability, atol=1e-3)
+        np.testing.assert_allclose(fit['difficulty'], difficulty, atol=1e-3)
+
+        self.assertEqual(fit['person_responses'].tolist(), [3, 3, 2, 3])
+        self.assertEqual(fit['item_responses'].tolist(), [4, 4, 3])
+        np.testing.assert_allclose(fit['item_mean'], [0.75, 0.375, 0.5 / 3])
+        # Harder questions and weaker students order as their raw scores do
+        self.assertEqual(np.argsort(fit['difficulty']).tolist(), [0, 1, 2])
+        self.assertEqual(np.argsort(-fit['ability']).tolist(), [0, 1, 2, 3])
+
+    def test_standard_errors_come_from_the_information(self):
+        persons, items, scores = zip(*RESPONSES)
+        fit = fit_rasch(persons, items, scores)
+        information = 1 / DIFFICULTY_PRIOR_SD ** 2
+        for person, item, _ in RESPONSES:
+            if item == 2:
+                p = 1 / (1 + math.exp(-(fit['ability'][person] - fit['difficulty'][2])))
+                information += p * (1 - p)
+        self.assertAlmostEqual(fit['difficulty_se'][2], 1 / math.sqrt(information))
+
+    def test_empty(self):
+        fit = fit_rasch([], [], [])
+        self.assertEqual((fit['ability'].size, fit['difficulty'].size), (0, 0))
+
+
+class CalibrateDifficultyTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            school = make_school()
+            teacher = make_teacher(school)
+            grade, self.subject, topics, _ = make_syllabus()
+            self.questions = [
+                make_question(teacher, grade, self.subject, topics[0], marks=marks) for marks in (1, 2, 2)
+            ]
+            test = make_test(teacher, self.subject, self.questions)
+            self.students = [make_student(school, grade, teacher, n) for n in range(4)]
+            for person, item, score in RESPONSES:
+                question = self.questions[item]
+                answer(self.students[person], test, question, marks=score * question.marks)
+            # Ungraded answers are left out
+            answer(self.students[2], make_test(teacher, self.subject, self.questions, title='Retake'),
+                   self.questions[2])
+
+    def test_stored_calibration_matches_the_fit(self):
+        call_command('calibrate_difficulty', stdout=StringIO())
+        persons, items, scores = zip(*RESPONSES)
+        fit = fit_rasch(persons, items, scores)
+
+        calibrations = {c.question_id: c for c in QuestionCalibration.objects.all()}
+        for n, question in enumerate(self.questions):
+            row = calibrations[question.id]
+            graded = StudentAnswer.objects.filter(question=question, marks_awarded__isnull=False)
+            self.assertEqual(row.responses, graded.count())
+            self.assertAlmostEqual(
+                row.mean_score, sum(float(a.marks_awarded) / question.marks for a in graded) / graded.count(), 4
+            )
+            self.assertAlmostEqual(row.difficulty, fit['difficulty'][n], 4)
+            self.assertAlmostEqual(row.standard_error, fit['difficulty_se'][n], 4)
+
+        abilities = dict(StudentAbility.objects.values_list('student_id', 'ability'))
+        for n, student in enumerate(self.students):
+            self.assertAlmostEqual(abilities[student.id], fit['ability'][n], 4)
@@ -0,0 +1,119 @@
+from django.core.cache import caches
+from django.test import TestCase
+
+from core.analytics.examiner_schema import build_examiner_schema
+from core.analytics.item_analysis import analyse_test
+from core.analytics.mcq_signals import compute_mcq_signals
+
+from .factories import answer, make_question, make_school, make_student, make_syllabus, make_teacher, make_test
+
+
+class ItemAnalysisTestBase(TestCase):
+    def setUp(self):
+        caches['analytics'].clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.school = make_school()
+            self.teacher = make_teacher(self.school)
+            self.grade, self.subject, topics, _ = make_syllabus()
+            self.topic = topics[0]
+
+    def build(self, responses, items):
+        """`responses`: one row per student of (option, marks) per item; None skips the item."""
+        with self.captureOnCommitCallbacks(execute=True):
+            questions = [
+                make_question(self.teacher, self.grade, self.subject, self.topic, text=f'<p>Q{i}</p>')
+                for i in range(items)
+            ]
+            test = make_test(self.teacher, self.subject, questions)
+            for n, row in enumerate(responses):
+                student = make_student(self.school, self.grade, self.teacher, n)
+                for question, response in zip(questions, row):
+                    if response is not None:
+                        option, marks = response
+                        answer(student, test, question, marks=marks, text=option)
+        return test, questions
+
+
+class ItemAnalysisTests(ItemAnalysisTestBase):
+    """
+    Four students, three one-mark MCQ items keyed 'A':
+
+        student  Q0  Q1  Q2  total
+        1        A1  A1  A1  3
+        2        A1  A1  B0  2
+        3        A1  B0  B0  1
+        4        B0  C0  B0  0
+
+    Totals have variance 1.25 and the item variances sum to 0.625, so
+    alpha = KR-20 = 3/2 * (1 - 0.625/1.25) = 0.75 and
+    SEM = sqrt(1.25) * sqrt(1 - 0.75) = 0.559.
+    Q0 against the rest [2, 1, 0, 0]: point-biserial 0.75 / sqrt(0.75 * 2.75) = 0.522.
+    The 27% groups are one student each: student 1 (upper) and 4 (lower).
+    """
+
+    def setUp(self):
+        super().setUp()
+        A1, B0, C0 = ('A', 1), ('B', 0), ('C', 0)
+        self.test, self.questions = self.build([
+            (A1, A1, A1),
+            (A1, A1, B0),
+            (A1, B0, B0),
+            (B0, C0, B0),
+        ], 3)
+        self.analysis = analyse_test(self.test.id)
+
+    def item(self, n):
+        return self.analysis['items'][self.questions[n].id]
+
+    def test_reliability(self):
+        self.assertEqual(self.analysis['student_count'], 4)
+        self.assertEqual(self.analysis['reliability'], {'kr20': 0.75, 'alpha': 0.75, 'sem': 0.56})
+        self.assertEqual(self.analysis['group_size'], 1)
+
+    def test_item_statistics(self):
+        self.assertEqual(
+            [(self.item(n)['facility'], self.item(n)['correct_pct']) for n in range(3)],
+            [(0.75, 75.0), (0.5, 50.0), (0.25, 25.0)],
+        )
+        self.assertEqual(self.item(0)['point_biserial'], 0.522)
+        self.assertEqual(
+            [self.item(n)['discrimination_index'] for n in range(3)], [1.0, 1.0, 1.0]
+        )
+
+    def test_distractors(self):
+        self.assertEqual(
+            [(d['option'], d['count'], d['pct'], d['upper'], d['lower'], d['is_key']) for d in self.item(2)['distractors']],
+            [('B', 3, 75.0, 0, 1, False), ('A', 1, 25.0, 1, 0, True)],
+        )
+
+    def test_student_totals(self):
+        self.assertEqual(
+            sorted(s['earned'] for s in self.analysis['students'].values()), [0.0, 1.0, 2.0, 3.0]
+        )
+
+
+class McqSignalsTests(ItemAnalysisTestBase):
+    def test_wrong_options_exclude_the_key(self):
+        # Most students chose the key; the old contract reported it as the dominant wrong option
+        test, (question,) = self.build([(('A', 1),), (('A', 1),), (('A', 1),), (('B', 0),)], 1)
+        signals = compute_mcq_signals(test)['questions'][question.id]
+        self.assertEqual(signals['correct_pct'], 75.0)
+        self.assertIsNone(signals['dominant_wrong_option'])
+        self.assertFalse(signals['guessing'])
+
+    def test_dominant_wrong_option_and_guessing(self):
+        # The ungraded answer counts as a response but not towards correct_pct
+        test, (question,) = self.build(
+            [(('A', 1),), (('B', 0),), (('C', 0),), (('D', 0),), (('B', None),)], 1
+        )
+        signals = compute_mcq_signals(test)['questions'][question.id]
+        self.assertEqual(signals['correct_pct'], 25.0)
+        self.assertEqual(signals['dominant_wrong_option'], 'B')  # 2 of 5 responses
+        self.assertTrue(signals['guessing'])  # B, C, D chosen 2, 1, 1 times
+
+    def test_examiner_schema_states_field_meanings(self):
+        test, (question,) = self.build([(('A', 1),), (('B', 0),)], 1)
+        schema = build_examiner_schema(test, compute_mcq_signals(test))
+        self.assertEqual(schema['question_analysis'][0]['correct_pct'], 50.0)
+        self.assertEqual(schema['question_analysis'][0]['difficulty'], 'moderately challenging')
+        self.assertIn('never the correct answer', schema['definitions']['dominant_wrong_option'])
@@ -0,0 +1,78 @@
+import datetime
+
+from django.db.models import F
+from django.test import TestCase
+
+from core.keyset import NEXT, PREVIOUS, InvalidCursor, KeysetPaginator, decode_cursor, encode_cursor
+from core.models import Question
+
+from .factories import make_question, make_school, make_syllabus, make_teacher
+
+
+class CursorTests(TestCase):
+    def test_round_trip(self):
+        values = [3, None, 'Topic 0', datetime.datetime(2024, 5, 1, 12, 30), 17]
+        direction, decoded, start = decode_cursor(encode_cursor(NEXT, values, 41))
+        self.assertEqual((direction, decoded, start), (NEXT, [3, None, 'Topic 0', '2024-05-01T12:30:00', 17], 41))
+        self.assertEqual(decode_cursor(encode_cursor(PREVIOUS)), (PREVIOUS, None, None))
+
+    def test_garbage_is_rejected(self):
+        for cursor in ('not base64!', encode_cursor('x', [1]), 'e30'):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+
+class KeysetPaginatorTests(TestCase):
+    def setUp(self):
+        teacher = make_teacher(make_school())
+        grade, subject, topics, _ = make_syllabus()
+        # Few distinct marks and some NULL years, so most sort keys tie
+        for n in range(23):
+            make_question(teacher, grade, subject, topics[n % 2], marks=n % 3, year=None if n % 4 == 0 else 2020 + n % 2)
+
+    def walk(self, ordering, per_page=5, **kwargs):
+        """Every page's ids following next_cursor from the first page."""
+        paginator = KeysetPaginator(Question.objects.all(), per_page, ordering, **kwargs)
+        pages, cursor = [], None
+        while True:
+            page = paginator.get_page(cursor)
+            pages.append([q.id for q in page])
+            cursor = page.next_cursor
+            if cursor is None:
+                return paginator, pages
+
+    def expected(self, *order_by):
+        return list(Question.objects.order_by(*order_by).values_list('id', flat=True))
+
+    def test_ties_are_broken_by_primary_key(self):
+        _, pages = self.walk(['-marks'])
+        self.assertEqual(sum(pages, []), self.expected('-marks', '-id'))
+        self.assertEqual([len(p) for p in pages], [5, 5, 5, 5, 3])
+
+    def test_nullable_and_related_keys(self):
+        _, pages = self.walk(['year', '-topic__name'])
+        # The primary key follows the last key's direction
+        self.assertEqual(sum(pages, []), self.expected(F('year').asc(nulls_last=True), '-topic__name', '-id'))
+
+    def test_previous_and_last_cursors(self):
+        paginator, pages = self.walk(['marks'])
+        first = paginator.get_page(None)
+        second = paginator.get_page(first.next_cursor)
+        self.assertEqual([q.id for q in paginator.get_page(second.previous_cursor)], pages[0])
+        # The last page is read backwards, so it holds a full page of the final rows
+        ids = sum(pages, [])
+        last = paginator.get_page(first.last_cursor)
+        self.assertEqual([q.id for q in last], ids[-5:])
+        self.assertEqual((last.start_index(), last.end_index(), last.has_next), (19, 23, False))
+        self.assertEqual([q.id for q in paginator.get_page(last.previous_cursor)], ids[-10:-5])
+
+    def test_invalid_cursor_gives_first_page(self):
+        paginator, pages = self.walk(['marks'])
+        self.assertEqual([q.id for q in paginator.get_page('garbage')], pages[0])
+        self.assertEqual([q.id for q in paginator.get_page(encode_cursor(NEXT, [1]))], pages[0])
+
+    def test_count_limit(self):
+        capped = KeysetPaginator(Question.objects.all(), 5, ['marks'], count_limit=10)
+        self.assertEqual((capped.count, capped.count_is_exact), (10, False))
+        exact = KeysetPaginator(Question.objects.all(), 5, ['marks'], count_limit=100)
+        self.assertEqual((exact.count, exact.count_is_exact), (23, True))
@@ -0,0 +1,140 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from core.analytics.mastery import rebuild_mastery_facts
+from core.analytics.performance import StudentAnalytics
+from core.models import MasteryFact, StudentAnswer
+
+from .factories import answer, make_question, make_school, make_student, make_syllabus, make_teacher, make_test
+
+
+def fact_rows(**filters):
+    """{(student, test, topic, lo): (earned, max_marks, attempts)}"""
+    return {
+        (f.student_id, f.test_id, f.topic_id, f.learning_objective_id): (f.earned, f.max_marks, f.attempts)
+        for f in MasteryFact.objects.filter(**filters)
+    }
+
+
+class MasteryFactSignalTests(TestCase):
+    def setUp(self):
+        # Run the fixture's own on_commit work now, so each test's capture
+        # block below only sees the callbacks its writes queue
+        with self.captureOnCommitCallbacks(execute=True):
+            self.school = make_school()
+            self.teacher = make_teacher(self.school)
+            self.grade, self.subject, self.topics, self.los = make_syllabus()
+            t0, t1 = self.topics
+            self.lo_a, self.lo_b = self.los[t0.id]
+            self.q1 = make_question(self.teacher, self.grade, self.subject, t0, marks=4)
+            self.q1.learning_objectives.set([self.lo_a, self.lo_b])
+            self.q2 = make_question(self.teacher, self.grade, self.subject, t1, marks=2)
+            self.test = make_test(self.teacher, self.subject, [self.q1, self.q2])
+            self.student = make_student(self.school, self.grade, self.teacher, 1)
+
+    def set_marks(self, question, marks):
+        with self.captureOnCommitCallbacks(execute=True):
+            a = StudentAnswer.objects.get(student=self.student, test=self.test, question=question)
+            a.marks_awarded = marks
+            a.save()
+
+    def test_grading_writes_topic_and_split_lo_facts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            answer(self.student, self.test, self.q1)
+        self.assertFalse(MasteryFact.objects.exists())
+
+        self.set_marks(self.q1, Decimal('3'))
+        s, t, topic = self.student.id, self.test.id, self.q1.topic_id
+        self.assertEqual(fact_rows(), {
+            (s, t, topic, None): (3.0, 4.0, 1),
+            (s, t, topic, self.lo_a.id): (1.5, 2.0, 1),
+            (s, t, topic, self.lo_b.id): (1.5, 2.0, 1),
+        })
+
+        self.set_marks(self.q1, Decimal('1'))
+        self.assertEqual(fact_rows(learning_objective=None)[(s, t, topic, None)], (1.0, 4.0, 1))
+
+    def test_answer_created_with_marks_gets_facts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            answer(self.student, self.test, self.q2, marks=2)
+        self.assertEqual(
+            fact_rows(), {(self.student.id, self.test.id, self.q2.topic_id, None): (2.0, 2.0, 1)}
+        )
+
+    def test_deleting_answer_removes_its_facts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            a = answer(self.student, self.test, self.q2, marks=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            a.delete()
+        self.assertFalse(MasteryFact.objects.exists())
+
+    def test_retag_moves_lo_facts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            answer(self.student, self.test, self.q1, marks=4)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.q1.learning_objectives.remove(self.lo_b)
+        self.assertEqual(fact_rows(learning_objective=self.lo_a)[
+            (self.student.id, self.test.id, self.q1.topic_id, self.lo_a.id)
+        ], (4.0, 4.0, 1))
+        self.assertFalse(MasteryFact.objects.filter(learning_objective=self.lo_b).exists())
+
+    def test_reverse_clear_drops_lo_facts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            answer(self.student, self.test, self.q1, marks=4)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lo_a.questions.clear()
+        self.assertFalse(MasteryFact.objects.filter(learning_objective=self.lo_a).exists())
+        self.assertEqual(MasteryFact.objects.get(learning_objective=self.lo_b).earned, 4.0)
+
+    def test_topic_and_marks_changes_refile_facts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            answer(self.student, self.test, self.q2, marks=2)
+        new_topic = self.topics[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.q2.topic = new_topic
+            self.q2.marks = 5
+            self.q2.save()
+        self.assertEqual(
+            fact_rows(), {(self.student.id, self.test.id, new_topic.id, None): (2.0, 5.0, 1)}
+        )
+        self.assertEqual(self.student.test_results.get(test=self.test).max_marks, 5.0)
+
+    def test_topic_performance_reads_the_facts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            answer(self.student, self.test, self.q1, marks=Decimal('3.5'))
+            answer(self.student, self.test, self.q2, marks=0)
+        t0, t1 = self.topics
+        self.assertEqual(StudentAnalytics(self.student).topic_performance(), [
+            {'topic': t0.name, 'mastery_percentage': 87.5, 'questions_attempted': 1, 'classification': 'strong'},
+            {'topic': t1.name, 'mastery_percentage': 0.0, 'questions_attempted': 1, 'classification': 'weak'},
+        ])
+
+
+class RebuildMasteryFactsTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            school = make_school()
+            teacher = make_teacher(school)
+            grade, subject, topics, los = make_syllabus()
+            question = make_question(teacher, grade, subject, topics[0], marks=2)
+            self.tests = [make_test(teacher, subject, [question], title=f'Test {i}') for i in range(2)]
+            self.students = [make_student(school, grade, teacher, n) for n in range(2)]
+            for student in self.students:
+                for test in self.tests:
+                    answer(student, test, question, marks=1)
+
+    def test_full_rebuild_matches_incremental_facts(self):
+        incremental = fact_rows()
+        self.assertEqual(rebuild_mastery_facts(), len(incremental))
+        self.assertEqual(fact_rows(), incremental)
+
+    def test_partial_rebuild_only_replaces_its_slices(self):
+        s0, s1 = self.students
+        t0, t1 = self.tests
+        MasteryFact.objects.update(earned=99)
+        rebuild_mastery_facts(
+            StudentAnswer.objects.filter(student=s0, test=t0) | StudentAnswer.objects.filter(student=s1, test=t1)
+        )
+        earned = {(f.student_id, f.test_id): f.earned for f in MasteryFact.objects.all()}
+        self.assertEqual(earned, {(s0.id, t0.id): 1.0, (s1.id, t1.id): 1.0, (s0.id, t1.id): 99, (s1.id, t0.id): 99})
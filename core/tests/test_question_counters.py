@@ -0,0 +1,47 @@
+from django.test import TestCase
+
+from core.models import Question, TestQuestion
+from core.question_counters import reconcile
+
+from .factories import make_question, make_school, make_syllabus, make_teacher, make_test
+
+
+def counters(question):
+    return Question.objects.filter(pk=question.pk).values_list('usage_count', 'lo_count', 'is_fully_tagged').get()
+
+
+class QuestionCounterTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher(make_school())
+        self.grade, self.subject, self.topics, self.los = make_syllabus()
+        self.question = make_question(self.teacher, self.grade, self.subject, self.topics[0])
+
+    def test_signals_keep_counters_current(self):
+        self.assertEqual(counters(self.question), (0, 0, False))
+
+        self.question.learning_objectives.set(self.los[self.topics[0].id])
+        test = make_test(self.teacher, self.subject, [self.question])
+        make_test(self.teacher, self.subject, [self.question], title='Another')
+        self.assertEqual(counters(self.question), (2, 2, True))
+
+        TestQuestion.objects.filter(test=test).delete()
+        self.los[self.topics[0].id][0].questions.clear()
+        self.assertEqual(counters(self.question), (1, 1, True))
+
+    def test_stale_full_save_doesnt_overwrite_counters(self):
+        stale = Question.objects.get(pk=self.question.pk)
+        make_test(self.teacher, self.subject, [self.question])
+        stale.marks = 3
+        stale.save()
+        self.assertEqual(counters(self.question), (1, 0, False))
+
+    def test_reconcile_repairs_drift(self):
+        self.question.learning_objectives.set(self.los[self.topics[0].id][:1])
+        make_test(self.teacher, self.subject, [self.question])
+        untouched = make_question(self.teacher, self.grade, self.subject, self.topics[1])
+        Question.objects.filter(pk=self.question.pk).update(usage_count=9, lo_count=0, is_fully_tagged=False)
+
+        self.assertEqual(reconcile(batch_size=1), 1)
+        self.assertEqual(counters(self.question), (1, 1, True))
+        self.assertEqual(counters(untouched), (0, 0, False))
+        self.assertEqual(reconcile(), 0)
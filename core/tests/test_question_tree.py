@@ -0,0 +1,132 @@
+from django.test import TestCase
+
+from core.models import Question
+from core.question_tree import load_tree, load_trees, node_path, rebuild_all_trees, walk_tree
+
+from .factories import make_question, make_school, make_syllabus, make_teacher
+
+
+def stored(*questions):
+    """[(root_id, path, total_marks), ...] of `questions`, read back from the database."""
+    rows = Question.objects.in_bulk([q.pk for q in questions])
+    return [(rows[q.pk].root_id, rows[q.pk].path, rows[q.pk].total_marks) for q in questions]
+
+
+def path(*questions):
+    found = ''
+    for question in questions:
+        found = node_path(found, question.pk)
+    return found
+
+
+class QuestionTreeTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher(make_school())
+        self.grade, self.subject, topics, _ = make_syllabus()
+        self.topic = topics[0]
+        #   root (0)
+        #   ├── a (2)
+        #   │   └── a1 (1)
+        #   └── b (3)
+        self.root = self.make(0)
+        self.a = self.make(2, parent=self.root, order=1)
+        self.a1 = self.make(1, parent=self.a)
+        self.b = self.make(3, parent=self.root, order=2)
+
+    def make(self, marks, **fields):
+        return make_question(self.teacher, self.grade, self.subject, self.topic, marks=marks, **fields)
+
+    def reload(self, question):
+        return Question.objects.get(pk=question.pk)
+
+    def test_new_questions_get_their_position_and_totals(self):
+        root, a, a1, b = self.root, self.a, self.a1, self.b
+        self.assertEqual(stored(root, a, a1, b), [
+            (None, path(root), 6),
+            (root.id, path(root, a), 3),
+            (root.id, path(root, a, a1), 1),
+            (root.id, path(root, b), 3),
+        ])
+        # The saved instance carries its total too
+        self.assertEqual(a1.total_marks, 1)
+
+    def test_marks_change_updates_the_ancestors(self):
+        a1 = self.reload(self.a1)
+        a1.marks = 4
+        a1.save()
+        self.assertEqual([total for _, _, total in stored(self.root, self.a, self.a1, self.b)], [9, 6, 4, 3])
+
+    def test_reparenting_moves_the_subtree(self):
+        a = self.reload(self.a)
+        a.parent = self.b
+        a.save()
+        root, b, a1 = self.root, self.b, self.a1
+        self.assertEqual(stored(root, b, a, a1), [
+            (None, path(root), 6),
+            (root.id, path(root, b), 6),
+            (root.id, path(root, b, a), 3),
+            (root.id, path(root, b, a, a1), 1),
+        ])
+
+    def test_moving_to_another_tree_refreshes_both(self):
+        other = self.make(5)
+        a = self.reload(self.a)
+        a.parent = other
+        a.save()
+        self.assertEqual(stored(self.root, other, a, self.a1), [
+            (None, path(self.root), 3),
+            (None, path(other), 8),
+            (other.id, path(other, a), 3),
+            (other.id, path(other, a, self.a1), 1),
+        ])
+
+        # Promoted to a top-level question, its sub-questions follow it
+        a.parent = None
+        a.save()
+        self.assertEqual(stored(other, a, self.a1), [
+            (None, path(other), 5),
+            (None, path(a), 3),
+            (a.id, path(a, self.a1), 1),
+        ])
+
+    def test_deletes_refresh_the_tree_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reload(self.a1).delete()
+        self.assertEqual([total for _, _, total in stored(self.root, self.a)], [5, 2])
+
+        # Deleting a sub-question with children drops their marks too
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reload(self.a).delete()
+        self.assertEqual(stored(self.root), [(None, path(self.root), 3)])
+
+    def test_stale_instance_doesnt_write_back_an_old_total(self):
+        root = self.reload(self.root)
+        a1 = self.reload(self.a1)
+        a1.marks = 4
+        a1.save()
+        # root was loaded with total_marks=6; a full save writes that back
+        root.question_text = '<p>Edited</p>'
+        root.save()
+        self.assertEqual(stored(root), [(None, path(root), 9)])
+        self.assertEqual(root.total_marks, 9)
+
+    def test_rebuild_all_trees_repairs_bulk_edits(self):
+        Question.objects.filter(pk=self.a.pk).update(parent=self.b)
+        Question.objects.filter(pk=self.b.pk).update(marks=1)
+        self.assertEqual(rebuild_all_trees(), 4)
+        self.assertEqual(stored(self.root, self.b, self.a, self.a1), [
+            (None, path(self.root), 4),
+            (self.root.id, path(self.root, self.b), 4),
+            (self.root.id, path(self.root, self.b, self.a), 3),
+            (self.root.id, path(self.root, self.b, self.a, self.a1), 1),
+        ])
+
+    def test_loading(self):
+        other = self.make(1)
+        with self.assertNumQueries(1):
+            trees = load_trees([self.root.id, other.id])
+        self.assertEqual([q.id for q in walk_tree(trees[self.root.id])], [self.a.id, self.a1.id, self.b.id])
+        self.assertEqual(trees[other.id].tree_children, [])
+
+        a = load_tree(self.reload(self.a))
+        self.assertEqual([q.id for q in walk_tree(a)], [self.a1.id])
@@ -0,0 +1,136 @@
+from collections import defaultdict
+
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+
+from core.models import Grade, LearningObjective, MasteryFact, Topic
+from core.taxonomy import clear_taxonomy_cache
+
+from .factories import answer, make_question, make_school, make_student, make_syllabus, make_teacher, make_test
+
+
+def reference_suggestions(school, grade, subject, test=None):
+    """Weak students per topic name from per-row loops over the facts and per-topic LO counts, as before."""
+    facts = MasteryFact.objects.filter(student__school=school, student__grade=grade, test__subject=subject)
+    if test is not None:
+        facts = facts.filter(test=test)
+
+    totals = defaultdict(lambda: defaultdict(lambda: [0.0, 0.0, set()]))
+    for fact in facts.select_related('topic', 'student'):
+        entry = totals[fact.topic.name][fact.student]
+        if fact.learning_objective_id is None:
+            entry[0] += fact.earned
+            entry[1] += fact.max_marks
+        else:
+            entry[2].add(fact.learning_objective_id)
+
+    total_los = {
+        topic.name: LearningObjective.objects.filter(topic=topic).count()
+        for topic in Topic.objects.filter(grade=grade, subject=subject)
+    }
+    suggestions = []
+    for name, students in totals.items():
+        lo_total = total_los.get(name, 0)
+        weak = []
+        for student, (earned, max_marks, tested) in students.items():
+            if max_marks <= 0:
+                continue
+            mastery = round(earned / max_marks * 100, 1)
+            if mastery < 60:
+                weak.append({
+                    'id': student.id,
+                    'name': student.full_name,
+                    'roll_number': student.roll_number or '',
+                    'mastery': mastery,
+                    'tested_los': len(tested),
+                    'total_los': lo_total,
+                    'lo_coverage': round(len(tested) / lo_total * 100, 0) if lo_total > 0 else 100,
+                })
+        if weak:
+            weak.sort(key=lambda x: x['mastery'])
+            suggestions.append({'topic': name, 'total_los': lo_total, 'weak_student_count': len(weak),
+                                'students': weak})
+    return sorted(suggestions, key=lambda x: x['topic'])
+
+
+class TopicReissueSuggestionTests(TestCase):
+    def setUp(self):
+        caches['analytics'].clear()
+        clear_taxonomy_cache()
+        self.addCleanup(clear_taxonomy_cache)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.school = make_school()
+            self.teacher = make_teacher(self.school)
+            self.grade, self.subject, (t0, t1), los = make_syllabus(topics=2, los_per_topic=3)
+            # A same-named topic of another grade merges into 'Topic 0'; 'Optics'
+            # has no LOs of this grade
+            grade2 = Grade.objects.create(name='IGCSE-2', grade_level='IGCSE')
+            t0_other = Topic.objects.create(name='Topic 0', grade=grade2, subject=self.subject)
+            other_lo = LearningObjective.objects.create(code='B.1', description='Other', grade=grade2,
+                                                        subject=self.subject, topic=t0_other)
+            optics = Topic.objects.create(name='Optics', grade=grade2, subject=self.subject)
+
+            q = {}
+            for key, topic, marks, tags in (
+                ('q1', t0, 4, los[t0.id][:2]),
+                ('q2', t0, 2, los[t0.id][2:]),
+                ('q3', t1, 5, los[t1.id][:1]),
+                ('q4', t0_other, 2, [other_lo]),
+                ('q5', optics, 3, []),
+                ('q6', t1, 0, []),
+            ):
+                q[key] = make_question(self.teacher, self.grade, self.subject, topic, marks=marks)
+                q[key].learning_objectives.set(tags)
+            self.test = make_test(self.teacher, self.subject, list(q.values()))
+            retake = make_test(self.teacher, self.subject, [q['q1'], q['q3']], title='Retake')
+
+            s1, s2, s3, s4 = (make_student(self.school, self.grade, self.teacher, n) for n in range(1, 5))
+            marks = {
+                s1: {'q1': 1, 'q2': 0, 'q3': 5, 'q4': 2, 'q5': 1, 'q6': 0},
+                s2: {'q1': 4, 'q2': 2, 'q3': 1},
+                s3: {'q1': 2, 'q2': None, 'q3': None},  # partly ungraded
+                s4: {'q6': 0},  # nothing at stake
+            }
+            for student, row in marks.items():
+                for key, mark in row.items():
+                    answer(student, self.test, q[key], marks=mark)
+            answer(s1, retake, q['q3'], marks=2)
+            answer(s2, retake, q['q1'], marks=0)
+            answer(s2, retake, q['q3'], marks=0)
+
+            # Another school's student isn't included
+            other = make_student(make_school('Other', 'S2'), self.grade, self.teacher, 9)
+            answer(other, self.test, q['q1'], marks=0)
+        self.client.force_login(self.teacher)
+
+    def suggestions(self, **params):
+        params.update(grade=self.grade.id, subject=self.subject.id)
+        response = self.client.get(reverse('topic_reissue_suggestions'), params)
+        data = response.json()
+        self.assertEqual(data['total_topics_with_issues'], len(data['suggestions']))
+        counts = [s['weak_student_count'] for s in data['suggestions']]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        return sorted(data['suggestions'], key=lambda x: x['topic'])
+
+    def test_matches_the_per_row_loops(self):
+        found = self.suggestions()
+        self.assertEqual(found, reference_suggestions(self.school, self.grade, self.subject))
+        self.assertEqual([(s['topic'], s['weak_student_count']) for s in found],
+                         [('Optics', 1), ('Topic 0', 2), ('Topic 1', 1)])
+        # Student 2 is on exactly 60% of 'Topic 0' across both tests; Student 1
+        # was tested on the other grade's LO too
+        self.assertEqual(
+            [(s['name'], s['mastery'], s['tested_los'], s['lo_coverage']) for s in found[1]['students']],
+            [('Student 1', 37.5, 4, 133), ('Student 3', 50.0, 2, 67)],
+        )
+        self.assertEqual(found[2]['students'][0]['mastery'], 10.0)
+
+    def test_scoped_to_one_test(self):
+        found = self.suggestions(test=self.test.id)
+        self.assertEqual(found, reference_suggestions(self.school, self.grade, self.subject, test=self.test))
+        self.assertEqual(found[2]['students'][0]['mastery'], 20.0)
+
+    def test_missing_params(self):
+        response = self.client.get(reverse('topic_reissue_suggestions'), {'grade': self.grade.id})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,111 @@
+import datetime
+import io
+import json
+import tempfile
+import threading
+import zipfile
+from unittest import mock, skipUnless
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import report_card_batch
+from core.models import Grade, ReportCardBatch
+from core.report_card_batch import (
+    _discard_pool, fail_stale_batches, report_card_filename, run_report_card_batch, start_report_card_batch,
+)
+from core.report_card_pdf import PDF_AVAILABLE
+
+from .factories import answer, make_question, make_school, make_student, make_syllabus, make_teacher, make_test
+
+
+@skipUnless(PDF_AVAILABLE, 'PyMuPDF is not installed')
+class ReportCardBatchTests(TestCase):
+    def setUp(self):
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.school = make_school()
+            self.teacher = make_teacher(self.school)
+            self.grade, subject, topics, _ = make_syllabus()
+            question = make_question(self.teacher, self.grade, subject, topics[0], marks=2)
+            test = make_test(self.teacher, subject, [question])
+            self.students = [make_student(self.school, self.grade, self.teacher, n) for n in (2, 1)]
+            other_grade = Grade.objects.create(name='IGCSE-2', grade_level='IGCSE')
+            make_student(self.school, other_grade, self.teacher, 3)
+            for n, student in enumerate(self.students):
+                answer(student, test, question, marks=n + 1)
+        self.client.force_login(self.teacher)
+
+    def start(self, **filters):
+        with mock.patch('core.report_card_views.start_report_card_batch') as start:
+            response = self.client.post(
+                reverse('report_card_batch_start'), json.dumps(filters), content_type='application/json'
+            )
+        return response, start
+
+    def status(self, batch_id):
+        return self.client.get(reverse('report_card_batch_status', args=[batch_id])).json()
+
+    def test_start_status_and_download(self):
+        response, start = self.start(grade=self.grade.id)
+        self.assertEqual(response.status_code, 202)
+        batch = ReportCardBatch.objects.get()
+        start.assert_called_once_with(batch)
+        self.assertEqual(batch.filters['grade'], str(self.grade.id))
+        self.assertEqual(self.status(batch.id)['status'], 'pending')
+        self.assertEqual(self.client.get(reverse('report_card_batch_download', args=[batch.id])).status_code, 404)
+
+        self.addCleanup(_discard_pool)
+        run_report_card_batch(batch.id)
+        status = self.status(batch.id)
+        self.assertEqual((status['status'], status['total'], status['completed'], status['percent']),
+                         ('completed', 2, 2, 100))
+
+        response = self.client.get(status['download_url'])
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            # In roll number order, one PDF per student of the grade
+            self.assertEqual(archive.namelist(), [report_card_filename(s) for s in reversed(self.students)])
+            self.assertTrue(all(archive.read(name).startswith(b'%PDF') for name in archive.namelist()))
+
+    def test_no_matching_students(self):
+        response, start = self.start(search='nobody')
+        self.assertEqual(response.status_code, 400)
+        start.assert_not_called()
+
+    def test_other_schools_batches_are_hidden(self):
+        batch = ReportCardBatch.objects.create(school=make_school('Other', 'S2'))
+        self.assertEqual(self.client.get(reverse('report_card_batch_status', args=[batch.id])).status_code, 404)
+
+    def test_stale_batches_fail(self):
+        lost = ReportCardBatch.objects.create(school=self.school, status='running', total=2)
+        queued = ReportCardBatch.objects.create(school=self.school)
+        ReportCardBatch.objects.filter(pk=lost.pk).update(updated_at=timezone.now() - datetime.timedelta(hours=1))
+
+        status = self.status(lost.id)
+        self.assertEqual(status['status'], 'failed')
+        self.assertIn('server stopped', status['error'])
+        self.assertEqual(self.status(queued.id)['status'], 'pending')
+        self.assertEqual(fail_stale_batches(), 0)
+        # A failed batch isn't picked up again
+        self.assertEqual(run_report_card_batch(lost.id).completed, 0)
+
+
+class ReportCardQueueTests(TestCase):
+    def test_batches_run_one_at_a_time_on_one_runner(self):
+        school = make_school()
+        batches = [ReportCardBatch.objects.create(school=school) for _ in range(3)]
+        ran, done = [], threading.Event()
+
+        def run(batch_id):
+            ran.append((batch_id, threading.current_thread()))
+            if len(ran) == len(batches):
+                done.set()
+
+        with mock.patch.object(report_card_batch, 'run_report_card_batch', side_effect=run), \
+                mock.patch.object(report_card_batch, 'fail_stale_batches'):
+            for batch in batches:
+                start_report_card_batch(batch)
+            self.assertTrue(done.wait(5))
+        self.assertEqual([batch_id for batch_id, _ in ran], [b.id for b in batches])
+        self.assertEqual(len({thread for _, thread in ran}), 1)
@@ -0,0 +1,93 @@
+import datetime
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import StudentAnswer, Subject, Test, Topic
+from core.taxonomy import clear_taxonomy_cache
+
+from .factories import answer, make_question, make_school, make_student, make_syllabus, make_teacher, make_test
+
+
+def reference_summary(student, subject=None, since=None):
+    """(test_count, avg_score) from per-test loops over the student's graded answers, each test weighted once."""
+    answers = StudentAnswer.objects.filter(student=student, marks_awarded__isnull=False).select_related('question')
+    if subject is not None:
+        answers = answers.filter(test__subject=subject)
+    if since is not None:
+        answers = answers.filter(test__created_at__gte=since)
+    test_ids = sorted({a.test_id for a in answers})
+    scores = []
+    for test_id in test_ids:
+        test_answers = [a for a in answers if a.test_id == test_id]
+        total = sum(float(a.question.marks or 0) for a in test_answers)
+        earned = sum(float(a.marks_awarded or 0) for a in test_answers)
+        if total > 0:
+            scores.append(earned / total * 100)
+    return len(test_ids), round(sum(scores) / len(scores), 1) if scores else 0
+
+
+class ReportCardDashboardTests(TestCase):
+    def setUp(self):
+        clear_taxonomy_cache()
+        self.addCleanup(clear_taxonomy_cache)
+        with self.captureOnCommitCallbacks(execute=True):
+            school = make_school()
+            self.teacher = make_teacher(school)
+            grade, self.physics, topics, _ = make_syllabus()
+            self.chemistry = Subject.objects.create(name='Chemistry', code='0620')
+            acids = Topic.objects.create(name='Acids', grade=grade, subject=self.chemistry)
+            physics = [make_question(self.teacher, grade, self.physics, topics[0], marks=m) for m in (1, 2, 5)]
+            chemistry = [make_question(self.teacher, grade, self.chemistry, acids, marks=m) for m in (4, 0)]
+            self.long_test = make_test(self.teacher, self.physics, physics)
+            short_test = make_test(self.teacher, self.physics, physics[:1], title='Quiz')
+            self.old_test = make_test(self.teacher, self.chemistry, chemistry, title='Acids')
+            Test.objects.filter(pk=self.old_test.pk).update(created_at=timezone.now() - datetime.timedelta(days=60))
+            zero_marks = make_test(self.teacher, self.chemistry, chemistry[1:], title='Survey')
+
+            self.students = [make_student(school, grade, self.teacher, n) for n in range(1, 6)]
+            s1, s2, s3, s4, _ = self.students
+            # Tests with different numbers of graded answers, so a per-answer
+            # weighting would give a different average
+            for question, marks in zip(physics, (1, 0, 1)):
+                answer(s1, self.long_test, question, marks=marks)
+            answer(s1, short_test, physics[0], marks=1)
+            answer(s1, self.old_test, chemistry[0], marks=3)
+            answer(s1, zero_marks, chemistry[1], marks=0)
+            answer(s2, self.long_test, physics[2], marks=5)
+            answer(s2, self.long_test, physics[1])  # ungraded
+            answer(s3, self.old_test, chemistry[0], marks=1)
+            answer(s4, short_test, physics[0])  # ungraded only
+        self.client.force_login(self.teacher)
+
+    def summaries(self, **params):
+        response = self.client.get(reverse('report_card_dashboard'), params)
+        return {row['student'].id: (row['test_count'], row['avg_score']) for row in response.context['students_data']}
+
+    def test_matches_the_per_test_loops(self):
+        self.assertEqual(self.summaries(), {s.id: reference_summary(s) for s in self.students})
+        self.assertEqual(self.summaries()[self.students[0].id], (4, 66.7))
+
+    def test_subject_and_date_filters(self):
+        self.assertEqual(
+            self.summaries(subject=self.chemistry.id),
+            {s.id: reference_summary(s, subject=self.chemistry) for s in self.students},
+        )
+        since = timezone.now() - datetime.timedelta(days=30)
+        self.assertEqual(
+            self.summaries(date_from=since.strftime('%Y-%m-%d')),
+            {s.id: reference_summary(s, since=since.replace(hour=0, minute=0, second=0, microsecond=0))
+             for s in self.students},
+        )
+
+    def test_query_count_doesnt_grow_with_the_page(self):
+        def queries(per_page):
+            self.client.get(reverse('report_card_dashboard'), {'per_page': 1})  # warm the session and taxonomy
+            with CaptureQueriesContext(connection) as captured:
+                self.client.get(reverse('report_card_dashboard'), {'per_page': per_page})
+            return len(captured)
+
+        self.assertEqual(queries(1), queries(5))
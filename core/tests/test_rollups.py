@@ -0,0 +1,122 @@
+import json
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase
+from django.urls import reverse
+
+from core.analytics import rollups
+from core.analytics.rollups import month_of, rebuild_school_rollups
+from core.models import SchoolSubjectMonth, StudentAnswer, StudentTestResult, Subject
+
+from .factories import answer, make_question, make_school, make_student, make_syllabus, make_teacher, make_test
+
+
+def result_rows():
+    return {
+        (r.student_id, r.test_id): (r.earned, r.max_marks, r.answers, r.graded_answers)
+        for r in StudentTestResult.objects.all()
+    }
+
+
+def month_cells():
+    return {
+        (c.school_id, c.subject_id, c.month): (c.earned, c.max_marks, c.results)
+        for c in SchoolSubjectMonth.objects.all()
+    }
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.school = make_school()
+            self.teacher = make_teacher(self.school)
+            self.grade, self.subject, topics, _ = make_syllabus()
+            self.questions = [
+                make_question(self.teacher, self.grade, self.subject, topics[0], marks=m) for m in (2, 3)
+            ]
+            self.test = make_test(self.teacher, self.subject, self.questions)
+            self.students = [make_student(self.school, self.grade, self.teacher, n) for n in range(2)]
+
+    def grade_all(self, marks):
+        with self.captureOnCommitCallbacks(execute=True):
+            for a in StudentAnswer.objects.filter(test=self.test):
+                a.marks_awarded = marks[(a.student_id, a.question_id)]
+                a.save()
+
+    def test_graded_answers_fill_attempt_rows_and_month_cells(self):
+        s0, s1 = self.students
+        q0, q1 = self.questions
+        with self.captureOnCommitCallbacks(execute=True):
+            for student in self.students:
+                for question in self.questions:
+                    answer(student, self.test, question)
+        self.grade_all({(s0.id, q0.id): 2, (s0.id, q1.id): 1, (s1.id, q0.id): 0, (s1.id, q1.id): 3})
+
+        self.assertEqual(result_rows(), {
+            (s0.id, self.test.id): (3.0, 5.0, 2, 2),
+            (s1.id, self.test.id): (3.0, 5.0, 2, 2),
+        })
+        month = month_of(StudentAnswer.objects.latest('submitted_at').submitted_at)
+        self.assertEqual(month_cells(), {(self.school.id, self.subject.id, month): (6.0, 10.0, 2)})
+
+        incremental = (result_rows(), month_cells())
+        self.assertEqual(rebuild_school_rollups(), (2, 1))
+        self.assertEqual((result_rows(), month_cells()), incremental)
+
+    def test_ungraded_saves_wait_for_submission(self):
+        student = self.students[0]
+        self.client.force_login(student.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('autosave_test_answers', args=[self.test.id]),
+                json.dumps({'answers': {f'q{self.questions[0].id}': 'A'}}),
+                content_type='application/json',
+            )
+        self.assertEqual(response.json(), {'success': True, 'message': 'Answers saved'})
+        self.assertFalse(StudentTestResult.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('submit_test', args=[self.test.id]),
+                json.dumps({'answers': {f'q{q.id}': 'B' for q in self.questions}}),
+                content_type='application/json',
+            )
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(result_rows(), {(student.id, self.test.id): (0.0, 0.0, 2, 0)})
+
+    def test_one_refresh_per_attempt_per_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for student in self.students:
+                for question in self.questions:
+                    answer(student, self.test, question)
+
+        with mock.patch.object(
+            rollups, 'refresh_student_test_result', wraps=rollups.refresh_student_test_result
+        ) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    for a in StudentAnswer.objects.filter(test=self.test):
+                        a.marks_awarded = 1
+                        a.save()
+        self.assertEqual(
+            sorted(call.args for call in refresh.call_args_list),
+            sorted((s.id, self.test.id) for s in self.students),
+        )
+
+    def test_deleting_answers_updates_cells(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            a = answer(self.students[0], self.test, self.questions[0], marks=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            a.delete()
+        self.assertEqual(result_rows(), {})
+        self.assertEqual(month_cells(), {})
+
+    def test_subject_change_moves_cells(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            answer(self.students[0], self.test, self.questions[0], marks=2)
+        other = Subject.objects.create(name='Chemistry', code='0620')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.test.subject = other
+            self.test.save()
+        self.assertEqual({subject for _, subject, _ in month_cells()}, {other.id})
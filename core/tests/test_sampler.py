@@ -0,0 +1,195 @@
+import numpy as np
+from django.core.cache import caches
+from django.db.models import F
+from django.db.models.functions import Abs
+from django.test import TestCase
+
+from core.analytics.irt import BAND_WINDOW
+from core.analytics.sampler import (
+    build_candidate_index, candidate_index, candidates, cover_los, mastered_question_ids, question_ids, sample,
+)
+from core.models import Grade, LearningObjective, Question, QuestionCalibration, StudentAnswer
+
+from .factories import answer, make_question, make_school, make_student, make_syllabus, make_teacher, make_test
+
+
+def reference_select(questions, count, target, window=BAND_WINDOW):
+    """The queryset selection sample(target=...) replaced: in-band at random, then nearest, then uncalibrated."""
+    picked = list(questions.filter(calibration__difficulty__range=(target - window, target + window))[:count])
+    picked += list(
+        questions.exclude(id__in=[q.id for q in picked])
+        .annotate(distance=Abs(F('calibration__difficulty') - target))
+        .order_by(F('distance').asc(nulls_last=True))[:count - len(picked)]
+    )
+    return {q.id for q in picked}
+
+
+def reference_cover(tags, count, skip_los=()):
+    """Greedy set cover over {question_id: {lo ids}} with plain sets; (picked ids, covered LOs)."""
+    remaining = {qid: set(los) - set(skip_los) for qid, los in tags.items()}
+    picked, covered = [], set()
+    while len(picked) < count:
+        gains = {qid: len(los - covered) for qid, los in remaining.items() if qid not in picked}
+        if not gains or max(gains.values()) == 0:
+            break
+        best = max(gains, key=gains.get)
+        picked.append(best)
+        covered |= remaining[best]
+    return picked, covered
+
+
+class SamplerTests(TestCase):
+    def setUp(self):
+        caches['analytics'].clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            school = make_school()
+            self.teacher = make_teacher(school)
+            self.grade, self.subject, self.topics, los = make_syllabus(topics=2, los_per_topic=4)
+            self.grade2 = Grade.objects.create(name='IGCSE-2', grade_level='IGCSE')
+            self.dp = Grade.objects.create(name='DP-1', grade_level='DP')
+            t0, t1 = self.topics
+            a, b, c, d = los[t0.id]
+            e, f, g, _ = los[t1.id]
+            # (topic, grade, difficulty or None, LOs); the gains of the LO
+            # cover below have no ties, so its order is deterministic
+            spec = [
+                (t0, self.grade, -0.2, [a, b, c]),
+                (t0, self.grade, 0.3, [c, d, e, f]),
+                (t0, self.grade2, 1.2, [f]),
+                (t0, self.grade, 2.0, [g]),
+                (t0, self.dp, 0.1, []),
+                (t1, self.grade, None, [a]),
+                (t1, self.grade2, -1.5, []),
+                (t1, self.grade, None, []),
+            ]
+            self.questions = []
+            for topic, grade, difficulty, tags in spec:
+                question = make_question(self.teacher, grade, self.subject, topic)
+                question.learning_objectives.set(tags)
+                if difficulty is not None:
+                    QuestionCalibration.objects.create(question=question, subject=self.subject, difficulty=difficulty)
+                self.questions.append(question)
+            # Sub-questions are never candidates
+            make_question(self.teacher, self.grade, self.subject, t0, parent=self.questions[0])
+        self.index = candidate_index(self.subject.id)
+        self.lo = {lo.code: lo.id for lo in LearningObjective.objects.all()}
+
+    def roots(self, **filters):
+        return Question.objects.filter(subject=self.subject, parent__isnull=True, **filters)
+
+    def test_index_matches_the_question_rows(self):
+        index = self.index
+        roots = list(self.roots().order_by('id'))
+        self.assertEqual(index['id'].tolist(), [q.id for q in roots])
+        self.assertEqual(index['topic'].tolist(), [q.topic_id for q in roots])
+        self.assertEqual(index['grade'].tolist(), [q.grade_id for q in roots])
+        calibrated = dict(QuestionCalibration.objects.values_list('question_id', 'difficulty'))
+        np.testing.assert_array_equal(index['difficulty'], [calibrated.get(q.id, np.nan) for q in roots])
+        for row, question in enumerate(roots):
+            self.assertEqual(
+                index['lo_ids'][index['lo_ptr'][row]:index['lo_ptr'][row + 1]].tolist(),
+                sorted(question.learning_objectives.values_list('id', flat=True)),
+            )
+
+    def test_candidates_match_the_queryset_filters(self):
+        t0, t1 = self.topics
+        same_level = [self.grade.id, self.grade2.id]
+        excluded = [self.questions[1].id]
+        cases = [
+            ({}, {}),
+            ({'topic_ids': [t0.id]}, {'topic': t0}),
+            ({'topic_ids': [t1.id], 'grade_ids': same_level}, {'topic': t1, 'grade__in': same_level}),
+        ]
+        for kwargs, filters in cases:
+            rows = candidates(self.index, exclude_ids=excluded, **kwargs)
+            self.assertEqual(
+                question_ids(self.index, rows),
+                list(self.roots(**filters).exclude(id__in=excluded).order_by('id').values_list('id', flat=True)),
+                msg=kwargs,
+            )
+
+    def test_sample_by_difficulty_tier(self):
+        rows = candidates(self.index)
+        band = {self.questions[n].id for n in (0, 1, 4)}
+        # Three in the band around 0, then the nearest calibrated ones, then
+        # uncalibrated; only the order within a tier is random
+        for count in (1, 2, 3, 5, 8):
+            for seed in range(5):
+                found = question_ids(self.index, sample(self.index, rows, count, target=0.0,
+                                                        rng=np.random.default_rng(seed)))
+                self.assertEqual(len(found), len(set(found)))
+                if count < len(band):
+                    self.assertTrue(set(found) <= band)
+                else:
+                    self.assertEqual(set(found), reference_select(self.roots(), count, 0.0), msg=(count, seed))
+
+    def test_uniform_sample(self):
+        rows = candidates(self.index, topic_ids=[self.topics[0].id])
+        drawn = set()
+        for seed in range(20):
+            found = sample(self.index, rows, 3, rng=np.random.default_rng(seed))
+            self.assertEqual(len(set(found.tolist())), 3)
+            self.assertTrue(set(found.tolist()) <= set(rows.tolist()))
+            drawn.update(found.tolist())
+        self.assertEqual(drawn, set(rows.tolist()))
+        self.assertEqual(len(sample(self.index, rows, 50)), rows.size)
+
+    def test_cover_los_matches_greedy_set_cover(self):
+        rows = candidates(self.index)
+        tags = {q.id: set(q.learning_objectives.values_list('id', flat=True)) for q in self.roots()}
+        for skip in ([], [self.lo['0.3'], self.lo['1.0'], self.lo['1.1']]):
+            expected, _ = reference_cover(tags, 4, skip)
+            for seed in range(5):
+                found = question_ids(self.index, cover_los(self.index, rows, 4, skip_los=skip,
+                                                           rng=np.random.default_rng(seed)))
+                self.assertEqual(found[:len(expected)], expected, msg=(skip, seed))
+                self.assertEqual(len(set(found)), 4)
+
+    def test_cached_until_a_retag(self):
+        with self.assertNumQueries(1):  # the version lookup
+            candidate_index(self.subject.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.questions[7].learning_objectives.add(self.lo['1.1'])
+        index = candidate_index(self.subject.id)
+        fresh = build_candidate_index(self.subject.id)
+        for name in ('id', 'lo_ptr', 'lo_ids'):
+            np.testing.assert_array_equal(index[name], fresh[name])
+        self.assertEqual(index['lo_ids'][index['lo_ptr'][7]:].tolist(), [self.lo['1.1']])
+
+
+class MasteredQuestionTests(TestCase):
+    def test_matches_the_per_answer_threshold(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            school = make_school()
+            teacher = make_teacher(school)
+            grade, subject, topics, _ = make_syllabus()
+            questions = [make_question(teacher, grade, subject, topics[n % 2], marks=m)
+                         for n, m in enumerate((10, 10, 3, 0))]
+            test = make_test(teacher, subject, questions)
+            students = [make_student(school, grade, teacher, n) for n in range(2)]
+            marks = [(7, 6.9, 3, 0), (9, 10, 2, 0)]
+            for student, row in zip(students, marks):
+                for question, mark in zip(questions, row):
+                    answer(student, test, question, marks=mark)
+
+        def reference(student_ids, **filters):
+            mastered = None
+            for student_id in student_ids:
+                ids = {
+                    qid for qid, awarded, max_marks in
+                    StudentAnswer.objects.filter(student_id=student_id, **filters)
+                    .values_list('question_id', 'marks_awarded', 'question__marks')
+                    if max_marks and awarded is not None and float(awarded) / float(max_marks) >= 0.7
+                }
+                mastered = ids if mastered is None else mastered & ids
+            return mastered
+
+        first, second = students
+        self.assertEqual(mastered_question_ids([first.id]), reference([first.id]))
+        self.assertEqual(mastered_question_ids([first.id]), {questions[0].id, questions[2].id})
+        self.assertEqual(mastered_question_ids([first.id, second.id]), reference([first.id, second.id]))
+        self.assertEqual(
+            mastered_question_ids([first.id], question__topic_id=topics[0].id),
+            reference([first.id], question__topic_id=topics[0].id),
+        )
+        self.assertEqual(mastered_question_ids([]), set())
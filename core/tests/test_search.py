@@ -0,0 +1,65 @@
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from core.search import plain_text, search_questions
+
+from .factories import make_question, make_school, make_syllabus, make_teacher
+
+
+class SearchQuestionsTests(TestCase):
+    def setUp(self):
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.teacher = make_teacher(make_school())
+            self.grade, self.subject, self.topics, _ = make_syllabus()
+
+    def make(self, text, answer='', topic=0):
+        # Search documents are written on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_question(
+                self.teacher, self.grade, self.subject, self.topics[topic], text=text, answer_text=answer
+            )
+
+    def ids(self, query, **filters):
+        return [pk for pk, _, _ in search_questions(query, **filters)['hits']]
+
+    def test_question_text_outranks_markscheme(self):
+        in_answer = self.make('<p>A ball is dropped</p>', answer='<p>Use the pendulum formula</p>')
+        in_text = self.make('<p>A simple pendulum swings</p>')
+        unrelated = self.make('<p>Ohm law</p>')
+        self.assertEqual(self.ids('pendulum'), [in_text.id, in_answer.id])
+        self.assertNotIn(unrelated.id, self.ids('pendulum'))
+
+    def test_every_term_must_match_and_last_is_a_prefix(self):
+        both = self.make('<p>Pendulum period and length</p>')
+        self.make('<p>Pendulum swings</p>')
+        self.assertEqual(self.ids('pendulum perio'), [both.id])
+
+    def test_continues_after_the_last_hit(self):
+        questions = [self.make(f'<p>Pendulum {n}</p>') for n in range(3)]
+        first = search_questions('pendulum', limit=2)['hits']
+        last_id, last_rank, _ = first[-1]
+        rest = search_questions('pendulum', limit=2, after=(last_rank, last_id))['hits']
+        self.assertEqual(sorted(pk for pk, _, _ in first + rest), [q.id for q in questions])
+
+    def test_facets_count_across_other_filters(self):
+        self.make('<p>Pendulum one</p>', topic=0)
+        self.make('<p>Pendulum two</p>', topic=1)
+        found = search_questions('pendulum', topic_id=self.topics[0].id)
+        self.assertEqual(found['total'], 1)
+        self.assertEqual(found['facets']['topic'], {self.topics[0].id: 1, self.topics[1].id: 1})
+        self.assertEqual(found['facets']['subject'], {self.subject.id: 1})
+
+    def test_highlight_escapes_question_text(self):
+        self.make('<p>&lt;img src=x onerror=alert(1)&gt; pendulum &amp; spring</p>')
+        (_, _, highlight), = search_questions('pendulum')['hits']
+        self.assertEqual(
+            highlight, '&lt;img src=x onerror=alert(1)&gt; <mark>pendulum</mark> &amp; spring'
+        )
+
+    def test_plain_text_drops_tags_and_images(self):
+        self.assertEqual(
+            plain_text('<p>Mass<br>of <b>ball</b></p><img src="data:image/png;base64,AAAA">&amp; more'),
+            'Mass of ball & more',
+        )
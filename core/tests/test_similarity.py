@@ -0,0 +1,93 @@
+import tempfile
+from pathlib import Path
+
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from core import similarity
+from core.models import Question, QuestionVector, Subject
+from core.similarity import rebuild, similar_questions
+
+from .factories import make_question, make_school, make_syllabus, make_teacher
+
+
+class SimilarQuestionsTests(TestCase):
+    def setUp(self):
+        directory = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(override_settings(QUESTION_SIMILARITY_DIR=directory, SIMILARITY_CHECK_INTERVAL=0))
+        # The index is per process; start every test without one
+        similarity._state.update(index=None, checked_at=0.0)
+        self.addCleanup(similarity._state.update, index=None, checked_at=0.0)
+
+        self.teacher = make_teacher(make_school())
+        self.grade, self.subject, self.topics, self.los = make_syllabus()
+        self.pendulum = self.make('<p>Calculate the period of a simple pendulum of length 0.8 m.</p>')
+        self.closest = self.make('<p>Calculate the period of a simple pendulum of length 1.2 m on the Moon.</p>')
+        self.related = self.make('<p>State two factors that affect the period of a pendulum.</p>', topic=1)
+        self.unrelated = self.make('<p>Define electrical resistance and give its unit.</p>', topic=1)
+
+    def make(self, text, subject=None, topic=0, **fields):
+        # Search documents and vectors are written on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_question(
+                self.teacher, self.grade, subject or self.subject, self.topics[topic], text=text, **fields
+            )
+
+    def ids(self, question, **kwargs):
+        return [pk for pk, _ in similar_questions(question.id, **kwargs)]
+
+    def test_closest_first_without_the_question_itself(self):
+        self.assertEqual(self.ids(self.pendulum)[:2], [self.closest.id, self.related.id])
+        self.assertNotIn(self.pendulum.id, self.ids(self.pendulum))
+        scores = [score for _, score in similar_questions(self.pendulum.id)]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(self.ids(self.pendulum, k=1, exclude=[self.closest.id]), [self.related.id])
+
+    def test_snapshot_plus_later_writes(self):
+        self.assertEqual(rebuild(batch_size=2), 4)
+        self.assertEqual(self.ids(self.pendulum)[:2], [self.closest.id, self.related.id])
+
+        # Written after the snapshot: picked up from the database rows
+        newer = self.make(self.pendulum.question_text)
+        self.assertEqual(self.ids(self.pendulum)[0], newer.id)
+        Question.objects.filter(pk=newer.pk).delete()
+        self.assertNotIn(newer.id, self.ids(self.pendulum))
+
+    def test_subject_filter_and_sub_questions(self):
+        chemistry = Subject.objects.create(name='Chemistry', code='0620')
+        twin = self.make(self.pendulum.question_text, subject=chemistry)
+        part = self.make(self.pendulum.question_text, parent=self.related)
+        self.assertEqual(self.ids(self.pendulum)[0], twin.id)
+        self.assertNotIn(twin.id, self.ids(self.pendulum, subject_id=self.subject.id))
+        self.assertNotIn(part.id, self.ids(self.pendulum))
+
+    def test_one_ordered_refresh_per_transaction(self):
+        lo = self.los[self.topics[0].id][0]
+        with mock.patch('core.signals.refresh_vectors', wraps=similarity.refresh_vectors) as refresh, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.pendulum.question_text = '<p>Define electrical resistance.</p>'
+            self.pendulum.save()
+            lo.questions.add(self.pendulum, self.closest)
+            refresh.assert_not_called()
+        refresh.assert_called_once_with({self.pendulum.id, self.closest.id})
+        # The vector was built from the search document written just before it
+        self.assertEqual(self.ids(self.unrelated)[0], self.pendulum.id)
+
+    def test_lo_clear_refreshes_every_question_it_tagged(self):
+        lo = self.los[self.topics[0].id][0]
+        with self.captureOnCommitCallbacks(execute=True):
+            lo.questions.add(self.pendulum, self.closest)
+        tagged = dict(QuestionVector.objects.values_list('question_id', 'vector'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lo.questions.clear()
+        self.assertNotIn('_cleared_question_ids', lo.__dict__)
+        vectors = dict(QuestionVector.objects.values_list('question_id', 'vector'))
+        self.assertNotEqual(vectors[self.pendulum.id], tagged[self.pendulum.id])
+        self.assertNotEqual(vectors[self.closest.id], tagged[self.closest.id])
+        self.assertEqual(vectors[self.related.id], tagged[self.related.id])
+        self.assertEqual(
+            list(Question.objects.filter(pk__in=[self.pendulum.pk, self.closest.pk]).values_list('lo_count', flat=True)),
+            [0, 0],
+        )
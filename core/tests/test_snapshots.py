@@ -0,0 +1,132 @@
+import datetime
+import tempfile
+from pathlib import Path
+from unittest import mock, skipUnless
+
+import numpy as np
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.analytics import snapshots
+from core.analytics.performance import ClassAnalytics
+from core.analytics.snapshots import (
+    PARQUET_AVAILABLE, export_snapshot, months_between, read_answers, read_dimension, read_manifest,
+)
+from core.models import StudentAnswer, Subject, Topic
+
+from .factories import answer, make_question, make_school, make_student, make_syllabus, make_teacher, make_test
+
+
+class SnapshotRoundTrip:
+    """Export → read tests, run once per column file format."""
+    parquet = None
+
+    def setUp(self):
+        self.directory = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(override_settings(ANALYTICS_SNAPSHOT_DIR=self.directory))
+        self.enterContext(mock.patch.object(snapshots, 'PARQUET_AVAILABLE', self.parquet))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.school = make_school()
+            self.other_school = make_school('Other', 'S2')
+            teacher = make_teacher(self.school)
+            grade, self.subject, topics, _ = make_syllabus()
+            chemistry = Subject.objects.create(name='Chemistry', code='0620')
+            acids = Topic.objects.create(name='Acids', grade=grade, subject=chemistry)
+            questions = [
+                make_question(teacher, grade, self.subject, topics[0], marks=2),
+                make_question(teacher, grade, self.subject, topics[1], marks=4),
+                make_question(teacher, grade, chemistry, acids, marks=0),
+            ]
+            self.test = make_test(teacher, self.subject, questions)
+            self.draft = draft = make_test(teacher, self.subject, questions[:1], title='Draft')
+            draft.is_published = False
+            draft.save()
+
+            students = [make_student(self.school, grade, teacher, n) for n in range(3)]
+            students.append(make_student(self.other_school, grade, teacher, 9))
+            marks = [(2, 1, 0), (1, 4, None), (0, None, 0), (2, 2, 0)]
+            for student, row in zip(students, marks):
+                for question, mark in zip(questions, row):
+                    answer(student, self.test, question, marks=mark)
+            answer(students[0], draft, questions[0], marks=2)
+        # One attempt from last month, to check month pruning
+        self.earlier = StudentAnswer.objects.filter(student=students[1]).order_by('id').first()
+        StudentAnswer.objects.filter(pk=self.earlier.pk).update(
+            submitted_at=timezone.now() - datetime.timedelta(days=45)
+        )
+
+    def test_answers_and_dimensions_round_trip(self):
+        suffix = '.parquet' if self.parquet else '.npz'
+        self.assertEqual(export_snapshot(full=True), 3)
+        manifest = read_manifest()
+        self.assertEqual(manifest['format'], 'parquet' if self.parquet else 'npz')
+        self.assertEqual(sum(p['rows'] for p in manifest['partitions'].values()), StudentAnswer.objects.count())
+        self.assertTrue(all(path.suffix == suffix for path in (self.directory / 'answers').rglob('part.*')))
+
+        answers = read_answers()
+        order = np.argsort(answers['answer_id'])
+        expected = list(StudentAnswer.objects.order_by('id').values_list(
+            'id', 'student_id', 'question__subject_id', 'question__topic_id', 'marks_awarded', 'question__marks',
+        ))
+        self.assertEqual(answers['answer_id'][order].tolist(), [row[0] for row in expected])
+        self.assertEqual(answers['student_id'][order].tolist(), [row[1] for row in expected])
+        self.assertEqual(answers['subject_id'][order].tolist(), [row[2] for row in expected])
+        self.assertEqual(answers['topic_id'][order].tolist(), [row[3] for row in expected])
+        # Ungraded answers have NaN marks
+        np.testing.assert_array_equal(
+            answers['marks_awarded'][order], [np.nan if row[4] is None else float(row[4]) for row in expected]
+        )
+        self.assertEqual(answers['max_marks'][order].tolist(), [float(row[5]) for row in expected])
+
+        tests = read_dimension('tests', ['test_id', 'is_published'])
+        self.assertEqual(
+            dict(zip(tests['test_id'].tolist(), tests['is_published'].tolist())),
+            {self.test.id: True, self.draft.id: False},
+        )
+
+    def test_reads_prune_partitions_and_columns(self):
+        export_snapshot(full=True)
+        mine = read_answers(schools=[self.school.id], months=months_between(timezone.now(), timezone.now()),
+                            columns=['answer_id'])
+        self.assertEqual(list(mine), ['answer_id'])
+        self.assertEqual(
+            sorted(mine['answer_id'].tolist()),
+            list(StudentAnswer.objects.filter(student__school=self.school).exclude(pk=self.earlier.pk)
+                 .order_by('id').values_list('id', flat=True)),
+        )
+        self.assertEqual(read_answers(schools=[0])['answer_id'].size, 0)
+
+    def test_class_average_reads_a_current_snapshot(self):
+        analytics = ClassAnalytics(self.school)
+        live = analytics.class_average_per_subject()
+        self.assertEqual({row['subject'] for row in live}, {'Physics', 'Chemistry'})
+
+        export_snapshot()
+        with mock.patch.object(ClassAnalytics, '_class_average_from_snapshot',
+                               wraps=analytics._class_average_from_snapshot) as from_snapshot:
+            self.assertEqual(
+                sorted(analytics.class_average_per_subject(), key=lambda row: row['subject']),
+                sorted(live, key=lambda row: row['subject']),
+            )
+            self.assertEqual(from_snapshot.call_count, 1)
+
+            # Grading after the export makes the snapshot stale for this school
+            with self.captureOnCommitCallbacks(execute=True):
+                ungraded = StudentAnswer.objects.filter(marks_awarded__isnull=True, student__school=self.school).first()
+                ungraded.marks_awarded = 1
+                ungraded.save()
+            self.assertFalse(snapshots.is_current(self.school))
+            self.assertTrue(snapshots.is_current(self.other_school))
+            fresh = analytics.class_average_per_subject()
+            self.assertEqual(from_snapshot.call_count, 1)
+        self.assertNotEqual(fresh, live)
+
+
+class NpzSnapshotTests(SnapshotRoundTrip, TestCase):
+    parquet = False
+
+
+@skipUnless(PARQUET_AVAILABLE, 'pyarrow is not installed')
+class ParquetSnapshotTests(SnapshotRoundTrip, TestCase):
+    parquet = True
@@ -0,0 +1,185 @@
+import math
+import statistics
+
+import numpy as np
+from django.core.cache import caches
+from django.test import TestCase
+
+from core.analytics import stats
+from core.models import StudentAnswer
+from core.views import _build_test_analytics
+
+from .factories import answer, make_question, make_school, make_student, make_syllabus, make_teacher, make_test
+
+SCORES = [100.0, 72.5, 70.0, 41.25, 9.99, 0.0, 55.0]
+
+
+# The per-row loops _build_test_analytics used before core.analytics.stats
+
+def legacy_histogram(values):
+    bins = [0] * 10
+    for v in values:
+        bins[min(9, int(v // 10))] += 1
+    return bins
+
+
+def legacy_gaussian_curve(mu, sigma, n):
+    curve_x = list(range(0, 101, 2))
+    if sigma == 0:
+        return curve_x, [0 for _ in curve_x]
+    return curve_x, [
+        (1 / (sigma * math.sqrt(2 * math.pi))) * math.exp(-0.5 * ((x - mu) / sigma) ** 2) * n * 10
+        for x in curve_x
+    ]
+
+
+def legacy_correlation(times, accuracy):
+    n = len(times)
+    mean_t = sum(times) / n
+    mean_a = sum(accuracy) / n
+    numerator = sum((t - mean_t) * (a - mean_a) for t, a in zip(times, accuracy))
+    denom_t = sum((t - mean_t) ** 2 for t in times) ** 0.5
+    denom_a = sum((a - mean_a) ** 2 for a in accuracy) ** 0.5
+    return numerator / (denom_t * denom_a) if denom_t * denom_a > 0 else 0
+
+
+class StatsFunctionTests(TestCase):
+    def test_describe_matches_statistics(self):
+        found = stats.describe(SCORES)
+        self.assertEqual((found['count'], found['min'], found['max']), (7, 0.0, 100.0))
+        self.assertAlmostEqual(found['mean'], statistics.mean(SCORES))
+        self.assertAlmostEqual(found['median'], statistics.median(SCORES))
+        self.assertAlmostEqual(found['std'], statistics.stdev(SCORES))
+        self.assertAlmostEqual(stats.describe(SCORES, ddof=0)['std'], statistics.pstdev(SCORES))
+        self.assertEqual(stats.describe([42.0])['std'], 0.0)
+        self.assertEqual(stats.describe([])['count'], 0)
+
+    def test_histogram_and_curve_match_the_loops(self):
+        self.assertEqual(stats.histogram(SCORES), legacy_histogram(SCORES))
+        # Bin edges land in the upper bin, 100% in the last one
+        self.assertEqual(stats.histogram([10.0, 20.0, 100.0]), legacy_histogram([10.0, 20.0, 100.0]))
+
+        mean, std = stats.gaussian_fit(SCORES)
+        x, y = stats.gaussian_curve(mean, std, len(SCORES))
+        legacy_x, legacy_y = legacy_gaussian_curve(mean, std, len(SCORES))
+        self.assertEqual(x, legacy_x)
+        np.testing.assert_allclose(y, legacy_y)
+        self.assertEqual(stats.gaussian_curve(50.0, 0.0, 3)[1], legacy_gaussian_curve(50.0, 0.0, 3)[1])
+
+    def test_pearson_matches_the_loop(self):
+        times = [30.0, 45.0, 12.0, 90.0, 60.0]
+        accuracy = [100.0, 50.0, 0.0, 66.7, 33.3]
+        self.assertAlmostEqual(stats.pearson(times, accuracy), legacy_correlation(times, accuracy))
+        self.assertEqual(stats.pearson([1.0, 1.0, 1.0], accuracy[:3]), 0.0)
+
+    def test_group_sums_in_first_appearance_order(self):
+        keys, counts, first, second = stats.group_sums([7, 3, 7, 5, 3], [1, 2, 3, 4, 5], [1, 1, 1, 1, 1])
+        self.assertEqual(keys.tolist(), [7, 3, 5])
+        self.assertEqual(counts.tolist(), [2, 2, 1])
+        self.assertEqual(first.tolist(), [4.0, 7.0, 4.0])
+        self.assertEqual(second.tolist(), [2.0, 2.0, 1.0])
+        self.assertEqual(stats.group_sums([], [])[0].size, 0)
+
+    def test_zscores_percentiles_and_sections(self):
+        mean, std = statistics.mean(SCORES), statistics.stdev(SCORES)
+        np.testing.assert_allclose(stats.zscores(SCORES), [(v - mean) / std for v in SCORES])
+        self.assertEqual(stats.zscores([5.0, 5.0]).tolist(), [0.0, 0.0])
+        self.assertEqual(stats.percentiles(SCORES, q=(50,)), {50: statistics.median(SCORES)})
+
+        sections = stats.section_breakdown(SCORES, ['B', 'A', 'B', 'A', 'B', 'C', 'A'])
+        self.assertEqual(list(sections), ['B', 'A', 'C'])
+        self.assertAlmostEqual(sections['A']['mean'], statistics.mean([72.5, 41.25, 55.0]))
+        self.assertEqual(sections['C']['std'], 0.0)
+
+
+class TestAnalyticsPayloadTests(TestCase):
+    """_build_test_analytics against the per-row aggregation it replaced, on a small graded test."""
+
+    def setUp(self):
+        caches['analytics'].clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            school = make_school()
+            teacher = make_teacher(school)
+            grade, subject, topics, _ = make_syllabus()
+            questions = [
+                make_question(teacher, grade, subject, topics[0], marks=2),
+                make_question(teacher, grade, subject, topics[0], marks=1),
+                make_question(teacher, grade, subject, topics[1], marks=4),
+            ]
+            self.test = make_test(teacher, subject, questions)
+            # (marks, seconds) per question; None leaves the question unanswered
+            rows = [
+                [(2, 40), (1, 15), (4, 120)],
+                [(1, 55), (0, None), (3, 200)],
+                [(0, 20), (1, 30), None],
+                [(2, None), (1, None), (0, None)],
+            ]
+            for n, row in enumerate(rows):
+                student = make_student(school, grade, teacher, n)
+                for question, response in zip(questions, row):
+                    if response is not None:
+                        marks, seconds = response
+                        a = answer(student, self.test, question, marks=marks)
+                        StudentAnswer.objects.filter(pk=a.pk).update(time_spent_seconds=seconds)
+        self.payload = _build_test_analytics(self.test)
+        self.answers = list(
+            StudentAnswer.objects.filter(test=self.test, marks_awarded__isnull=False)
+            .select_related('question', 'question__topic')
+        )
+
+    def test_distribution(self):
+        distribution = self.payload['distribution']
+        scores = distribution['scores']
+        self.assertEqual(sorted(scores), [14.29, 42.86, 57.14, 100.0])
+        self.assertEqual(distribution['histogram'], legacy_histogram(scores))
+        self.assertEqual(distribution['mean'], round(statistics.mean(scores), 2))
+        self.assertEqual(distribution['median'], round(statistics.median(scores), 2))
+        self.assertEqual(distribution['std_dev'], round(statistics.stdev(scores), 2))
+        np.testing.assert_allclose(
+            distribution['curve']['y'],
+            legacy_gaussian_curve(statistics.mean(scores), statistics.stdev(scores), len(scores))[1],
+        )
+
+    def test_time_analytics(self):
+        timed = [(a.time_spent_seconds, float(a.marks_awarded), float(a.question.marks))
+                 for a in self.answers if a.time_spent_seconds is not None]
+        times = [t for t, _, _ in timed]
+        student_times = {}
+        for a in self.answers:
+            if a.time_spent_seconds is not None:
+                student_times[a.student_id] = student_times.get(a.student_id, 0) + a.time_spent_seconds
+
+        found = self.payload['time_analytics']
+        self.assertEqual(found['total_timed_answers'], len(timed))
+        self.assertEqual(found['avg_time_per_question'], round(sum(times) / len(times), 1))
+        self.assertEqual(found['median_time_per_question'], sorted(times)[len(times) // 2])
+        self.assertEqual(
+            found['avg_total_time_per_student'], round(sum(student_times.values()) / len(student_times), 1)
+        )
+        self.assertEqual(found['time_accuracy_correlation'], round(legacy_correlation(
+            times, [round(e / m * 100, 1) if m > 0 else 0 for _, e, m in timed]
+        ), 3))
+        self.assertEqual(
+            sorted(row['time'] for row in found['student_time_score']),
+            sorted(round(t / 60, 1) for t in student_times.values()),
+        )
+
+    def test_topic_mastery_and_matrix(self):
+        topic_map, matrix = {}, {}
+        for a in self.answers:
+            for totals in (topic_map.setdefault(a.question.topic.name, [0.0, 0.0]),
+                           matrix.setdefault(a.student_id, {}).setdefault(a.question.topic.name, [0.0, 0.0])):
+                totals[0] += float(a.marks_awarded)
+                totals[1] += float(a.question.marks)
+
+        self.assertEqual(
+            {lo['name']: lo['avg_mastery'] for lo in self.payload['learning_objectives']},
+            {name: round(e / m * 100, 1) for name, (e, m) in topic_map.items()},
+        )
+        names = [lo['name'] for lo in self.payload['learning_objectives']]
+        for student in self.payload['students']:
+            expected = matrix.get(student['id'], {})
+            self.assertEqual(student['lo_performance'], {
+                name: round(expected[name][0] / expected[name][1] * 100, 1) if name in expected else None
+                for name in names
+            })
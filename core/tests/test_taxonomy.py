@@ -0,0 +1,94 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.models import AnalyticsVersion, Grade, LearningObjective, Subject, Topic
+from core.taxonomy import TAXONOMY_SCOPE, Taxonomy, clear_taxonomy_cache, get_taxonomy
+
+from .factories import make_school, make_syllabus, make_teacher
+
+
+class TaxonomyTests(TestCase):
+    def setUp(self):
+        clear_taxonomy_cache()
+        self.addCleanup(clear_taxonomy_cache)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.grade, self.subject, self.topics, self.los = make_syllabus()
+            self.chemistry = Subject.objects.create(name='Chemistry', code='0620')
+            self.acids = Topic.objects.create(name='Acids', grade=self.grade, subject=self.chemistry)
+            # Created after 'Topic 0' / 'Topic 1' but sorts first
+            self.forces = Topic.objects.create(name='Forces', grade=self.grade, subject=self.subject)
+        self.client.force_login(make_teacher(make_school()))
+
+    def ajax_topics(self, **params):
+        return [row['name'] for row in self.client.get(reverse('ajax_topics'), params).json()['topics']]
+
+    def ajax_los(self, **params):
+        return self.client.get(reverse('ajax_los'), params).json()['los']
+
+    def test_ajax_topics(self):
+        self.assertEqual(self.ajax_topics(grade_id=self.grade.id, subject_id=self.subject.id),
+                         ['Forces', 'Topic 0', 'Topic 1'])
+        self.assertEqual(self.ajax_topics(subject_id=self.chemistry.id), ['Acids'])
+        self.assertEqual(self.ajax_topics(grade_id=self.grade.id), ['Acids', 'Forces', 'Topic 0', 'Topic 1'])
+        self.assertEqual(self.ajax_topics(grade_id='abc', subject_id=self.subject.id), [])
+        self.assertEqual(self.ajax_topics(grade_id=self.grade.id + 100, subject_id=self.subject.id), [])
+
+    def test_ajax_learning_objectives(self):
+        topic = self.topics[1]
+        LearningObjective.objects.create(code='1.0a', description='Later', grade=self.grade, subject=self.subject,
+                                         topic=topic)
+        clear_taxonomy_cache()
+        self.assertEqual(self.ajax_los(topic_id=topic.id), [
+            {'id': lo.id, 'code': lo.code, 'description': lo.description}
+            for lo in LearningObjective.objects.filter(topic=topic).order_by('code')
+        ])
+        self.assertEqual([lo['code'] for lo in self.ajax_los(topic_id=topic.id)], ['1.0', '1.0a', '1.1'])
+        self.assertEqual(self.ajax_los(), [])
+        self.assertEqual(self.ajax_los(topic_id=self.acids.id), [])
+
+    def test_cached_until_a_change_commits(self):
+        taxonomy = get_taxonomy()
+        with self.assertNumQueries(0):
+            self.assertIs(get_taxonomy(), taxonomy)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Topic.objects.create(name='Waves', grade=self.grade, subject=self.subject)
+        self.assertIsNot(get_taxonomy(), taxonomy)
+        self.assertIn('Waves', self.ajax_topics(grade_id=self.grade.id, subject_id=self.subject.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.forces.delete()
+        self.assertNotIn('Forces', self.ajax_topics(grade_id=self.grade.id, subject_id=self.subject.id))
+
+    def test_another_process_bump_reloads_after_the_check_interval(self):
+        taxonomy = get_taxonomy()
+        # Written by another process: this one's cache isn't cleared
+        Topic.objects.bulk_create([Topic(name='Waves', grade=self.grade, subject=self.subject)])
+        AnalyticsVersion.objects.filter(scope=TAXONOMY_SCOPE, object_id=0).update(version=99)
+        self.assertIs(get_taxonomy(), taxonomy)
+        with override_settings(TAXONOMY_CHECK_INTERVAL=0):
+            self.assertIn('Waves', [t.name for t in get_taxonomy().topic_list()])
+            # Unchanged version: the check doesn't reload
+            taxonomy = get_taxonomy()
+            self.assertIs(get_taxonomy(), taxonomy)
+
+    def test_rows_without_a_loaded_parent_are_skipped(self):
+        # As if a grade and its topics were inserted between the loader's queries
+        late = Grade(id=self.grade.id + 100, name='IGCSE-2')
+        orphan = Topic(id=self.forces.id + 100, name='Orphan', grade=late, subject=self.subject)
+        orphan_lo = LearningObjective(code='9.9', grade=self.grade, subject=self.subject, topic=orphan)
+        taxonomy = Taxonomy(
+            Grade.objects.all(), Subject.objects.all(), [*Topic.objects.all(), orphan],
+            [*LearningObjective.objects.all(), orphan_lo],
+        )
+        self.assertNotIn(orphan.id, taxonomy.topics)
+        self.assertEqual(taxonomy.topics_for(late.id), [])
+        self.assertEqual(len(taxonomy.learning_objectives), LearningObjective.objects.count())
+
+    def test_same_level_grades(self):
+        other = Grade.objects.create(name='IGCSE-2', grade_level='IGCSE')
+        Grade.objects.create(name='A-1', grade_level='A Level')
+        loose = Grade.objects.create(name='Loose', grade_level='')
+        taxonomy = get_taxonomy()
+        self.assertEqual(taxonomy.same_level_grades(self.grade), [self.grade, other])
+        self.assertEqual(taxonomy.same_level_grades(loose), [loose])
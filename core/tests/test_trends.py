@@ -0,0 +1,121 @@
+import datetime
+import statistics
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from core.analytics.trends import compute_series_trends, refresh_student_trends, trend_flag
+from core.models import StudentSubjectTrend, StudentTestResult, Subject
+
+from .factories import make_school, make_student, make_syllabus, make_teacher, make_test
+
+
+def reference_trend(scores):
+    """The per-series statistics as StudentAnalytics.subject_performance_trend computes them."""
+    n = len(scores)
+    x_mean, y_mean = (n - 1) / 2, sum(scores) / n
+    denominator = sum((x - x_mean) ** 2 for x in range(n))
+    slope = sum((x - x_mean) * (y - y_mean) for x, y in enumerate(scores)) / denominator if denominator else 0
+    window = scores[-3:]
+    return {
+        'points': n,
+        'slope': slope,
+        'rolling_mean': sum(window) / len(window),
+        'volatility': statistics.stdev(scores) if n > 1 else 0,
+        'latest': scores[-1],
+        'best': max(scores),
+        'worst': min(scores),
+    }
+
+
+class SeriesTrendTests(TestCase):
+    def test_matches_the_per_series_regression(self):
+        series = {
+            (1, 10): [40.0, 55.0, 52.0, 70.0, 81.0],
+            (1, 11): [90.0, 70.0],
+            (2, 10): [65.0],
+            (3, 10): [50.0, 50.0, 50.0],
+        }
+        students, subjects, scores = [], [], []
+        for (student, subject), values in series.items():
+            students += [student] * len(values)
+            subjects += [subject] * len(values)
+            scores += values
+
+        found = compute_series_trends(students, subjects, scores)
+        self.assertEqual(list(zip(found['student'].tolist(), found['subject'].tolist())), list(series))
+        for row, values in enumerate(series.values()):
+            for name, expected in reference_trend(values).items():
+                self.assertAlmostEqual(float(found[name][row]), expected, places=9, msg=name)
+
+    def test_flags(self):
+        self.assertEqual(trend_flag(1, 50), 'insufficient_data')
+        self.assertEqual(trend_flag(3, 2.5), 'improving')
+        self.assertEqual(trend_flag(3, -2.5), 'declining')
+        self.assertEqual(trend_flag(3, 2.0), 'stable')
+
+    def test_empty(self):
+        self.assertEqual(compute_series_trends([], [], [])['slope'].size, 0)
+
+
+class StudentTrendTests(TestCase):
+    def setUp(self):
+        self.school = make_school()
+        self.other_school = make_school('Other', 'S2')
+        self.teacher = make_teacher(self.school)
+        self.grade, self.subject, _, _ = make_syllabus()
+        self.chemistry = Subject.objects.create(name='Chemistry', code='0620')
+        self.student = make_student(self.school, self.grade, self.teacher, 1)
+        self.elsewhere = make_student(self.other_school, self.grade, self.teacher, 2)
+        self.day = timezone.now() - datetime.timedelta(days=30)
+
+    def result(self, student, subject, earned, max_marks=10, days=0):
+        test = make_test(self.teacher, subject, title=f'Test {StudentTestResult.objects.count()}')
+        submitted = self.day + datetime.timedelta(days=days)
+        return StudentTestResult.objects.create(
+            school=student.school, test=test, student=student, subject=subject, month=submitted.date().replace(day=1),
+            earned=earned, max_marks=max_marks, last_submitted=submitted,
+        )
+
+    def trends(self):
+        return {
+            (t.student_id, t.subject_id): (t.trend, t.points, t.latest_score)
+            for t in StudentSubjectTrend.objects.all()
+        }
+
+    def test_refresh_orders_attempts_by_submission(self):
+        # Created out of order: the latest submission is the first row
+        self.result(self.student, self.subject, 9, days=3)
+        self.result(self.student, self.subject, 4, days=1)
+        self.result(self.student, self.subject, 6, days=2)
+        self.result(self.student, self.chemistry, 5, days=1)
+        self.result(self.student, self.chemistry, 5, max_marks=0, days=2)  # ungraded, ignored
+
+        self.assertEqual(refresh_student_trends(), 2)
+        self.assertEqual(self.trends(), {
+            (self.student.id, self.subject.id): ('improving', 3, 90.0),
+            (self.student.id, self.chemistry.id): ('insufficient_data', 1, 50.0),
+        })
+        row = StudentSubjectTrend.objects.get(subject=self.subject)
+        self.assertEqual((row.slope, row.best_score, row.worst_score), (25.0, 90.0, 40.0))
+        self.assertEqual(row.last_test_at, self.day + datetime.timedelta(days=3))
+
+    def test_command_school_and_incremental(self):
+        self.result(self.student, self.subject, 9, days=1)
+        self.result(self.student, self.subject, 2, days=2)
+        self.result(self.elsewhere, self.subject, 5, days=1)
+
+        call_command('compute_student_trends', school='S1', stdout=StringIO())
+        self.assertEqual(self.trends(), {(self.student.id, self.subject.id): ('declining', 2, 20.0)})
+
+        call_command('compute_student_trends', stdout=StringIO())
+        self.result(self.elsewhere, self.subject, 9, days=2)
+        StudentSubjectTrend.objects.filter(student=self.student).update(latest_score=0)
+        call_command('compute_student_trends', incremental=True, stdout=StringIO())
+        # Only the student with a new result was recomputed
+        self.assertEqual(self.trends(), {
+            (self.student.id, self.subject.id): ('declining', 2, 0.0),
+            (self.elsewhere.id, self.subject.id): ('improving', 2, 90.0),
+        })
@@ -74,6 +74,7 @@ urlpatterns = [
     # Question Library API (for test editors)
     path("questions/api/search/", views.question_library_api_search, name="question_library_api_search"),
     path("questions/api/<int:question_id>/", views.question_library_api_get, name="question_library_api_get"),
+    path("questions/api/<int:question_id>/similar/", views.question_library_api_similar, name="question_library_api_similar"),
     path("questions/api/create/", views.question_library_api_create, name="question_library_api_create"),
     path("questions/add-structured/", views.structured_question_editor, name="structured_question_editor"),
 
@@ -186,6 +187,9 @@ urlpatterns = [
     # Report Cards
     path("teacher/report-cards/", report_card_views.report_card_dashboard, name="report_card_dashboard"),
     path("teacher/report-cards/<int:student_id>/data/", report_card_views.report_card_detail, name="report_card_detail"),
+    path("teacher/report-cards/batch/", report_card_views.report_card_batch_start, name="report_card_batch_start"),
+    path("teacher/report-cards/batch/<int:batch_id>/", report_card_views.report_card_batch_status, name="report_card_batch_status"),
+    path("teacher/report-cards/batch/<int:batch_id>/download/", report_card_views.report_card_batch_download, name="report_card_batch_download"),
     path("teacher/report-cards/reissue-suggestions/", report_card_views.topic_reissue_suggestions, name="topic_reissue_suggestions"),
     path("teacher/reissue-dashboard/", report_card_views.reissue_dashboard, name="reissue_dashboard"),
     path("teacher/assign-practice/", report_card_views.assign_practice, name="assign_practice"),
@@ -11,9 +11,11 @@ from django.db import models
 from django.db.models import Q
 from django.urls import reverse
 import json
+from collections import defaultdict
 from core.ai.topic_tagger import suggest_topic_for_question
 from core.ai.lo_tagger import suggest_los_for_question
-from django.db.models import Count
+from django.db.models import Count, Value
+from django.db.models.functions import Coalesce, Concat, Lower, NullIf, Trim
 
 from .models import (
     Grade,
@@ -31,7 +33,26 @@ from .models import (
     AnswerSpace,
     StudentAnswerSpace,
     QuestionPage,
+    MasteryFact,
+    StudentTestResult,
+    SchoolSubjectMonth,
+    StudentAbility,
+)
+from .taxonomy import get_taxonomy
+from .question_tree import load_tree, load_trees, tree_id, walk_tree
+from .search import search_questions
+from .question_preview import LISTING_DEFER, thumbnail_url
+from .keyset import (
+    LISTING_COUNT_LIMIT, NEXT, InvalidCursor, KeysetPaginator, binary_collation, decode_cursor, encode_cursor,
 )
+from .duplicates import duplicate_summary, find_duplicates
+from .similarity import similar_questions
+from .composition import UnknownQuestions, add_questions, copy_test, remove_questions
+from .analytics.mastery import topic_facts, aggregate_facts
+from .analytics.irt import practice_target
+from .analytics.sampler import candidate_index, candidates, mastered_question_ids, question_ids, sample
+from .analytics.rollups import refresh_attempts_on_commit
+from .db_router import use_analytics_replica
 
 # Import logs views
 from .logs_views import ai_tagging_logs, view_log_file
@@ -193,15 +214,25 @@ def parse_answer_parts_from_markscheme(answer_text, total_marks=0):
     return answer_parts
 
 
-def build_question_data_recursive(question, number_prefix, level=0):
+def build_question_data_recursive(question, number_prefix, level=0, answer_spaces=None):
     """
     Build question data recursively including all sub-questions.
     Returns a nested structure with parent question and all children.
+
+    Sub-questions come from `question.tree_children` (see core/question_tree.py;
+    loaded here if missing) and `answer_spaces` maps question id -> AnswerSpaces,
+    so a whole tree is built with two queries.
     """
     from .models import AnswerSpace
 
-    # Check for answer spaces
-    answer_spaces = AnswerSpace.objects.filter(question=question).order_by('order')
+    if not hasattr(question, 'tree_children'):
+        load_tree(question)
+    if answer_spaces is None:
+        answer_spaces = defaultdict(list)
+        tree_ids = [question.id] + [q.id for q in walk_tree(question)]
+        for space in AnswerSpace.objects.filter(question_id__in=tree_ids).order_by('order'):
+            answer_spaces[space.question_id].append(space)
+    spaces = answer_spaces.get(question.id, [])
 
     question_data = {
         'id': question.id,
@@ -228,7 +259,7 @@ def build_question_data_recursive(question, number_prefix, level=0):
         question_data['isStructured'] = False
 
     # Add legacy answer spaces if exists
-    if answer_spaces.exists():
+    if spaces:
         question_data['hasAnswerSpaces'] = True
         question_data['answerSpaces'] = [{
             'id': space.id,
@@ -240,18 +271,18 @@ def build_question_data_recursive(question, number_prefix, level=0):
             'order': space.order,
             'marks': float(space.marks),
             'config': space.config
-        } for space in answer_spaces]
+        } for space in spaces]
     else:
         question_data['hasAnswerSpaces'] = False
 
     # Recursively build sub-questions
-    sub_questions = question.sub_questions.all().order_by('order')
-    if sub_questions.exists():
+    sub_questions = question.tree_children
+    if sub_questions:
         question_data['subQuestions'] = []
         for idx, sub_q in enumerate(sub_questions):
             sub_number = sub_q.question_number or chr(ord('a') + idx)
             sub_prefix = f"{number_prefix}({sub_number})"
-            sub_data = build_question_data_recursive(sub_q, sub_prefix, level + 1)
+            sub_data = build_question_data_recursive(sub_q, sub_prefix, level + 1, answer_spaces)
             question_data['subQuestions'].append(sub_data)
 
     return question_data
@@ -267,8 +298,8 @@ def qp_slicer_workstation(request):
     Z = Green (Question Start), X = Red (Question End), W = Purple (Stitch/Continue)
     A = White mask (to cover question numbers)
     """
-    grades = Grade.objects.all().order_by('name')
-    subjects = Subject.objects.all().order_by('name')
+    grades = get_taxonomy().grade_list()
+    subjects = get_taxonomy().subject_list()
 
     return render(request, 'teacher/qp_slicer_workstation.html', {
         'grades': grades,
@@ -373,23 +404,17 @@ def teacher_dashboard(request):
         })
 
     # ── 4. Questions without learning objectives ──
-    all_questions = Question.objects.all()[:50]
-    for q in all_questions:
-        if q.learning_objectives.count() == 0:
-            pending_tasks.append({
-                'type': 'tag_lo',
-                'url': reverse('edit_question', args=[q.id]),
-                'title': 'Tag learning objective for question',
-                'description': f'Question #{q.id} needs a learning objective',
-                'icon': '🎯',
-            })
-            if len([t for t in pending_tasks if t['type'] == 'tag_lo']) >= 10:
-                break
+    for q in Question.objects.filter(lo_count=0).only('id')[:10]:
+        pending_tasks.append({
+            'type': 'tag_lo',
+            'url': reverse('edit_question', args=[q.id]),
+            'title': 'Tag learning objective for question',
+            'description': f'Question #{q.id} needs a learning objective',
+            'icon': '🎯',
+        })
 
     # Count all untagged questions (without topic or LOs)
-    untagged_count = Question.objects.filter(
-        Q(topic__isnull=True) | Q(learning_objectives__isnull=True)
-    ).distinct().count()
+    untagged_count = Question.objects.filter(is_fully_tagged=False).count()
 
     context = {
         'school': school,
@@ -405,12 +430,131 @@ def teacher_dashboard(request):
 # ══════════════════════════════════════════════════════════════════
 #  ACADEMIC OVERVIEW DASHBOARD
 # ══════════════════════════════════════════════════════════════════
+def _school_performance_charts(school, now):
+    """
+    Score charts of the academic overview dashboard, read from the
+    StudentTestResult / SchoolSubjectMonth rollups (core/analytics/rollups.py)
+    instead of scanning StudentAnswer.
+    """
+    from django.db.models import Sum
+    from datetime import timedelta
+    from core.analytics.rollups import month_of
+
+    subject_months = SchoolSubjectMonth.objects.filter(school=school)
+    results_qs = StudentTestResult.objects.filter(school=school, max_marks__gt=0)
+
+    # ── SUBJECT PERFORMANCE (horizontal bar) ─────────────────────
+    subject_labels, subject_scores = [], []
+    for r in (
+        subject_months.filter(subject__isnull=False)
+        .values('subject__name')
+        .annotate(t=Sum('max_marks'), e=Sum('earned'))
+        .order_by('subject__name')
+    ):
+        if r['t'] and r['t'] > 0:
+            subject_labels.append(r['subject__name'])
+            subject_scores.append(round(r['e'] / r['t'] * 100, 1))
+
+    # ── PERFORMANCE TREND (monthly area, last 12 months) ─────────
+    monthly_raw = (
+        subject_months
+        .filter(month__gte=month_of(now - timedelta(days=365)))
+        .values('month')
+        .annotate(t=Sum('max_marks'), e=Sum('earned'))
+        .order_by('month')
+    )
+    trend_labels, trend_scores = [], []
+    for r in monthly_raw:
+        if r['t'] and r['t'] > 0:
+            trend_labels.append(r['month'].strftime('%b %Y'))
+            trend_scores.append(round(r['e'] / r['t'] * 100, 1))
+
+    # ── SUBJECT TREND LINES (per-subject monthly, last 6 months) ──
+    subj_trend_raw = list(
+        subject_months
+        .filter(subject__isnull=False, month__gte=month_of(now - timedelta(days=183)))
+        .values('month', 'subject__name')
+        .annotate(t=Sum('max_marks'), e=Sum('earned'))
+        .order_by('month', 'subject__name')
+    )
+    # Build per-subject series from a (subject, month) index
+    subj_trend_cells = {(r['subject__name'], r['month']): r for r in subj_trend_raw}
+    trend_months = sorted({r['month'] for r in subj_trend_raw})
+    subj_trend_months = [m.strftime('%b %Y') for m in trend_months]
+    subj_trend_subjects = sorted({r['subject__name'] for r in subj_trend_raw})
+    subj_trend_series = []
+    for subj in subj_trend_subjects:
+        data = []
+        for month in trend_months:
+            match = subj_trend_cells.get((subj, month))
+            if match and match['t'] and match['t'] > 0:
+                data.append(round(match['e'] / match['t'] * 100, 1))
+            else:
+                data.append(None)
+        subj_trend_series.append({'name': subj, 'data': data})
+
+    # ── SCORE DISTRIBUTION (10 bands histogram) ───────────────────
+    score_bands = [0] * 10
+    for e, t in results_qs.values_list('earned', 'max_marks'):
+        score_bands[min(int((e / t * 100) // 10), 9)] += 1
+
+    # ── TOP & BOTTOM PERFORMERS ───────────────────────────────────
+    perf_list = [
+        {'name': r['student__full_name'], 'score': round(r['e'] / r['t'] * 100, 1)}
+        for r in results_qs.values('student_id', 'student__full_name')
+        .annotate(t=Sum('max_marks'), e=Sum('earned'))
+        .order_by('student_id')
+    ]
+    perf_list.sort(key=lambda x: -x['score'])
+    top_names  = [p['name'] for p in perf_list[:8]]
+    top_scores = [p['score'] for p in perf_list[:8]]
+    bot_names  = [p['name'] for p in reversed(perf_list[-8:])] if len(perf_list) >= 8 else [p['name'] for p in reversed(perf_list)]
+    bot_scores = [p['score'] for p in reversed(perf_list[-8:])] if len(perf_list) >= 8 else [p['score'] for p in reversed(perf_list)]
+
+    # ── SUBJECT × GRADE HEATMAP ───────────────────────────────────
+    sg_raw = list(
+        results_qs
+        .filter(subject__isnull=False)
+        .values('subject__name', 'student__grade__name', 'student__grade__grade_level')
+        .annotate(t=Sum('max_marks'), e=Sum('earned'))
+        .order_by('student__grade__grade_level', 'subject__name')
+    )
+    sg_cells = {(r['subject__name'], r['student__grade__name']): r for r in sg_raw}
+    hm_grades   = list(dict.fromkeys(r['student__grade__name'] for r in sg_raw))
+    hm_subjects = sorted(set(r['subject__name'] for r in sg_raw))
+    heatmap_series = []
+    for subj in hm_subjects:
+        data = []
+        for grade in hm_grades:
+            match = sg_cells.get((subj, grade))
+            y = round(match['e'] / match['t'] * 100, 1) if (match and match['t'] and match['t'] > 0) else 0
+            data.append({'x': grade or 'N/A', 'y': y})
+        heatmap_series.append({'name': subj, 'data': data})
+
+    return {
+        'subject_labels':    subject_labels,
+        'subject_scores':    subject_scores,
+        'trend_labels':      trend_labels,
+        'trend_scores':      trend_scores,
+        'subj_trend_months': subj_trend_months,
+        'subj_trend_series': subj_trend_series,
+        'score_bands':       score_bands,
+        'top_names':         top_names,
+        'top_scores':        top_scores,
+        'bot_names':         bot_names,
+        'bot_scores':        bot_scores,
+        'heatmap_series':    heatmap_series,
+    }
+
+
 @login_required
 @staff_member_required
+@use_analytics_replica
 def academic_overview_dashboard(request):
     """School-wide academic analytics dashboard with rich interactive charts."""
-    from django.db.models import Sum, Count, FloatField
-    from django.db.models.functions import Cast, TruncMonth, TruncDay
+    from django.db.models import Count, Avg, F, FloatField
+    from django.db.models.functions import TruncDay
+    from core.analytics.cache import cached_school_result
     from django.utils import timezone
     from datetime import timedelta
     import json as _json
@@ -440,82 +584,12 @@ def academic_overview_dashboard(request):
         student_answers__marks_awarded__isnull=True
     ).distinct().count()
 
-    # ── SUBJECT PERFORMANCE (horizontal bar) ─────────────────────
-    subj_buckets = {}
-    for ans in StudentAnswer.objects.filter(
-        student__school=school,
-        marks_awarded__isnull=False,
-        test__subject__isnull=False,
-    ).select_related('test__subject', 'question'):
-        s = ans.test.subject.name
-        subj_buckets.setdefault(s, [0.0, 0.0])
-        subj_buckets[s][0] += float(ans.marks_awarded)
-        subj_buckets[s][1] += float(ans.question.marks)
-
-    subject_labels, subject_scores = [], []
-    for s, (earned, total) in sorted(subj_buckets.items()):
-        if total > 0:
-            subject_labels.append(s)
-            subject_scores.append(round(earned / total * 100, 1))
-
-    # ── PERFORMANCE TREND (monthly area, last 12 months) ─────────
-    monthly_raw = (
-        StudentAnswer.objects
-        .filter(
-            student__school=school,
-            marks_awarded__isnull=False,
-            submitted_at__gte=now - timedelta(days=365),
-        )
-        .annotate(month=TruncMonth('submitted_at'))
-        .values('month')
-        .annotate(
-            t=Sum(Cast('question__marks', FloatField())),
-            e=Sum(Cast('marks_awarded', FloatField())),
-        )
-        .order_by('month')
-    )
-    trend_labels, trend_scores = [], []
-    for r in monthly_raw:
-        if r['t'] and r['t'] > 0:
-            trend_labels.append(r['month'].strftime('%b %Y'))
-            trend_scores.append(round(r['e'] / r['t'] * 100, 1))
-
-    # ── SUBJECT TREND LINES (per-subject monthly, last 6 months) ──
-    six_months_ago = now - timedelta(days=183)
-    subj_trend_raw = (
-        StudentAnswer.objects
-        .filter(
-            student__school=school,
-            marks_awarded__isnull=False,
-            test__subject__isnull=False,
-            submitted_at__gte=six_months_ago,
-        )
-        .annotate(month=TruncMonth('submitted_at'))
-        .values('month', 'test__subject__name')
-        .annotate(
-            t=Sum(Cast('question__marks', FloatField())),
-            e=Sum(Cast('marks_awarded', FloatField())),
-        )
-        .order_by('month', 'test__subject__name')
+    # Score charts only change with answers/marks, so they are cached per school
+    charts = cached_school_result(
+        school.id if school else None,
+        f'overview_charts:{now:%Y-%m-%d}',
+        lambda: _school_performance_charts(school, now),
     )
-    # Build per-subject series
-    subj_trend_months = sorted(set(r['month'].strftime('%b %Y') for r in subj_trend_raw))
-    subj_trend_subjects = sorted(set(r['test__subject__name'] for r in subj_trend_raw))
-    subj_trend_series = []
-    for subj in subj_trend_subjects:
-        data = []
-        for m_str in subj_trend_months:
-            match = next(
-                (r for r in subj_trend_raw
-                 if r['test__subject__name'] == subj
-                 and r['month'].strftime('%b %Y') == m_str),
-                None
-            )
-            if match and match['t'] and match['t'] > 0:
-                data.append(round(match['e'] / match['t'] * 100, 1))
-            else:
-                data.append(None)
-        subj_trend_series.append({'name': subj, 'data': data})
 
     # ── GRADE DISTRIBUTION (donut) ────────────────────────────────
     gd_raw = (
@@ -544,47 +618,37 @@ def academic_overview_dashboard(request):
     test_live    = all_tests_qs.filter(is_published=True, results_published=False).count()
     test_done    = all_tests_qs.filter(results_published=True).count()
 
-    # ── SCORE DISTRIBUTION (10 bands histogram) ───────────────────
-    score_bands = [0] * 10
-    ts_qs = (
-        StudentAnswer.objects
-        .filter(student__school=school, marks_awarded__isnull=False)
-        .values('student_id', 'test_id')
-        .annotate(
-            t=Sum(Cast('question__marks', FloatField())),
-            e=Sum(Cast('marks_awarded', FloatField())),
-        )
-    )
-    for row in ts_qs:
-        if row['t'] and row['t'] > 0:
-            score_bands[min(int((row['e'] / row['t'] * 100) // 10), 9)] += 1
-
     # ── TEACHER METRICS (grouped bar) ────────────────────────────
+    results_qs = StudentTestResult.objects.filter(school=school, max_marks__gt=0)
     teacher_names, teacher_tests_ct, teacher_students_ct, teacher_avg_scores = [], [], [], []
-    for tp in UserProfile.objects.filter(
-        school=school, role__in=['teacher', 'school_admin']
-    ).select_related('user')[:12]:
-        u = tp.user
-        t_tests = Test.objects.filter(created_by=u).count()
-        t_studs = Student.objects.filter(
-            answers__test__created_by=u, school=school
-        ).distinct().count()
-        buckets = {}
-        for row in StudentAnswer.objects.filter(
-            test__created_by=u,
-            student__school=school,
-            marks_awarded__isnull=False,
-        ).values('student_id', 'test_id').annotate(
-            t=Sum(Cast('question__marks', FloatField())),
-            e=Sum(Cast('marks_awarded', FloatField())),
-        ):
-            if row['t'] and row['t'] > 0:
-                buckets[(row['student_id'], row['test_id'])] = row['e'] / row['t'] * 100
-        avg = round(sum(buckets.values()) / len(buckets), 1) if buckets else 0.0
+    teacher_users = [
+        tp.user for tp in UserProfile.objects.filter(
+            school=school, role__in=['teacher', 'school_admin']
+        ).select_related('user')[:12]
+    ]
+    teacher_ids = [u.id for u in teacher_users]
+    tests_by_teacher = dict(
+        Test.objects.filter(created_by_id__in=teacher_ids)
+        .values('created_by_id').annotate(n=Count('id')).order_by()
+        .values_list('created_by_id', 'n')
+    )
+    students_by_teacher = dict(
+        StudentTestResult.objects.filter(school=school, test__created_by_id__in=teacher_ids)
+        .values('test__created_by_id').annotate(n=Count('student', distinct=True)).order_by()
+        .values_list('test__created_by_id', 'n')
+    )
+    avg_by_teacher = dict(
+        results_qs.filter(test__created_by_id__in=teacher_ids)
+        .values('test__created_by_id')
+        .annotate(avg=Avg(F('earned') * 100.0 / F('max_marks'), output_field=FloatField()))
+        .order_by()
+        .values_list('test__created_by_id', 'avg')
+    )
+    for u in teacher_users:
         teacher_names.append(u.get_full_name() or u.username)
-        teacher_tests_ct.append(t_tests)
-        teacher_students_ct.append(t_studs)
-        teacher_avg_scores.append(avg)
+        teacher_tests_ct.append(tests_by_teacher.get(u.id, 0))
+        teacher_students_ct.append(students_by_teacher.get(u.id, 0))
+        teacher_avg_scores.append(round(avg_by_teacher.get(u.id) or 0.0, 1))
 
     # ── DAILY ACTIVITY (area line, last 30 days) ──────────────────
     da_raw = (
@@ -601,57 +665,6 @@ def academic_overview_dashboard(request):
     activity_labels = [r['day'].strftime('%d %b') for r in da_raw]
     activity_counts  = [r['active'] for r in da_raw]
 
-    # ── TOP & BOTTOM PERFORMERS ───────────────────────────────────
-    perf_map = {}
-    for ans in StudentAnswer.objects.filter(
-        student__school=school,
-        marks_awarded__isnull=False,
-    ).select_related('student', 'question'):
-        k = ans.student_id
-        perf_map.setdefault(k, {'name': ans.student.full_name, 'e': 0.0, 't': 0.0})
-        perf_map[k]['e'] += float(ans.marks_awarded)
-        perf_map[k]['t'] += float(ans.question.marks)
-
-    perf_list = [
-        {'name': v['name'], 'score': round(v['e'] / v['t'] * 100, 1)}
-        for v in perf_map.values() if v['t'] > 0
-    ]
-    perf_list.sort(key=lambda x: -x['score'])
-    top_names  = [p['name'] for p in perf_list[:8]]
-    top_scores = [p['score'] for p in perf_list[:8]]
-    bot_names  = [p['name'] for p in reversed(perf_list[-8:])] if len(perf_list) >= 8 else [p['name'] for p in reversed(perf_list)]
-    bot_scores = [p['score'] for p in reversed(perf_list[-8:])] if len(perf_list) >= 8 else [p['score'] for p in reversed(perf_list)]
-
-    # ── SUBJECT × GRADE HEATMAP ───────────────────────────────────
-    sg_raw = list(
-        StudentAnswer.objects
-        .filter(
-            student__school=school,
-            marks_awarded__isnull=False,
-            test__subject__isnull=False,
-        )
-        .values('test__subject__name', 'student__grade__name', 'student__grade__grade_level')
-        .annotate(
-            t=Sum(Cast('question__marks', FloatField())),
-            e=Sum(Cast('marks_awarded', FloatField())),
-        )
-        .order_by('student__grade__grade_level', 'test__subject__name')
-    )
-    hm_grades   = list(dict.fromkeys(r['student__grade__name'] for r in sg_raw))
-    hm_subjects = sorted(set(r['test__subject__name'] for r in sg_raw))
-    heatmap_series = []
-    for subj in hm_subjects:
-        data = []
-        for grade in hm_grades:
-            match = next(
-                (r for r in sg_raw
-                 if r['test__subject__name'] == subj and r['student__grade__name'] == grade),
-                None
-            )
-            y = round(match['e'] / match['t'] * 100, 1) if (match and match['t'] and match['t'] > 0) else 0
-            data.append({'x': grade or 'N/A', 'y': y})
-        heatmap_series.append({'name': subj, 'data': data})
-
     # ── AVERAGE LOGIN FREQUENCY (radar per grade) ─────────────────
     # Using last_login within last 7 / 14 / 30 days as tier buckets
     login_7d  = all_students_qs.filter(user__last_login__gte=now - timedelta(days=7)).count()
@@ -690,28 +703,28 @@ def academic_overview_dashboard(request):
         'login_old':  login_old,
         'login_never': login_never,
         # JSON for ApexCharts
-        'subject_labels':       _json.dumps(subject_labels),
-        'subject_scores':       _json.dumps(subject_scores),
-        'trend_labels':         _json.dumps(trend_labels),
-        'trend_scores':         _json.dumps(trend_scores),
-        'subj_trend_months':    _json.dumps(subj_trend_months),
-        'subj_trend_series':    _json.dumps(subj_trend_series),
+        'subject_labels':       _json.dumps(charts['subject_labels']),
+        'subject_scores':       _json.dumps(charts['subject_scores']),
+        'trend_labels':         _json.dumps(charts['trend_labels']),
+        'trend_scores':         _json.dumps(charts['trend_scores']),
+        'subj_trend_months':    _json.dumps(charts['subj_trend_months']),
+        'subj_trend_series':    _json.dumps(charts['subj_trend_series']),
         'grade_labels':         _json.dumps(grade_labels),
         'grade_counts':         _json.dumps(grade_counts),
         'qt_labels':            _json.dumps(qt_labels),
         'qt_counts':            _json.dumps(qt_counts),
-        'score_bands':          _json.dumps(score_bands),
+        'score_bands':          _json.dumps(charts['score_bands']),
         'teacher_names':        _json.dumps(teacher_names),
         'teacher_tests_ct':     _json.dumps(teacher_tests_ct),
         'teacher_students_ct':  _json.dumps(teacher_students_ct),
         'teacher_avg_scores':   _json.dumps(teacher_avg_scores),
         'activity_labels':      _json.dumps(activity_labels),
         'activity_counts':      _json.dumps(activity_counts),
-        'top_names':            _json.dumps(top_names),
-        'top_scores':           _json.dumps(top_scores),
-        'bot_names':            _json.dumps(bot_names),
-        'bot_scores':           _json.dumps(bot_scores),
-        'heatmap_series':       _json.dumps(heatmap_series),
+        'top_names':            _json.dumps(charts['top_names']),
+        'top_scores':           _json.dumps(charts['top_scores']),
+        'bot_names':            _json.dumps(charts['bot_names']),
+        'bot_scores':           _json.dumps(charts['bot_scores']),
+        'heatmap_series':       _json.dumps(charts['heatmap_series']),
         'login_freq_data':      _json.dumps([login_7d, login_14d, login_30d, login_old, login_never]),
     }
     return render(request, 'teacher/academic_overview_dashboard.html', context)
@@ -1063,13 +1076,16 @@ def add_user(request):
     context = {
         'school': school,
         'is_school_admin': is_school_admin,
-        'grades': Grade.objects.all(),
-        'subjects': Subject.objects.all()
+        'grades': get_taxonomy().grade_list(),
+        'subjects': get_taxonomy().subject_list()
     }
     
     return render(request, "teacher/add_new_teacher_student.html", context)
 
 
+USERS_PER_PAGE = 50
+
+
 @login_required
 def manage_users(request):
     """
@@ -1085,62 +1101,100 @@ def manage_users(request):
         messages.error(request, "You are not assigned to a school.")
         return redirect("teacher_dashboard")
     
+    search = request.GET.get("search", "").strip()
+    role_filter = request.GET.get("role", "")
+
     # Get all user profiles from same school
     teachers = UserProfile.objects.filter(
         school=school,
         role__in=['teacher', 'school_admin']
-    ).select_related('user').order_by('user__first_name', 'user__last_name')
+    ).select_related('user')
     
     # Get student records
     students = Student.objects.filter(
         school=school
-    ).select_related('grade', 'user').order_by('grade__name', 'section', 'roll_number')
-    
-    # Combine into unified list
+    ).select_related('grade', 'user')
+
+    total_teachers = teachers.count()
+    total_students = students.count()
+
+    if search:
+        teachers = teachers.filter(
+            Q(user__first_name__icontains=search) | Q(user__last_name__icontains=search) |
+            Q(user__username__icontains=search) | Q(user__email__icontains=search)
+        )
+        students = students.filter(
+            Q(full_name__icontains=search) | Q(user__username__icontains=search) |
+            Q(user__email__icontains=search)
+        )
+
+    # One list sorted by name (teachers first on ties), paged by cursor
+    # over both querysets (core/keyset.py)
+    teachers = teachers.annotate(
+        sort_name=binary_collation(Lower(Coalesce(
+            NullIf(Trim(Concat('user__first_name', Value(' '), 'user__last_name')), Value('')),
+            'user__username',
+        ))),
+        kind=Value(0),
+    )
+    students = students.annotate(sort_name=binary_collation(Lower('full_name')), kind=Value(1))
+    sources = []
+    if role_filter in ('', 'teacher', 'school_admin'):
+        sources.append(teachers.filter(role=role_filter) if role_filter else teachers)
+    if role_filter in ('', 'student'):
+        sources.append(students)
+
     all_users = []
-    
-    for teacher in teachers:
-        all_users.append({
-            'user_id': teacher.user.id,
-            'name': f"{teacher.user.first_name} {teacher.user.last_name}".strip() or teacher.user.username,
-            'username': teacher.user.username,
-            'email': teacher.user.email,
-            'role': teacher.role,
-            'role_display': teacher.get_role_display(),
-            'joined': teacher.created_at,
-            'additional_info': None,
-            'student_id': None
-        })
-    
-    for student in students:
-        all_users.append({
-            'user_id': student.user.id if student.user else None,
-            'name': student.full_name,
-            'username': student.user.username if student.user else 'No account',
-            'email': student.user.email if student.user else '',
-            'role': 'student',
-            'role_display': 'Student',
-            'joined': student.created_at,
-            'additional_info': {
-                'grade': student.grade.name,
-                'section': student.section,
-                'roll_number': student.roll_number,
-                'admission_id': student.admission_id
-            },
-            'student_id': student.id
-        })
-    
-    # Sort by name
-    all_users.sort(key=lambda x: x['name'].lower())
+    page_obj = None
+    if sources:
+        page_obj = KeysetPaginator(sources, USERS_PER_PAGE, ['sort_name', 'kind']).get_page(
+            request.GET.get("cursor")
+        )
+
+    for row in page_obj or []:
+        if row.kind == 0:
+            teacher = row
+            all_users.append({
+                'user_id': teacher.user.id,
+                'name': f"{teacher.user.first_name} {teacher.user.last_name}".strip() or teacher.user.username,
+                'username': teacher.user.username,
+                'email': teacher.user.email,
+                'role': teacher.role,
+                'role_display': teacher.get_role_display(),
+                'joined': teacher.created_at,
+                'additional_info': None,
+                'student_id': None
+            })
+        else:
+            student = row
+            all_users.append({
+                'user_id': student.user.id if student.user else None,
+                'name': student.full_name,
+                'username': student.user.username if student.user else 'No account',
+                'email': student.user.email if student.user else '',
+                'role': 'student',
+                'role_display': 'Student',
+                'joined': student.created_at,
+                'additional_info': {
+                    'grade': student.grade.name,
+                    'section': student.section,
+                    'roll_number': student.roll_number,
+                    'admission_id': student.admission_id
+                },
+                'student_id': student.id
+            })
     
     context = {
         'school': school,
         'all_users': all_users,
+        'page_obj': page_obj,
+        'search': search,
+        'role_filter': role_filter,
         'is_school_admin': is_school_admin,
         'role': role,
-        'total_users': len(all_users),
-        'total_teachers': teachers.count(),
-        'total_students': students.count()
+        'total_users': total_teachers + total_students,
+        'total_teachers': total_teachers,
+        'total_students': total_students
     }
     
     return render(request, "teacher/manage_teacher_student.html", context)
@@ -1240,7 +1294,7 @@ def manage_students(request):
     ).select_related('grade', 'school', 'created_by', 'user').order_by('grade', 'section', 'roll_number')
     
     # Get all grades for the edit modal dropdown
-    grades = Grade.objects.all()
+    grades = get_taxonomy().grade_list()
     
     context = {
         'students': students,
@@ -1415,27 +1469,21 @@ def delete_test(request, test_id):
 
 @login_required
 def duplicate_test(request, test_id):
+    """
+    Copy a test and its questions; ?assignments=1 also copies student / group
+    assignments and ?teachers=1 the teachers it is shared with.
+    """
     test = get_object_or_404(Test, id=test_id)
     if not test.user_has_access(request.user):
         return redirect("tests_list")
 
-    new_test = Test.objects.create(
-        title=f"{test.title} (Copy)",
-        created_by=request.user,
-        duration_minutes=test.duration_minutes,
-        start_time=test.start_time,
-        subject=test.subject,
+    copy_test(
+        test,
+        request.user,
+        assignments=request.GET.get("assignments") == "1",
+        teachers=request.GET.get("teachers") == "1",
     )
 
-    # Copy test questions
-    test_questions = TestQuestion.objects.filter(test=test).order_by('order')
-    for tq in test_questions:
-        TestQuestion.objects.create(
-            test=new_test,
-            question=tq.question,
-            order=tq.order,
-        )
-
     return redirect("tests_list")
 
 
@@ -1462,16 +1510,10 @@ def autosave_test(request, test_id):
 
 @login_required
 def question_library(request):
-    from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-    from django.db.models import Count
-
     school = get_user_school(request.user)
     qs = Question.objects.filter(
         created_by=request.user
-    ).select_related("grade", "subject", "topic").prefetch_related("learning_objectives")
-
-    # Annotate with usage count (how many tests use this question)
-    qs = qs.annotate(usage_count=Count('testquestion', distinct=True))
+    ).select_related("grade", "subject", "topic", "fingerprint").prefetch_related("learning_objectives").defer(*LISTING_DEFER)
 
     # Filters
     grade = request.GET.get("grade")
@@ -1521,31 +1563,20 @@ def question_library(request):
         sort_by = 'usage_count'
         order = 'asc'
 
-    # Apply sort with order
-    if order == "asc":
-        qs = qs.order_by(sort_by)
-    else:
-        qs = qs.order_by(f"-{sort_by}")
-
-    # Pagination - 20 questions per page
-    paginator = Paginator(qs, 20)
-    page = request.GET.get("page", 1)
-
-    try:
-        questions = paginator.page(page)
-    except PageNotAnInteger:
-        questions = paginator.page(1)
-    except EmptyPage:
-        questions = paginator.page(paginator.num_pages)
+    # Pagination - 20 questions per page, by cursor (core/keyset.py)
+    paginator = KeysetPaginator(
+        qs, 20, [sort_by if order == "asc" else f"-{sort_by}"], count_limit=LISTING_COUNT_LIMIT
+    )
+    questions = paginator.get_page(request.GET.get("cursor"))
 
     return render(
         request,
         "teacher/question_library.html",
         {
             "questions": questions,
-            "grades": Grade.objects.all(),
-            "subjects": Subject.objects.all(),
-            "topics": Topic.objects.all(),
+            "grades": get_taxonomy().grade_list(),
+            "subjects": get_taxonomy().subject_list(),
+            "topics": get_taxonomy().topic_list(),
             "school": school,
             "current_sort": sort_by,
             "current_order": order,
@@ -1576,9 +1607,9 @@ def add_edit_question(request, question_id=None):
             question.learning_objectives.values_list("id", flat=True)
         )
 
-    grades = Grade.objects.all()
-    subjects = Subject.objects.all()
-    topics = Topic.objects.all()
+    grades = get_taxonomy().grade_list()
+    subjects = get_taxonomy().subject_list()
+    topics = get_taxonomy().topic_list()
 
     if request.method == "POST":
         data = request.POST
@@ -1640,8 +1671,8 @@ def structured_question_editor(request):
     New structured question editor - allows creating questions with sub-parts,
     per-question topic and LO tagging, and batch saving to library.
     """
-    grades = Grade.objects.all().order_by('name')
-    subjects = Subject.objects.all().order_by('name')
+    grades = get_taxonomy().grade_list()
+    subjects = get_taxonomy().subject_list()
 
     return render(request, 'teacher/structured_question_editor.html', {
         'grades': grades,
@@ -1885,9 +1916,9 @@ def edit_question_v2(request, question_id):
     # LOs for the current topic
     selected_lo_ids = list(question.learning_objectives.values_list('id', flat=True))
 
-    grades   = Grade.objects.all()
-    subjects = Subject.objects.all()
-    topics   = Topic.objects.all()
+    grades   = get_taxonomy().grade_list()
+    subjects = get_taxonomy().subject_list()
+    topics   = get_taxonomy().topic_list()
     years    = list(range(2026, 1999, -1))
 
     return render(request, 'teacher/edit_question_v2.html', {
@@ -1937,18 +1968,7 @@ def inline_add_question(request, test_id):
         if lo_ids:
             question.learning_objectives.set(lo_ids)
 
-        last_order = (
-            TestQuestion.objects
-            .filter(test=test)
-            .aggregate(max_order=models.Max("order"))
-            ["max_order"] or 0
-        )
-
-        tq = TestQuestion.objects.create(
-            test=test,
-            question=question,
-            order=last_order + 1
-        )
+        tq, = add_questions(test, [question.id])
 
         return JsonResponse({
             "status": "ok",
@@ -1970,16 +1990,9 @@ def remove_question_from_test(request, test_id, test_question_id):
     if not test.user_has_access(request.user):
         return JsonResponse({"error": "Access denied"}, status=403)
     test_question = get_object_or_404(TestQuestion, id=test_question_id, test=test)
-    
-    test_question.delete()
-    
-    # Reorder
-    remaining_questions = TestQuestion.objects.filter(test=test).order_by('order')
-    for idx, tq in enumerate(remaining_questions, start=1):
-        if tq.order != idx:
-            tq.order = idx
-            tq.save()
-    
+
+    remove_questions(test, [test_question.id])
+
     return JsonResponse({"status": "ok", "message": "Question removed"})
 
 
@@ -1999,24 +2012,20 @@ def add_questions_to_test(request, test_id):
         if not question_ids:
             return JsonResponse({"error": "No questions selected"}, status=400)
         
-        max_order = TestQuestion.objects.filter(test=test).aggregate(
-            models.Max('order')
-        )['order__max'] or 0
-        
-        for idx, question_id in enumerate(question_ids):
-            question = get_object_or_404(Question, id=question_id)
-            
-            if not TestQuestion.objects.filter(test=test, question=question).exists():
-                TestQuestion.objects.create(
-                    test=test,
-                    question=question,
-                    order=max_order + idx + 1
-                )
-        
-        return JsonResponse({"status": "ok", "message": "Questions added successfully"})
-        
+        added = add_questions(test, question_ids)
+
+        return JsonResponse({
+            "status": "ok",
+            "message": "Questions added successfully",
+            "added": len(added),
+        })
+
     except json.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON"}, status=400)
+    except UnknownQuestions as e:
+        return JsonResponse({"error": str(e), "missing": e.question_ids}, status=404)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
@@ -2095,7 +2104,7 @@ def add_student(request):
         return redirect("students_list")
 
     return render(request, "teacher/students/add_student.html", {
-        "grades": Grade.objects.all(),
+        "grades": get_taxonomy().grade_list(),
         "school": school
     })
 @login_required
@@ -2128,7 +2137,7 @@ def edit_student(request, student_id):
         "teacher/students/edit_student.html",
         {
             "student": student,
-            "grades": Grade.objects.all(),
+            "grades": get_taxonomy().grade_list(),
             "school": school,
         }
     )
@@ -2156,8 +2165,8 @@ def add_group(request):
         return redirect("groups_list")
 
     return render(request, "teacher/groups/add_group.html", {
-        "grades": Grade.objects.all(),
-        "subjects": Subject.objects.all(),
+        "grades": get_taxonomy().grade_list(),
+        "subjects": get_taxonomy().subject_list(),
         "students": Student.objects.filter(school=school),
         "school": school,
     })
@@ -2181,16 +2190,9 @@ def ajax_topics(request):
     grade_id = request.GET.get("grade_id")
     subject_id = request.GET.get("subject_id")
 
-    qs = Topic.objects.all()
-
-    if grade_id:
-        qs = qs.filter(grade_id=grade_id)
-    if subject_id:
-        qs = qs.filter(subject_id=subject_id)
-
     topics = [
         {"id": t.id, "name": t.name}
-        for t in qs.order_by("name")
+        for t in get_taxonomy().topics_for(grade_id, subject_id)
     ]
 
     return JsonResponse({"topics": topics})
@@ -2204,9 +2206,7 @@ def ajax_learning_objectives(request):
     if not topic_id:
         return JsonResponse({"los": []})
 
-    los = LearningObjective.objects.filter(
-        topic_id=topic_id
-    ).order_by("code")
+    los = get_taxonomy().learning_objectives_for(topic_id)
 
     return JsonResponse({
         "los": [
@@ -2404,7 +2404,7 @@ def manage_class_groups(request):
         profile__role='student'
     ).select_related('profile').order_by('profile__grade', 'profile__division', 'first_name')
     
-    grades = Grade.objects.all()
+    grades = get_taxonomy().grade_list()
     
     return render(request, 'teacher/manage_class_groups.html', {
         'groups': groups,
@@ -2531,7 +2531,7 @@ def test_editor(request, test_id):
         role__in=['teacher', 'school_admin']
     ).exclude(user=request.user).exclude(user=test.created_by).select_related('user')
 
-    subjects = Subject.objects.all()
+    subjects = get_taxonomy().subject_list()
 
     return render(
         request,
@@ -2544,7 +2544,7 @@ def test_editor(request, test_id):
             "assigned_students": assigned_students,
             "assigned_teacher_ids": assigned_teacher_ids,
             "school_teachers": school_teachers,
-            "grades": Grade.objects.all(),
+            "grades": get_taxonomy().grade_list(),
             "subjects": subjects,
             "school": school,
             "is_owner": test.created_by == request.user or request.user.username == 'sis_admin',
@@ -2669,11 +2669,21 @@ def take_test(request, test_id):
         'pages': []
     }
 
+    # Every question tree of the test in one query, answer spaces in another
+    test_questions = list(test_questions)
+    tree_nodes = {}
+    for root in load_trees({tree_id(tq.question) for tq in test_questions}).values():
+        for node in [root] + walk_tree(root):
+            tree_nodes[node.id] = node
+    answer_spaces = defaultdict(list)
+    for space in AnswerSpace.objects.filter(question_id__in=tree_nodes).order_by('order'):
+        answer_spaces[space.question_id].append(space)
+
     for idx, tq in enumerate(test_questions, 1):
-        question = tq.question
+        question = tree_nodes.get(tq.question_id, tq.question)
 
         # Build question data with hierarchical sub-questions
-        question_data = build_question_data_recursive(question, f'Q{idx}')
+        question_data = build_question_data_recursive(question, f'Q{idx}', answer_spaces=answer_spaces)
 
         # Each question (with all its sub-questions) is a separate page
         test_data['pages'].append({
@@ -2685,7 +2695,7 @@ def take_test(request, test_id):
         'test': test,
         'test_data': json.dumps(test_data),  # Convert to JSON string
         'student': student,
-        'question_count': test_questions.count()
+        'question_count': len(test_questions)
     })
 
 
@@ -3030,6 +3040,9 @@ def submit_test(request, test_id):
             except Question.DoesNotExist:
                 continue
 
+        # Ungraded answers don't refresh analytics on save; count the attempt once
+        refresh_attempts_on_commit([(student.id, test.id)])
+
         # Clear session answers
         if f'test_{test_id}_answers' in request.session:
             del request.session[f'test_{test_id}_answers']
@@ -3718,10 +3731,11 @@ def student_test_review(request, test_id):
     review_data = []
     if test.test_type == 'standard':
         test_questions = test.test_questions.all().order_by('order').select_related('question__topic')
+        answers_by_question = {sa.question_id: sa for sa in student_answers}
 
         for tq in test_questions:
             question = tq.question
-            student_answer = student_answers.filter(question=question).first()
+            student_answer = answers_by_question.get(question.id)
 
             review_data.append({
                 'question': question,
@@ -3737,6 +3751,14 @@ def student_test_review(request, test_id):
     percentage = (scored_marks / total_marks * 100) if total_marks > 0 else 0
 
     # ── Topic-wise performance stats ──────────────────────────────
+    # Graded marks come from the mastery fact table; question counts and
+    # total marks still cover every question on the paper.
+    graded_by_topic = {
+        row['topic_id']: row
+        for row in aggregate_facts(
+            topic_facts(MasteryFact.objects.filter(student=student, test=test)), 'topic_id'
+        )
+    }
     topic_map = {}
     for rd in review_data:
         topic_obj = rd['question'].topic
@@ -3756,11 +3778,13 @@ def student_test_review(request, test_id):
         s = topic_map[topic_name]
         s['total_marks']    += rd['max_marks']
         s['question_count'] += 1
-        if rd['awarded_marks'] is not None:
-            s['awarded_marks'] += float(rd['awarded_marks'])
-            s['graded_count']  += 1
 
     for s in topic_map.values():
+        graded = graded_by_topic.get(s['topic_id'])
+        if graded:
+            s['awarded_marks'] = graded['total_earned'] or 0.0
+            s['graded_count'] = graded['total_attempts'] or 0
+
         if s['graded_count'] > 0 and s['total_marks'] > 0:
             pct = (s['awarded_marks'] / s['total_marks']) * 100
             s['percentage'] = round(pct, 1)
@@ -3809,56 +3833,28 @@ def student_practice(request, topic_id):
 
     topic = get_object_or_404(Topic, id=topic_id)
 
-    # Get questions from this topic that the student has NOT answered correctly
-    # First, get question IDs the student already answered well (>= 70%)
-    well_answered_ids = list(
-        StudentAnswer.objects.filter(
-            student=student,
-            question__topic=topic,
-            marks_awarded__isnull=False,
-        ).values_list('question_id', 'marks_awarded', 'question__marks')
-    )
-
-    skip_ids = set()
-    for qid, awarded, qmax in well_answered_ids:
-        if qmax and qmax > 0 and float(awarded) / float(qmax) >= 0.7:
-            skip_ids.add(qid)
+    # Skip questions from this topic the student already answered well (>= 70%)
+    skip_ids = mastered_question_ids([student.id], question__topic=topic)
 
-    # Fetch questions from this topic, excluding well-answered ones, parent-level only
-    practice_qs = (
-        Question.objects.filter(topic=topic, parent__isnull=True)
-        .exclude(id__in=skip_ids)
-        .order_by('?')[:5]
-    )
+    # Sample parent-level questions from the subject's cached candidate index.
+    # With a calibrated ability, aim for questions the student gets right ~70% of the time.
+    index = candidate_index(topic.subject_id)
+    ability = StudentAbility.objects.filter(student=student, subject_id=topic.subject_id).first()
+    target = practice_target(ability.ability) if ability else None
+    selected = question_ids(index, sample(index, candidates(index, [topic.id], exclude_ids=skip_ids), 5, target))
 
     # If not enough, fill with any questions from this topic
-    if practice_qs.count() < 5:
-        remaining = 5 - practice_qs.count()
-        extra_ids = set(practice_qs.values_list('id', flat=True))
-        extra_qs = (
-            Question.objects.filter(topic=topic, parent__isnull=True)
-            .exclude(id__in=extra_ids)
-            .order_by('?')[:remaining]
-        )
-        practice_qs = list(practice_qs) + list(extra_qs)
-    else:
-        practice_qs = list(practice_qs)
-
-    # Also try nearby LOs if not enough questions
-    if len(practice_qs) < 5:
-        remaining = 5 - len(practice_qs)
-        existing_ids = set(q.id for q in practice_qs)
-        # Get questions from same subject/grade, nearby topics
-        nearby_qs = (
-            Question.objects.filter(
-                grade=topic.grade,
-                subject=topic.subject,
-                parent__isnull=True,
-            )
-            .exclude(id__in=existing_ids)
-            .order_by('?')[:remaining]
-        )
-        practice_qs = practice_qs + list(nearby_qs)
+    if len(selected) < 5:
+        extra = candidates(index, [topic.id], exclude_ids=selected)
+        selected += question_ids(index, sample(index, extra, 5 - len(selected)))
+
+    # Also try nearby LOs if not enough questions: same subject/grade, nearby topics
+    if len(selected) < 5:
+        nearby = candidates(index, grade_ids=[topic.grade_id], exclude_ids=selected)
+        selected += question_ids(index, sample(index, nearby, 5 - len(selected)))
+
+    questions = Question.objects.in_bulk(selected)
+    practice_qs = [questions[question_id] for question_id in selected if question_id in questions]
 
     context = {
         'student': student,
@@ -3953,8 +3949,8 @@ def import_mcq_images(request):
     """Import MCQ questions from PNG images"""
     import base64
 
-    grades = Grade.objects.all()
-    subjects = Subject.objects.all()
+    grades = get_taxonomy().grade_list()
+    subjects = get_taxonomy().subject_list()
 
     if request.method == 'POST':
         try:
@@ -4021,8 +4017,8 @@ def import_mcq_pdf(request):
     import re
     from pathlib import Path
 
-    grades = Grade.objects.all()
-    subjects = Subject.objects.all()
+    grades = get_taxonomy().grade_list()
+    subjects = get_taxonomy().subject_list()
 
     if request.method == 'POST':
         try:
@@ -4103,6 +4099,7 @@ def import_qp_slices(request):
         year = request.POST.get('year')
         question_type = request.POST.get('question_type', 'structured')
         total_images = int(request.POST.get('total_images', 0))
+        skip_duplicates = request.POST.get('skip_duplicates') in ('1', 'true')
 
         if not all([grade_id, subject_id]):
             return JsonResponse({'error': 'Missing grade or subject'}, status=400)
@@ -4113,6 +4110,7 @@ def import_qp_slices(request):
             return JsonResponse({'error': 'No topics found for this subject'}, status=400)
 
         imported_count = 0
+        duplicates = []
 
         for i in range(total_images):
             image_data = request.POST.get(f'image_{i}')
@@ -4130,6 +4128,13 @@ def import_qp_slices(request):
             # Create HTML img tag
             question_html = f'<img src="data:image/png;base64,{base64_str}" alt="Question {i+1}" style="max-width: 100%; height: auto;" />'
 
+            # Near-duplicates of questions already in the bank are reported, or skipped on request
+            matches = find_duplicates(subject_id, question_html)
+            if matches:
+                duplicates.append({'index': i, 'skipped': skip_duplicates, **duplicate_summary(matches)})
+                if skip_duplicates:
+                    continue
+
             # Create question
             question_data = {
                 'grade_id': grade_id,
@@ -4148,7 +4153,7 @@ def import_qp_slices(request):
             Question.objects.create(**question_data)
             imported_count += 1
 
-        return JsonResponse({'success': True, 'count': imported_count})
+        return JsonResponse({'success': True, 'count': imported_count, 'duplicates': duplicates})
 
     except Exception as e:
         import traceback
@@ -4754,12 +4759,8 @@ def bulk_ai_tag_questions(request):
         try:
             qs = (
                 Question.objects
-                .annotate(lo_count=Count("learning_objectives"))
-                .filter(
-                    Q(topic__isnull=True) | Q(lo_count=0)
-                )
+                .filter(is_fully_tagged=False)
                 .select_related("grade", "subject", "topic")
-                .distinct()
             )
 
             total = qs.count()
@@ -4870,18 +4871,12 @@ def untagged_questions_view(request):
     Display questions missing topic and/or learning objectives
     (ORM-safe, no ghost data)
     """
-    from django.db.models import Count
-
-    # Base queryset with safe annotation
+    # Base queryset (missing a topic or any LO)
     qs = (
         Question.objects
-        .annotate(lo_count=Count("learning_objectives"))
-        .filter(
-            Q(topic__isnull=True) | Q(lo_count=0)
-        )
+        .filter(is_fully_tagged=False)
         .select_related("grade", "subject", "topic")
         .prefetch_related("learning_objectives")
-        .distinct()
     )
 
     # School filtering
@@ -4892,7 +4887,7 @@ def untagged_questions_view(request):
         except (AttributeError, UserProfile.DoesNotExist):
             qs = qs.filter(created_by=request.user)
 
-    # Statistics (ALL derived from the SAME annotated queryset)
+    # Statistics (ALL derived from the SAME queryset)
     total_untagged = qs.count()
     missing_topics = qs.filter(topic__isnull=True).count()
     missing_los = qs.filter(lo_count=0).count()
@@ -4930,12 +4925,8 @@ def start_background_tagging(request):
         # ORM-safe untagged queryset
         qs = (
             Question.objects
-            .annotate(lo_count=Count("learning_objectives"))
-            .filter(
-                Q(topic__isnull=True) | Q(lo_count=0)
-            )
+            .filter(is_fully_tagged=False)
             .select_related("grade", "subject", "topic")
-            .distinct()
         )
 
         # School filtering
@@ -5011,63 +5002,80 @@ def mcq_examiner_report(request, test_id):
     })
 
 from django.shortcuts import render, get_object_or_404
-from collections import defaultdict
 from decimal import Decimal
-import statistics
-import math
 
 from core.models import Test, StudentAnswer
 from django.db.models import Avg, Count, Sum
+from collections import Counter
+from core.analytics.item_analysis import get_item_analysis
+from core.analytics.cache import cached_test_result
+from core.analytics import stats
+import numpy as np
 
 
+@use_analytics_replica
 def test_analytics_view(request, test_id):
     test = get_object_or_404(Test, id=test_id)
 
-    # ─────────────────────────────────────────────
-    # 1. Pull all evaluated answers safely
-    # ─────────────────────────────────────────────
-    answers = (
-        StudentAnswer.objects
-        .select_related("student", "question", "question__topic")
-        .filter(test=test, marks_awarded__isnull=False)
-    )
-    
-    
+    analytics = cached_test_result(test.id, "dashboard", lambda: _build_test_analytics(test))
 
-    if not answers.exists():
+    if analytics is None:
         return render(request, "analytics_dashboard.html", {
             "test": test,
             "error": "No evaluated student responses available for this test."
         })
 
+    return render(request, "teacher/analytics_dashboard.html", {
+        "test": test,
+        "analytics": analytics,
+    })
+
+
+def _build_test_analytics(test):
+    """Dashboard payload for test_analytics_view, or None when nothing is graded yet."""
     # ─────────────────────────────────────────────
-    # 2. Student-level aggregation
+    # 1. Pull all evaluated answers as arrays in one query
     # ─────────────────────────────────────────────
-    student_map = {}
-    total_test_marks = float(
-        test.questions.aggregate(total=Sum("marks"))["total"] or 0
+    rows = list(
+        StudentAnswer.objects
+        .filter(test=test, marks_awarded__isnull=False)
+        .order_by("student_id", "question_id")
+        .values_list(
+            "student_id", "time_spent_seconds", "marks_awarded",
+            "question__marks", "question__topic_id",
+        )
     )
 
-    for a in answers:
-        sid = a.student_id
-        student_map.setdefault(sid, {
-            "id": sid,
-            "name": a.student.full_name,
-            "grade": a.student.grade.name if a.student.grade else "",
-            "section": a.student.section or "",
-            "earned": 0.0,
-            "max": 0.0,
-            "answered": 0,
-        })
+    if not rows:
+        return None
+
+    ans_student = np.array([r[0] for r in rows])
+    ans_time = np.array([np.nan if r[1] is None else r[1] for r in rows], dtype=float)
+    ans_earned = np.array([float(r[2]) for r in rows])
+    ans_max = np.array([float(r[3] or 0) for r in rows])
+    ans_topic = np.array([r[4] or 0 for r in rows])
+
+    # ─────────────────────────────────────────────
+    # 2. Student-level aggregation
+    # ─────────────────────────────────────────────
+    analysis = get_item_analysis(test.id)
+    questions = list(test.questions.all().select_related("topic"))
+    question_count = len(questions)
+    total_test_marks = float(sum(q.marks for q in questions))
 
-        student_map[sid]["earned"] += float(a.marks_awarded)
-        student_map[sid]["max"] += float(a.question.marks)
-        student_map[sid]["answered"] += 1
+    graded_students = {
+        sid: s for sid, s in analysis["students"].items() if s["graded"]
+    }
+    student_info = {
+        s["id"]: s for s in Student.objects.filter(id__in=graded_students.keys())
+        .values("id", "full_name", "grade__name", "section")
+    }
 
     students = []
     scores = []
 
-    for s in student_map.values():
+    for sid, s in graded_students.items():
+        info = student_info[sid]
         percent = round((s["earned"] / total_test_marks) * 100, 2) if total_test_marks else 0.0
         scores.append(percent)
 
@@ -5080,134 +5088,89 @@ def test_analytics_view(request, test_id):
             risk = "low"
 
         students.append({
-            "id": s["id"],
-            "name": s["name"],
-            "grade": s["grade"],
-            "section": s["section"],
+            "id": sid,
+            "name": info["full_name"],
+            "grade": info["grade__name"] or "",
+            "section": info["section"] or "",
             "score": percent,
             "risk": risk,
             "completion": {
-                "answered": s["answered"],
-                "total": test.questions.count(),
-                "complete": s["answered"] == test.questions.count(),
+                "answered": s["graded"],
+                "total": question_count,
+                "complete": s["graded"] == question_count,
             }
         })
 
+    for s, z in zip(students, stats.zscores(scores).tolist()):
+        s["z_score"] = round(z, 2)
+
     students.sort(key=lambda x: x["score"], reverse=True)
 
     # ─────────────────────────────────────────────
     # 3. Cohort distribution & statistics
     # ─────────────────────────────────────────────
-    mean = statistics.mean(scores)
-    std = statistics.stdev(scores) if len(scores) > 1 else 0.0
-
-    def histogram(values):
-        bins = [0] * 10
-        for v in values:
-            idx = min(9, int(v // 10))
-            bins[idx] += 1
-        return bins
-
-    def gaussian_curve(mu, sigma, n):
-        curve_x = list(range(0, 101, 2))
-        curve_y = []
-        if sigma == 0:
-            curve_y = [0 for _ in curve_x]
-        else:
-            for x in curve_x:
-                pdf = (1 / (sigma * math.sqrt(2 * math.pi))) * math.exp(
-                    -0.5 * ((x - mu) / sigma) ** 2
-                )
-                curve_y.append(pdf * n * 10)
-        return curve_x, curve_y
-
-    curve_x, curve_y = gaussian_curve(mean, std, len(scores))
+    cohort = stats.describe(scores)
+    mean, std = cohort["mean"], cohort["std"]
+    curve_x, curve_y = stats.gaussian_curve(mean, std, len(scores))
 
     # ─────────────────────────────────────────────
-    # 4. Question-level analytics
+    # 4. Question-level analytics (whole-test item analysis)
     # ─────────────────────────────────────────────
     question_stats = []
-    questions = test.questions.all().select_related("topic")
 
-    for idx, q in enumerate(questions, 1):
-        q_answers = answers.filter(question=q)
-        attempts = q_answers.count()
+    for item in analysis["items"].values():
+        attempts = item["graded"]
 
         if attempts == 0:
             continue
 
-        correct = q_answers.filter(
-            marks_awarded__gte=float(q.marks) * 0.5
-        ).count()
-
-        success_rate = round((correct / attempts) * 100, 1)
-
-        # Time analytics per question
-        q_times = [a.time_spent_seconds for a in q_answers if a.time_spent_seconds is not None]
-        avg_time = round(sum(q_times) / len(q_times), 1) if q_times else None
-        min_time = min(q_times) if q_times else None
-        max_time = max(q_times) if q_times else None
+        success_rate = item["success_rate"]
 
         question_stats.append({
-            "id": q.id,
-            "number": idx,
-            "topic": q.topic.name if q.topic else "",
-            "marks": float(q.marks),
+            "id": item["question_id"],
+            "number": item["number"],
+            "topic": item["topic"],
+            "marks": item["marks"],
             "attempts": attempts,
             "success_rate": success_rate,
-            "type": q.question_type,
+            "type": item["type"],
             "difficulty": (
                 "easy" if success_rate >= 75 else
                 "medium" if success_rate >= 50 else
                 "hard"
             ),
-            "avg_time": avg_time,
-            "min_time": min_time,
-            "max_time": max_time,
+            "facility": item["facility"] or 0.0,
+            "discrimination": item["point_biserial"] or 0.0,
+            "discrimination_index": item["discrimination_index"] or 0.0,
+            "avg_time": item["avg_time"],
+            "min_time": item["min_time"],
+            "max_time": item["max_time"],
         })
 
     # ─────────────────────────────────────────────
     # 4b. Time Analytics
     # ─────────────────────────────────────────────
-    all_timed_answers = [
-        (a.time_spent_seconds, float(a.marks_awarded), float(a.question.marks))
-        for a in answers if a.time_spent_seconds is not None
-    ]
+    timed = ~np.isnan(ans_time)
 
-    if all_timed_answers:
-        all_times_raw = [t[0] for t in all_timed_answers]
-        avg_time_overall = round(sum(all_times_raw) / len(all_times_raw), 1)
-        sorted_times = sorted(all_times_raw)
-        median_time = sorted_times[len(sorted_times) // 2]
+    if timed.any():
+        times = ans_time[timed]
+        avg_time_overall = round(float(times.mean()), 1)
+        median_time = int(np.sort(times)[times.size // 2])
 
         # Per-student total time
-        student_times = {}
-        for a in answers:
-            if a.time_spent_seconds is not None:
-                sid = a.student_id
-                student_times.setdefault(sid, 0)
-                student_times[sid] += a.time_spent_seconds
-
-        avg_total_time = round(sum(student_times.values()) / len(student_times), 1) if student_times else 0
+        timed_students, _, student_total_times = stats.group_sums(ans_student[timed], times)
+        avg_total_time = round(float(student_total_times.mean()), 1)
 
         # Time vs accuracy correlation (Pearson) across all timed answers
-        times_list = [t[0] for t in all_timed_answers]
-        accuracy_list = [round((t[1] / t[2]) * 100, 1) if t[2] > 0 else 0 for t in all_timed_answers]
-
-        correlation = 0
-        if len(times_list) > 2:
-            n = len(times_list)
-            mean_t = sum(times_list) / n
-            mean_a = sum(accuracy_list) / n
-            numerator = sum((t - mean_t) * (a - mean_a) for t, a in zip(times_list, accuracy_list))
-            denom_t = (sum((t - mean_t) ** 2 for t in times_list)) ** 0.5
-            denom_a = (sum((a - mean_a) ** 2 for a in accuracy_list)) ** 0.5
-            correlation = round(numerator / (denom_t * denom_a), 3) if (denom_t * denom_a) > 0 else 0
+        timed_max = ans_max[timed]
+        accuracy = np.where(
+            timed_max > 0, np.round(ans_earned[timed] / np.where(timed_max > 0, timed_max, 1) * 100, 1), 0
+        )
+        correlation = round(stats.pearson(times, accuracy), 3) if times.size > 2 else 0
 
         # Compute overall expected time per mark for flagging
-        total_marks_timed = sum(t[2] for t in all_timed_answers)
-        total_time_timed = sum(t[0] for t in all_timed_answers)
-        time_per_mark = total_time_timed / total_marks_timed if total_marks_timed > 0 else 0
+        total_marks_timed = float(timed_max.sum())
+        time_per_mark = float(times.sum()) / total_marks_timed if total_marks_timed > 0 else 0
 
         for qs in question_stats:
             if qs["avg_time"] is not None:
@@ -5226,16 +5189,16 @@ def test_analytics_view(request, test_id):
                 qs["time_flag"] = "no_data"
 
         # Per-student time vs score for scatter chart
-        student_time_score = []
-        for sid, total_t in student_times.items():
-            for s in students:
-                if s["id"] == sid:
-                    student_time_score.append({
-                        "name": s["name"],
-                        "time": round(total_t / 60, 1),  # minutes
-                        "score": s["score"],
-                    })
-                    break
+        students_by_id = {s["id"]: s for s in students}
+        student_time_score = [
+            {
+                "name": students_by_id[sid]["name"],
+                "time": round(total_t / 60, 1),  # minutes
+                "score": students_by_id[sid]["score"],
+            }
+            for sid, total_t in zip(timed_students.tolist(), student_total_times.tolist())
+            if sid in students_by_id
+        ]
 
         time_analytics = {
             "has_data": True,
@@ -5246,7 +5209,7 @@ def test_analytics_view(request, test_id):
             "time_accuracy_correlation": correlation,
             "time_per_mark": round(time_per_mark, 1),
             "student_time_score": student_time_score,
-            "total_timed_answers": len(all_timed_answers),
+            "total_timed_answers": int(times.size),
         }
     else:
         time_analytics = {"has_data": False}
@@ -5256,16 +5219,13 @@ def test_analytics_view(request, test_id):
     # ─────────────────────────────────────────────
     # 5. Topic / LO mastery
     # ─────────────────────────────────────────────
-    topic_map = defaultdict(lambda: {"earned": 0.0, "max": 0.0})
-
-    for a in answers:
-        topic = a.question.topic
-        topic_map[topic]["earned"] += float(a.marks_awarded)
-        topic_map[topic]["max"] += float(a.question.marks)
+    topic_question_counts = Counter(q.topic_id for q in questions)
+    topic_names = dict(Topic.objects.filter(id__in=set(ans_topic.tolist())).values_list("id", "name"))
+    topic_ids, _, topic_earned, topic_max = stats.group_sums(ans_topic, ans_earned, ans_max)
 
     learning_objectives = []
-    for topic, d in topic_map.items():
-        mastery = round((d["earned"] / d["max"]) * 100, 1) if d["max"] else 0.0
+    for topic_id, earned, max_marks in zip(topic_ids.tolist(), topic_earned.tolist(), topic_max.tolist()):
+        mastery = round((earned / max_marks) * 100, 1) if max_marks else 0.0
 
         band = (
             "mastered" if mastery >= 80 else
@@ -5274,10 +5234,10 @@ def test_analytics_view(request, test_id):
         )
 
         learning_objectives.append({
-            "name": topic.name,
+            "name": topic_names.get(topic_id, "Uncategorized"),
             "avg_mastery": mastery,
             "band": band,
-            "question_count": test.questions.filter(topic=topic).count()
+            "question_count": topic_question_counts[topic_id or None]
         })
 
     # ─────────────────────────────────────────────
@@ -5357,20 +5317,14 @@ def test_analytics_view(request, test_id):
     # Build per-student, per-LO performance matrix
     lo_matrix = {}  # {student_id: {lo_name: {earned, max}}}
 
-    for a in answers:
-        sid = a.student_id
-
-        # Get all LOs for this question (using topic as proxy for now)
-        # In future, use a.question.learning_objectives.all() if properly tagged
-        lo_name = a.question.topic.name if a.question.topic else "Uncategorized"
-
-        if sid not in lo_matrix:
-            lo_matrix[sid] = {}
-        if lo_name not in lo_matrix[sid]:
-            lo_matrix[sid][lo_name] = {"earned": 0.0, "max": 0.0}
-
-        lo_matrix[sid][lo_name]["earned"] += float(a.marks_awarded)
-        lo_matrix[sid][lo_name]["max"] += float(a.question.marks)
+    # Topic is used as the LO proxy for now
+    # In future, use the question/LO through table if properly tagged
+    topic_span = int(ans_topic.max()) + 1
+    pairs, _, pair_earned, pair_max = stats.group_sums(ans_student * topic_span + ans_topic, ans_earned, ans_max)
+    for pair, earned, max_marks in zip(pairs.tolist(), pair_earned.tolist(), pair_max.tolist()):
+        sid, topic_id = divmod(pair, topic_span)
+        lo_name = topic_names.get(topic_id, "Uncategorized")
+        lo_matrix.setdefault(sid, {})[lo_name] = {"earned": earned, "max": max_marks}
 
     # Add LO performance to each student
     for s in students:
@@ -5442,35 +5396,39 @@ def test_analytics_view(request, test_id):
     completed_students = sum(1 for s in students if s["completion"]["complete"])
     completion_rate = round((completed_students / total_students) * 100, 1) if total_students else 0
 
-    context = {
-        "test": test,
-        "analytics": {
-            "students": students,
-            "distribution": {
-                "scores": scores,
-                "histogram": histogram(scores),
-                "mean": round(mean, 2),
-                "median": round(statistics.median(scores), 2),
-                "std_dev": round(std, 2),
-                "curve": {"x": curve_x, "y": curve_y},
-            },
-            "questions": question_stats,
-            "learning_objectives": learning_objectives,
-            "assessment_quality_radar": assessment_quality_radar,
-            "differentiated_groups": differentiated_groups,
-            "examiner_report": examiner_report,
-            "time_analytics": time_analytics,
-            "summary": {
-                "discrimination_index": round(discrimination_score / 100, 2),
-                "completion_rate": completion_rate,
-                "total_students": total_students,
-                "completed_students": completed_students,
+    return {
+        "students": students,
+        "distribution": {
+            "scores": scores,
+            "histogram": stats.histogram(scores),
+            "mean": round(mean, 2),
+            "median": round(cohort["median"], 2),
+            "std_dev": round(std, 2),
+            "percentiles": {p: round(v, 2) for p, v in stats.percentiles(scores).items()},
+            "curve": {"x": curve_x, "y": curve_y},
+            "kde": stats.kernel_density(scores),
+            "sections": {
+                section: {"count": d["count"], "mean": round(d["mean"], 2), "std_dev": round(d["std"], 2)}
+                for section, d in stats.section_breakdown(
+                    [s["score"] for s in students], [s["section"] for s in students]
+                ).items()
             },
-        }
+        },
+        "questions": question_stats,
+        "learning_objectives": learning_objectives,
+        "assessment_quality_radar": assessment_quality_radar,
+        "differentiated_groups": differentiated_groups,
+        "examiner_report": examiner_report,
+        "time_analytics": time_analytics,
+        "summary": {
+            "discrimination_index": round(discrimination_score / 100, 2),
+            "completion_rate": completion_rate,
+            "total_students": total_students,
+            "completed_students": completed_students,
+            "reliability": analysis["reliability"],
+        },
     }
 
-    return render(request, "teacher/analytics_dashboard.html", context)
-
 
 # ===================== QUESTION LIBRARY API =====================
 
@@ -5479,6 +5437,11 @@ def question_library_api_search(request):
     """
     API endpoint to search questions in the library
     GET /questions/api/search/?subject_id=&grade_id=&topic_id=&q=
+    With q, results come from the full-text index (core/search.py), best match
+    first, with a highlighted snippet each and subject / grade / topic facets.
+    Rows carry preview_text / thumbnail_url; add full=1 for question_text,
+    answer_text and parts_config (or fetch one question from /questions/api/<id>/).
+    Pass the response's next_cursor back as cursor= for the following page.
     """
     try:
         # Support both naming conventions: subject_id or subject, grade_id or grade
@@ -5487,33 +5450,51 @@ def question_library_api_search(request):
         topic_id = request.GET.get('topic_id') or request.GET.get('topic')
         search_query = request.GET.get('q', '').strip()
         limit = int(request.GET.get('limit', 50))
+        full = request.GET.get('full') == '1'
+        listing = Question.objects.select_related('topic')
+        if not full:
+            listing = listing.defer(*LISTING_DEFER)
 
-        questions = Question.objects.all().order_by('-created_at')
+        cursor = request.GET.get('cursor')
+        next_cursor = None
 
-        if subject_id:
-            questions = questions.filter(subject_id=subject_id)
-        if grade_id:
-            questions = questions.filter(grade_id=grade_id)
-        if topic_id:
-            questions = questions.filter(topic_id=topic_id)
         if search_query:
-            questions = questions.filter(question_text__icontains=search_query)
+            try:
+                _, after, _ = decode_cursor(cursor) if cursor else (None, None, None)
+            except InvalidCursor:
+                after = None
+            found = search_questions(
+                search_query, subject_id, grade_id, topic_id, limit + 1, after if after and len(after) == 2 else None
+            )
+            hits = found['hits'][:limit]
+            if len(found['hits']) > limit:
+                question_id, rank, _ = hits[-1]
+                next_cursor = encode_cursor(NEXT, [rank, question_id])
+            by_id = listing.in_bulk([pk for pk, _, _ in hits])
+            questions = [by_id[pk] for pk, _, _ in hits if pk in by_id]
+            highlights = {pk: highlight for pk, _, highlight in hits}
+        else:
+            questions = listing
 
-        questions = questions[:limit]
+            if subject_id:
+                questions = questions.filter(subject_id=subject_id)
+            if grade_id:
+                questions = questions.filter(grade_id=grade_id)
+            if topic_id:
+                questions = questions.filter(topic_id=topic_id)
+
+            page = KeysetPaginator(questions, limit, ['-created_at']).get_page(cursor)
+            questions, next_cursor = page.object_list, page.next_cursor
 
         results = []
         for q in questions:
             # Get topic name
             topic_name = q.topic.name if q.topic else 'No Topic'
 
-            # Truncate question text for preview
-            preview_text = q.question_text[:150] + '...' if len(q.question_text) > 150 else q.question_text
-
             results.append({
                 'id': q.id,
-                'question_text': q.question_text,
-                'preview_text': preview_text,
-                'answer_text': q.answer_text or '',
+                'preview_text': q.preview_text,
+                'thumbnail_url': thumbnail_url(q),
                 'marks': q.marks,
                 'question_type': q.question_type,
                 'topic_name': topic_name,
@@ -5521,14 +5502,26 @@ def question_library_api_search(request):
                 'subject_id': q.subject_id,
                 'grade_id': q.grade_id,
                 'year': q.year,
-                'parts_config': q.parts_config,
             })
+            if full:
+                results[-1].update({
+                    'question_text': q.question_text,
+                    'answer_text': q.answer_text or '',
+                    'parts_config': q.parts_config,
+                })
+            if search_query:
+                results[-1]['highlight'] = highlights[q.id]
 
-        return JsonResponse({
+        response = {
             'success': True,
             'questions': results,
-            'total': len(results)
-        })
+            'total': len(results),
+            'next_cursor': next_cursor,
+        }
+        if search_query:
+            response['matches'] = found['total']
+            response['facets'] = found['facets']
+        return JsonResponse(response)
 
     except Exception as e:
         return JsonResponse({
@@ -5575,6 +5568,66 @@ def question_library_api_get(request, question_id):
         }, status=500)
 
 
+@login_required
+def question_library_api_similar(request, question_id):
+    """
+    API endpoint for the questions most similar to one question
+    GET /questions/api/<id>/similar/?k=10&test_id=&any_subject=1
+    Neighbours come from the local vector index (core/similarity.py), best
+    first, within the question's subject unless any_subject=1. With test_id,
+    questions already in that test are left out.
+    """
+    try:
+        question = Question.objects.only('id', 'subject_id').get(id=question_id)
+        k = max(1, min(int(request.GET.get('k', 10)), 50))
+        subject_id = None if request.GET.get('any_subject') == '1' else question.subject_id
+        exclude = ()
+        if request.GET.get('test_id'):
+            exclude = TestQuestion.objects.filter(test_id=request.GET['test_id']).values_list('question_id', flat=True)
+
+        neighbours = similar_questions(question.id, k, subject_id, exclude)
+        by_id = Question.objects.select_related('topic').defer(*LISTING_DEFER).in_bulk([pk for pk, _ in neighbours])
+
+        results = []
+        for pk, score in neighbours:
+            q = by_id.get(pk)
+            if q is None:
+                continue
+            results.append({
+                'id': q.id,
+                'similarity': score,
+                'preview_text': q.preview_text,
+                'thumbnail_url': thumbnail_url(q),
+                'marks': q.marks,
+                'question_type': q.question_type,
+                'topic_name': q.topic.name if q.topic else 'No Topic',
+                'topic_id': q.topic_id,
+                'subject_id': q.subject_id,
+                'grade_id': q.grade_id,
+                'year': q.year,
+            })
+
+        return JsonResponse({
+            'success': True,
+            'question_id': question.id,
+            'questions': results,
+            'total': len(results),
+        })
+
+    except Question.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'error': 'Question not found'
+        }, status=404)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'k must be a number'}, status=400)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
 @login_required
 def question_library_api_create(request):
     """
@@ -5600,6 +5653,15 @@ def question_library_api_create(request):
         if not subject_id or not grade_id:
             return JsonResponse({'error': 'Subject and Grade are required'}, status=400)
 
+        # Refuse near-duplicates of existing questions when asked to
+        matches = find_duplicates(subject_id, question_text)
+        if matches and data.get('skip_duplicates'):
+            return JsonResponse({
+                'success': False,
+                'error': 'A near-duplicate of this question is already in the library',
+                **duplicate_summary(matches),
+            }, status=409)
+
         # Create the question
         question = Question.objects.create(
             question_text=question_text,
@@ -5619,11 +5681,14 @@ def question_library_api_create(request):
         if los:
             question.learning_objectives.set(los)
 
-        return JsonResponse({
+        response = {
             'success': True,
             'question_id': question.id,
             'message': 'Question created successfully'
-        })
+        }
+        if matches:
+            response.update(duplicate_summary(matches))
+        return JsonResponse(response)
 
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON'}, status=400)